@@ -1,10 +1,12 @@
 import time
 
 import numpy as np
+from scipy.stats import binned_statistic
 
-from pyfoamalgo.config import __NAN_DTYPES__
+from pyfoamalgo.config import __NAN_DTYPES__, __INT_DTYPES__
 from pyfoamalgo import (
-    nanmean, nansum, nanstd, nanvar, nanmin, nanmax, histogram1d
+    nanmean, nansum, nanstd, nanvar, nanmin, nanmax, histogram1d, histogram2d,
+    binned_mean_count, QuantileSketch
 )
 
 
@@ -46,6 +48,24 @@ def benchmark_nan_keep_zero_axis(f_cpp, f_py, shape, dtype):
           f"dt (numpy): {dt_py:.4f}")
 
 
+def benchmark_integer(f_cpp, f_py, shape, dtype):
+    data = np.random.randint(0, 1000, size=shape).astype(dtype)
+
+    t0 = time.perf_counter()
+    ret_cpp = f_cpp(data, axis=(-2, -1))
+    dt_cpp = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    ret_py = f_py(data, axis=(-2, -1))
+    dt_py = time.perf_counter() - t0
+
+    np.testing.assert_allclose(ret_cpp, ret_py, rtol=1e-6)
+
+    print(f"\ninteger, axis = (-2, -1), dtype = {dtype} - \n"
+          f"dt (cpp): {dt_cpp:.4f}, "
+          f"dt (numpy): {dt_py:.4f}")
+
+
 def benchmark_histogram1d(f_cpp, f_py, shape, dtype):
     data = np.random.randn(*shape).astype(dtype=dtype)
 
@@ -64,6 +84,63 @@ def benchmark_histogram1d(f_cpp, f_py, shape, dtype):
     print(f"\ndtype = {dtype} - \ndt (cpp): {dt_cpp:.4f}, dt (numpy): {dt_py:.4f}")
 
 
+def benchmark_histogram2d(f_cpp, f_py, shape, dtype):
+    x = np.random.randn(*shape).astype(dtype=dtype)
+    y = np.random.randn(*shape).astype(dtype=dtype)
+
+    t0 = time.perf_counter()
+    ret_cpp = f_cpp(x, y, bins=100)
+    dt_cpp = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    ret_py = f_py(x.ravel(), y.ravel(), bins=100)
+    dt_py = time.perf_counter() - t0
+
+    np.testing.assert_allclose(ret_cpp[0], ret_py[0], rtol=1e-4)
+
+    print(f"\n----- {f_cpp.__name__} ------")
+    print(f"\ndtype = {dtype} - \ndt (cpp): {dt_cpp:.4f}, dt (numpy): {dt_py:.4f}")
+
+
+def benchmark_binned_mean_count(shape, dtype):
+    x = np.random.randn(*shape).astype(dtype=dtype).ravel()
+    y = np.random.randn(*shape).astype(dtype=dtype).ravel()
+
+    t0 = time.perf_counter()
+    mean_cpp, count_cpp, _ = binned_mean_count(x, y, bins=100)
+    dt_cpp = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    mean_py, _, _ = binned_statistic(x, y, 'mean', bins=100)
+    count_py, _, _ = binned_statistic(x, y, 'count', bins=100)
+    dt_py = time.perf_counter() - t0
+
+    np.testing.assert_allclose(mean_cpp, mean_py, rtol=1e-4, atol=1e-6)
+    np.testing.assert_array_equal(count_cpp, count_py)
+
+    print("\n----- binned_mean_count ------")
+    print(f"\ndtype = {dtype} - \ndt (cpp): {dt_cpp:.4f}, dt (scipy): {dt_py:.4f}")
+
+
+def benchmark_quantile_sketch(shape, dtype):
+    data = np.random.randn(*shape).astype(dtype=dtype)
+    data[:, :3, ::3] = np.nan
+
+    t0 = time.perf_counter()
+    sketch = QuantileSketch()
+    sketch.update(data)
+    ret_cpp = sketch.quantile([0.01, 0.99])
+    dt_cpp = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    ret_py = np.nanquantile(data, [0.01, 0.99])
+    dt_py = time.perf_counter() - t0
+
+    np.testing.assert_allclose(ret_cpp, ret_py, atol=0.1)
+
+    print("\n----- QuantileSketch ------")
+    print(f"\ndtype = {dtype} - \ndt (cpp): {dt_cpp:.4f}, dt (numpy): {dt_py:.4f}")
+
 if __name__ == "__main__":
     print("*" * 80)
     print("Benchmark statistics functions")
@@ -82,3 +159,17 @@ if __name__ == "__main__":
 
         for f_cpp, f_py in [(histogram1d, np.histogram)]:
             benchmark_histogram1d(f_cpp, f_py, s, dtype)
+
+        benchmark_histogram2d(histogram2d, np.histogram2d, s, dtype)
+
+        benchmark_binned_mean_count(s, dtype)
+
+        benchmark_quantile_sketch(s, dtype)
+
+    for dtype in __INT_DTYPES__:
+        for f_cpp, f_py in [(nansum, np.sum),
+                            (nanmean, np.mean),
+                            (nanstd, np.std),
+                            (nanmax, np.max)]:
+            print(f"\n----- {f_cpp.__name__} ------")
+            benchmark_integer(f_cpp, f_py, s, dtype)
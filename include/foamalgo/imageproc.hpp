@@ -10,7 +10,13 @@
 #ifndef FOAM_IMAGE_PROC_H
 #define FOAM_IMAGE_PROC_H
 
+#include <algorithm>
+#include <array>
+#include <cmath>
+#include <cstdint>
+#include <limits>
 #include <type_traits>
+#include <vector>
 
 #include "xtensor/xview.hpp"
 #include "xtensor/xmath.hpp"
@@ -21,6 +27,7 @@
 #include "tbb/blocked_range2d.h"
 #endif
 
+#include "miscellaneous.hpp"
 #include "traits.hpp"
 #include "utilities.hpp"
 
@@ -28,26 +35,31 @@
 namespace foam
 {
 
-#if defined(FOAMALGO_USE_TBB)
 namespace detail
 {
 
-template<typename E>
-inline auto nanmeanImageArrayImp(E&& src, const std::vector<size_t>& keep = {})
+template<typename E, typename O>
+inline void nanmeanImageArrayImp(const E& src, const std::vector<size_t>& keep, O& out)
 {
   using value_type = typename std::decay_t<E>::value_type;
   auto shape = src.shape();
 
-  auto mean = ReducedImageType<E>::from_shape({static_cast<std::size_t>(shape[1]),
-                                               static_cast<std::size_t>(shape[2])});
+  utils::checkShape(out.shape(), shape, "Output and input images have different shapes", 0, 1);
 
+#if defined(FOAMALGO_USE_TBB)
   tbb::parallel_for(tbb::blocked_range2d<int>(0, shape[1], 0, shape[2]),
-    [&src, &keep, &shape, &mean] (const tbb::blocked_range2d<int> &block)
+    [&src, &keep, &shape, &out] (const tbb::blocked_range2d<int> &block)
     {
       for(int j=block.rows().begin(); j != block.rows().end(); ++j)
       {
         for(int k=block.cols().begin(); k != block.cols().end(); ++k)
         {
+#else
+      for (size_t j = 0; j < shape[1]; ++j)
+      {
+        for (size_t k = 0; k < shape[2]; ++k)
+        {
+#endif
           std::size_t count = 0;
           value_type sum = 0;
           if (keep.empty())
@@ -75,18 +87,58 @@ inline auto nanmeanImageArrayImp(E&& src, const std::vector<size_t>& keep = {})
           }
 
           if (count == 0)
-            mean(j, k) = std::numeric_limits<value_type>::quiet_NaN();
-          else mean(j, k) = sum / value_type(count);
+            out(j, k) = std::numeric_limits<value_type>::quiet_NaN();
+          else out(j, k) = sum / value_type(count);
         }
       }
+#if defined(FOAMALGO_USE_TBB)
     }
   );
+#endif
+}
 
-  return mean;
+template<typename E, typename O>
+inline void nanmeanTwoImagesImp(const E& src1, const E& src2, O& out)
+{
+  using value_type = typename std::decay_t<E>::value_type;
+  auto shape = src1.shape();
+
+  utils::checkShape(shape, src2.shape(), "Images have different shapes");
+  utils::checkShape(out.shape(), shape, "Output and input images have different shapes");
+
+#if defined(FOAMALGO_USE_TBB)
+  tbb::parallel_for(tbb::blocked_range2d<int>(0, shape[0], 0, shape[1]),
+    [&src1, &src2, &out] (const tbb::blocked_range2d<int> &block)
+    {
+      for(int j=block.rows().begin(); j != block.rows().end(); ++j)
+      {
+        for(int k=block.cols().begin(); k != block.cols().end(); ++k)
+        {
+#else
+      for (size_t j = 0; j < shape[0]; ++j)
+      {
+        for (size_t k = 0; k < shape[1]; ++k)
+        {
+#endif
+          auto x = src1(j, k);
+          auto y = src2(j, k);
+
+          if (std::isnan(x) and std::isnan(y))
+            out(j, k) = std::numeric_limits<value_type>::quiet_NaN();
+          else if (std::isnan(x))
+            out(j, k) = y;
+          else if (std::isnan(y))
+            out(j, k) = x;
+          else out(j, k)  = value_type(0.5) * (x + y);
+        }
+      }
+#if defined(FOAMALGO_USE_TBB)
+    }
+  );
+#endif
 }
 
 } // detail
-#endif
 
 /**
  * @brief Calculate the nanmean of the selected images from an array of images.
@@ -99,13 +151,29 @@ template<typename E, EnableIf<std::decay_t<E>, IsImageArray> = false>
 inline auto nanmeanImageArray(E&& src, const std::vector<size_t>& keep)
 {
   if (keep.empty()) throw std::invalid_argument("keep cannot be empty!");
-#if defined(FOAMALGO_USE_TBB)
-  return detail::nanmeanImageArrayImp(std::forward<E>(src), keep);
-#else
-  using value_type = typename std::decay_t<E>::value_type;
-  auto&& sliced(xt::view(std::forward<E>(src), xt::keep(keep), xt::all(), xt::all()));
-  return xt::eval(xt::nanmean<value_type>(sliced, 0));
-#endif
+
+  auto shape = src.shape();
+  auto mean = ReducedImageType<E>::from_shape({static_cast<std::size_t>(shape[1]),
+                                               static_cast<std::size_t>(shape[2])});
+  detail::nanmeanImageArrayImp(src, keep, mean);
+  return mean;
+}
+
+/**
+ * @brief Calculate the nanmean of the selected images from an array of images
+ * and write the result into a pre-allocated image.
+ *
+ * @param src: image data. shape = (indices, y, x)
+ * @param keep: a list of selected indices.
+ * @param out: output image. shape = (y, x)
+ */
+template<typename E, typename O,
+         EnableIf<std::decay_t<E>, IsImageArray> = false, EnableIf<O, IsImage> = false>
+inline void nanmeanImageArray(E&& src, const std::vector<size_t>& keep, O& out)
+{
+  if (keep.empty()) throw std::invalid_argument("keep cannot be empty!");
+
+  detail::nanmeanImageArrayImp(src, keep, out);
 }
 
 /**
@@ -117,12 +185,25 @@ inline auto nanmeanImageArray(E&& src, const std::vector<size_t>& keep)
 template<typename E, EnableIf<std::decay_t<E>, IsImageArray> = false>
 inline auto nanmeanImageArray(E&& src)
 {
-#if defined(FOAMALGO_USE_TBB)
-  return detail::nanmeanImageArrayImp(std::forward<E>(src));
-#else
-  using value_type = typename std::decay_t<E>::value_type;
-  return xt::eval(xt::nanmean<value_type>(std::forward<E>(src), 0));
-#endif
+  auto shape = src.shape();
+  auto mean = ReducedImageType<E>::from_shape({static_cast<std::size_t>(shape[1]),
+                                               static_cast<std::size_t>(shape[2])});
+  detail::nanmeanImageArrayImp(src, {}, mean);
+  return mean;
+}
+
+/**
+ * @brief Calculate the nanmean of an array of images and write the result
+ * into a pre-allocated image.
+ *
+ * @param src: image data. shape = (indices, y, x)
+ * @param out: output image. shape = (y, x)
+ */
+template<typename E, typename O,
+         EnableIf<std::decay_t<E>, IsImageArray> = false, EnableIf<O, IsImage> = false>
+inline void nanmeanImageArray(E&& src, O& out)
+{
+  detail::nanmeanImageArrayImp(src, {}, out);
 }
 
 /**
@@ -135,159 +216,473 @@ inline auto nanmeanImageArray(E&& src)
 template<typename E>
 inline auto nanmeanImageArray(E&& src1, E&& src2)
 {
-  using value_type = typename std::decay_t<E>::value_type;
   auto shape = src1.shape();
+  auto mean = std::decay_t<E>({shape[0], shape[1]});
+  detail::nanmeanTwoImagesImp(src1, src2, mean);
+  return mean;
+}
 
-  utils::checkShape(shape, src2.shape(), "Images have different shapes");
+/**
+ * @brief Calculate the nanmean of two images and write the result into a
+ * pre-allocated image.
+ *
+ * @param src1: image data. shape = (y, x)
+ * @param src2: image data. shape = (y, x)
+ * @param out: output image. shape = (y, x)
+ */
+template<typename E, typename O, EnableIf<O, IsImage> = false>
+inline void nanmeanImageArray(E&& src1, E&& src2, O& out)
+{
+  detail::nanmeanTwoImagesImp(src1, src2, out);
+}
 
-#if defined(FOAMALGO_USE_TBB)
-  auto mean = std::decay_t<E>({shape[0], shape[1]});
+/**
+ * @brief Calculate the nanmeans of groups of images from an array of images
+ * in a single pass.
+ *
+ * @param src: image data. shape = (indices, y, x)
+ * @param labels: group label of each image. Images with negative labels
+ *                are ignored.
+ * @param out: the nanmean image of each group. The nanmean of a group
+ *             without any image is NaN. shape = (groups, y, x)
+ */
+template<typename E, typename O,
+         EnableIf<std::decay_t<E>, IsImageArray> = false, EnableIf<O, IsImageArray> = false>
+inline void groupedNanmeanImageArray(E&& src, const std::vector<int>& labels, O& out)
+{
+  using value_type = typename std::decay_t<E>::value_type;
+  using out_value_type = typename O::value_type;
+  auto shape = src.shape();
+  auto n_groups = out.shape()[0];
 
-  tbb::parallel_for(tbb::blocked_range2d<int>(0, shape[0], 0, shape[1]),
-    [&src1, &src2, &shape, &mean] (const tbb::blocked_range2d<int> &block)
+  FOAM_ASSERT_ARGUMENT(labels.size() == shape[0], "Number of labels and number of images are different")
+  for (auto label : labels)
+  {
+    FOAM_ASSERT_ARGUMENT(label < static_cast<int>(n_groups), "Label exceeds the number of groups")
+  }
+  utils::checkShape(out.shape(), shape, "Output and input images have different shapes", 1, 1);
+
+#if defined(FOAMALGO_USE_TBB)
+  tbb::parallel_for(tbb::blocked_range2d<int>(0, shape[1], 0, shape[2]),
+    [&src, &labels, &shape, &out, n_groups] (const tbb::blocked_range2d<int> &block)
     {
+      std::vector<value_type> sums(n_groups);
+      std::vector<size_t> counts(n_groups);
       for(int j=block.rows().begin(); j != block.rows().end(); ++j)
       {
         for(int k=block.cols().begin(); k != block.cols().end(); ++k)
         {
-          auto x = src1(j, k);
-          auto y = src2(j, k);
+#else
+      std::vector<value_type> sums(n_groups);
+      std::vector<size_t> counts(n_groups);
+      for (size_t j = 0; j < shape[1]; ++j)
+      {
+        for (size_t k = 0; k < shape[2]; ++k)
+        {
+#endif
+          std::fill(sums.begin(), sums.end(), value_type(0));
+          std::fill(counts.begin(), counts.end(), 0);
+          for (size_t i = 0; i < shape[0]; ++i)
+          {
+            int label = labels[i];
+            if (label < 0) continue;
 
-          if (std::isnan(x) and std::isnan(y))
-            mean(j, k) = std::numeric_limits<value_type>::quiet_NaN();
-          else if (std::isnan(x))
-            mean(j, k) = y;
-          else if (std::isnan(y))
-            mean(j, k) = x;
-          else mean(j, k)  = value_type(0.5) * (x + y);
+            auto v = src(i, j, k);
+            if (! std::isnan(v))
+            {
+              counts[label] += 1;
+              sums[label] += v;
+            }
+          }
+
+          for (size_t g = 0; g < n_groups; ++g)
+          {
+            if (counts[g] == 0)
+              out(g, j, k) = std::numeric_limits<out_value_type>::quiet_NaN();
+            else out(g, j, k) = static_cast<out_value_type>(sums[g] / value_type(counts[g]));
+          }
         }
       }
+#if defined(FOAMALGO_USE_TBB)
     }
   );
-
-  return mean;
-#else
-  auto&& stacked = xt::stack(xt::xtuple(std::forward<E>(src1), std::forward<E>(src2)));
-  return xt::eval(xt::nanmean<value_type>(stacked, 0));
 #endif
 }
 
+namespace detail
+{
+
 /**
- * @brief Inplace convert nan using 0 in an image.
+ * Reduce the non-nan values of each pixel along the first axis of an array
+ * of images. Pixels are processed in 2D tiles and each tile reuses its own
+ * buffer for the collected values.
  *
- * @param src: image data. shape = (y, x)
+ * @param src: image data. shape = (indices, y, x)
+ * @param keep: a list of selected indices. All images are used if empty.
+ * @param out: output image. shape = (y, x)
+ * @param functor: callable which takes a vector of the collected values and
+ *                 returns the reduced value.
  */
-template <typename E, EnableIf<E, IsImage> = false>
-inline void maskImageDataZero(E& src)
+template<typename E, typename O, typename F>
+inline void nanreduceImageArrayImp(const E& src, const std::vector<size_t>& keep, O& out, F&& functor)
 {
-  using value_type = typename E::value_type;
+  using value_type = typename std::decay_t<E>::value_type;
   auto shape = src.shape();
+  size_t n = keep.empty() ? shape[0] : keep.size();
 
-  for (size_t j = 0; j < shape[0]; ++j)
-  {
-    for (size_t k = 0; k < shape[1]; ++k)
+#if defined(FOAMALGO_USE_TBB)
+  tbb::parallel_for(tbb::blocked_range2d<int>(0, shape[1], 0, shape[2]),
+    [&src, &keep, &shape, &out, &functor, n] (const tbb::blocked_range2d<int> &block)
     {
-      if (std::isnan(src(j, k))) src(j, k) = value_type(0);
+      std::vector<value_type> buffer;
+      buffer.reserve(n);
+      for(int j=block.rows().begin(); j != block.rows().end(); ++j)
+      {
+        for(int k=block.cols().begin(); k != block.cols().end(); ++k)
+        {
+#else
+      std::vector<value_type> buffer;
+      buffer.reserve(n);
+      for (size_t j = 0; j < shape[1]; ++j)
+      {
+        for (size_t k = 0; k < shape[2]; ++k)
+        {
+#endif
+          buffer.clear();
+          if (keep.empty())
+          {
+            for (size_t i = 0; i < shape[0]; ++i)
+            {
+              auto v = src(i, j, k);
+              if (! std::isnan(v)) buffer.push_back(v);
+            }
+          } else
+          {
+            for (auto it = keep.begin(); it != keep.end(); ++it)
+            {
+              auto v = src(*it, j, k);
+              if (! std::isnan(v)) buffer.push_back(v);
+            }
+          }
+
+          out(j, k) = functor(buffer);
+        }
+      }
+#if defined(FOAMALGO_USE_TBB)
     }
-  }
+  );
+#endif
 }
 
 /**
- * @brief Maintain an identical API with maskImageDataZero.
- *
- * @param src: image data. shape = (y, x)
+ * Calculate the median of a buffer of non-nan values. The order of the
+ * values in the buffer is not preserved.
  */
-template <typename E, EnableIf<E, IsImage> = false>
-inline void maskImageDataNan(E& src) {}
+template<typename T>
+inline T medianOfBuffer(std::vector<T>& buffer)
+{
+  size_t n = buffer.size();
+  if (n == 0) return std::numeric_limits<T>::quiet_NaN();
+
+  auto mid = buffer.begin() + n / 2;
+  std::nth_element(buffer.begin(), mid, buffer.end());
+  if (n % 2 == 1) return *mid;
+  // the lower middle is the maximum of the left partition
+  return T(0.5) * (*mid + *std::max_element(buffer.begin(), mid));
+}
 
 /**
- * @brief Get the nan mask of an image.
- *
- * This function is a complementary to maskImageDataNan since the overload
- * maskImageDataNan(E& src, N& out) is ambiguous because of another overload
- * maskImageDataNan(E& src, const M& mask).
- *
- * @param src: image data. shape = (y, x)
- * @param out: output array to place the mask. shape = (y, x)
+ * Calculate the mean and the (population) standard deviation of a buffer
+ * of non-nan values.
  */
-template <typename E, typename N, EnableIf<E, IsImage> = false, EnableIf<N, IsImageMask> = false>
-inline void imageDataNanMask(const E& src, N& out)
+template<typename T>
+inline std::pair<T, T> meanStdOfBuffer(const std::vector<T>& buffer)
 {
-  auto shape = src.shape();
-
-  utils::checkShape(shape, out.shape(), "Image and output array have different shapes");
+  auto nan = std::numeric_limits<T>::quiet_NaN();
+  size_t n = buffer.size();
+  if (n == 0) return {nan, nan};
+
+  // accumulate in double to preserve precision for a large number of float values
+  double sum = 0.;
+  for (auto v : buffer) sum += v;
+  double mean = sum / static_cast<double>(n);
+
+  double ss = 0.;
+  for (auto v : buffer) ss += (v - mean) * (v - mean);
+  return {static_cast<T>(mean), static_cast<T>(std::sqrt(ss / static_cast<double>(n)))};
+}
 
-  for (size_t j = 0; j < shape[0]; ++j)
+/**
+ * Calculate the mean of a buffer of non-nan values after iteratively
+ * rejecting the values which are more than 'sigma' standard deviations away
+ * from the median. The order of the values in the buffer is not preserved.
+ */
+template<typename T>
+inline T sigmaClippedMeanOfBuffer(std::vector<T>& buffer, T sigma, size_t max_iter)
+{
+  for (size_t iter = 0; iter < max_iter; ++iter)
   {
-    for (size_t k = 0; k < shape[1]; ++k)
-    {
-      if (std::isnan(src(j, k))) out(j, k) = true;
-    }
+    if (buffer.size() <= 1) break;
+
+    T bound = sigma * meanStdOfBuffer(buffer).second;
+    T median = medianOfBuffer(buffer);
+
+    auto last = std::remove_if(buffer.begin(), buffer.end(),
+                               [median, bound] (T v) { return std::abs(v - median) > bound; });
+    if (last == buffer.end()) break;
+    buffer.erase(last, buffer.end());
   }
+
+  return meanStdOfBuffer(buffer).first;
 }
 
+} // detail
+
 /**
- * @brief Inplace mask an image using 0 with threshold mask. Nan pixels in
- * the image are also converted into 0.
+ * @brief Calculate the nanmedian of the selected images from an array of images.
  *
- * @param src: image data. shape = (y, x)
- * @param lb: lower threshold
- * @param ub: upper threshold
+ * @param src: image data. shape = (indices, y, x)
+ * @param keep: a list of selected indices.
+ * @return: the nanmedian image. shape = (y, x)
  */
-template <typename E, typename T,
-  EnableIf<E, IsImage> = false, std::enable_if_t<std::is_arithmetic<T>::value, bool> = false>
-inline void maskImageDataZero(E& src, T lb, T ub)
+template<typename E, EnableIf<std::decay_t<E>, IsImageArray> = false>
+inline auto nanmedianImageArray(E&& src, const std::vector<size_t>& keep)
 {
-  using value_type = typename E::value_type;
-  auto shape = src.shape();
+  if (keep.empty()) throw std::invalid_argument("keep cannot be empty!");
 
-  for (size_t j = 0; j < shape[0]; ++j)
-  {
-    for (size_t k = 0; k < shape[1]; ++k)
-    {
-      auto v = src(j, k);
-      if (std::isnan(v) || v < lb || v > ub) src(j, k) = value_type(0);
-    }
-  }
+  using value_type = typename std::decay_t<E>::value_type;
+  auto shape = src.shape();
+  auto median = ReducedImageType<E>::from_shape({static_cast<std::size_t>(shape[1]),
+                                                 static_cast<std::size_t>(shape[2])});
+  detail::nanreduceImageArrayImp(src, keep, median, detail::medianOfBuffer<value_type>);
+  return median;
 }
 
 /**
- * @brief Inplace mask an image using 0 with threshold mask. Nan pixels in
- * the image are also converted into 0.
+ * @brief Calculate the nanmedian of an array of images.
  *
- * @param src: image data. shape = (y, x)
- * @param lb: lower threshold
- * @param ub: upper threshold
- * @param out: output array to place the overall mask. shape = (y, x)
+ * @param src: image data. shape = (indices, y, x)
+ * @return: the nanmedian image. shape = (y, x)
  */
-template <typename E, typename T, typename N,
-  EnableIf<E, IsImage> = false, std::enable_if_t<std::is_arithmetic<T>::value, bool> = false,
-  EnableIf<N, IsImageMask> = false>
-inline void maskImageDataZero(E& src, T lb, T ub, N& out)
+template<typename E, EnableIf<std::decay_t<E>, IsImageArray> = false>
+inline auto nanmedianImageArray(E&& src)
 {
-  using value_type = typename E::value_type;
+  using value_type = typename std::decay_t<E>::value_type;
   auto shape = src.shape();
-
-  utils::checkShape(shape, out.shape(), "Image and output array have different shapes");
-
-  for (size_t j = 0; j < shape[0]; ++j)
-  {
-    for (size_t k = 0; k < shape[1]; ++k)
-    {
-      auto v = src(j, k);
-      if (std::isnan(v) || v < lb || v > ub)
-      {
-        src(j, k) = value_type(0);
-        out(j, k) = true;
-      }
-    }
-  }
+  auto median = ReducedImageType<E>::from_shape({static_cast<std::size_t>(shape[1]),
+                                                 static_cast<std::size_t>(shape[2])});
+  detail::nanreduceImageArrayImp(src, {}, median, detail::medianOfBuffer<value_type>);
+  return median;
 }
 
 /**
- * @brief Inplace mask an image using nan with threshold mask.
+ * @brief Calculate the nanstd of the selected images from an array of images.
  *
- * @param src: image data. shape = (y, x)
+ * @param src: image data. shape = (indices, y, x)
+ * @param keep: a list of selected indices.
+ * @return: the nanstd image. shape = (y, x)
+ */
+template<typename E, EnableIf<std::decay_t<E>, IsImageArray> = false>
+inline auto nanstdImageArray(E&& src, const std::vector<size_t>& keep)
+{
+  if (keep.empty()) throw std::invalid_argument("keep cannot be empty!");
+
+  using value_type = typename std::decay_t<E>::value_type;
+  auto shape = src.shape();
+  auto stdev = ReducedImageType<E>::from_shape({static_cast<std::size_t>(shape[1]),
+                                                static_cast<std::size_t>(shape[2])});
+  detail::nanreduceImageArrayImp(src, keep, stdev,
+    [] (const std::vector<value_type>& buffer) { return detail::meanStdOfBuffer(buffer).second; });
+  return stdev;
+}
+
+/**
+ * @brief Calculate the nanstd of an array of images.
+ *
+ * @param src: image data. shape = (indices, y, x)
+ * @return: the nanstd image. shape = (y, x)
+ */
+template<typename E, EnableIf<std::decay_t<E>, IsImageArray> = false>
+inline auto nanstdImageArray(E&& src)
+{
+  using value_type = typename std::decay_t<E>::value_type;
+  auto shape = src.shape();
+  auto stdev = ReducedImageType<E>::from_shape({static_cast<std::size_t>(shape[1]),
+                                                static_cast<std::size_t>(shape[2])});
+  detail::nanreduceImageArrayImp(src, {}, stdev,
+    [] (const std::vector<value_type>& buffer) { return detail::meanStdOfBuffer(buffer).second; });
+  return stdev;
+}
+
+/**
+ * @brief Calculate the sigma-clipped nanmean of the selected images from an
+ * array of images.
+ *
+ * For each pixel, values which are more than 'sigma' standard deviations
+ * away from the median are rejected iteratively until no value is rejected
+ * or the maximum number of iterations is reached.
+ *
+ * @param src: image data. shape = (indices, y, x)
+ * @param keep: a list of selected indices.
+ * @param sigma: number of standard deviations used as the clipping bound.
+ * @param max_iter: maximum number of clipping iterations.
+ * @return: the sigma-clipped nanmean image. shape = (y, x)
+ */
+template<typename E, typename T, EnableIf<std::decay_t<E>, IsImageArray> = false>
+inline auto sigmaClippedNanmeanImageArray(E&& src, const std::vector<size_t>& keep, T sigma, size_t max_iter)
+{
+  if (keep.empty()) throw std::invalid_argument("keep cannot be empty!");
+  FOAM_ASSERT_ARGUMENT(sigma > 0, "sigma must be positive")
+
+  using value_type = typename std::decay_t<E>::value_type;
+  auto shape = src.shape();
+  auto mean = ReducedImageType<E>::from_shape({static_cast<std::size_t>(shape[1]),
+                                               static_cast<std::size_t>(shape[2])});
+  detail::nanreduceImageArrayImp(src, keep, mean,
+    [sigma, max_iter] (std::vector<value_type>& buffer)
+    { return detail::sigmaClippedMeanOfBuffer(buffer, static_cast<value_type>(sigma), max_iter); });
+  return mean;
+}
+
+/**
+ * @brief Calculate the sigma-clipped nanmean of an array of images.
+ *
+ * @param src: image data. shape = (indices, y, x)
+ * @param sigma: number of standard deviations used as the clipping bound.
+ * @param max_iter: maximum number of clipping iterations.
+ * @return: the sigma-clipped nanmean image. shape = (y, x)
+ */
+template<typename E, typename T, EnableIf<std::decay_t<E>, IsImageArray> = false>
+inline auto sigmaClippedNanmeanImageArray(E&& src, T sigma, size_t max_iter)
+{
+  FOAM_ASSERT_ARGUMENT(sigma > 0, "sigma must be positive")
+
+  using value_type = typename std::decay_t<E>::value_type;
+  auto shape = src.shape();
+  auto mean = ReducedImageType<E>::from_shape({static_cast<std::size_t>(shape[1]),
+                                               static_cast<std::size_t>(shape[2])});
+  detail::nanreduceImageArrayImp(src, {}, mean,
+    [sigma, max_iter] (std::vector<value_type>& buffer)
+    { return detail::sigmaClippedMeanOfBuffer(buffer, static_cast<value_type>(sigma), max_iter); });
+  return mean;
+}
+
+/**
+ * @brief Inplace convert nan using 0 in an image.
+ *
+ * @param src: image data. shape = (y, x)
+ */
+template <typename E, EnableIf<E, IsImage> = false>
+inline void maskImageDataZero(E& src)
+{
+  using value_type = typename E::value_type;
+  auto shape = src.shape();
+
+  for (size_t j = 0; j < shape[0]; ++j)
+  {
+    for (size_t k = 0; k < shape[1]; ++k)
+    {
+      if (std::isnan(src(j, k))) src(j, k) = value_type(0);
+    }
+  }
+}
+
+/**
+ * @brief Maintain an identical API with maskImageDataZero.
+ *
+ * @param src: image data. shape = (y, x)
+ */
+template <typename E, EnableIf<E, IsImage> = false>
+inline void maskImageDataNan(E& src) {}
+
+/**
+ * @brief Get the nan mask of an image.
+ *
+ * This function is a complementary to maskImageDataNan since the overload
+ * maskImageDataNan(E& src, N& out) is ambiguous because of another overload
+ * maskImageDataNan(E& src, const M& mask).
+ *
+ * @param src: image data. shape = (y, x)
+ * @param out: output array to place the mask. shape = (y, x)
+ */
+template <typename E, typename N, EnableIf<E, IsImage> = false, EnableIf<N, IsImageMask> = false>
+inline void imageDataNanMask(const E& src, N& out)
+{
+  auto shape = src.shape();
+
+  utils::checkShape(shape, out.shape(), "Image and output array have different shapes");
+
+  for (size_t j = 0; j < shape[0]; ++j)
+  {
+    for (size_t k = 0; k < shape[1]; ++k)
+    {
+      if (std::isnan(src(j, k))) out(j, k) = true;
+    }
+  }
+}
+
+/**
+ * @brief Inplace mask an image using 0 with threshold mask. Nan pixels in
+ * the image are also converted into 0.
+ *
+ * @param src: image data. shape = (y, x)
+ * @param lb: lower threshold
+ * @param ub: upper threshold
+ */
+template <typename E, typename T,
+  EnableIf<E, IsImage> = false, std::enable_if_t<std::is_arithmetic<T>::value, bool> = false>
+inline void maskImageDataZero(E& src, T lb, T ub)
+{
+  using value_type = typename E::value_type;
+  auto shape = src.shape();
+
+  for (size_t j = 0; j < shape[0]; ++j)
+  {
+    for (size_t k = 0; k < shape[1]; ++k)
+    {
+      auto v = src(j, k);
+      if (std::isnan(v) || v < lb || v > ub) src(j, k) = value_type(0);
+    }
+  }
+}
+
+/**
+ * @brief Inplace mask an image using 0 with threshold mask. Nan pixels in
+ * the image are also converted into 0.
+ *
+ * @param src: image data. shape = (y, x)
+ * @param lb: lower threshold
+ * @param ub: upper threshold
+ * @param out: output array to place the overall mask. shape = (y, x)
+ */
+template <typename E, typename T, typename N,
+  EnableIf<E, IsImage> = false, std::enable_if_t<std::is_arithmetic<T>::value, bool> = false,
+  EnableIf<N, IsImageMask> = false>
+inline void maskImageDataZero(E& src, T lb, T ub, N& out)
+{
+  using value_type = typename E::value_type;
+  auto shape = src.shape();
+
+  utils::checkShape(shape, out.shape(), "Image and output array have different shapes");
+
+  for (size_t j = 0; j < shape[0]; ++j)
+  {
+    for (size_t k = 0; k < shape[1]; ++k)
+    {
+      auto v = src(j, k);
+      if (std::isnan(v) || v < lb || v > ub)
+      {
+        src(j, k) = value_type(0);
+        out(j, k) = true;
+      }
+    }
+  }
+}
+
+/**
+ * @brief Inplace mask an image using nan with threshold mask.
+ *
+ * @param src: image data. shape = (y, x)
  * @param lb: lower threshold
  * @param ub: upper threshold
  */
@@ -901,63 +1296,141 @@ inline void maskImageDataNan(E& src, const M& mask, T lb, T ub)
 }
 
 /**
- * @brief Inplace apply moving average for an image
- *
- * @param src: moving average of image data. shape = (y, x)
- * @param data: new image data. shape = (y, x)
- * @param count: new moving average count.
+ * Reason codes of bad pixels. A bad pixel can have more than one reason.
  */
-template <typename E, EnableIf<E, IsImage> = false>
-inline void movingAvgImageData(E& src, const E& data, size_t count)
+enum class BadPixel : uint8_t
 {
-  if (count == 0) throw std::invalid_argument("'count' cannot be zero!");
+  NONE = 0x00,
+  NAN_VALUE = 0x01, // mean or standard deviation is NaN
+  COLD = 0x02, // mean is below the lower bound
+  HOT = 0x04, // mean is above the upper bound
+  DEAD = 0x08, // standard deviation is below the lower bound
+  NOISY = 0x10, // standard deviation is above the upper bound
+};
+
+namespace detail
+{
+
+template<typename T>
+inline uint8_t badPixelCode(T mean, T stdev, T mean_lb, T mean_ub, T std_lb, T std_ub)
+{
+  if (std::isnan(mean) || std::isnan(stdev)) return static_cast<uint8_t>(BadPixel::NAN_VALUE);
+
+  uint8_t code = static_cast<uint8_t>(BadPixel::NONE);
+  if (mean < mean_lb) code |= static_cast<uint8_t>(BadPixel::COLD);
+  if (mean > mean_ub) code |= static_cast<uint8_t>(BadPixel::HOT);
+  if (stdev < std_lb) code |= static_cast<uint8_t>(BadPixel::DEAD);
+  if (stdev > std_ub) code |= static_cast<uint8_t>(BadPixel::NOISY);
+  return code;
+}
+
+} // detail
 
+/**
+ * @brief Compute the bad pixel mask of an image from its mean and standard
+ * deviation maps.
+ *
+ * @param mean: mean map. shape = (y, x)
+ * @param stdev: standard deviation map. shape = (y, x)
+ * @param mean_lb: lower bound of the mean.
+ * @param mean_ub: upper bound of the mean.
+ * @param std_lb: lower bound of the standard deviation.
+ * @param std_ub: upper bound of the standard deviation.
+ * @param out: output mask. If its value type is bool, a pixel is true if it
+ *             is bad. Otherwise, it is a bitwise OR of BadPixel codes.
+ *             shape = (y, x)
+ */
+template <typename E, typename T, typename N, EnableIf<E, IsImage> = false>
+inline void computeBadPixelMask(const E& mean, const E& stdev,
+                                T mean_lb, T mean_ub, T std_lb, T std_ub, N& out)
+{
   using value_type = typename E::value_type;
-  auto shape = src.shape();
+  using out_value_type = typename N::value_type;
+  auto shape = mean.shape();
 
-  utils::checkShape(shape, data.shape(), "Inconsistent data shapes");
+  utils::checkShape(shape, stdev.shape(), "Mean and std maps have different shapes");
+  utils::checkShape(shape, out.shape(), "Mean map and output have different shapes");
 
-  for (size_t j = 0; j < shape[0]; ++j)
-  {
-    for (size_t k = 0; k < shape[1]; ++k)
+  auto m_lb = static_cast<value_type>(mean_lb);
+  auto m_ub = static_cast<value_type>(mean_ub);
+  auto s_lb = static_cast<value_type>(std_lb);
+  auto s_ub = static_cast<value_type>(std_ub);
+
+#if defined(FOAMALGO_USE_TBB)
+  tbb::parallel_for(tbb::blocked_range<int>(0, shape[0]),
+    [&mean, &stdev, m_lb, m_ub, s_lb, s_ub, &out, &shape] (const tbb::blocked_range<int> &block)
     {
-      src(j, k) += (data(j, k) - src(j, k)) / value_type(count);
+      for(int j=block.begin(); j != block.end(); ++j)
+      {
+#else
+      for (size_t j = 0; j < shape[0]; ++j)
+      {
+#endif
+        for (size_t k = 0; k < shape[1]; ++k)
+        {
+          out(j, k) = static_cast<out_value_type>(
+            detail::badPixelCode(mean(j, k), stdev(j, k), m_lb, m_ub, s_lb, s_ub));
+        }
+      }
+#if defined(FOAMALGO_USE_TBB)
     }
-  }
+  );
+#endif
 }
 
 /**
- * @brief Inplace apply moving average for an array of images.
+ * @brief Compute the bad pixel masks of an array of images, e.g. memory
+ * cells or modules, from their mean and standard deviation maps.
  *
- * @param src: moving average of image data. shape = (indices, y, x)
- * @param data: new image data. shape = (indices, y, x)
- * @param count: new moving average count.
+ * @param mean: mean maps. shape = (indices, y, x)
+ * @param stdev: standard deviation maps. shape = (indices, y, x)
+ * @param mean_lb: lower bounds of the mean for each image.
+ * @param mean_ub: upper bounds of the mean for each image.
+ * @param std_lb: lower bounds of the standard deviation for each image.
+ * @param std_ub: upper bounds of the standard deviation for each image.
+ * @param out: output masks. If its value type is bool, a pixel is true if it
+ *             is bad. Otherwise, it is a bitwise OR of BadPixel codes.
+ *             shape = (indices, y, x)
  */
-template <typename E, EnableIf<E, IsImageArray> = false>
-inline void movingAvgImageData(E& src, const E& data, size_t count)
+template <typename E, typename T, typename N, EnableIf<E, IsImageArray> = false>
+inline void computeBadPixelMask(const E& mean, const E& stdev,
+                                const std::vector<T>& mean_lb, const std::vector<T>& mean_ub,
+                                const std::vector<T>& std_lb, const std::vector<T>& std_ub,
+                                N& out)
 {
-  if (count == 0) throw std::invalid_argument("'count' cannot be zero!");
-
   using value_type = typename E::value_type;
-  auto shape = src.shape();
+  using out_value_type = typename N::value_type;
+  auto shape = mean.shape();
 
-  utils::checkShape(shape, data.shape(), "Inconsistent data shapes");
+  utils::checkShape(shape, stdev.shape(), "Mean and std maps have different shapes");
+  utils::checkShape(shape, out.shape(), "Mean maps and output have different shapes");
+  FOAM_ASSERT_ARGUMENT(mean_lb.size() == shape[0] && mean_ub.size() == shape[0]
+                       && std_lb.size() == shape[0] && std_ub.size() == shape[0],
+                       "Number of bounds and images are different")
 
 #if defined(FOAMALGO_USE_TBB)
-  tbb::parallel_for(tbb::blocked_range<int>(0, shape[0]),
-    [&src, &data, count, &shape] (const tbb::blocked_range<int> &block)
+  tbb::parallel_for(tbb::blocked_range2d<int>(0, shape[0], 0, shape[1]),
+    [&mean, &stdev, &mean_lb, &mean_ub, &std_lb, &std_ub, &out, &shape]
+    (const tbb::blocked_range2d<int> &block)
     {
-      for(int i=block.begin(); i != block.end(); ++i)
+      for(int i=block.rows().begin(); i != block.rows().end(); ++i)
       {
+        for(int j=block.cols().begin(); j != block.cols().end(); ++j)
+        {
 #else
       for (size_t i = 0; i < shape[0]; ++i)
       {
-#endif
         for (size_t j = 0; j < shape[1]; ++j)
         {
+#endif
+          auto m_lb = static_cast<value_type>(mean_lb[i]);
+          auto m_ub = static_cast<value_type>(mean_ub[i]);
+          auto s_lb = static_cast<value_type>(std_lb[i]);
+          auto s_ub = static_cast<value_type>(std_ub[i]);
           for (size_t k = 0; k < shape[2]; ++k)
           {
-            src(i, j, k) += (data(i, j, k) - src(i, j, k)) / value_type(count);
+            out(i, j, k) = static_cast<out_value_type>(
+              detail::badPixelCode(mean(i, j, k), stdev(i, j, k), m_lb, m_ub, s_lb, s_ub));
           }
         }
       }
@@ -967,6 +1440,2342 @@ inline void movingAvgImageData(E& src, const E& data, size_t count)
 #endif
 }
 
+namespace detail
+{
+
+template<typename O, typename T>
+inline O photonizePixel(T v, double inv_adu_per_photon, double threshold)
+{
+  // NaN is also discarded since comparison with NaN is always false
+  if (!(static_cast<double>(v) >= threshold)) return 0;
+
+  double n = std::floor(static_cast<double>(v) * inv_adu_per_photon + 0.5);
+  if (n <= 0.) return 0;
+  if (n >= static_cast<double>(std::numeric_limits<O>::max())) return std::numeric_limits<O>::max();
+  return static_cast<O>(n);
+}
+
+} // detail
+
+/**
+ * @brief Convert an image from ADU to number of photons.
+ *
+ * A pixel is zero if its value is below the threshold or NaN. Otherwise,
+ * its value is divided by 'adu_per_photon' and rounded to the nearest
+ * integer, which saturates at the maximum of the output value type.
+ *
+ * @param src: image data in ADU. shape = (y, x)
+ * @param adu_per_photon: ADU per photon. It must be positive.
+ * @param threshold: threshold in ADU.
+ * @param out: number of photons. shape = (y, x)
+ */
+template <typename E, typename T, typename O, EnableIf<E, IsImage> = false, EnableIf<O, IsImage> = false>
+inline void photonize(const E& src, T adu_per_photon, T threshold, O& out)
+{
+  using out_value_type = typename O::value_type;
+  static_assert(std::is_integral<out_value_type>::value, "Output must have an integer value type");
+  FOAM_ASSERT_ARGUMENT(adu_per_photon > 0, "ADU per photon must be positive")
+
+  auto shape = src.shape();
+  utils::checkShape(shape, out.shape(), "Image data and output have different shapes");
+
+  double inv = 1. / static_cast<double>(adu_per_photon);
+  double th = static_cast<double>(threshold);
+#if defined(FOAMALGO_USE_TBB)
+  tbb::parallel_for(tbb::blocked_range<int>(0, shape[0]),
+    [&src, &out, &shape, inv, th] (const tbb::blocked_range<int> &block)
+    {
+      for(int j=block.begin(); j != block.end(); ++j)
+      {
+#else
+      for (size_t j = 0; j < shape[0]; ++j)
+      {
+#endif
+        for (size_t k = 0; k < shape[1]; ++k)
+        {
+          out(j, k) = detail::photonizePixel<out_value_type>(src(j, k), inv, th);
+        }
+      }
+#if defined(FOAMALGO_USE_TBB)
+    }
+  );
+#endif
+}
+
+/**
+ * @brief Convert an array of images from ADU to number of photons.
+ *
+ * @param src: image data in ADU. shape = (indices, y, x)
+ * @param adu_per_photon: ADU per photon. It must be positive.
+ * @param threshold: threshold in ADU.
+ * @param out: number of photons. shape = (indices, y, x)
+ */
+template <typename E, typename T, typename O, EnableIf<E, IsImageArray> = false, EnableIf<O, IsImageArray> = false>
+inline void photonize(const E& src, T adu_per_photon, T threshold, O& out)
+{
+  using out_value_type = typename O::value_type;
+  static_assert(std::is_integral<out_value_type>::value, "Output must have an integer value type");
+  FOAM_ASSERT_ARGUMENT(adu_per_photon > 0, "ADU per photon must be positive")
+
+  auto shape = src.shape();
+  utils::checkShape(shape, out.shape(), "Image data and output have different shapes");
+
+  double inv = 1. / static_cast<double>(adu_per_photon);
+  double th = static_cast<double>(threshold);
+#if defined(FOAMALGO_USE_TBB)
+  tbb::parallel_for(tbb::blocked_range2d<int>(0, shape[0], 0, shape[1]),
+    [&src, &out, &shape, inv, th] (const tbb::blocked_range2d<int> &block)
+    {
+      for(int i=block.rows().begin(); i != block.rows().end(); ++i)
+      {
+        for(int j=block.cols().begin(); j != block.cols().end(); ++j)
+        {
+#else
+      for (size_t i = 0; i < shape[0]; ++i)
+      {
+        for (size_t j = 0; j < shape[1]; ++j)
+        {
+#endif
+          for (size_t k = 0; k < shape[2]; ++k)
+          {
+            out(i, j, k) = detail::photonizePixel<out_value_type>(src(i, j, k), inv, th);
+          }
+        }
+      }
+#if defined(FOAMALGO_USE_TBB)
+    }
+  );
+#endif
+}
+
+/**
+ * Statistics of a region of interest (ROI).
+ */
+enum class RoiStat : uint8_t
+{
+  SUM = 0x00, // NaN if any pixel is NaN
+  NANSUM = 0x01,
+  MEAN = 0x02, // NaN if any pixel is NaN
+  NANMEAN = 0x03,
+  MIN = 0x04, // NaN if any pixel is NaN
+  NANMIN = 0x05,
+  MAX = 0x06, // NaN if any pixel is NaN
+  NANMAX = 0x07,
+};
+
+namespace detail
+{
+
+/**
+ * Accumulate all the statistics in RoiStat in a single pass.
+ */
+template<typename T>
+class RoiAccumulator
+{
+  double nansum_ = 0.;
+  size_t count_ = 0; // number of non-nan pixels
+  size_t size_ = 0; // number of pixels
+  T nanmin_ = std::numeric_limits<T>::max();
+  T nanmax_ = std::numeric_limits<T>::lowest();
+
+public:
+
+  void push(T v)
+  {
+    ++size_;
+    if (std::isnan(v)) return;
+    ++count_;
+    nansum_ += static_cast<double>(v);
+    if (v < nanmin_) nanmin_ = v;
+    if (v > nanmax_) nanmax_ = v;
+  }
+
+  double value(RoiStat stat) const
+  {
+    constexpr double nan = std::numeric_limits<double>::quiet_NaN();
+    bool has_nan = count_ != size_;
+    switch(stat)
+    {
+      case RoiStat::SUM:
+        return has_nan ? nan : nansum_;
+      case RoiStat::NANSUM:
+        return nansum_;
+      case RoiStat::MEAN:
+        return (has_nan || size_ == 0) ? nan : nansum_ / static_cast<double>(size_);
+      case RoiStat::NANMEAN:
+        return count_ == 0 ? nan : nansum_ / static_cast<double>(count_);
+      case RoiStat::MIN:
+        return (has_nan || size_ == 0) ? nan : static_cast<double>(nanmin_);
+      case RoiStat::NANMIN:
+        return count_ == 0 ? nan : static_cast<double>(nanmin_);
+      case RoiStat::MAX:
+        return (has_nan || size_ == 0) ? nan : static_cast<double>(nanmax_);
+      case RoiStat::NANMAX:
+        return count_ == 0 ? nan : static_cast<double>(nanmax_);
+      default:
+        throw std::invalid_argument("Unknown ROI statistic");
+    }
+  }
+};
+
+/**
+ * Clip ROIs (x, y, w, h) by an image with the given height and width. The
+ * width and height of a ROI which does not overlap with the image are 0.
+ */
+inline std::vector<std::array<int, 4>> clipRois(const std::vector<std::array<int, 4>>& rois,
+                                                size_t height, size_t width)
+{
+  std::array<int, 4> rect {0, 0, static_cast<int>(width), static_cast<int>(height)};
+
+  std::vector<std::array<int, 4>> clipped;
+  clipped.reserve(rois.size());
+  for (const auto& roi : rois)
+  {
+    auto r = intersection(roi, rect);
+    if (r[2] <= 0 || r[3] <= 0) r = {0, 0, 0, 0};
+    clipped.push_back(r);
+  }
+  return clipped;
+}
+
+} // detail
+
+/**
+ * @brief Compute statistics of ROIs of an image.
+ *
+ * ROIs are clipped by the image. The statistics of a ROI which does not
+ * overlap with the image are computed from an empty set of pixels,
+ * i.e. sums are 0 and the others are NaN.
+ *
+ * @param src: image data. shape = (y, x)
+ * @param rois: (x, y, w, h) of ROIs.
+ * @param stats: statistics to compute.
+ * @param out: statistics. shape = (rois, stats)
+ */
+template <typename E, typename O, EnableIf<E, IsImage> = false, EnableIf<O, IsImage> = false>
+inline void roiStatistics(const E& src,
+                          const std::vector<std::array<int, 4>>& rois,
+                          const std::vector<RoiStat>& stats,
+                          O& out)
+{
+  using value_type = typename E::value_type;
+  using out_value_type = typename O::value_type;
+  auto shape = src.shape();
+
+  utils::checkShape(std::array<size_t, 2>{rois.size(), stats.size()}, out.shape(),
+                    "Expected output shape and actual output shape are different");
+
+  auto clipped = detail::clipRois(rois, shape[0], shape[1]);
+  for (size_t r = 0; r < clipped.size(); ++r)
+  {
+    const auto& roi = clipped[r];
+    detail::RoiAccumulator<value_type> acc;
+    for (int j = roi[1]; j < roi[1] + roi[3]; ++j)
+    {
+      for (int k = roi[0]; k < roi[0] + roi[2]; ++k) acc.push(src(j, k));
+    }
+    for (size_t s = 0; s < stats.size(); ++s) out(r, s) = static_cast<out_value_type>(acc.value(stats[s]));
+  }
+}
+
+/**
+ * @brief Compute statistics of ROIs of an array of images.
+ *
+ * The images are processed in parallel and each ROI of an image is
+ * visited only once for all the statistics.
+ *
+ * @param src: image data. shape = (indices, y, x)
+ * @param rois: (x, y, w, h) of ROIs.
+ * @param stats: statistics to compute.
+ * @param out: statistics. shape = (indices, rois, stats)
+ */
+template <typename E, typename O, EnableIf<E, IsImageArray> = false, EnableIf<O, IsImageArray> = false>
+inline void roiStatistics(const E& src,
+                          const std::vector<std::array<int, 4>>& rois,
+                          const std::vector<RoiStat>& stats,
+                          O& out)
+{
+  using value_type = typename E::value_type;
+  using out_value_type = typename O::value_type;
+  auto shape = src.shape();
+
+  utils::checkShape(std::array<size_t, 3>{shape[0], rois.size(), stats.size()}, out.shape(),
+                    "Expected output shape and actual output shape are different");
+
+  auto clipped = detail::clipRois(rois, shape[1], shape[2]);
+#if defined(FOAMALGO_USE_TBB)
+  tbb::parallel_for(tbb::blocked_range<int>(0, shape[0]),
+    [&src, &clipped, &stats, &out] (const tbb::blocked_range<int> &block)
+    {
+      for(int i=block.begin(); i != block.end(); ++i)
+      {
+#else
+      for (size_t i = 0; i < shape[0]; ++i)
+      {
+#endif
+        for (size_t r = 0; r < clipped.size(); ++r)
+        {
+          const auto& roi = clipped[r];
+          detail::RoiAccumulator<value_type> acc;
+          for (int j = roi[1]; j < roi[1] + roi[3]; ++j)
+          {
+            for (int k = roi[0]; k < roi[0] + roi[2]; ++k) acc.push(src(i, j, k));
+          }
+          for (size_t s = 0; s < stats.size(); ++s)
+          {
+            out(i, r, s) = static_cast<out_value_type>(acc.value(stats[s]));
+          }
+        }
+      }
+#if defined(FOAMALGO_USE_TBB)
+    }
+  );
+#endif
+}
+
+/**
+ * @brief Compute projections of ROIs of an array of images.
+ *
+ * The projections of all the ROIs are concatenated along the last axis of
+ * the output. ROIs are clipped by the image and the length of the
+ * projection of a ROI which does not overlap with the image is 0.
+ *
+ * @param src: image data. shape = (indices, y, x)
+ * @param rois: (x, y, w, h) of ROIs.
+ * @param axis: axis of the ROI to be reduced, i.e. 0 for projections with
+ *              length w and 1 for projections with length h.
+ * @param average: true for nanmean and false for nansum.
+ * @param out: concatenated projections. shape = (indices, total length)
+ */
+template <typename E, typename O, EnableIf<E, IsImageArray> = false, EnableIf<O, IsImage> = false>
+inline void roiProjection(const E& src,
+                          const std::vector<std::array<int, 4>>& rois,
+                          int axis,
+                          bool average,
+                          O& out)
+{
+  using out_value_type = typename O::value_type;
+  auto shape = src.shape();
+
+  FOAM_ASSERT_ARGUMENT(axis == 0 || axis == 1, "Axis must be either 0 or 1")
+
+  auto clipped = detail::clipRois(rois, shape[1], shape[2]);
+  std::vector<size_t> offsets { 0 };
+  for (const auto& roi : clipped) offsets.push_back(offsets.back() + (axis == 0 ? roi[2] : roi[3]));
+
+  utils::checkShape(std::array<size_t, 2>{shape[0], offsets.back()}, out.shape(),
+                    "Expected output shape and actual output shape are different");
+
+  constexpr double nan = std::numeric_limits<double>::quiet_NaN();
+#if defined(FOAMALGO_USE_TBB)
+  tbb::parallel_for(tbb::blocked_range<int>(0, shape[0]),
+    [&src, &clipped, &offsets, axis, average, &out] (const tbb::blocked_range<int> &block)
+    {
+      std::vector<double> sum;
+      std::vector<size_t> count;
+      for(int i=block.begin(); i != block.end(); ++i)
+      {
+#else
+      std::vector<double> sum;
+      std::vector<size_t> count;
+      for (size_t i = 0; i < shape[0]; ++i)
+      {
+#endif
+        for (size_t r = 0; r < clipped.size(); ++r)
+        {
+          const auto& roi = clipped[r];
+          size_t length = offsets[r + 1] - offsets[r];
+          sum.assign(length, 0.);
+          count.assign(length, 0);
+          for (int j = roi[1]; j < roi[1] + roi[3]; ++j)
+          {
+            for (int k = roi[0]; k < roi[0] + roi[2]; ++k)
+            {
+              auto v = src(i, j, k);
+              if (std::isnan(v)) continue;
+              size_t p = axis == 0 ? k - roi[0] : j - roi[1];
+              sum[p] += static_cast<double>(v);
+              ++count[p];
+            }
+          }
+
+          for (size_t p = 0; p < length; ++p)
+          {
+            double v = sum[p];
+            if (average) v = count[p] == 0 ? nan : v / static_cast<double>(count[p]);
+            out(i, offsets[r] + p) = static_cast<out_value_type>(v);
+          }
+        }
+      }
+#if defined(FOAMALGO_USE_TBB)
+    }
+  );
+#endif
+}
+
+namespace detail
+{
+
+/**
+ * Compute the intensity-weighted moments (total, y, x, sigma_y, sigma_x)
+ * of the non-NaN and unmasked pixels within a clipped ROI in a single pass.
+ * Negative pixels, e.g. in dark-subtracted images, have zero weight in the
+ * centroid and width, which are NaN if there is no positive pixel.
+ *
+ * @param get: functor which returns the pixel value at (y, x).
+ * @param masked: functor which returns whether the pixel at (y, x) is masked.
+ */
+template<typename F, typename M>
+inline std::array<double, 5> imageMoments(F&& get, M&& masked, const std::array<int, 4>& roi)
+{
+  constexpr double nan = std::numeric_limits<double>::quiet_NaN();
+
+  // coordinates are relative to the origin of the ROI to reduce the
+  // cancellation error in computing the variances
+  double s = 0., sw = 0., sy = 0., sx = 0., syy = 0., sxx = 0.;
+  for (int j = 0; j < roi[3]; ++j)
+  {
+    for (int k = 0; k < roi[2]; ++k)
+    {
+      int y = roi[1] + j;
+      int x = roi[0] + k;
+      auto v = get(y, x);
+      if (std::isnan(v) || masked(y, x)) continue;
+      s += static_cast<double>(v);
+      // Negative weights could move the centroid out of the ROI.
+      double w = std::max(static_cast<double>(v), 0.);
+      sw += w;
+      sy += w * j;
+      sx += w * k;
+      syy += w * j * j;
+      sxx += w * k * k;
+    }
+  }
+
+  if (sw == 0.) return {s, nan, nan, nan, nan};
+
+  double cy = sy / sw;
+  double cx = sx / sw;
+  return {s, roi[1] + cy, roi[0] + cx,
+          std::sqrt(std::max(syy / sw - cy * cy, 0.)), std::sqrt(std::max(sxx / sw - cx * cx, 0.))};
+}
+
+template<typename F, typename M, typename S>
+inline void imageMomentsImp(F&& get, M&& masked, const std::array<int, 4>& roi, size_t height, size_t width,
+                            S&& set)
+{
+  auto clipped = clipRois({roi}, height, width)[0];
+  auto moments = imageMoments(std::forward<F>(get), std::forward<M>(masked), clipped);
+  for (size_t m = 0; m < moments.size(); ++m) set(m, moments[m]);
+}
+
+} // detail
+
+/**
+ * @brief Compute the intensity-weighted centroid and width of a ROI of an image.
+ *
+ * NaN pixels are ignored. The ROI is clipped by the image. Negative pixels
+ * are included in the total but have zero weight in the centroid and width.
+ * If there is no positive pixel, the centroid and width are NaN.
+ *
+ * @param src: image data. shape = (y, x)
+ * @param roi: (x, y, w, h) of the ROI.
+ * @param out: (total, y, x, sigma_y, sigma_x). shape = (5,)
+ */
+template <typename E, typename O, EnableIf<E, IsImage> = false, EnableIf<O, IsVector> = false>
+inline void imageMoments(const E& src, const std::array<int, 4>& roi, O& out)
+{
+  using out_value_type = typename O::value_type;
+  auto shape = src.shape();
+  utils::checkShape(std::array<size_t, 1>{5}, out.shape(),
+                    "Expected output shape and actual output shape are different");
+
+  detail::imageMomentsImp([&src] (size_t j, size_t k) { return src(j, k); },
+                          [] (size_t, size_t) { return false; },
+                          roi, shape[0], shape[1],
+                          [&out] (size_t m, double v) { out(m) = static_cast<out_value_type>(v); });
+}
+
+/**
+ * @brief Compute the intensity-weighted centroid and width of a ROI of an image.
+ *
+ * @param src: image data. shape = (y, x)
+ * @param mask: image mask. Masked pixels are ignored. shape = (y, x)
+ * @param roi: (x, y, w, h) of the ROI.
+ * @param out: (total, y, x, sigma_y, sigma_x). shape = (5,)
+ */
+template <typename E, typename M, typename O,
+  EnableIf<E, IsImage> = false, EnableIf<M, IsImageMask> = false, EnableIf<O, IsVector> = false>
+inline void imageMoments(const E& src, const M& mask, const std::array<int, 4>& roi, O& out)
+{
+  using out_value_type = typename O::value_type;
+  auto shape = src.shape();
+  utils::checkShape(shape, mask.shape(), "Image and mask have different shapes");
+  utils::checkShape(std::array<size_t, 1>{5}, out.shape(),
+                    "Expected output shape and actual output shape are different");
+
+  detail::imageMomentsImp([&src] (size_t j, size_t k) { return src(j, k); },
+                          [&mask] (size_t j, size_t k) { return mask(j, k); },
+                          roi, shape[0], shape[1],
+                          [&out] (size_t m, double v) { out(m) = static_cast<out_value_type>(v); });
+}
+
+/**
+ * @brief Compute the intensity-weighted centroids and widths of a ROI of
+ * an array of images.
+ *
+ * The images are processed in parallel and each image is visited only once.
+ *
+ * @param src: image data. shape = (indices, y, x)
+ * @param roi: (x, y, w, h) of the ROI.
+ * @param out: (total, y, x, sigma_y, sigma_x) of each image. shape = (indices, 5)
+ */
+template <typename E, typename O, EnableIf<E, IsImageArray> = false, EnableIf<O, IsImage> = false>
+inline void imageMoments(const E& src, const std::array<int, 4>& roi, O& out)
+{
+  using out_value_type = typename O::value_type;
+  auto shape = src.shape();
+  utils::checkShape(std::array<size_t, 2>{shape[0], 5}, out.shape(),
+                    "Expected output shape and actual output shape are different");
+
+#if defined(FOAMALGO_USE_TBB)
+  tbb::parallel_for(tbb::blocked_range<int>(0, shape[0]),
+    [&src, &roi, &out, &shape] (const tbb::blocked_range<int> &block)
+    {
+      for(int i=block.begin(); i != block.end(); ++i)
+      {
+#else
+      for (size_t i = 0; i < shape[0]; ++i)
+      {
+#endif
+        detail::imageMomentsImp([&src, i] (size_t j, size_t k) { return src(i, j, k); },
+                                [] (size_t, size_t) { return false; },
+                                roi, shape[1], shape[2],
+                                [&out, i] (size_t m, double v) { out(i, m) = static_cast<out_value_type>(v); });
+      }
+#if defined(FOAMALGO_USE_TBB)
+    }
+  );
+#endif
+}
+
+/**
+ * @brief Compute the intensity-weighted centroids and widths of a ROI of
+ * an array of images.
+ *
+ * @param src: image data. shape = (indices, y, x)
+ * @param mask: image mask. Masked pixels are ignored. shape = (y, x)
+ * @param roi: (x, y, w, h) of the ROI.
+ * @param out: (total, y, x, sigma_y, sigma_x) of each image. shape = (indices, 5)
+ */
+template <typename E, typename M, typename O,
+  EnableIf<E, IsImageArray> = false, EnableIf<M, IsImageMask> = false, EnableIf<O, IsImage> = false>
+inline void imageMoments(const E& src, const M& mask, const std::array<int, 4>& roi, O& out)
+{
+  using out_value_type = typename O::value_type;
+  auto shape = src.shape();
+  utils::checkShape(shape, mask.shape(), "Image and mask have different shapes", 1);
+  utils::checkShape(std::array<size_t, 2>{shape[0], 5}, out.shape(),
+                    "Expected output shape and actual output shape are different");
+
+#if defined(FOAMALGO_USE_TBB)
+  tbb::parallel_for(tbb::blocked_range<int>(0, shape[0]),
+    [&src, &mask, &roi, &out, &shape] (const tbb::blocked_range<int> &block)
+    {
+      for(int i=block.begin(); i != block.end(); ++i)
+      {
+#else
+      for (size_t i = 0; i < shape[0]; ++i)
+      {
+#endif
+        detail::imageMomentsImp([&src, i] (size_t j, size_t k) { return src(i, j, k); },
+                                [&mask] (size_t j, size_t k) { return mask(j, k); },
+                                roi, shape[1], shape[2],
+                                [&out, i] (size_t m, double v) { out(i, m) = static_cast<out_value_type>(v); });
+      }
+#if defined(FOAMALGO_USE_TBB)
+    }
+  );
+#endif
+}
+
+namespace detail
+{
+
+/**
+ * Bin a row of blocks of an image.
+ *
+ * @param get: functor which returns the pixel value at (y, x).
+ * @param set: functor which sets the value of the binned pixel at x.
+ */
+template<typename F, typename G>
+inline void binImageDataRow(size_t jb, size_t factor, size_t ny, size_t nx, bool average,
+                            F&& get, G&& set)
+{
+  constexpr double nan = std::numeric_limits<double>::quiet_NaN();
+  size_t j_end = std::min((jb + 1) * factor, ny);
+  for (size_t kb = 0; kb * factor < nx; ++kb)
+  {
+    size_t k_end = std::min((kb + 1) * factor, nx);
+    double sum = 0.;
+    size_t count = 0;
+    for (size_t j = jb * factor; j < j_end; ++j)
+    {
+      for (size_t k = kb * factor; k < k_end; ++k)
+      {
+        auto v = get(j, k);
+        if (std::isnan(v)) continue;
+        sum += static_cast<double>(v);
+        ++count;
+      }
+    }
+
+    if (average) set(kb, count == 0 ? nan : sum / static_cast<double>(count));
+    else set(kb, sum);
+  }
+}
+
+inline size_t binnedSize(size_t size, size_t factor)
+{
+  return (size + factor - 1) / factor;
+}
+
+} // detail
+
+/**
+ * @brief Bin an image by summing or averaging the non-NaN pixels in each
+ * block of factor x factor pixels.
+ *
+ * The blocks at the edges are smaller if the image size is not a multiple
+ * of the factor.
+ *
+ * @param src: image data. shape = (y, x)
+ * @param factor: binning factor. It must be positive.
+ * @param average: true for nanmean and false for nansum.
+ * @param out: binned image. shape = (ceil(y / factor), ceil(x / factor))
+ */
+template <typename E, typename O, EnableIf<E, IsImage> = false, EnableIf<O, IsImage> = false>
+inline void binImageData(const E& src, size_t factor, bool average, O& out)
+{
+  using out_value_type = typename O::value_type;
+  FOAM_ASSERT_ARGUMENT(factor > 0, "Binning factor must be positive")
+
+  auto shape = src.shape();
+  utils::checkShape(std::array<size_t, 2>{detail::binnedSize(shape[0], factor),
+                                          detail::binnedSize(shape[1], factor)},
+                    out.shape(),
+                    "Expected output shape and actual output shape are different");
+
+#if defined(FOAMALGO_USE_TBB)
+  tbb::parallel_for(tbb::blocked_range<int>(0, out.shape()[0]),
+    [&src, &out, &shape, factor, average] (const tbb::blocked_range<int> &block)
+    {
+      for(int jb=block.begin(); jb != block.end(); ++jb)
+      {
+#else
+      for (size_t jb = 0; jb < out.shape()[0]; ++jb)
+      {
+#endif
+        detail::binImageDataRow(jb, factor, shape[0], shape[1], average,
+                                [&src] (size_t j, size_t k) { return src(j, k); },
+                                [&out, jb] (size_t kb, double v)
+                                { out(jb, kb) = static_cast<out_value_type>(v); });
+      }
+#if defined(FOAMALGO_USE_TBB)
+    }
+  );
+#endif
+}
+
+/**
+ * @brief Bin an array of images by summing or averaging the non-NaN pixels
+ * in each block of factor x factor pixels.
+ *
+ * @param src: image data. shape = (indices, y, x)
+ * @param factor: binning factor. It must be positive.
+ * @param average: true for nanmean and false for nansum.
+ * @param out: binned images. shape = (indices, ceil(y / factor), ceil(x / factor))
+ */
+template <typename E, typename O, EnableIf<E, IsImageArray> = false, EnableIf<O, IsImageArray> = false>
+inline void binImageData(const E& src, size_t factor, bool average, O& out)
+{
+  using out_value_type = typename O::value_type;
+  FOAM_ASSERT_ARGUMENT(factor > 0, "Binning factor must be positive")
+
+  auto shape = src.shape();
+  utils::checkShape(std::array<size_t, 3>{shape[0],
+                                          detail::binnedSize(shape[1], factor),
+                                          detail::binnedSize(shape[2], factor)},
+                    out.shape(),
+                    "Expected output shape and actual output shape are different");
+
+#if defined(FOAMALGO_USE_TBB)
+  tbb::parallel_for(tbb::blocked_range2d<int>(0, shape[0], 0, out.shape()[1]),
+    [&src, &out, &shape, factor, average] (const tbb::blocked_range2d<int> &block)
+    {
+      for(int i=block.rows().begin(); i != block.rows().end(); ++i)
+      {
+        for(int jb=block.cols().begin(); jb != block.cols().end(); ++jb)
+        {
+#else
+      for (size_t i = 0; i < shape[0]; ++i)
+      {
+        for (size_t jb = 0; jb < out.shape()[1]; ++jb)
+        {
+#endif
+          detail::binImageDataRow(jb, factor, shape[1], shape[2], average,
+                                  [&src, i] (size_t j, size_t k) { return src(i, j, k); },
+                                  [&out, i, jb] (size_t kb, double v)
+                                  { out(i, jb, kb) = static_cast<out_value_type>(v); });
+        }
+      }
+#if defined(FOAMALGO_USE_TBB)
+    }
+  );
+#endif
+}
+
+/**
+ * @brief Up-sample an image by repeating each pixel factor x factor times.
+ *
+ * It is the inverse of binImageData in terms of shape, i.e. the output
+ * image can be cropped at the bottom and the right edges.
+ *
+ * @param src: image data. shape = (y, x)
+ * @param factor: up-sampling factor. It must be positive.
+ * @param out: up-sampled image. shape = (y', x') with
+ *             ceil(y' / factor) = y and ceil(x' / factor) = x.
+ */
+template <typename E, typename O, EnableIf<E, IsImage> = false, EnableIf<O, IsImage> = false>
+inline void upsampleImageData(const E& src, size_t factor, O& out)
+{
+  using out_value_type = typename O::value_type;
+  FOAM_ASSERT_ARGUMENT(factor > 0, "Up-sampling factor must be positive")
+
+  auto shape = out.shape();
+  utils::checkShape(src.shape(),
+                    std::array<size_t, 2>{detail::binnedSize(shape[0], factor),
+                                          detail::binnedSize(shape[1], factor)},
+                    "Image data cannot be up-sampled to the output");
+
+  for (size_t j = 0; j < shape[0]; ++j)
+  {
+    for (size_t k = 0; k < shape[1]; ++k)
+    {
+      out(j, k) = static_cast<out_value_type>(src(j / factor, k / factor));
+    }
+  }
+}
+
+/**
+ * @brief Up-sample an array of images by repeating each pixel
+ * factor x factor times.
+ *
+ * @param src: image data. shape = (indices, y, x)
+ * @param factor: up-sampling factor. It must be positive.
+ * @param out: up-sampled images. shape = (indices, y', x') with
+ *             ceil(y' / factor) = y and ceil(x' / factor) = x.
+ */
+template <typename E, typename O, EnableIf<E, IsImageArray> = false, EnableIf<O, IsImageArray> = false>
+inline void upsampleImageData(const E& src, size_t factor, O& out)
+{
+  using out_value_type = typename O::value_type;
+  FOAM_ASSERT_ARGUMENT(factor > 0, "Up-sampling factor must be positive")
+
+  auto shape = out.shape();
+  utils::checkShape(src.shape(),
+                    std::array<size_t, 3>{shape[0],
+                                          detail::binnedSize(shape[1], factor),
+                                          detail::binnedSize(shape[2], factor)},
+                    "Image data cannot be up-sampled to the output");
+
+#if defined(FOAMALGO_USE_TBB)
+  tbb::parallel_for(tbb::blocked_range2d<int>(0, shape[0], 0, shape[1]),
+    [&src, &out, &shape, factor] (const tbb::blocked_range2d<int> &block)
+    {
+      for(int i=block.rows().begin(); i != block.rows().end(); ++i)
+      {
+        for(int j=block.cols().begin(); j != block.cols().end(); ++j)
+        {
+#else
+      for (size_t i = 0; i < shape[0]; ++i)
+      {
+        for (size_t j = 0; j < shape[1]; ++j)
+        {
+#endif
+          for (size_t k = 0; k < shape[2]; ++k)
+          {
+            out(i, j, k) = static_cast<out_value_type>(src(i, j / factor, k / factor));
+          }
+        }
+      }
+#if defined(FOAMALGO_USE_TBB)
+    }
+  );
+#endif
+}
+
+/**
+ * @brief Inplace apply moving average for an image
+ *
+ * @param src: moving average of image data. shape = (y, x)
+ * @param data: new image data. shape = (y, x)
+ * @param count: new moving average count.
+ */
+template <typename E, EnableIf<E, IsImage> = false>
+inline void movingAvgImageData(E& src, const E& data, size_t count)
+{
+  if (count == 0) throw std::invalid_argument("'count' cannot be zero!");
+
+  using value_type = typename E::value_type;
+  auto shape = src.shape();
+
+  utils::checkShape(shape, data.shape(), "Inconsistent data shapes");
+
+  for (size_t j = 0; j < shape[0]; ++j)
+  {
+    for (size_t k = 0; k < shape[1]; ++k)
+    {
+      src(j, k) += (data(j, k) - src(j, k)) / value_type(count);
+    }
+  }
+}
+
+/**
+ * @brief Inplace apply moving average for an array of images.
+ *
+ * @param src: moving average of image data. shape = (indices, y, x)
+ * @param data: new image data. shape = (indices, y, x)
+ * @param count: new moving average count.
+ */
+template <typename E, EnableIf<E, IsImageArray> = false>
+inline void movingAvgImageData(E& src, const E& data, size_t count)
+{
+  if (count == 0) throw std::invalid_argument("'count' cannot be zero!");
+
+  using value_type = typename E::value_type;
+  auto shape = src.shape();
+
+  utils::checkShape(shape, data.shape(), "Inconsistent data shapes");
+
+#if defined(FOAMALGO_USE_TBB)
+  tbb::parallel_for(tbb::blocked_range<int>(0, shape[0]),
+    [&src, &data, count, &shape] (const tbb::blocked_range<int> &block)
+    {
+      for(int i=block.begin(); i != block.end(); ++i)
+      {
+#else
+      for (size_t i = 0; i < shape[0]; ++i)
+      {
+#endif
+        for (size_t j = 0; j < shape[1]; ++j)
+        {
+          for (size_t k = 0; k < shape[2]; ++k)
+          {
+            src(i, j, k) += (data(i, j, k) - src(i, j, k)) / value_type(count);
+          }
+        }
+      }
+#if defined(FOAMALGO_USE_TBB)
+    }
+  );
+#endif
+}
+
+/**
+ * @class MovingAverageImageData
+ * @brief Exact moving average of a stream of images or arrays of images.
+ *
+ * The last 'window' frames are kept in a pre-allocated ring buffer together
+ * with their running sum. Therefore, updating the moving average with a new
+ * frame requires only one addition and one subtraction for each pixel. If
+ * any of the frames in the window is NaN at a pixel, the moving average of
+ * the pixel is NaN. The running sum of a pixel is recomputed from the window
+ * when an infinite value leaves it.
+ */
+template<typename T = float>
+class MovingAverageImageData
+{
+  static_assert(std::is_floating_point<T>::value);
+
+  size_t window_;
+  size_t count_ = 0; // number of frames in the window
+  size_t head_ = 0; // position of the next frame in the ring buffer
+
+  std::vector<size_t> shape_; // shape of a frame
+  size_t size_ = 0; // number of pixels in a frame
+
+  xt::xtensor<T, 2> ring_; // shape = (window, pixels)
+  xt::xtensor<double, 1> sum_; // running sum of non-nan values, shape = (pixels,)
+  xt::xtensor<size_t, 1> nan_count_; // number of nan values, shape = (pixels,)
+
+  template<typename S>
+  void initialize(const S& shape);
+
+  T updatePixel(size_t p, T v, bool full);
+
+  T averagePixel(size_t p) const
+  {
+    if (nan_count_(p) > 0) return std::numeric_limits<T>::quiet_NaN();
+    return static_cast<T>(sum_(p) / static_cast<double>(count_));
+  }
+
+public:
+
+  explicit MovingAverageImageData(size_t window);
+
+  ~MovingAverageImageData() = default;
+
+  /**
+   * Update the moving average with a new image and write the result into
+   * the output.
+   *
+   * @param src: image data. shape = (y, x)
+   * @param out: moving average. shape = (y, x)
+   */
+  template<typename E, typename O, EnableIf<E, IsImage> = false, EnableIf<O, IsImage> = false>
+  void update(const E& src, O& out);
+
+  /**
+   * Update the moving average with a new array of images and write the
+   * result into the output.
+   *
+   * @param src: image data. shape = (indices, y, x)
+   * @param out: moving average. shape = (indices, y, x)
+   */
+  template<typename E, typename O, EnableIf<E, IsImageArray> = false, EnableIf<O, IsImageArray> = false>
+  void update(const E& src, O& out);
+
+  /**
+   * Write the current moving average into the output.
+   *
+   * @param out: moving average. It must have the same shape as the frames.
+   */
+  template<typename O>
+  void average(O& out) const;
+
+  /**
+   * Change the moving average window. If the new window is smaller than
+   * the number of frames in the current window, the oldest frames are
+   * dropped.
+   *
+   * @param window: new window size.
+   */
+  void setWindow(size_t window);
+
+  /**
+   * Remove all the frames.
+   */
+  void reset();
+
+  /**
+   * Return the number of frames in the window.
+   */
+  size_t count() const { return count_; }
+
+  /**
+   * Return the window size.
+   */
+  size_t window() const { return window_; }
+};
+
+template<typename T>
+MovingAverageImageData<T>::MovingAverageImageData(size_t window) : window_(window)
+{
+  FOAM_ASSERT_ARGUMENT(window > 0, "Window must be positive")
+}
+
+template<typename T>
+template<typename S>
+void MovingAverageImageData<T>::initialize(const S& shape)
+{
+  if (count_ > 0)
+  {
+    FOAM_ASSERT_ARGUMENT(shape_.size() == shape.size(),
+                         "Frame has a different number of dimensions from the previous ones")
+    utils::checkShape(shape_, shape, "Frame has a different shape from the previous ones");
+    return;
+  }
+
+  shape_.assign(shape.begin(), shape.end());
+  size_t size = 1;
+  for (auto s : shape_) size *= s;
+
+  if (size != size_ || ring_.shape()[0] != window_)
+  {
+    size_ = size;
+    ring_ = xt::xtensor<T, 2>::from_shape({window_, size_});
+    sum_ = xt::xtensor<double, 1>::from_shape({size_});
+    nan_count_ = xt::xtensor<size_t, 1>::from_shape({size_});
+  }
+  sum_.fill(0);
+  nan_count_.fill(0);
+  head_ = 0;
+}
+
+template<typename T>
+T MovingAverageImageData<T>::updatePixel(size_t p, T v, bool full)
+{
+  bool recompute = false;
+  if (full)
+  {
+    T old = ring_(head_, p);
+    if (std::isnan(old)) nan_count_(p) -= 1;
+    else if (std::isinf(old)) recompute = true;
+    else sum_(p) -= static_cast<double>(old);
+  }
+
+  if (std::isnan(v)) nan_count_(p) += 1;
+  ring_(head_, p) = v;
+
+  if (recompute)
+  {
+    // Subtracting an infinite value would turn the running sum into NaN.
+    // Since it is rare, the sum is simply recomputed from the window.
+    double sum = 0.;
+    for (size_t i = 0; i < count_; ++i)
+    {
+      T u = ring_(i, p);
+      if (!std::isnan(u)) sum += static_cast<double>(u);
+    }
+    sum_(p) = sum;
+  }
+  else if (!std::isnan(v))
+  {
+    sum_(p) += static_cast<double>(v);
+  }
+
+  return averagePixel(p);
+}
+
+template<typename T>
+template<typename E, typename O, EnableIf<E, IsImage>, EnableIf<O, IsImage>>
+void MovingAverageImageData<T>::update(const E& src, O& out)
+{
+  auto shape = src.shape();
+  utils::checkShape(shape, out.shape(), "Image data and output have different shapes");
+  initialize(shape);
+
+  bool full = count_ == window_;
+  if (!full) ++count_;
+
+#if defined(FOAMALGO_USE_TBB)
+  tbb::parallel_for(tbb::blocked_range2d<int>(0, shape[0], 0, shape[1]),
+    [&src, &out, &shape, full, this] (const tbb::blocked_range2d<int> &block)
+    {
+      for(int j=block.rows().begin(); j != block.rows().end(); ++j)
+      {
+        for(int k=block.cols().begin(); k != block.cols().end(); ++k)
+        {
+#else
+      for (size_t j = 0; j < shape[0]; ++j)
+      {
+        for (size_t k = 0; k < shape[1]; ++k)
+        {
+#endif
+          out(j, k) = updatePixel(j * shape[1] + k, static_cast<T>(src(j, k)), full);
+        }
+      }
+#if defined(FOAMALGO_USE_TBB)
+    }
+  );
+#endif
+
+  head_ = (head_ + 1) % window_;
+}
+
+template<typename T>
+template<typename E, typename O, EnableIf<E, IsImageArray>, EnableIf<O, IsImageArray>>
+void MovingAverageImageData<T>::update(const E& src, O& out)
+{
+  auto shape = src.shape();
+  utils::checkShape(shape, out.shape(), "Image data and output have different shapes");
+  initialize(shape);
+
+  bool full = count_ == window_;
+  if (!full) ++count_;
+
+#if defined(FOAMALGO_USE_TBB)
+  tbb::parallel_for(tbb::blocked_range2d<int>(0, shape[0], 0, shape[1]),
+    [&src, &out, &shape, full, this] (const tbb::blocked_range2d<int> &block)
+    {
+      for(int i=block.rows().begin(); i != block.rows().end(); ++i)
+      {
+        for(int j=block.cols().begin(); j != block.cols().end(); ++j)
+        {
+#else
+      for (size_t i = 0; i < shape[0]; ++i)
+      {
+        for (size_t j = 0; j < shape[1]; ++j)
+        {
+#endif
+          size_t offset = (i * shape[1] + j) * shape[2];
+          for (size_t k = 0; k < shape[2]; ++k)
+          {
+            out(i, j, k) = updatePixel(offset + k, static_cast<T>(src(i, j, k)), full);
+          }
+        }
+      }
+#if defined(FOAMALGO_USE_TBB)
+    }
+  );
+#endif
+
+  head_ = (head_ + 1) % window_;
+}
+
+template<typename T>
+template<typename O>
+void MovingAverageImageData<T>::average(O& out) const
+{
+  FOAM_ASSERT_ARGUMENT(count_ > 0, "Moving average is empty")
+  FOAM_ASSERT_ARGUMENT(shape_.size() == out.dimension(),
+                       "Frames and output have different number of dimensions")
+  utils::checkShape(shape_, out.shape(), "Frames and output have different shapes");
+
+  auto it = out.begin();
+  for (size_t p = 0; p < size_; ++p, ++it) *it = averagePixel(p);
+}
+
+template<typename T>
+void MovingAverageImageData<T>::setWindow(size_t window)
+{
+  FOAM_ASSERT_ARGUMENT(window > 0, "Window must be positive")
+  if (window == window_) return;
+
+  size_t count = std::min(count_, window);
+  auto ring = xt::xtensor<T, 2>::from_shape({window, size_});
+
+  sum_.fill(0);
+  nan_count_.fill(0);
+  // keep the latest frames in chronological order
+  for (size_t i = 0; i < count; ++i)
+  {
+    size_t src_idx = (head_ + window_ - count + i) % window_;
+    for (size_t p = 0; p < size_; ++p)
+    {
+      T v = ring_(src_idx, p);
+      ring(i, p) = v;
+      if (std::isnan(v)) nan_count_(p) += 1;
+      else sum_(p) += static_cast<double>(v);
+    }
+  }
+
+  ring_ = std::move(ring);
+  window_ = window;
+  count_ = count;
+  head_ = count % window;
+}
+
+template<typename T>
+void MovingAverageImageData<T>::reset()
+{
+  count_ = 0;
+  head_ = 0;
+}
+
+/**
+ * @class ImageStatsAccumulator
+ * @brief Accumulate pixel-wise statistics of a stream of images.
+ *
+ * The count, mean and the sum of squared differences from the mean (M2)
+ * of every pixel are updated in place by using Welford's online algorithm.
+ * Therefore, the memory usage does not depend on the number of images
+ * accumulated. NaN pixels are ignored.
+ *
+ * The statistics can be accumulated separately for different memory cells.
+ */
+template<typename T = double>
+class ImageStatsAccumulator
+{
+  static_assert(std::is_floating_point<T>::value);
+
+public:
+
+  using value_type = T;
+  using count_type = xt::xtensor<uint64_t, 3>;
+  using array_type = xt::xtensor<T, 3>;
+
+private:
+
+  size_t n_cells_;
+  size_t ny_;
+  size_t nx_;
+
+  count_type count_; // shape = (cells, y, x)
+  array_type mean_; // shape = (cells, y, x)
+  array_type m2_; // shape = (cells, y, x)
+
+  template<typename E>
+  void updateImp(const E& src, const std::vector<size_t>& cells);
+
+public:
+
+  ImageStatsAccumulator(size_t ny, size_t nx, size_t n_cells=1);
+
+  ~ImageStatsAccumulator() = default;
+
+  /**
+   * Update the statistics with an array of images.
+   *
+   * If there is only one memory cell, all the images are accumulated into
+   * it. Otherwise, the number of images must be equal to the number of
+   * memory cells and the i-th image is accumulated into the i-th cell.
+   *
+   * @param src: image data. shape = (indices, y, x)
+   */
+  template<typename E, EnableIf<std::decay_t<E>, IsImageArray> = false>
+  void update(const E& src);
+
+  /**
+   * Update the statistics with an array of images.
+   *
+   * @param src: image data. shape = (indices, y, x)
+   * @param cells: memory cell indices of the images.
+   */
+  template<typename E, EnableIf<std::decay_t<E>, IsImageArray> = false>
+  void update(const E& src, const std::vector<size_t>& cells);
+
+  /**
+   * Update the statistics with a single image. There must be only one
+   * memory cell.
+   *
+   * @param src: image data. shape = (y, x)
+   */
+  template<typename E, EnableIf<std::decay_t<E>, IsImage> = false>
+  void update(const E& src);
+
+  /**
+   * Merge the statistics accumulated by another accumulator.
+   *
+   * @param other: accumulator which has the same shape.
+   */
+  void merge(const ImageStatsAccumulator& other);
+
+  /**
+   * Reset the accumulated statistics.
+   */
+  void reset();
+
+  /**
+   * Return the number of accumulated values. shape = (cells, y, x)
+   */
+  const count_type& count() const { return count_; }
+
+  /**
+   * Return the mean. Pixels without any accumulated value are NaN.
+   * shape = (cells, y, x)
+   */
+  array_type mean() const;
+
+  /**
+   * Return the variance.
+   *
+   * @param ddof: delta degrees of freedom. Pixels with no more than 'ddof'
+   *              accumulated values are NaN.
+   * @return: shape = (cells, y, x)
+   */
+  array_type variance(size_t ddof=0) const;
+
+  /**
+   * Return the standard deviation.
+   *
+   * @param ddof: delta degrees of freedom.
+   * @return: shape = (cells, y, x)
+   */
+  array_type std(size_t ddof=0) const;
+};
+
+template<typename T>
+ImageStatsAccumulator<T>::ImageStatsAccumulator(size_t ny, size_t nx, size_t n_cells)
+  : n_cells_(n_cells), ny_(ny), nx_(nx)
+{
+  FOAM_ASSERT_ARGUMENT(n_cells > 0, "Number of memory cells must be positive")
+
+  count_ = xt::zeros<uint64_t>({n_cells_, ny_, nx_});
+  mean_ = xt::zeros<T>({n_cells_, ny_, nx_});
+  m2_ = xt::zeros<T>({n_cells_, ny_, nx_});
+}
+
+template<typename T>
+template<typename E>
+void ImageStatsAccumulator<T>::updateImp(const E& src, const std::vector<size_t>& cells)
+{
+  auto shape = src.shape();
+  std::array<size_t, 2> image_shape {ny_, nx_};
+  utils::checkShape(image_shape, shape, "Accumulator and image data have different shapes", 0, 1);
+
+  FOAM_ASSERT_ARGUMENT(cells.size() == shape[0],
+                       "Number of memory cell indices and images are different")
+  for (auto c : cells)
+  {
+    FOAM_ASSERT_ARGUMENT(c < n_cells_, "Memory cell index is out of range")
+  }
+
+#if defined(FOAMALGO_USE_TBB)
+  tbb::parallel_for(tbb::blocked_range2d<int>(0, ny_, 0, nx_),
+    [&src, &cells, &shape, this] (const tbb::blocked_range2d<int> &block)
+    {
+      for(int j=block.rows().begin(); j != block.rows().end(); ++j)
+      {
+        for(int k=block.cols().begin(); k != block.cols().end(); ++k)
+        {
+#else
+      for (size_t j = 0; j < ny_; ++j)
+      {
+        for (size_t k = 0; k < nx_; ++k)
+        {
+#endif
+          for (size_t i = 0; i < shape[0]; ++i)
+          {
+            auto v = static_cast<T>(src(i, j, k));
+            if (std::isnan(v)) continue;
+
+            size_t c = cells[i];
+            auto n = ++count_(c, j, k);
+            T delta = v - mean_(c, j, k);
+            mean_(c, j, k) += delta / static_cast<T>(n);
+            m2_(c, j, k) += delta * (v - mean_(c, j, k));
+          }
+        }
+      }
+#if defined(FOAMALGO_USE_TBB)
+    }
+  );
+#endif
+}
+
+template<typename T>
+template<typename E, EnableIf<std::decay_t<E>, IsImageArray>>
+void ImageStatsAccumulator<T>::update(const E& src)
+{
+  size_t n = src.shape()[0];
+  if (n_cells_ == 1)
+  {
+    updateImp(src, std::vector<size_t>(n, 0));
+    return;
+  }
+
+  FOAM_ASSERT_ARGUMENT(n == n_cells_, "Number of images and memory cells are different")
+  std::vector<size_t> cells(n);
+  for (size_t i = 0; i < n; ++i) cells[i] = i;
+  updateImp(src, cells);
+}
+
+template<typename T>
+template<typename E, EnableIf<std::decay_t<E>, IsImageArray>>
+void ImageStatsAccumulator<T>::update(const E& src, const std::vector<size_t>& cells)
+{
+  updateImp(src, cells);
+}
+
+template<typename T>
+template<typename E, EnableIf<std::decay_t<E>, IsImage>>
+void ImageStatsAccumulator<T>::update(const E& src)
+{
+  FOAM_ASSERT_ARGUMENT(n_cells_ == 1, "Accumulator has more than one memory cell")
+
+  auto shape = src.shape();
+  std::array<size_t, 2> image_shape {ny_, nx_};
+  utils::checkShape(image_shape, shape, "Accumulator and image data have different shapes");
+
+#if defined(FOAMALGO_USE_TBB)
+  tbb::parallel_for(tbb::blocked_range2d<int>(0, ny_, 0, nx_),
+    [&src, this] (const tbb::blocked_range2d<int> &block)
+    {
+      for(int j=block.rows().begin(); j != block.rows().end(); ++j)
+      {
+        for(int k=block.cols().begin(); k != block.cols().end(); ++k)
+        {
+#else
+      for (size_t j = 0; j < ny_; ++j)
+      {
+        for (size_t k = 0; k < nx_; ++k)
+        {
+#endif
+          auto v = static_cast<T>(src(j, k));
+          if (std::isnan(v)) continue;
+
+          auto n = ++count_(0, j, k);
+          T delta = v - mean_(0, j, k);
+          mean_(0, j, k) += delta / static_cast<T>(n);
+          m2_(0, j, k) += delta * (v - mean_(0, j, k));
+        }
+      }
+#if defined(FOAMALGO_USE_TBB)
+    }
+  );
+#endif
+}
+
+template<typename T>
+void ImageStatsAccumulator<T>::merge(const ImageStatsAccumulator& other)
+{
+  utils::checkShape(count_.shape(), other.count_.shape(), "Accumulators have different shapes");
+
+  // parallelize over pixels since there is usually only one memory cell
+#if defined(FOAMALGO_USE_TBB)
+  tbb::parallel_for(tbb::blocked_range2d<int>(0, ny_, 0, nx_),
+    [&other, this] (const tbb::blocked_range2d<int> &block)
+    {
+      for(int j=block.rows().begin(); j != block.rows().end(); ++j)
+      {
+        for(int k=block.cols().begin(); k != block.cols().end(); ++k)
+        {
+#else
+      for (size_t j = 0; j < ny_; ++j)
+      {
+        for (size_t k = 0; k < nx_; ++k)
+        {
+#endif
+          for (size_t i = 0; i < n_cells_; ++i)
+          {
+            auto nb = other.count_(i, j, k);
+            if (nb == 0) continue;
+
+            auto na = count_(i, j, k);
+            auto n = na + nb;
+            T delta = other.mean_(i, j, k) - mean_(i, j, k);
+            T ratio = static_cast<T>(nb) / static_cast<T>(n);
+            mean_(i, j, k) += delta * ratio;
+            m2_(i, j, k) += other.m2_(i, j, k) + delta * delta * static_cast<T>(na) * ratio;
+            count_(i, j, k) = n;
+          }
+        }
+      }
+#if defined(FOAMALGO_USE_TBB)
+    }
+  );
+#endif
+}
+
+template<typename T>
+void ImageStatsAccumulator<T>::reset()
+{
+  count_.fill(0);
+  mean_.fill(0);
+  m2_.fill(0);
+}
+
+template<typename T>
+typename ImageStatsAccumulator<T>::array_type ImageStatsAccumulator<T>::mean() const
+{
+  auto ret = array_type::from_shape({n_cells_, ny_, nx_});
+  for (size_t i = 0; i < n_cells_; ++i)
+  {
+    for (size_t j = 0; j < ny_; ++j)
+    {
+      for (size_t k = 0; k < nx_; ++k)
+      {
+        ret(i, j, k) = count_(i, j, k) == 0 ? std::numeric_limits<T>::quiet_NaN() : mean_(i, j, k);
+      }
+    }
+  }
+  return ret;
+}
+
+template<typename T>
+typename ImageStatsAccumulator<T>::array_type ImageStatsAccumulator<T>::variance(size_t ddof) const
+{
+  auto ret = array_type::from_shape({n_cells_, ny_, nx_});
+  for (size_t i = 0; i < n_cells_; ++i)
+  {
+    for (size_t j = 0; j < ny_; ++j)
+    {
+      for (size_t k = 0; k < nx_; ++k)
+      {
+        auto n = count_(i, j, k);
+        ret(i, j, k) = n <= ddof ? std::numeric_limits<T>::quiet_NaN()
+                                 : m2_(i, j, k) / static_cast<T>(n - ddof);
+      }
+    }
+  }
+  return ret;
+}
+
+template<typename T>
+typename ImageStatsAccumulator<T>::array_type ImageStatsAccumulator<T>::std(size_t ddof) const
+{
+  auto ret = variance(ddof);
+  for (auto& v : ret) v = std::sqrt(v);
+  return ret;
+}
+
+/**
+ * @class PixelCorrelationAccumulator
+ * @brief Accumulate pixel-wise correlations between a stream of images and
+ * a scalar per image, e.g. pulse energy or delay.
+ *
+ * The count, the means of the pixel value and the scalar, their sums of
+ * squared differences from the means and their co-moment are updated in
+ * place by using Welford's online algorithm. Therefore, the memory usage
+ * does not depend on the number of images accumulated. NaN pixels are
+ * ignored and images with NaN scalars are skipped.
+ */
+template<typename T = double>
+class PixelCorrelationAccumulator
+{
+  static_assert(std::is_floating_point<T>::value);
+
+public:
+
+  using value_type = T;
+  using count_type = xt::xtensor<uint64_t, 2>;
+  using array_type = xt::xtensor<T, 2>;
+
+private:
+
+  size_t ny_;
+  size_t nx_;
+
+  count_type count_; // shape = (y, x)
+  array_type mean_x_; // mean of the pixel values, shape = (y, x)
+  array_type mean_y_; // mean of the scalars, shape = (y, x)
+  array_type m2_x_; // shape = (y, x)
+  array_type m2_y_; // shape = (y, x)
+  array_type c_xy_; // co-moment, shape = (y, x)
+
+  void push(size_t j, size_t k, T x, T y);
+
+public:
+
+  PixelCorrelationAccumulator(size_t ny, size_t nx);
+
+  ~PixelCorrelationAccumulator() = default;
+
+  /**
+   * Update the statistics with an array of images.
+   *
+   * @param src: image data. shape = (indices, y, x)
+   * @param scalars: scalar of each image. shape = (indices,)
+   */
+  template<typename E, EnableIf<std::decay_t<E>, IsImageArray> = false>
+  void update(const E& src, const std::vector<T>& scalars);
+
+  /**
+   * Update the statistics with a single image.
+   *
+   * @param src: image data. shape = (y, x)
+   * @param scalar: scalar of the image.
+   */
+  template<typename E, EnableIf<std::decay_t<E>, IsImage> = false>
+  void update(const E& src, T scalar);
+
+  /**
+   * Merge the statistics accumulated by another accumulator.
+   *
+   * @param other: accumulator which has the same shape.
+   */
+  void merge(const PixelCorrelationAccumulator& other);
+
+  /**
+   * Reset the accumulated statistics.
+   */
+  void reset();
+
+  /**
+   * Return the number of accumulated values. shape = (y, x)
+   */
+  const count_type& count() const { return count_; }
+
+  /**
+   * Return the covariance between the pixel values and the scalars.
+   *
+   * @param ddof: delta degrees of freedom. Pixels with no more than 'ddof'
+   *              accumulated values are NaN.
+   * @return: shape = (y, x)
+   */
+  array_type covariance(size_t ddof=0) const;
+
+  /**
+   * Return the Pearson correlation coefficient between the pixel values
+   * and the scalars. Pixels with zero variance of either the pixel value
+   * or the scalar are NaN.
+   *
+   * @return: shape = (y, x)
+   */
+  array_type correlation() const;
+};
+
+template<typename T>
+PixelCorrelationAccumulator<T>::PixelCorrelationAccumulator(size_t ny, size_t nx) : ny_(ny), nx_(nx)
+{
+  count_ = xt::zeros<uint64_t>({ny_, nx_});
+  mean_x_ = xt::zeros<T>({ny_, nx_});
+  mean_y_ = xt::zeros<T>({ny_, nx_});
+  m2_x_ = xt::zeros<T>({ny_, nx_});
+  m2_y_ = xt::zeros<T>({ny_, nx_});
+  c_xy_ = xt::zeros<T>({ny_, nx_});
+}
+
+template<typename T>
+void PixelCorrelationAccumulator<T>::push(size_t j, size_t k, T x, T y)
+{
+  auto n = ++count_(j, k);
+  T dx = x - mean_x_(j, k);
+  T dy = y - mean_y_(j, k);
+  mean_x_(j, k) += dx / static_cast<T>(n);
+  mean_y_(j, k) += dy / static_cast<T>(n);
+  T dy_new = y - mean_y_(j, k);
+  m2_x_(j, k) += dx * (x - mean_x_(j, k));
+  m2_y_(j, k) += dy * dy_new;
+  c_xy_(j, k) += dx * dy_new;
+}
+
+template<typename T>
+template<typename E, EnableIf<std::decay_t<E>, IsImageArray>>
+void PixelCorrelationAccumulator<T>::update(const E& src, const std::vector<T>& scalars)
+{
+  auto shape = src.shape();
+  std::array<size_t, 2> image_shape {ny_, nx_};
+  utils::checkShape(image_shape, shape, "Accumulator and image data have different shapes", 0, 1);
+  FOAM_ASSERT_ARGUMENT(scalars.size() == shape[0], "Number of scalars and images are different")
+
+#if defined(FOAMALGO_USE_TBB)
+  tbb::parallel_for(tbb::blocked_range2d<int>(0, ny_, 0, nx_),
+    [&src, &scalars, &shape, this] (const tbb::blocked_range2d<int> &block)
+    {
+      for(int j=block.rows().begin(); j != block.rows().end(); ++j)
+      {
+        for(int k=block.cols().begin(); k != block.cols().end(); ++k)
+        {
+#else
+      for (size_t j = 0; j < ny_; ++j)
+      {
+        for (size_t k = 0; k < nx_; ++k)
+        {
+#endif
+          for (size_t i = 0; i < shape[0]; ++i)
+          {
+            auto x = static_cast<T>(src(i, j, k));
+            if (std::isnan(x) || std::isnan(scalars[i])) continue;
+            push(j, k, x, scalars[i]);
+          }
+        }
+      }
+#if defined(FOAMALGO_USE_TBB)
+    }
+  );
+#endif
+}
+
+template<typename T>
+template<typename E, EnableIf<std::decay_t<E>, IsImage>>
+void PixelCorrelationAccumulator<T>::update(const E& src, T scalar)
+{
+  auto shape = src.shape();
+  std::array<size_t, 2> image_shape {ny_, nx_};
+  utils::checkShape(image_shape, shape, "Accumulator and image data have different shapes");
+
+  if (std::isnan(scalar)) return;
+
+#if defined(FOAMALGO_USE_TBB)
+  tbb::parallel_for(tbb::blocked_range<int>(0, ny_),
+    [&src, scalar, this] (const tbb::blocked_range<int> &block)
+    {
+      for(int j=block.begin(); j != block.end(); ++j)
+      {
+#else
+      for (size_t j = 0; j < ny_; ++j)
+      {
+#endif
+        for (size_t k = 0; k < nx_; ++k)
+        {
+          auto x = static_cast<T>(src(j, k));
+          if (std::isnan(x)) continue;
+          push(j, k, x, scalar);
+        }
+      }
+#if defined(FOAMALGO_USE_TBB)
+    }
+  );
+#endif
+}
+
+template<typename T>
+void PixelCorrelationAccumulator<T>::merge(const PixelCorrelationAccumulator& other)
+{
+  utils::checkShape(count_.shape(), other.count_.shape(), "Accumulators have different shapes");
+
+#if defined(FOAMALGO_USE_TBB)
+  tbb::parallel_for(tbb::blocked_range<int>(0, ny_),
+    [&other, this] (const tbb::blocked_range<int> &block)
+    {
+      for(int j=block.begin(); j != block.end(); ++j)
+      {
+#else
+      for (size_t j = 0; j < ny_; ++j)
+      {
+#endif
+        for (size_t k = 0; k < nx_; ++k)
+        {
+          auto nb = other.count_(j, k);
+          if (nb == 0) continue;
+
+          auto na = count_(j, k);
+          auto n = na + nb;
+          T dx = other.mean_x_(j, k) - mean_x_(j, k);
+          T dy = other.mean_y_(j, k) - mean_y_(j, k);
+          T ratio = static_cast<T>(nb) / static_cast<T>(n);
+          T weight = static_cast<T>(na) * ratio;
+          mean_x_(j, k) += dx * ratio;
+          mean_y_(j, k) += dy * ratio;
+          m2_x_(j, k) += other.m2_x_(j, k) + dx * dx * weight;
+          m2_y_(j, k) += other.m2_y_(j, k) + dy * dy * weight;
+          c_xy_(j, k) += other.c_xy_(j, k) + dx * dy * weight;
+          count_(j, k) = n;
+        }
+      }
+#if defined(FOAMALGO_USE_TBB)
+    }
+  );
+#endif
+}
+
+template<typename T>
+void PixelCorrelationAccumulator<T>::reset()
+{
+  count_.fill(0);
+  mean_x_.fill(0);
+  mean_y_.fill(0);
+  m2_x_.fill(0);
+  m2_y_.fill(0);
+  c_xy_.fill(0);
+}
+
+template<typename T>
+typename PixelCorrelationAccumulator<T>::array_type PixelCorrelationAccumulator<T>::covariance(size_t ddof) const
+{
+  auto ret = array_type::from_shape({ny_, nx_});
+  for (size_t j = 0; j < ny_; ++j)
+  {
+    for (size_t k = 0; k < nx_; ++k)
+    {
+      auto n = count_(j, k);
+      ret(j, k) = n <= ddof ? std::numeric_limits<T>::quiet_NaN() : c_xy_(j, k) / static_cast<T>(n - ddof);
+    }
+  }
+  return ret;
+}
+
+template<typename T>
+typename PixelCorrelationAccumulator<T>::array_type PixelCorrelationAccumulator<T>::correlation() const
+{
+  auto ret = array_type::from_shape({ny_, nx_});
+  for (size_t j = 0; j < ny_; ++j)
+  {
+    for (size_t k = 0; k < nx_; ++k)
+    {
+      T denominator = std::sqrt(m2_x_(j, k) * m2_y_(j, k));
+      ret(j, k) = denominator > 0 ? c_xy_(j, k) / denominator : std::numeric_limits<T>::quiet_NaN();
+    }
+  }
+  return ret;
+}
+
+/**
+ * @class PeakFinder
+ * @brief Find peaks, e.g. Bragg spots, in images.
+ *
+ * A peak is a local maximum in its 3x3 neighbourhood which is above the
+ * ADC threshold. The local background and noise are the mean and standard
+ * deviation of the pixels on the square ring with the Chebyshev radius
+ * 'local_bg_radius' around the maximum. The pixels inside the ring which
+ * are above the local threshold (background + min_snr * noise) and
+ * connected to the maximum belong to the peak, and the number of them must
+ * be within [min_pixels, max_pixels]. min_snr must not be negative.
+ * Masked and NaN pixels are ignored.
+ *
+ * At most 'max_peaks' peaks, the first ones in the raster order, are
+ * returned for each image. The number of peaks of each image returned by
+ * the array methods includes the ones which are not returned. Therefore, a
+ * number larger than 'max_peaks' indicates that the peaks are truncated.
+ */
+template<typename T = float>
+class PeakFinder
+{
+  static_assert(std::is_floating_point<T>::value);
+
+public:
+
+  using value_type = T;
+  // columns: (y, x, intensity, number of pixels, SNR), where (y, x) is the
+  // center of mass and intensity is the background-subtracted sum
+  using peaks_type = xt::xtensor<T, 2>;
+  using counts_type = xt::xtensor<size_t, 1>;
+
+  static constexpr size_t n_columns = 5;
+
+private:
+
+  using peak_type = std::array<T, n_columns>;
+
+  T adc_threshold_;
+  T min_snr_;
+  size_t min_pixels_;
+  size_t max_pixels_;
+  size_t local_bg_radius_;
+  size_t max_peaks_; // maximum number of peaks in an image
+
+  template<typename F, typename M>
+  size_t findImp(F&& get, M&& masked, size_t h, size_t w, std::vector<peak_type>& peaks) const;
+
+  static peaks_type toPeaks(const std::vector<std::vector<peak_type>>& peaks);
+
+public:
+
+  PeakFinder(T adc_threshold, T min_snr, size_t min_pixels = 2, size_t max_pixels = 50,
+             size_t local_bg_radius = 3, size_t max_peaks = 2048);
+
+  ~PeakFinder() = default;
+
+  /**
+   * Find peaks in an image.
+   *
+   * @param src: image data. shape = (y, x)
+   *
+   * @return: peaks. shape = (peaks, 5)
+   */
+  template<typename E, EnableIf<E, IsImage> = false>
+  peaks_type find(const E& src) const;
+
+  /**
+   * Find peaks in an image.
+   *
+   * @param src: image data. shape = (y, x)
+   * @param mask: image mask. Pixels with true values are ignored. shape = (y, x)
+   *
+   * @return: peaks. shape = (peaks, 5)
+   */
+  template<typename E, typename M, EnableIf<E, IsImage> = false, EnableIf<M, IsImageMask> = false>
+  peaks_type find(const E& src, const M& mask) const;
+
+  /**
+   * Find peaks in an array of images in parallel.
+   *
+   * @param src: image data. shape = (indices, y, x)
+   *
+   * @return: (peaks of all the images, number of peaks found in each image).
+   *          shape = ((peaks, 5), (indices,))
+   */
+  template<typename E, EnableIf<E, IsImageArray> = false>
+  std::pair<peaks_type, counts_type> find(const E& src) const;
+
+  /**
+   * Find peaks in an array of images in parallel.
+   *
+   * @param src: image data. shape = (indices, y, x)
+   * @param mask: image mask shared by all the images. Pixels with true
+   *              values are ignored. shape = (y, x)
+   *
+   * @return: (peaks of all the images, number of peaks found in each image).
+   *          shape = ((peaks, 5), (indices,))
+   */
+  template<typename E, typename M, EnableIf<E, IsImageArray> = false, EnableIf<M, IsImageMask> = false>
+  std::pair<peaks_type, counts_type> find(const E& src, const M& mask) const;
+
+private:
+
+  template<typename E, typename M>
+  std::pair<peaks_type, counts_type> findArray(const E& src, M&& masked) const;
+};
+
+template<typename T>
+PeakFinder<T>::PeakFinder(T adc_threshold, T min_snr, size_t min_pixels, size_t max_pixels,
+                          size_t local_bg_radius, size_t max_peaks)
+  : adc_threshold_(adc_threshold),
+    min_snr_(min_snr),
+    min_pixels_(min_pixels),
+    max_pixels_(max_pixels),
+    local_bg_radius_(local_bg_radius),
+    max_peaks_(max_peaks)
+{
+  // A negative SNR would allow pixels below the background in a peak.
+  FOAM_ASSERT_ARGUMENT(min_snr >= 0, "min_snr must not be negative")
+  FOAM_ASSERT_ARGUMENT(local_bg_radius > 0, "Local background radius must be positive")
+  FOAM_ASSERT_ARGUMENT(min_pixels <= max_pixels, "min_pixels must not be larger than max_pixels")
+}
+
+template<typename T>
+template<typename F, typename M>
+size_t PeakFinder<T>::findImp(F&& get, M&& masked, size_t h, size_t w, std::vector<peak_type>& peaks) const
+{
+  int ih = static_cast<int>(h);
+  int iw = static_cast<int>(w);
+  int r = static_cast<int>(local_bg_radius_);
+  auto valid = [&get, &masked, ih, iw] (int j, int k)
+  {
+    return j >= 0 && j < ih && k >= 0 && k < iw && !masked(j, k) && !std::isnan(get(j, k));
+  };
+
+  // buffers of the flood fill in the box inside the background ring
+  int box = 2 * r - 1;
+  std::vector<char> visited(box * box);
+  std::vector<std::pair<int, int>> stack;
+
+  size_t n_found = 0;
+  for (int j = 0; j < ih; ++j)
+  {
+    for (int k = 0; k < iw; ++k)
+    {
+      // comparison with NaN is always false
+      if (masked(j, k) || !(get(j, k) > adc_threshold_)) continue;
+      auto v = static_cast<double>(get(j, k));
+
+      // For a plateau, only the first pixel in the raster order is a
+      // local maximum.
+      bool is_max = true;
+      for (int dj = -1; dj <= 1 && is_max; ++dj)
+      {
+        for (int dk = -1; dk <= 1; ++dk)
+        {
+          if ((dj == 0 && dk == 0) || !valid(j + dj, k + dk)) continue;
+          auto u = static_cast<double>(get(j + dj, k + dk));
+          bool before = dj < 0 || (dj == 0 && dk < 0);
+          if (u > v || (before && u == v))
+          {
+            is_max = false;
+            break;
+          }
+        }
+      }
+      if (!is_max) continue;
+
+      double bg_sum = 0.;
+      double bg_sum2 = 0.;
+      size_t bg_count = 0;
+      for (int dj = -r; dj <= r; ++dj)
+      {
+        for (int dk = -r; dk <= r; ++dk)
+        {
+          if (std::max(std::abs(dj), std::abs(dk)) != r || !valid(j + dj, k + dk)) continue;
+          auto u = static_cast<double>(get(j + dj, k + dk));
+          bg_sum += u;
+          bg_sum2 += u * u;
+          ++bg_count;
+        }
+      }
+      if (bg_count < 2) continue;
+
+      double bg = bg_sum / static_cast<double>(bg_count);
+      double noise = std::sqrt(std::max(0., bg_sum2 / static_cast<double>(bg_count) - bg * bg));
+      double local_threshold = bg + static_cast<double>(min_snr_) * noise;
+      if (!(v > local_threshold)) continue;
+
+      // The pixels of a peak are connected to the maximum (8-connectivity)
+      // within the box, so that nearby peaks do not count each other's pixels.
+      double intensity = 0.;
+      double cy = 0.;
+      double cx = 0.;
+      size_t n_pixels = 0;
+      std::fill(visited.begin(), visited.end(), 0);
+      visited[(r - 1) * box + r - 1] = 1;
+      stack.assign(1, {j, k});
+      while (!stack.empty())
+      {
+        auto [jj, kk] = stack.back();
+        stack.pop_back();
+
+        double weight = static_cast<double>(get(jj, kk)) - bg;
+        intensity += weight;
+        cy += weight * jj;
+        cx += weight * kk;
+        ++n_pixels;
+
+        for (int dj = -1; dj <= 1; ++dj)
+        {
+          for (int dk = -1; dk <= 1; ++dk)
+          {
+            int bj = jj + dj - j + r - 1;
+            int bk = kk + dk - k + r - 1;
+            if (bj < 0 || bj >= box || bk < 0 || bk >= box || visited[bj * box + bk]) continue;
+            visited[bj * box + bk] = 1;
+            if (!valid(jj + dj, kk + dk)) continue;
+            if (static_cast<double>(get(jj + dj, kk + dk)) <= local_threshold) continue;
+            stack.emplace_back(jj + dj, kk + dk);
+          }
+        }
+      }
+      if (n_pixels < min_pixels_ || n_pixels > max_pixels_) continue;
+
+      // peaks beyond the maximum number are counted but not stored
+      if (++n_found > max_peaks_) continue;
+
+      double snr = noise > 0. ? (v - bg) / noise : std::numeric_limits<double>::infinity();
+      peaks.push_back({static_cast<T>(cy / intensity),
+                       static_cast<T>(cx / intensity),
+                       static_cast<T>(intensity),
+                       static_cast<T>(n_pixels),
+                       static_cast<T>(snr)});
+    }
+  }
+  return n_found;
+}
+
+template<typename T>
+typename PeakFinder<T>::peaks_type
+PeakFinder<T>::toPeaks(const std::vector<std::vector<peak_type>>& peaks)
+{
+  size_t n_peaks = 0;
+  for (const auto& v : peaks) n_peaks += v.size();
+
+  auto ret = peaks_type::from_shape({n_peaks, n_columns});
+  size_t i = 0;
+  for (const auto& v : peaks)
+  {
+    for (const auto& p : v)
+    {
+      for (size_t c = 0; c < n_columns; ++c) ret(i, c) = p[c];
+      ++i;
+    }
+  }
+  return ret;
+}
+
+template<typename T>
+template<typename E, EnableIf<E, IsImage>>
+typename PeakFinder<T>::peaks_type PeakFinder<T>::find(const E& src) const
+{
+  auto shape = src.shape();
+  std::vector<std::vector<peak_type>> peaks(1);
+  findImp([&src] (int j, int k) { return src(j, k); },
+          [] (int, int) { return false; },
+          shape[0], shape[1], peaks[0]);
+  return toPeaks(peaks);
+}
+
+template<typename T>
+template<typename E, typename M, EnableIf<E, IsImage>, EnableIf<M, IsImageMask>>
+typename PeakFinder<T>::peaks_type PeakFinder<T>::find(const E& src, const M& mask) const
+{
+  auto shape = src.shape();
+  utils::checkShape(shape, mask.shape(), "Image and mask have different shapes");
+
+  std::vector<std::vector<peak_type>> peaks(1);
+  findImp([&src] (int j, int k) { return src(j, k); },
+          [&mask] (int j, int k) { return mask(j, k); },
+          shape[0], shape[1], peaks[0]);
+  return toPeaks(peaks);
+}
+
+template<typename T>
+template<typename E, typename M>
+std::pair<typename PeakFinder<T>::peaks_type, typename PeakFinder<T>::counts_type>
+PeakFinder<T>::findArray(const E& src, M&& masked) const
+{
+  auto shape = src.shape();
+  std::vector<std::vector<peak_type>> peaks(shape[0]);
+  auto counts = counts_type::from_shape({shape[0]});
+
+#if defined(FOAMALGO_USE_TBB)
+  tbb::parallel_for(tbb::blocked_range<int>(0, shape[0]),
+    [&src, &masked, &shape, &peaks, &counts, this] (const tbb::blocked_range<int> &block)
+    {
+      for(int i=block.begin(); i != block.end(); ++i)
+      {
+#else
+      for (size_t i = 0; i < shape[0]; ++i)
+      {
+#endif
+        counts(i) = findImp([&src, i] (int j, int k) { return src(i, j, k); },
+                            masked, shape[1], shape[2], peaks[i]);
+      }
+#if defined(FOAMALGO_USE_TBB)
+    }
+  );
+#endif
+
+  return {toPeaks(peaks), counts};
+}
+
+template<typename T>
+template<typename E, EnableIf<E, IsImageArray>>
+std::pair<typename PeakFinder<T>::peaks_type, typename PeakFinder<T>::counts_type>
+PeakFinder<T>::find(const E& src) const
+{
+  return findArray(src, [] (int, int) { return false; });
+}
+
+template<typename T>
+template<typename E, typename M, EnableIf<E, IsImageArray>, EnableIf<M, IsImageMask>>
+std::pair<typename PeakFinder<T>::peaks_type, typename PeakFinder<T>::counts_type>
+PeakFinder<T>::find(const E& src, const M& mask) const
+{
+  utils::checkShape(src.shape(), mask.shape(), "Image and mask have different shapes", 1);
+  return findArray(src, [&mask] (int j, int k) { return mask(j, k); });
+}
+
+namespace detail
+{
+
+/**
+ * Disjoint-set forest with path halving. The root of a set is always the
+ * smallest element.
+ */
+class UnionFind
+{
+  std::vector<size_t> parent_;
+
+public:
+
+  void clear() { parent_.clear(); }
+
+  size_t make()
+  {
+    parent_.push_back(parent_.size());
+    return parent_.size() - 1;
+  }
+
+  size_t find(size_t x)
+  {
+    while (parent_[x] != x)
+    {
+      parent_[x] = parent_[parent_[x]];
+      x = parent_[x];
+    }
+    return x;
+  }
+
+  void unite(size_t a, size_t b)
+  {
+    a = find(a);
+    b = find(b);
+    if (a < b) parent_[b] = a;
+    else if (b < a) parent_[a] = b;
+  }
+
+  size_t size() const { return parent_.size(); }
+};
+
+} // detail
+
+/**
+ * @class ClusterFinder
+ * @brief Find clusters, e.g. droplets, of connected pixels above a threshold.
+ *
+ * Clusters are labeled in a two-pass scan with a union-find. They are
+ * ordered by their first pixels in the raster order. NaN pixels do not
+ * belong to any cluster. The center of a cluster is weighted by the pixel
+ * values, unless any pixel of the cluster is not positive.
+ */
+template<typename T = float>
+class ClusterFinder
+{
+  static_assert(std::is_floating_point<T>::value);
+
+public:
+
+  using value_type = T;
+  // columns: (number of pixels, sum, y, x), where (y, x) is the center of mass
+  using clusters_type = xt::xtensor<double, 2>;
+  using counts_type = xt::xtensor<size_t, 1>;
+
+  static constexpr size_t n_columns = 4;
+
+private:
+
+  using cluster_type = std::array<double, n_columns>;
+
+  T threshold_;
+  size_t connectivity_;
+  size_t min_pixels_;
+
+  template<typename F>
+  void findImp(F&& get, size_t h, size_t w, std::vector<size_t>& labels, detail::UnionFind& uf,
+               std::vector<cluster_type>& clusters) const;
+
+  static clusters_type toClusters(const std::vector<std::vector<cluster_type>>& clusters);
+
+public:
+
+  /**
+   * Constructor.
+   *
+   * @param threshold: pixels with values above the threshold are considered.
+   * @param connectivity: 4 for connecting pixels only with the horizontal and
+   *                      vertical neighbours and 8 for also with the diagonal ones.
+   * @param min_pixels: minimum number of pixels in a cluster.
+   */
+  explicit ClusterFinder(T threshold, size_t connectivity = 8, size_t min_pixels = 1);
+
+  ~ClusterFinder() = default;
+
+  /**
+   * Find clusters in an image.
+   *
+   * @param src: image data. shape = (y, x)
+   *
+   * @return: clusters. shape = (clusters, 4)
+   */
+  template<typename E, EnableIf<E, IsImage> = false>
+  clusters_type find(const E& src) const;
+
+  /**
+   * Find clusters in an array of images in parallel.
+   *
+   * @param src: image data. shape = (indices, y, x)
+   *
+   * @return: (clusters of all the images, number of clusters in each image).
+   *          shape = ((clusters, 4), (indices,))
+   */
+  template<typename E, EnableIf<E, IsImageArray> = false>
+  std::pair<clusters_type, counts_type> find(const E& src) const;
+};
+
+template<typename T>
+ClusterFinder<T>::ClusterFinder(T threshold, size_t connectivity, size_t min_pixels)
+  : threshold_(threshold), connectivity_(connectivity), min_pixels_(min_pixels)
+{
+  FOAM_ASSERT_ARGUMENT(connectivity == 4 || connectivity == 8, "Connectivity must be either 4 or 8")
+}
+
+template<typename T>
+template<typename F>
+void ClusterFinder<T>::findImp(F&& get, size_t h, size_t w, std::vector<size_t>& labels,
+                               detail::UnionFind& uf, std::vector<cluster_type>& clusters) const
+{
+  // label 0 is reserved for the background
+  labels.assign(h * w, 0);
+  uf.clear();
+  uf.make();
+
+  // first pass: assign provisional labels and record their equivalences
+  for (size_t j = 0; j < h; ++j)
+  {
+    for (size_t k = 0; k < w; ++k)
+    {
+      // comparison with NaN is always false
+      if (!(get(j, k) > threshold_)) continue;
+
+      size_t label = 0;
+      auto connect = [&label, &labels, &uf, w] (size_t jj, size_t kk)
+      {
+        size_t neighbour = labels[jj * w + kk];
+        if (neighbour == 0) return;
+        if (label == 0) label = neighbour;
+        else uf.unite(label, neighbour);
+      };
+
+      if (k > 0) connect(j, k - 1);
+      if (j > 0)
+      {
+        connect(j - 1, k);
+        if (connectivity_ == 8)
+        {
+          if (k > 0) connect(j - 1, k - 1);
+          if (k + 1 < w) connect(j - 1, k + 1);
+        }
+      }
+      labels[j * w + k] = label == 0 ? uf.make() : label;
+    }
+  }
+
+  // second pass: accumulate the pixels of each cluster
+  // columns: (number of pixels, sum, weighted y, weighted x, y, x, minimum)
+  std::vector<size_t> cluster_indices(uf.size(), 0);
+  std::vector<std::array<double, n_columns + 3>> candidates;
+  for (size_t j = 0; j < h; ++j)
+  {
+    for (size_t k = 0; k < w; ++k)
+    {
+      size_t label = labels[j * w + k];
+      if (label == 0) continue;
+
+      size_t root = uf.find(label);
+      if (cluster_indices[root] == 0)
+      {
+        candidates.push_back({0., 0., 0., 0., 0., 0., std::numeric_limits<double>::infinity()});
+        cluster_indices[root] = candidates.size();
+      }
+      auto& c = candidates[cluster_indices[root] - 1];
+      auto v = static_cast<double>(get(j, k));
+      c[0] += 1;
+      c[1] += v;
+      c[2] += v * j;
+      c[3] += v * k;
+      c[4] += j;
+      c[5] += k;
+      c[6] = std::min(c[6], v);
+    }
+  }
+
+  for (const auto& c : candidates)
+  {
+    if (c[0] < min_pixels_) continue;
+    // The intensity-weighted center can be far outside a cluster with
+    // non-positive pixels, which is possible with a non-positive threshold.
+    if (c[6] > 0) clusters.push_back({c[0], c[1], c[2] / c[1], c[3] / c[1]});
+    else clusters.push_back({c[0], c[1], c[4] / c[0], c[5] / c[0]});
+  }
+}
+
+template<typename T>
+typename ClusterFinder<T>::clusters_type
+ClusterFinder<T>::toClusters(const std::vector<std::vector<cluster_type>>& clusters)
+{
+  size_t n_clusters = 0;
+  for (const auto& v : clusters) n_clusters += v.size();
+
+  auto ret = clusters_type::from_shape({n_clusters, n_columns});
+  size_t i = 0;
+  for (const auto& v : clusters)
+  {
+    for (const auto& c : v)
+    {
+      for (size_t col = 0; col < n_columns; ++col) ret(i, col) = c[col];
+      ++i;
+    }
+  }
+  return ret;
+}
+
+template<typename T>
+template<typename E, EnableIf<E, IsImage>>
+typename ClusterFinder<T>::clusters_type ClusterFinder<T>::find(const E& src) const
+{
+  auto shape = src.shape();
+  std::vector<size_t> labels;
+  detail::UnionFind uf;
+  std::vector<std::vector<cluster_type>> clusters(1);
+  findImp([&src] (size_t j, size_t k) { return src(j, k); }, shape[0], shape[1], labels, uf, clusters[0]);
+  return toClusters(clusters);
+}
+
+template<typename T>
+template<typename E, EnableIf<E, IsImageArray>>
+std::pair<typename ClusterFinder<T>::clusters_type, typename ClusterFinder<T>::counts_type>
+ClusterFinder<T>::find(const E& src) const
+{
+  auto shape = src.shape();
+  std::vector<std::vector<cluster_type>> clusters(shape[0]);
+
+#if defined(FOAMALGO_USE_TBB)
+  tbb::parallel_for(tbb::blocked_range<int>(0, shape[0]),
+    [&src, &shape, &clusters, this] (const tbb::blocked_range<int> &block)
+    {
+      std::vector<size_t> labels;
+      detail::UnionFind uf;
+      for(int i=block.begin(); i != block.end(); ++i)
+      {
+#else
+      std::vector<size_t> labels;
+      detail::UnionFind uf;
+      for (size_t i = 0; i < shape[0]; ++i)
+      {
+#endif
+        findImp([&src, i] (size_t j, size_t k) { return src(i, j, k); },
+                shape[1], shape[2], labels, uf, clusters[i]);
+      }
+#if defined(FOAMALGO_USE_TBB)
+    }
+  );
+#endif
+
+  auto counts = counts_type::from_shape({shape[0]});
+  for (size_t i = 0; i < shape[0]; ++i) counts(i) = clusters[i].size();
+  return {toClusters(clusters), counts};
+}
+
 class OffsetPolicy
 {
 public:
@@ -8,17 +8,1800 @@
 #ifndef FOAM_STATISTICS_HPP
 #define FOAM_STATISTICS_HPP
 
+#include <algorithm>
+#include <array>
+#include <cmath>
+#include <limits>
+#include <numeric>
+#include <random>
+#include <sstream>
 #include <type_traits>
+#include <vector>
+
+#if defined(FOAMALGO_USE_TBB)
+#include <mutex> // There is a bug in "tbb/mutex.h".
+#include "tbb/parallel_for.h"
+#endif
 
 #include "xtensor/xmath.hpp"
-#include "xtensor/xhistogram.hpp"
+#include "xtensor/xnoalias.hpp"
 
 #include "traits.hpp"
+#include "utilities.hpp"
 
 
 namespace foam
 {
 
+/**
+ * @brief Evaluate a reducer expression into a pre-allocated array.
+ *
+ * @param reducer: reducer expression, e.g. xt::nanmean(src, {0}).
+ * @param out: output array. It must have the same shape as the result of
+ *             the reduction.
+ */
+template<typename E, typename O>
+inline void reduceInto(E&& reducer, O& out)
+{
+  FOAM_ASSERT_ARGUMENT(reducer.dimension() == out.dimension(),
+                       "Output and the reduced data have different dimensions")
+  utils::checkShape(reducer.shape(), out.shape(), "Output and the reduced data have different shapes");
+
+  xt::noalias(out) = std::forward<E>(reducer);
+}
+
+namespace detail
+{
+
+/**
+ * Find the index of the bin of a value which is within the outer edges of
+ * equal-width bins. It follows numpy.histogram: a bin includes its left
+ * edge and the last bin also includes its right edge.
+ */
+template<typename T>
+inline size_t histBinIndex(T v, double first, double last, const std::vector<T>& edges)
+{
+  auto n_bins = static_cast<long>(edges.size()) - 1;
+  auto idx = static_cast<long>((static_cast<double>(v) - first) / (last - first) * static_cast<double>(n_bins));
+  if (idx >= n_bins) idx = n_bins - 1;
+  if (idx < 0) idx = 0;
+
+  if (v < edges[idx] && idx > 0) --idx;
+  else if (idx != n_bins - 1 && v >= edges[idx + 1]) ++idx;
+  return static_cast<size_t>(idx);
+}
+
+/**
+ * Compute the edges of equal-width bins in the same way as numpy.linspace.
+ */
+template<typename T>
+inline std::vector<T> histEdges(double first, double last, size_t n_bins)
+{
+  std::vector<T> edges(n_bins + 1);
+  double step = (last - first) / static_cast<double>(n_bins);
+  for (size_t i = 0; i < n_bins; ++i) edges[i] = static_cast<T>(first + static_cast<double>(i) * step);
+  edges[n_bins] = static_cast<T>(last);
+  return edges;
+}
+
+/**
+ * Accumulate the (weighted) counts of n values into a histogram.
+ *
+ * The values are processed in parallel by chunks. Each chunk is first
+ * accumulated into local bins, which are then added to the histogram.
+ *
+ * @param n: number of values.
+ * @param bin: callable which returns the (flattened) bin index of the i-th
+ *             value, or the number of bins if the value is not counted.
+ * @param weight: callable which returns the weight of the i-th value.
+ * @param hist: histogram.
+ * @param chunk_size: number of values in a chunk.
+ */
+template<typename B, typename W, typename H>
+inline void accumulateHistogram(size_t n, B&& bin, W&& weight, H& hist, size_t chunk_size = 1 << 16)
+{
+  using hist_type = typename H::value_type;
+  size_t n_bins = hist.size();
+
+#if defined(FOAMALGO_USE_TBB)
+  std::mutex mtx;
+  tbb::parallel_for(tbb::blocked_range<size_t>(0, n, chunk_size),
+    [&bin, &weight, &hist, &mtx, n_bins] (const tbb::blocked_range<size_t> &block)
+    {
+      std::vector<hist_type> local(n_bins, hist_type(0));
+      for(size_t i=block.begin(); i != block.end(); ++i)
+      {
+#else
+      (void)chunk_size;
+      std::vector<hist_type> local(n_bins, hist_type(0));
+      for (size_t i = 0; i < n; ++i)
+      {
+#endif
+        size_t b = bin(i);
+        if (b < n_bins) local[b] += weight(i);
+      }
+
+#if defined(FOAMALGO_USE_TBB)
+      std::scoped_lock lock(mtx);
+#endif
+      auto it = hist.begin();
+      for (auto c : local) *(it++) += c;
+#if defined(FOAMALGO_USE_TBB)
+    }
+  );
+#endif
+}
+
+} // detail
+
+/**
+ * @brief Compute the histogram and the statistics of the non-NaN values of
+ * an array within [lb, ub].
+ *
+ * The histogram, mean and variance are accumulated in a single pass over
+ * the data. The median is then selected among the values in the bin(s)
+ * where it locates, which requires another pass but without copying the
+ * whole array. If either lb or ub is infinite, an extra pass is needed to
+ * find the outer edge(s) of the histogram from the data.
+ *
+ * @param src: data array.
+ * @param lb: lower bound of the values and the histogram.
+ * @param ub: upper bound of the values and the histogram.
+ * @param hist: histogram, whose size is the number of bins.
+ *
+ * @return: (left edge of the histogram, right edge of the histogram, mean,
+ *          median, standard deviation). The statistics are NaN if there is
+ *          no value.
+ */
+template<typename E, typename H, EnableIf<H, IsVector> = false>
+inline std::array<double, 5> nanhistWithStats(const E& src, double lb, double ub, H& hist)
+{
+  using value_type = typename E::value_type;
+  static_assert(std::is_floating_point<value_type>::value);
+  using hist_type = typename H::value_type;
+  constexpr double nan = std::numeric_limits<double>::quiet_NaN();
+
+  FOAM_ASSERT_ARGUMENT(lb < ub, "Lower bound must be smaller than upper bound")
+  size_t n_bins = hist.size();
+  FOAM_ASSERT_ARGUMENT(n_bins > 0, "Number of bins must be positive")
+
+  // values are compared with the bounds in the precision of the data
+  auto lb_v = static_cast<value_type>(lb);
+  auto ub_v = static_cast<value_type>(ub);
+  auto valid = [lb_v, ub_v] (value_type v) { return !std::isnan(v) && v >= lb_v && v <= ub_v; };
+
+  // outer edges, see pyfoamalgo.statistics._get_outer_edges
+  double first = lb;
+  double last = ub;
+  if (!std::isfinite(lb) || !std::isfinite(ub))
+  {
+    size_t count = 0;
+    auto v_min = std::numeric_limits<value_type>::infinity();
+    auto v_max = -std::numeric_limits<value_type>::infinity();
+    for (auto v : src)
+    {
+      if (!valid(v)) continue;
+      ++count;
+      if (v < v_min) v_min = v;
+      if (v > v_max) v_max = v;
+    }
+
+    if (!std::isfinite(lb) && !std::isfinite(ub))
+    {
+      if (count == 0) first = last = 0.;
+      else
+      {
+        first = v_min;
+        last = v_max;
+      }
+      if (first == last)
+      {
+        first -= 0.5;
+        last += 0.5;
+      }
+    } else if (!std::isfinite(ub))
+    {
+      last = count == 0 ? first + 1. : static_cast<double>(v_max);
+      if (last <= first) last = first + 1.;
+    } else
+    {
+      first = count == 0 ? last - 1. : static_cast<double>(v_min);
+      if (first >= last) first = last - 1.;
+    }
+  }
+
+  if (!std::isfinite(first) || !std::isfinite(last))
+  {
+    std::ostringstream ss;
+    ss << "Range of the histogram [" << first << ", " << last << "] is not finite";
+    throw std::invalid_argument(ss.str());
+  }
+
+  auto edges = detail::histEdges<value_type>(first, last, n_bins);
+
+  // histogram, mean and variance
+  std::fill(hist.begin(), hist.end(), hist_type(0));
+  size_t count = 0;
+  double mean = 0.;
+  double m2 = 0.;
+  for (auto v : src)
+  {
+    if (!valid(v)) continue;
+    ++hist(detail::histBinIndex(v, first, last, edges));
+
+    ++count;
+    double delta = static_cast<double>(v) - mean;
+    mean += delta / static_cast<double>(count);
+    m2 += delta * (static_cast<double>(v) - mean);
+  }
+
+  if (count == 0) return {first, last, nan, nan, nan};
+
+  // median
+  size_t k_lo = (count - 1) / 2;
+  size_t k_hi = count / 2;
+  size_t b_lo = 0;
+  size_t n_before = 0; // number of values before bin 'b_lo'
+  while (n_before + static_cast<size_t>(hist(b_lo)) <= k_lo) n_before += static_cast<size_t>(hist(b_lo++));
+  size_t b_hi = b_lo;
+  size_t n_until = n_before + static_cast<size_t>(hist(b_hi)); // number of values until bin 'b_hi'
+  while (n_until <= k_hi) n_until += static_cast<size_t>(hist(++b_hi));
+
+  std::vector<value_type> selected;
+  selected.reserve(n_until - n_before);
+  for (auto v : src)
+  {
+    if (!valid(v)) continue;
+    auto b = detail::histBinIndex(v, first, last, edges);
+    if (b >= b_lo && b <= b_hi) selected.push_back(v);
+  }
+
+  auto it_lo = selected.begin() + (k_lo - n_before);
+  std::nth_element(selected.begin(), it_lo, selected.end());
+  double median = static_cast<double>(*it_lo);
+  if (k_hi != k_lo)
+  {
+    // the next value is the minimum of the upper partition
+    median = 0.5 * (median + static_cast<double>(*std::min_element(it_lo + 1, selected.end())));
+  }
+
+  return {first, last, mean, median, std::sqrt(m2 / static_cast<double>(count))};
+}
+
+namespace detail
+{
+
+/**
+ * Return a callable which finds the bin index of a value following
+ * numpy.histogram. NaN and the values outside [lb, ub] are assigned to the
+ * index 'number of bins'.
+ */
+template<typename T>
+inline auto histBinFinder(double lb, double ub, size_t n_bins)
+{
+  FOAM_ASSERT_ARGUMENT(n_bins > 0, "Number of bins must be positive")
+  FOAM_ASSERT_ARGUMENT(std::isfinite(lb) && std::isfinite(ub) && lb < ub,
+                       "Edges must be finite and lower bound must be smaller than upper bound")
+
+  return [lb, ub, n_bins, edges = histEdges<T>(lb, ub, n_bins)] (auto v)
+  {
+    auto x = static_cast<T>(v);
+    // comparison with NaN is always false
+    if (!(x >= edges.front() && x <= edges.back())) return n_bins;
+    return histBinIndex(x, lb, ub, edges);
+  };
+}
+
+/**
+ * Return a callable which finds the bin index of a value with the given
+ * monotonically increasing edges by binary search following
+ * numpy.histogram. NaN and the values outside the edges are assigned to
+ * the index 'number of bins'.
+ */
+template<typename V>
+inline auto histEdgesBinFinder(const V& edges)
+{
+  size_t n_bins = edges.size() - 1;
+  FOAM_ASSERT_ARGUMENT(edges.size() > 1, "Number of bins must be positive")
+  for (size_t i = 0; i < n_bins; ++i)
+  {
+    FOAM_ASSERT_ARGUMENT(edges(i) <= edges(i + 1), "Edges must increase monotonically")
+  }
+
+  return [n_bins, edges = std::vector<double>(edges.begin(), edges.end())] (auto v)
+  {
+    auto x = static_cast<double>(v);
+    // comparison with NaN is always false
+    if (!(x >= edges.front() && x <= edges.back())) return n_bins;
+    // the last bin also includes its right edge
+    if (x == edges.back()) return n_bins - 1;
+    return static_cast<size_t>(std::upper_bound(edges.begin(), edges.end(), x) - edges.begin()) - 1;
+  };
+}
+
+} // detail
+
+/**
+ * @brief Compute the histogram of an array within [lb, ub].
+ *
+ * It follows numpy.histogram: a bin includes its left edge and the last
+ * bin also includes its right edge. NaN and the values outside [lb, ub]
+ * are ignored. The values are accumulated in parallel by chunks.
+ *
+ * @param src: data array. shape = (n,)
+ * @param lb: left edge of the first bin.
+ * @param ub: right edge of the last bin.
+ * @param hist: histogram, whose size is the number of bins.
+ */
+template<typename E, typename H, EnableIf<E, IsVector> = false, EnableIf<H, IsVector> = false>
+inline void histogram1d(const E& src, double lb, double ub, H& hist)
+{
+  using value_type = typename E::value_type;
+  // the same precision of the edges as numpy.histogram
+  using edge_type = std::conditional_t<std::is_floating_point<value_type>::value, value_type, double>;
+  using hist_type = typename H::value_type;
+
+  auto bin = detail::histBinFinder<edge_type>(lb, ub, hist.size());
+  std::fill(hist.begin(), hist.end(), hist_type(0));
+  detail::accumulateHistogram(src.size(),
+                              [&src, &bin] (size_t i) { return bin(src(i)); },
+                              [] (size_t) { return hist_type(1); },
+                              hist);
+}
+
+/**
+ * @brief Compute the weighted histogram of an array within [lb, ub].
+ *
+ * @param src: data array. shape = (n,)
+ * @param weights: weights of the values. shape = (n,)
+ * @param lb: left edge of the first bin.
+ * @param ub: right edge of the last bin.
+ * @param hist: histogram, whose size is the number of bins.
+ */
+template<typename E, typename W, typename H,
+         EnableIf<E, IsVector> = false, EnableIf<W, IsVector> = false, EnableIf<H, IsVector> = false>
+inline void histogram1d(const E& src, const W& weights, double lb, double ub, H& hist)
+{
+  using value_type = typename E::value_type;
+  using edge_type = std::conditional_t<std::is_floating_point<value_type>::value, value_type, double>;
+  using hist_type = typename H::value_type;
+
+  utils::checkShape(src.shape(), weights.shape(), "Values and weights have different shapes");
+
+  auto bin = detail::histBinFinder<edge_type>(lb, ub, hist.size());
+  std::fill(hist.begin(), hist.end(), hist_type(0));
+  detail::accumulateHistogram(src.size(),
+                              [&src, &bin] (size_t i) { return bin(src(i)); },
+                              [&weights] (size_t i) { return static_cast<hist_type>(weights(i)); },
+                              hist);
+}
+
+/**
+ * @brief Compute the histogram of an array with the given bin edges.
+ *
+ * It follows numpy.histogram: a bin includes its left edge and the last
+ * bin also includes its right edge. NaN and the values outside the edges
+ * are ignored. The bin of a value is found by binary search and the values
+ * are accumulated in parallel by chunks.
+ *
+ * @param src: data array. shape = (n,)
+ * @param edges: monotonically increasing bin edges. shape = (bins + 1,)
+ * @param hist: histogram. shape = (bins,)
+ */
+template<typename E, typename V, typename H,
+         EnableIf<E, IsVector> = false, EnableIf<V, IsVector> = false, EnableIf<H, IsVector> = false>
+inline void histogram1d(const E& src, const V& edges, H& hist)
+{
+  using hist_type = typename H::value_type;
+
+  FOAM_ASSERT_ARGUMENT(hist.size() + 1 == edges.size(), "Number of edges must be number of bins plus one")
+
+  auto bin = detail::histEdgesBinFinder(edges);
+  std::fill(hist.begin(), hist.end(), hist_type(0));
+  detail::accumulateHistogram(src.size(),
+                              [&src, &bin] (size_t i) { return bin(src(i)); },
+                              [] (size_t) { return hist_type(1); },
+                              hist);
+}
+
+/**
+ * @brief Compute the weighted histogram of an array with the given bin
+ * edges.
+ *
+ * @param src: data array. shape = (n,)
+ * @param weights: weights of the values. shape = (n,)
+ * @param edges: monotonically increasing bin edges. shape = (bins + 1,)
+ * @param hist: histogram. shape = (bins,)
+ */
+template<typename E, typename W, typename V, typename H,
+         EnableIf<E, IsVector> = false, EnableIf<W, IsVector> = false,
+         EnableIf<V, IsVector> = false, EnableIf<H, IsVector> = false>
+inline void histogram1d(const E& src, const W& weights, const V& edges, H& hist)
+{
+  using hist_type = typename H::value_type;
+
+  utils::checkShape(src.shape(), weights.shape(), "Values and weights have different shapes");
+  FOAM_ASSERT_ARGUMENT(hist.size() + 1 == edges.size(), "Number of edges must be number of bins plus one")
+
+  auto bin = detail::histEdgesBinFinder(edges);
+  std::fill(hist.begin(), hist.end(), hist_type(0));
+  detail::accumulateHistogram(src.size(),
+                              [&src, &bin] (size_t i) { return bin(src(i)); },
+                              [&weights] (size_t i) { return static_cast<hist_type>(weights(i)); },
+                              hist);
+}
+
+/**
+ * @brief Compute the 2D histogram of two arrays within
+ * [x_lb, x_ub] x [y_lb, y_ub].
+ *
+ * It follows numpy.histogram2d. A pair of values is ignored if either of
+ * them is NaN or outside the range. The values are accumulated in parallel
+ * by chunks.
+ *
+ * @param x: data array of the first dimension. shape = (n,)
+ * @param y: data array of the second dimension. shape = (n,)
+ * @param x_lb: left edge of the first bin of the first dimension.
+ * @param x_ub: right edge of the last bin of the first dimension.
+ * @param y_lb: left edge of the first bin of the second dimension.
+ * @param y_ub: right edge of the last bin of the second dimension.
+ * @param hist: histogram. shape = (number of x bins, number of y bins)
+ */
+template<typename E, typename H, EnableIf<E, IsVector> = false, EnableIf<H, IsImage> = false>
+inline void histogram2d(const E& x, const E& y, double x_lb, double x_ub, double y_lb, double y_ub, H& hist)
+{
+  using hist_type = typename H::value_type;
+
+  utils::checkShape(x.shape(), y.shape(), "x and y have different shapes");
+
+  // numpy.histogram2d always uses edges in double precision
+  auto x_bin = detail::histBinFinder<double>(x_lb, x_ub, hist.shape()[0]);
+  auto y_bin = detail::histBinFinder<double>(y_lb, y_ub, hist.shape()[1]);
+  size_t n_bins = hist.size();
+  size_t n_x_bins = hist.shape()[0];
+  size_t n_y_bins = hist.shape()[1];
+  std::fill(hist.begin(), hist.end(), hist_type(0));
+  detail::accumulateHistogram(x.size(),
+                              [&] (size_t i)
+                              {
+                                size_t bx = x_bin(x(i));
+                                size_t by = y_bin(y(i));
+                                if (bx == n_x_bins || by == n_y_bins) return n_bins;
+                                return bx * n_y_bins + by;
+                              },
+                              [] (size_t) { return hist_type(1); },
+                              hist);
+}
+
+/**
+ * @brief Compute the weighted 2D histogram of two arrays within
+ * [x_lb, x_ub] x [y_lb, y_ub].
+ *
+ * @param x: data array of the first dimension. shape = (n,)
+ * @param y: data array of the second dimension. shape = (n,)
+ * @param weights: weights of the pairs of values. shape = (n,)
+ * @param x_lb: left edge of the first bin of the first dimension.
+ * @param x_ub: right edge of the last bin of the first dimension.
+ * @param y_lb: left edge of the first bin of the second dimension.
+ * @param y_ub: right edge of the last bin of the second dimension.
+ * @param hist: histogram. shape = (number of x bins, number of y bins)
+ */
+template<typename E, typename W, typename H,
+         EnableIf<E, IsVector> = false, EnableIf<W, IsVector> = false, EnableIf<H, IsImage> = false>
+inline void histogram2d(const E& x, const E& y, const W& weights,
+                        double x_lb, double x_ub, double y_lb, double y_ub, H& hist)
+{
+  using hist_type = typename H::value_type;
+
+  utils::checkShape(x.shape(), y.shape(), "x and y have different shapes");
+  utils::checkShape(x.shape(), weights.shape(), "Values and weights have different shapes");
+
+  auto x_bin = detail::histBinFinder<double>(x_lb, x_ub, hist.shape()[0]);
+  auto y_bin = detail::histBinFinder<double>(y_lb, y_ub, hist.shape()[1]);
+  size_t n_bins = hist.size();
+  size_t n_x_bins = hist.shape()[0];
+  size_t n_y_bins = hist.shape()[1];
+  std::fill(hist.begin(), hist.end(), hist_type(0));
+  detail::accumulateHistogram(x.size(),
+                              [&] (size_t i)
+                              {
+                                size_t bx = x_bin(x(i));
+                                size_t by = y_bin(y(i));
+                                if (bx == n_x_bins || by == n_y_bins) return n_bins;
+                                return bx * n_y_bins + by;
+                              },
+                              [&weights] (size_t i) { return static_cast<hist_type>(weights(i)); },
+                              hist);
+}
+
+enum class QuantileMethod
+{
+  LINEAR = 0x01, // numpy.nanquantile(..., method='linear')
+  NEAREST = 0x02, // numpy.nanquantile(..., method='nearest')
+};
+
+namespace detail
+{
+
+/**
+ * Select the q-th quantile of the first n values of a NaN-free buffer by
+ * introselect. The buffer is partially reordered.
+ */
+template<typename T>
+inline double quantileSelect(std::vector<T>& buf, size_t n, double q, QuantileMethod method)
+{
+  if (n == 0) return std::numeric_limits<double>::quiet_NaN();
+
+  auto first = buf.begin();
+  auto last = buf.begin() + n;
+  double v_idx = q * static_cast<double>(n - 1);
+  if (method == QuantileMethod::NEAREST)
+  {
+    // round half to even as numpy.around
+    auto it = first + static_cast<long>(std::nearbyint(v_idx));
+    std::nth_element(first, it, last);
+    return static_cast<double>(*it);
+  }
+
+  auto lo = static_cast<size_t>(std::floor(v_idx));
+  auto it_lo = first + lo;
+  std::nth_element(first, it_lo, last);
+  double a = static_cast<double>(*it_lo);
+  double gamma = v_idx - static_cast<double>(lo);
+  if (gamma == 0. || lo + 1 == n) return a;
+
+  // the next value is the minimum of the upper partition
+  double b = static_cast<double>(*std::min_element(it_lo + 1, last));
+  // the same interpolation as numpy
+  return gamma >= 0.5 ? b - (b - a) * (1. - gamma) : a + (b - a) * gamma;
+}
+
+/**
+ * Sort and de-duplicate the reduced axes, which can be negative.
+ */
+inline std::vector<size_t> normalizeAxes(const std::vector<int>& axis, size_t dim)
+{
+  std::vector<size_t> ret;
+  for (auto ax : axis)
+  {
+    auto d = static_cast<int>(dim);
+    FOAM_ASSERT_ARGUMENT(ax >= -d && ax < d, "Axis is out of bounds")
+    ret.push_back(static_cast<size_t>(ax < 0 ? ax + d : ax));
+  }
+  std::sort(ret.begin(), ret.end());
+  FOAM_ASSERT_ARGUMENT(std::adjacent_find(ret.begin(), ret.end()) == ret.end(), "Repeated axis")
+  return ret;
+}
+
+/**
+ * Return the offset of the i-th element (in row-major order) of an array
+ * with the given shape and strides, which start from strides[s1].
+ */
+template<typename S, typename ST>
+inline std::ptrdiff_t unravelOffset(size_t i, const S& shape, const ST& strides, size_t s1 = 0)
+{
+  std::ptrdiff_t offset = 0;
+  for (size_t d = shape.size(); d-- > 0;)
+  {
+    offset += static_cast<std::ptrdiff_t>(i % shape[d]) * strides[d + s1];
+    i /= shape[d];
+  }
+  return offset;
+}
+
+/**
+ * Call f with the offset of each of the elements [first, last) (in
+ * row-major order) of an array with the given shape and strides.
+ */
+template<typename S, typename ST, typename F>
+inline void forEachOffset(const S& shape, const ST& strides, size_t first, size_t last, F&& f)
+{
+  if (first >= last) return;
+
+  size_t dim = shape.size();
+  std::vector<size_t> idx(dim);
+  std::ptrdiff_t offset = 0;
+  size_t rest = first;
+  for (size_t d = dim; d-- > 0;)
+  {
+    idx[d] = rest % shape[d];
+    rest /= shape[d];
+    offset += static_cast<std::ptrdiff_t>(idx[d]) * strides[d];
+  }
+
+  for (size_t i = first; i < last; ++i)
+  {
+    f(offset);
+    for (size_t d = dim; d-- > 0;)
+    {
+      offset += strides[d];
+      if (++idx[d] < shape[d]) break;
+      offset -= static_cast<std::ptrdiff_t>(shape[d]) * strides[d];
+      idx[d] = 0;
+    }
+  }
+}
+
+/**
+ * Split the dimensions of an array into the kept and the reduced ones for
+ * a reduction along the given axes.
+ */
+class AxesReduction
+{
+  std::vector<size_t> kept_shape_;
+  std::vector<std::ptrdiff_t> kept_strides_;
+  std::vector<size_t> reduced_shape_;
+  std::vector<std::ptrdiff_t> reduced_strides_;
+  size_t size_ = 1;
+  size_t reduced_size_ = 1;
+
+public:
+
+  template<typename E>
+  AxesReduction(const E& src, const std::vector<int>& axis)
+  {
+    auto reduced = normalizeAxes(axis, src.dimension());
+    for (size_t d = 0; d < src.dimension(); ++d)
+    {
+      auto n = static_cast<size_t>(src.shape()[d]);
+      auto stride = static_cast<std::ptrdiff_t>(src.strides()[d]);
+      if (std::binary_search(reduced.begin(), reduced.end(), d))
+      {
+        reduced_shape_.push_back(n);
+        reduced_strides_.push_back(stride);
+        reduced_size_ *= n;
+      } else
+      {
+        kept_shape_.push_back(n);
+        kept_strides_.push_back(stride);
+        size_ *= n;
+      }
+    }
+  }
+
+  /**
+   * Return the shape of the result.
+   */
+  const std::vector<size_t>& shape() const { return kept_shape_; }
+
+  /**
+   * Return the number of elements of the result.
+   */
+  size_t size() const { return size_; }
+
+  /**
+   * Return the number of reduced elements for each element of the result.
+   */
+  size_t reducedSize() const { return reduced_size_; }
+
+  /**
+   * Return the offset of the first reduced element for the i-th element
+   * of the result.
+   */
+  std::ptrdiff_t offset(size_t i) const { return unravelOffset(i, kept_shape_, kept_strides_); }
+
+  /**
+   * Call f with the offset (with respect to the first one) of each reduced
+   * element of the reduced elements [first, last).
+   */
+  template<typename F>
+  void forEachReduced(size_t first, size_t last, F&& f) const
+  {
+    forEachOffset(reduced_shape_, reduced_strides_, first, last, std::forward<F>(f));
+  }
+};
+
+} // detail
+
+/**
+ * @brief Compute the q-th quantile of the non-NaN values of an array.
+ *
+ * It is equivalent to numpy.nanquantile but selects the quantile by
+ * introselect instead of sorting.
+ *
+ * @param src: data array.
+ * @param q: quantile, which must be within [0, 1].
+ * @param method: method of estimating the quantile.
+ *
+ * @return: the quantile, which is NaN if there is no value.
+ */
+template<typename E>
+inline typename E::value_type nanquantile(const E& src, double q, QuantileMethod method = QuantileMethod::LINEAR)
+{
+  using value_type = typename E::value_type;
+  static_assert(std::is_floating_point<value_type>::value);
+  FOAM_ASSERT_ARGUMENT(q >= 0. && q <= 1., "Quantile must be within [0, 1]")
+
+  std::vector<value_type> buf;
+  buf.reserve(src.size());
+  for (auto v : src)
+  {
+    if (!std::isnan(v)) buf.push_back(v);
+  }
+  return static_cast<value_type>(detail::quantileSelect(buf, buf.size(), q, method));
+}
+
+/**
+ * @brief Compute the q-th quantile of the non-NaN values of an array along
+ * the given axes into a pre-allocated array.
+ *
+ * The quantiles are computed in parallel over the elements of the output.
+ *
+ * @param src: data array.
+ * @param q: quantile, which must be within [0, 1].
+ * @param axis: axes along which the quantile is computed.
+ * @param out: output array. It must have the shape of src with the axes
+ *             removed.
+ * @param method: method of estimating the quantile.
+ */
+template<typename E, typename O>
+inline void nanquantile(const E& src, double q, const std::vector<int>& axis, O& out,
+                        QuantileMethod method = QuantileMethod::LINEAR)
+{
+  using value_type = typename E::value_type;
+  static_assert(std::is_floating_point<value_type>::value);
+  FOAM_ASSERT_ARGUMENT(q >= 0. && q <= 1., "Quantile must be within [0, 1]")
+
+  detail::AxesReduction reduction(src, axis);
+  FOAM_ASSERT_ARGUMENT(out.dimension() == reduction.shape().size(),
+                       "Output and the reduced data have different dimensions")
+  utils::checkShape(out.shape(), reduction.shape(), "Output and the reduced data have different shapes");
+
+  const value_type* data = src.data();
+
+#if defined(FOAMALGO_USE_TBB)
+  tbb::parallel_for(tbb::blocked_range<size_t>(0, reduction.size()),
+    [&, data] (const tbb::blocked_range<size_t> &block)
+    {
+      std::vector<value_type> buf(reduction.reducedSize());
+      for(size_t i=block.begin(); i != block.end(); ++i)
+      {
+#else
+      std::vector<value_type> buf(reduction.reducedSize());
+      for (size_t i = 0; i < reduction.size(); ++i)
+      {
+#endif
+        auto first = data + reduction.offset(i);
+        size_t n = 0;
+        reduction.forEachReduced(0, reduction.reducedSize(), [first, &buf, &n] (std::ptrdiff_t o)
+        {
+          auto v = first[o];
+          if (!std::isnan(v)) buf[n++] = v;
+        });
+        auto out_offset = detail::unravelOffset(i, out.shape(), out.strides());
+        out.data()[out_offset] = static_cast<typename O::value_type>(detail::quantileSelect(buf, n, q, method));
+      }
+#if defined(FOAMALGO_USE_TBB)
+    }
+  );
+#endif
+}
+
+/**
+ * @brief Compute the median of the non-NaN values of an array.
+ *
+ * @param src: data array.
+ *
+ * @return: the median, which is NaN if there is no value.
+ */
+template<typename E>
+inline typename E::value_type nanmedian(const E& src)
+{
+  return nanquantile(src, 0.5);
+}
+
+/**
+ * @brief Compute the median of the non-NaN values of an array along the
+ * given axes into a pre-allocated array.
+ *
+ * @param src: data array.
+ * @param axis: axes along which the median is computed.
+ * @param out: output array. It must have the shape of src with the axes
+ *             removed.
+ */
+template<typename E, typename O>
+inline void nanmedian(const E& src, const std::vector<int>& axis, O& out)
+{
+  nanquantile(src, 0.5, axis, out);
+}
+
+namespace detail
+{
+
+/**
+ * Statistics of the non-NaN values which are accumulated in a single pass
+ * and can be merged.
+ */
+struct NanStats
+{
+  size_t count = 0;
+  double sum = 0.;
+  double min = std::numeric_limits<double>::infinity();
+  double max = -std::numeric_limits<double>::infinity();
+  double mean = 0.;
+  double m2 = 0.; // sum of squares of differences from the mean
+
+  template<typename T>
+  void push(T v)
+  {
+    if (std::isnan(v)) return;
+
+    auto x = static_cast<double>(v);
+    ++count;
+    sum += x;
+    if (x < min) min = x;
+    if (x > max) max = x;
+    // Welford's algorithm
+    double delta = x - mean;
+    mean += delta / static_cast<double>(count);
+    m2 += delta * (x - mean);
+  }
+
+  void merge(const NanStats& other)
+  {
+    if (other.count == 0) return;
+    if (count == 0)
+    {
+      *this = other;
+      return;
+    }
+
+    // Chan's algorithm
+    double n = static_cast<double>(count + other.count);
+    double delta = other.mean - mean;
+    mean += delta * static_cast<double>(other.count) / n;
+    m2 += other.m2 + delta * delta * static_cast<double>(count) * static_cast<double>(other.count) / n;
+    count += other.count;
+    sum += other.sum;
+    if (other.min < min) min = other.min;
+    if (other.max > max) max = other.max;
+  }
+
+  /**
+   * Return (count, sum, min, max, mean, variance).
+   */
+  std::array<double, 6> result() const
+  {
+    if (count == 0)
+    {
+      constexpr double nan = std::numeric_limits<double>::quiet_NaN();
+      return {0., 0., nan, nan, nan, nan};
+    }
+    // the mean is computed from the sum to be consistent with inf
+    return {static_cast<double>(count), sum, min, max, sum / static_cast<double>(count),
+            m2 / static_cast<double>(count)};
+  }
+};
+
+} // detail
+
+/**
+ * @brief Compute the count, sum, minimum, maximum, mean and variance of the
+ * non-NaN values of an array in a single pass.
+ *
+ * The array is accumulated in parallel by chunks, whose statistics are
+ * then merged.
+ *
+ * @param src: data array.
+ *
+ * @return: (count, sum, min, max, mean, variance). The last four are NaN
+ *          if there is no value.
+ */
+template<typename E>
+inline std::array<double, 6> nanDescribe(const E& src)
+{
+  static_assert(std::is_floating_point<typename E::value_type>::value);
+
+  auto& shape = src.shape();
+  auto& strides = src.strides();
+  auto data = src.data();
+  detail::NanStats stats;
+
+#if defined(FOAMALGO_USE_TBB)
+  std::mutex mtx;
+  tbb::parallel_for(tbb::blocked_range<size_t>(0, src.size(), 1 << 16),
+    [&] (const tbb::blocked_range<size_t> &block)
+    {
+      detail::NanStats local;
+      detail::forEachOffset(shape, strides, block.begin(), block.end(),
+                            [data, &local] (std::ptrdiff_t o) { local.push(data[o]); });
+
+      std::scoped_lock lock(mtx);
+      stats.merge(local);
+    }
+  );
+#else
+  detail::forEachOffset(shape, strides, 0, src.size(), [data, &stats] (std::ptrdiff_t o) { stats.push(data[o]); });
+#endif
+
+  return stats.result();
+}
+
+/**
+ * @brief Compute the count, sum, minimum, maximum, mean and variance of the
+ * non-NaN values of an array along the given axes in a single pass.
+ *
+ * The statistics are computed in parallel over the elements of the result.
+ *
+ * @param src: data array.
+ * @param axis: axes along which the statistics are computed.
+ * @param out: output array. out[0], ..., out[5] are the count, sum, min,
+ *             max, mean and variance respectively, which have the shape
+ *             of src with the axes removed.
+ */
+template<typename E, typename O>
+inline void nanDescribe(const E& src, const std::vector<int>& axis, O& out)
+{
+  static_assert(std::is_floating_point<typename E::value_type>::value);
+  using out_type = typename O::value_type;
+
+  detail::AxesReduction reduction(src, axis);
+  FOAM_ASSERT_ARGUMENT(out.dimension() == reduction.shape().size() + 1,
+                       "Output and the reduced data have different dimensions")
+  FOAM_ASSERT_ARGUMENT(out.shape()[0] == 6, "Output must have 6 rows")
+  utils::checkShape(out.shape(), reduction.shape(), "Output and the reduced data have different shapes", 1, 0);
+
+  auto data = src.data();
+  auto out_data = out.data();
+  auto row_stride = static_cast<std::ptrdiff_t>(out.strides()[0]);
+
+#if defined(FOAMALGO_USE_TBB)
+  tbb::parallel_for(tbb::blocked_range<size_t>(0, reduction.size()),
+    [&] (const tbb::blocked_range<size_t> &block)
+    {
+      for(size_t i=block.begin(); i != block.end(); ++i)
+      {
+#else
+      for (size_t i = 0; i < reduction.size(); ++i)
+      {
+#endif
+        auto first = data + reduction.offset(i);
+        detail::NanStats stats;
+        reduction.forEachReduced(0, reduction.reducedSize(), [first, &stats] (std::ptrdiff_t o)
+        {
+          stats.push(first[o]);
+        });
+
+        auto ret = stats.result();
+        auto out_offset = detail::unravelOffset(i, reduction.shape(), out.strides(), 1);
+        for (size_t k = 0; k < ret.size(); ++k)
+        {
+          out_data[out_offset + static_cast<std::ptrdiff_t>(k) * row_stride] = static_cast<out_type>(ret[k]);
+        }
+      }
+#if defined(FOAMALGO_USE_TBB)
+    }
+  );
+#endif
+}
+
+enum class IntegerReduction
+{
+  SUM = 0x01,
+  MEAN = 0x02,
+  VAR = 0x03,
+  STD = 0x04,
+  MIN = 0x05,
+  MAX = 0x06,
+};
+
+namespace detail
+{
+
+/**
+ * Statistics of integers which are accumulated in a single pass and can
+ * be merged. Only the statistics required by the reduction are accumulated.
+ *
+ * The sum is accumulated in 64-bit integers as numpy.sum.
+ */
+template<typename T, IntegerReduction op>
+struct IntegerStats
+{
+  static_assert(std::is_integral<T>::value);
+
+  using sum_type = std::conditional_t<std::is_signed<T>::value, long long, unsigned long long>;
+
+  size_t count = 0;
+  sum_type sum = 0;
+  T min = std::numeric_limits<T>::max();
+  T max = std::numeric_limits<T>::lowest();
+  double mean = 0.;
+  double m2 = 0.; // sum of squares of differences from the mean
+
+  void push(T v)
+  {
+    if constexpr (op == IntegerReduction::SUM || op == IntegerReduction::MEAN)
+    {
+      ++count;
+      sum += static_cast<sum_type>(v);
+    } else if constexpr (op == IntegerReduction::VAR || op == IntegerReduction::STD)
+    {
+      // Welford's algorithm
+      auto x = static_cast<double>(v);
+      ++count;
+      double delta = x - mean;
+      mean += delta / static_cast<double>(count);
+      m2 += delta * (x - mean);
+    } else if constexpr (op == IntegerReduction::MIN)
+    {
+      if (v < min) min = v;
+    } else
+    {
+      if (v > max) max = v;
+    }
+  }
+
+  void merge(const IntegerStats& other)
+  {
+    if constexpr (op == IntegerReduction::VAR || op == IntegerReduction::STD)
+    {
+      if (other.count == 0) return;
+      if (count == 0)
+      {
+        *this = other;
+        return;
+      }
+
+      // Chan's algorithm
+      double n = static_cast<double>(count + other.count);
+      double delta = other.mean - mean;
+      mean += delta * static_cast<double>(other.count) / n;
+      m2 += other.m2 + delta * delta * static_cast<double>(count) * static_cast<double>(other.count) / n;
+    }
+    count += other.count;
+    sum += other.sum;
+    if (other.min < min) min = other.min;
+    if (other.max > max) max = other.max;
+  }
+
+  /**
+   * Return the result of the reduction, whose type follows numpy.
+   */
+  auto result() const
+  {
+    if constexpr (op == IntegerReduction::SUM) return sum;
+    else if constexpr (op == IntegerReduction::MIN) return min;
+    else if constexpr (op == IntegerReduction::MAX) return max;
+    else
+    {
+      if (count == 0) return std::numeric_limits<double>::quiet_NaN();
+      if constexpr (op == IntegerReduction::MEAN) return static_cast<double>(sum) / static_cast<double>(count);
+      else if constexpr (op == IntegerReduction::VAR) return m2 / static_cast<double>(count);
+      else return std::sqrt(m2 / static_cast<double>(count));
+    }
+  }
+};
+
+} // detail
+
+/**
+ * @brief Reduce an integer array.
+ *
+ * It is the counterpart of the NaN-reducers, e.g. xt::nansum, for integer
+ * arrays, which are free of NaN. The array is reduced in parallel by chunks,
+ * whose statistics are then merged. The sum is computed with 64-bit integers
+ * and the mean, variance and standard deviation are computed in double
+ * precision.
+ *
+ * @tparam op: reduction.
+ *
+ * @param src: data array.
+ *
+ * @return: the result, which is NaN for the mean, variance and standard
+ *          deviation of an empty array.
+ */
+template<IntegerReduction op, typename E>
+inline auto integerReduce(const E& src)
+{
+  FOAM_ASSERT_ARGUMENT(src.size() > 0 || (op != IntegerReduction::MIN && op != IntegerReduction::MAX),
+                       "Zero-size array has no minimum or maximum")
+
+  auto& shape = src.shape();
+  auto& strides = src.strides();
+  auto data = src.data();
+  detail::IntegerStats<typename E::value_type, op> stats;
+
+#if defined(FOAMALGO_USE_TBB)
+  std::mutex mtx;
+  tbb::parallel_for(tbb::blocked_range<size_t>(0, src.size(), 1 << 16),
+    [&] (const tbb::blocked_range<size_t> &block)
+    {
+      detail::IntegerStats<typename E::value_type, op> local;
+      detail::forEachOffset(shape, strides, block.begin(), block.end(),
+                            [data, &local] (std::ptrdiff_t o) { local.push(data[o]); });
+
+      std::scoped_lock lock(mtx);
+      stats.merge(local);
+    }
+  );
+#else
+  detail::forEachOffset(shape, strides, 0, src.size(), [data, &stats] (std::ptrdiff_t o) { stats.push(data[o]); });
+#endif
+
+  return stats.result();
+}
+
+/**
+ * @brief Reduce an integer array along the given axes.
+ *
+ * The reduction is computed in parallel over the elements of the result.
+ *
+ * @tparam op: reduction.
+ *
+ * @param src: data array.
+ * @param axis: axes along which the array is reduced.
+ * @param out: output array, which has the shape of src with the axes
+ *             removed.
+ */
+template<IntegerReduction op, typename E, typename O>
+inline void integerReduce(const E& src, const std::vector<int>& axis, O& out)
+{
+  using out_type = typename O::value_type;
+
+  detail::AxesReduction reduction(src, axis);
+  FOAM_ASSERT_ARGUMENT(out.dimension() == reduction.shape().size(),
+                       "Output and the reduced data have different dimensions")
+  utils::checkShape(out.shape(), reduction.shape(), "Output and the reduced data have different shapes");
+  FOAM_ASSERT_ARGUMENT(reduction.reducedSize() > 0 || reduction.size() == 0 ||
+                       (op != IntegerReduction::MIN && op != IntegerReduction::MAX),
+                       "Zero-size array has no minimum or maximum")
+
+  auto data = src.data();
+  auto out_data = out.data();
+
+#if defined(FOAMALGO_USE_TBB)
+  tbb::parallel_for(tbb::blocked_range<size_t>(0, reduction.size()),
+    [&] (const tbb::blocked_range<size_t> &block)
+    {
+      for(size_t i=block.begin(); i != block.end(); ++i)
+      {
+#else
+      for (size_t i = 0; i < reduction.size(); ++i)
+      {
+#endif
+        auto first = data + reduction.offset(i);
+        detail::IntegerStats<typename E::value_type, op> stats;
+        reduction.forEachReduced(0, reduction.reducedSize(), [first, &stats] (std::ptrdiff_t o)
+        {
+          stats.push(first[o]);
+        });
+        out_data[detail::unravelOffset(i, reduction.shape(), out.strides())] =
+          static_cast<out_type>(stats.result());
+      }
+#if defined(FOAMALGO_USE_TBB)
+    }
+  );
+#endif
+}
+
+namespace detail
+{
+
+/**
+ * Accumulate the statistics of the values of y in equal-width bins of x
+ * in parallel by chunks.
+ */
+template<typename E1, typename E2>
+inline std::vector<NanStats> binnedStats(const E1& x, const E2& y, double lb, double ub, size_t n_bins)
+{
+  utils::checkShape(x.shape(), y.shape(), "x and y have different shapes");
+
+  // the same as scipy.stats.binned_statistic
+  auto bin = histBinFinder<double>(lb, ub, n_bins);
+  std::vector<NanStats> stats(n_bins);
+
+#if defined(FOAMALGO_USE_TBB)
+  std::mutex mtx;
+  tbb::parallel_for(tbb::blocked_range<size_t>(0, x.size(), 1 << 16),
+    [&x, &y, &bin, &stats, &mtx, n_bins] (const tbb::blocked_range<size_t> &block)
+    {
+      std::vector<NanStats> local(n_bins);
+      for(size_t i=block.begin(); i != block.end(); ++i)
+      {
+#else
+      std::vector<NanStats>& local = stats;
+      for (size_t i = 0; i < x.size(); ++i)
+      {
+#endif
+        size_t b = bin(x(i));
+        if (b < n_bins) local[b].push(y(i));
+      }
+
+#if defined(FOAMALGO_USE_TBB)
+      std::scoped_lock lock(mtx);
+      for (size_t b = 0; b < n_bins; ++b) stats[b].merge(local[b]);
+    }
+  );
+#endif
+
+  return stats;
+}
+
+} // detail
+
+/**
+ * @brief Compute the mean and count of the values of y in equal-width bins
+ * of x within [lb, ub] in a single pass.
+ *
+ * The bins follow scipy.stats.binned_statistic: a bin includes its left
+ * edge and the last bin also includes its right edge. A pair of values is
+ * ignored if either of them is NaN or x is outside [lb, ub].
+ *
+ * @param x: values to be binned. shape = (n,)
+ * @param y: values on which the statistics are computed. shape = (n,)
+ * @param lb: left edge of the first bin.
+ * @param ub: right edge of the last bin.
+ * @param mean: mean of y in each bin, which is NaN if the bin is empty.
+ *              shape = (bins,)
+ * @param count: number of values in each bin. shape = (bins,)
+ */
+template<typename E1, typename E2, typename M, typename C,
+         EnableIf<E1, IsVector> = false, EnableIf<E2, IsVector> = false,
+         EnableIf<M, IsVector> = false, EnableIf<C, IsVector> = false>
+inline void binnedMeanCount(const E1& x, const E2& y, double lb, double ub, M& mean, C& count)
+{
+  utils::checkShape(mean.shape(), count.shape(), "Mean and count have different shapes");
+
+  auto stats = detail::binnedStats(x, y, lb, ub, mean.size());
+  for (size_t b = 0; b < stats.size(); ++b)
+  {
+    auto ret = stats[b].result();
+    count(b) = static_cast<typename C::value_type>(stats[b].count);
+    mean(b) = static_cast<typename M::value_type>(ret[4]);
+  }
+}
+
+/**
+ * @brief Compute the mean, count and variance of the values of y in
+ * equal-width bins of x within [lb, ub] in a single pass.
+ *
+ * @param x: values to be binned. shape = (n,)
+ * @param y: values on which the statistics are computed. shape = (n,)
+ * @param lb: left edge of the first bin.
+ * @param ub: right edge of the last bin.
+ * @param mean: mean of y in each bin, which is NaN if the bin is empty.
+ *              shape = (bins,)
+ * @param count: number of values in each bin. shape = (bins,)
+ * @param var: variance of y in each bin, which is NaN if the bin is empty.
+ *             shape = (bins,)
+ */
+template<typename E1, typename E2, typename M, typename C, typename V,
+         EnableIf<E1, IsVector> = false, EnableIf<E2, IsVector> = false,
+         EnableIf<M, IsVector> = false, EnableIf<C, IsVector> = false, EnableIf<V, IsVector> = false>
+inline void binnedMeanCount(const E1& x, const E2& y, double lb, double ub, M& mean, C& count, V& var)
+{
+  utils::checkShape(mean.shape(), count.shape(), "Mean and count have different shapes");
+  utils::checkShape(mean.shape(), var.shape(), "Mean and variance have different shapes");
+
+  auto stats = detail::binnedStats(x, y, lb, ub, mean.size());
+  for (size_t b = 0; b < stats.size(); ++b)
+  {
+    auto ret = stats[b].result();
+    count(b) = static_cast<typename C::value_type>(stats[b].count);
+    mean(b) = static_cast<typename M::value_type>(ret[4]);
+    var(b) = static_cast<typename V::value_type>(ret[5]);
+  }
+}
+
+/**
+ * @class StreamingHistogram
+ * @brief Accumulate a histogram with fixed edges over a stream of data.
+ *
+ * The bins are equal-width in either the linear or the logarithmic scale.
+ * Following numpy.histogram, a bin includes its left edge and the last bin
+ * also includes its right edge. NaN and the values outside the edges are
+ * ignored.
+ */
+template<typename T = double>
+class StreamingHistogram
+{
+  static_assert(std::is_floating_point<T>::value);
+
+public:
+
+  using value_type = T;
+  using vector_type = xt::xtensor<T, 1>;
+
+  // number of values filled into the local bins of a thread at a time
+  static constexpr size_t chunk_size = 1 << 16;
+
+private:
+
+  size_t n_bins_;
+  T lb_;
+  T ub_;
+  bool log_;
+  T scale_; // number of bins per unit of the value (or its decimal logarithm)
+
+  vector_type edges_; // shape = (bins + 1,)
+  vector_type counts_; // shape = (bins,)
+
+  template<typename V>
+  size_t binIndex(V v) const;
+
+  template<typename E, typename F>
+  void fillImp(const E& src, F&& weight);
+
+public:
+
+  /**
+   * Constructor.
+   *
+   * @param n_bins: number of bins.
+   * @param lb: left edge of the first bin.
+   * @param ub: right edge of the last bin.
+   * @param log: true for logarithmically spaced edges, which requires
+   *             positive lb.
+   */
+  StreamingHistogram(size_t n_bins, T lb, T ub, bool log=false);
+
+  ~StreamingHistogram() = default;
+
+  /**
+   * Fill values into the histogram.
+   *
+   * @param src: values. shape = (n,)
+   */
+  template<typename E, EnableIf<E, IsVector> = false>
+  void fill(const E& src);
+
+  /**
+   * Fill weighted values into the histogram.
+   *
+   * @param src: values. shape = (n,)
+   * @param weights: weights of the values. shape = (n,)
+   */
+  template<typename E, typename W, EnableIf<E, IsVector> = false, EnableIf<W, IsVector> = false>
+  void fill(const E& src, const W& weights);
+
+  /**
+   * Merge the counts accumulated by another histogram.
+   *
+   * @param other: histogram which has the same edges.
+   */
+  void merge(const StreamingHistogram& other);
+
+  /**
+   * Reset the counts.
+   */
+  void reset() { counts_.fill(0); }
+
+  /**
+   * Return the (weighted) counts. shape = (bins,)
+   */
+  const vector_type& counts() const { return counts_; }
+
+  /**
+   * Return the edges. shape = (bins + 1,)
+   */
+  const vector_type& edges() const { return edges_; }
+
+  /**
+   * Return the centers of the bins, which are geometric means of the
+   * edges for logarithmically spaced bins. shape = (bins,)
+   */
+  vector_type centers() const;
+};
+
+template<typename T>
+StreamingHistogram<T>::StreamingHistogram(size_t n_bins, T lb, T ub, bool log)
+  : n_bins_(n_bins), lb_(lb), ub_(ub), log_(log)
+{
+  FOAM_ASSERT_ARGUMENT(n_bins > 0, "Number of bins must be positive")
+  FOAM_ASSERT_ARGUMENT(std::isfinite(lb) && std::isfinite(ub) && lb < ub,
+                       "Edges must be finite and lower bound must be smaller than upper bound")
+  FOAM_ASSERT_ARGUMENT(!log || lb > 0, "Lower bound must be positive for logarithmically spaced bins")
+
+  edges_ = vector_type::from_shape({n_bins_ + 1});
+  if (log_)
+  {
+    // the same as numpy.logspace
+    scale_ = static_cast<T>(n_bins_) / (std::log10(ub_) - std::log10(lb_));
+    for (size_t i = 0; i < n_bins_; ++i)
+    {
+      edges_(i) = std::pow(T(10), std::log10(lb_) + static_cast<T>(i) / scale_);
+    }
+  } else
+  {
+    scale_ = static_cast<T>(n_bins_) / (ub_ - lb_);
+    for (size_t i = 0; i < n_bins_; ++i) edges_(i) = lb_ + static_cast<T>(i) / scale_;
+  }
+  edges_(0) = lb_;
+  edges_(n_bins_) = ub_;
+
+  counts_ = xt::zeros<T>({n_bins_});
+}
+
+template<typename T>
+template<typename V>
+size_t StreamingHistogram<T>::binIndex(V v) const
+{
+  auto x = static_cast<T>(v);
+  // comparison with NaN is always false
+  if (!(x >= lb_ && x <= ub_)) return n_bins_;
+
+  auto n = static_cast<long>(n_bins_);
+  auto idx = static_cast<long>((log_ ? std::log10(x) - std::log10(lb_) : x - lb_) * scale_);
+  if (idx >= n) idx = n - 1;
+  if (idx < 0) idx = 0;
+
+  // correct the round-off error with the edges
+  if (x < edges_(idx) && idx > 0) --idx;
+  else if (idx != n - 1 && x >= edges_(idx + 1)) ++idx;
+  return static_cast<size_t>(idx);
+}
+
+template<typename T>
+template<typename E, typename F>
+void StreamingHistogram<T>::fillImp(const E& src, F&& weight)
+{
+  detail::accumulateHistogram(src.size(),
+                              [&src, this] (size_t i) { return binIndex(src(i)); },
+                              std::forward<F>(weight),
+                              counts_,
+                              chunk_size);
+}
+
+template<typename T>
+template<typename E, EnableIf<E, IsVector>>
+void StreamingHistogram<T>::fill(const E& src)
+{
+  fillImp(src, [] (size_t) { return T(1); });
+}
+
+template<typename T>
+template<typename E, typename W, EnableIf<E, IsVector>, EnableIf<W, IsVector>>
+void StreamingHistogram<T>::fill(const E& src, const W& weights)
+{
+  utils::checkShape(src.shape(), weights.shape(), "Values and weights have different shapes");
+
+  fillImp(src, [&weights] (size_t i) { return static_cast<T>(weights(i)); });
+}
+
+template<typename T>
+void StreamingHistogram<T>::merge(const StreamingHistogram& other)
+{
+  FOAM_ASSERT_ARGUMENT(n_bins_ == other.n_bins_ && lb_ == other.lb_ && ub_ == other.ub_ && log_ == other.log_,
+                       "Histograms have different edges")
+
+  for (size_t i = 0; i < n_bins_; ++i) counts_(i) += other.counts_(i);
+}
+
+template<typename T>
+typename StreamingHistogram<T>::vector_type StreamingHistogram<T>::centers() const
+{
+  auto ret = vector_type::from_shape({n_bins_});
+  for (size_t i = 0; i < n_bins_; ++i)
+  {
+    ret(i) = log_ ? std::sqrt(edges_(i) * edges_(i + 1)) : T(0.5) * (edges_(i) + edges_(i + 1));
+  }
+  return ret;
+}
+
+/**
+ * @class QuantileSketch
+ * @brief Estimate the quantiles of a stream of data with bounded memory.
+ *
+ * It implements the KLL sketch (Karnin, Lang and Liberty, 2016). The values
+ * are retained in a hierarchy of compactors, where a value in the h-th
+ * compactor represents 2^h values of the stream. A full compactor is sorted
+ * and every other value, starting from a random one, is promoted to the next
+ * compactor. The memory is O(k log(n / k)) and the rank error of a quantile
+ * is O(n / k), e.g. below 2% of the number of values for k = 200 with high
+ * probability. Sketches, e.g. filled by different workers, can be merged.
+ * NaN is ignored.
+ */
+template<typename T = double>
+class QuantileSketch
+{
+  static_assert(std::is_floating_point<T>::value);
+
+public:
+
+  using value_type = T;
+
+  // number of values filled into the local sketch of a thread at a time
+  static constexpr size_t chunk_size = 1 << 16;
+
+private:
+
+  size_t k_;
+  size_t count_ = 0; // number of values in the stream
+  size_t size_ = 0; // number of retained values
+  size_t max_size_ = 0; // total capacity of the compactors
+  T min_;
+  T max_;
+
+  std::vector<std::vector<T>> compactors_;
+  std::vector<size_t> capacities_;
+  std::mt19937 rng_;
+
+  size_t capacity(size_t h) const;
+
+  void grow();
+
+  void compress();
+
+  template<typename V>
+  void push(V v);
+
+public:
+
+  /**
+   * Constructor.
+   *
+   * @param k: parameter which controls the accuracy and the memory of the
+   *           sketch. The capacity of the top compactor is k.
+   * @param seed: seed of the random offsets of compaction.
+   */
+  explicit QuantileSketch(size_t k = 200, unsigned int seed = std::random_device{}());
+
+  ~QuantileSketch() = default;
+
+  /**
+   * Add values to the sketch.
+   *
+   * Large arrays are added in parallel by chunks, whose local sketches are
+   * then merged.
+   *
+   * @param src: values. shape = (n,)
+   */
+  template<typename E, EnableIf<E, IsVector> = false>
+  void update(const E& src);
+
+  /**
+   * Merge the values summarized by another sketch.
+   */
+  void merge(const QuantileSketch& other);
+
+  /**
+   * Remove all the values.
+   */
+  void reset();
+
+  /**
+   * Return the estimated q-th quantile.
+   *
+   * It returns the retained value whose rank is the nearest to q (n - 1),
+   * where n is the number of values, similar to
+   * numpy.nanquantile(..., method='nearest'). The result is exact if the
+   * sketch has not been compacted.
+   *
+   * @param q: quantile, which must be within [0, 1].
+   *
+   * @return: the quantile, which is NaN if there is no value.
+   */
+  T quantile(double q) const;
+
+  /**
+   * Return the estimated quantiles.
+   *
+   * The retained values are sorted once and all the quantiles are found
+   * in one sweep. Each of them is the same as the one returned by quantile.
+   *
+   * @param qs: quantiles, each of which must be within [0, 1].
+   *
+   * @return: the quantiles in the same order as qs.
+   */
+  std::vector<T> quantiles(const std::vector<double>& qs) const;
+
+  /**
+   * Return the number of values added to the sketch.
+   */
+  size_t count() const { return count_; }
+
+  /**
+   * Return the number of values retained by the sketch.
+   */
+  size_t size() const { return size_; }
+
+  /**
+   * Return the parameter k.
+   */
+  size_t k() const { return k_; }
+
+  /**
+   * Return the minimum value, which is NaN if there is no value.
+   */
+  T min() const { return count_ > 0 ? min_ : std::numeric_limits<T>::quiet_NaN(); }
+
+  /**
+   * Return the maximum value, which is NaN if there is no value.
+   */
+  T max() const { return count_ > 0 ? max_ : std::numeric_limits<T>::quiet_NaN(); }
+};
+
+template<typename T>
+QuantileSketch<T>::QuantileSketch(size_t k, unsigned int seed)
+  : k_(k), min_(std::numeric_limits<T>::infinity()), max_(-std::numeric_limits<T>::infinity()), rng_(seed)
+{
+  FOAM_ASSERT_ARGUMENT(k >= 8, "k must not be smaller than 8")
+
+  grow();
+}
+
+template<typename T>
+size_t QuantileSketch<T>::capacity(size_t h) const
+{
+  // the capacity decreases geometrically with the depth of the compactor
+  auto depth = static_cast<double>(compactors_.size() - h - 1);
+  return std::max(size_t(8), static_cast<size_t>(std::ceil(std::pow(2. / 3., depth) * static_cast<double>(k_))));
+}
+
+template<typename T>
+void QuantileSketch<T>::grow()
+{
+  compactors_.emplace_back();
+  capacities_.resize(compactors_.size());
+  max_size_ = 0;
+  for (size_t h = 0; h < compactors_.size(); ++h)
+  {
+    capacities_[h] = capacity(h);
+    max_size_ += capacities_[h];
+  }
+}
+
+template<typename T>
+void QuantileSketch<T>::compress()
+{
+  for (size_t h = 0; h < compactors_.size(); ++h)
+  {
+    if (compactors_[h].size() < capacities_[h]) continue;
+
+    if (h + 1 == compactors_.size()) grow();
+    // grow() may invalidate the reference
+    auto& src = compactors_[h];
+    auto& dst = compactors_[h + 1];
+
+    // only the bottom compactor is unsorted
+    if (h == 0) std::sort(src.begin(), src.end());
+    // keep the smallest value if the number of values is odd
+    size_t first = src.size() % 2;
+    auto middle = static_cast<std::ptrdiff_t>(dst.size());
+    for (size_t i = first + (rng_() & 1); i < src.size(); i += 2) dst.push_back(src[i]);
+    std::inplace_merge(dst.begin(), dst.begin() + middle, dst.end());
+    size_ -= src.size() - first - (src.size() - first) / 2;
+    src.resize(first);
+    return;
+  }
+}
+
+template<typename T>
+template<typename V>
+void QuantileSketch<T>::push(V v)
+{
+  auto x = static_cast<T>(v);
+  if (std::isnan(x)) return;
+
+  ++count_;
+  if (x < min_) min_ = x;
+  if (x > max_) max_ = x;
+
+  compactors_[0].push_back(x);
+  if (++size_ >= max_size_) compress();
+}
+
+template<typename T>
+template<typename E, EnableIf<E, IsVector>>
+void QuantileSketch<T>::update(const E& src)
+{
+#if defined(FOAMALGO_USE_TBB)
+  if (src.size() > chunk_size)
+  {
+    std::mutex mtx;
+    unsigned int seed = rng_();
+    tbb::parallel_for(tbb::blocked_range<size_t>(0, src.size(), chunk_size),
+      [&src, &mtx, seed, this] (const tbb::blocked_range<size_t> &block)
+      {
+        QuantileSketch local(k_, seed + static_cast<unsigned int>(block.begin() / chunk_size));
+        for(size_t i=block.begin(); i != block.end(); ++i) local.push(src(i));
+
+        std::scoped_lock lock(mtx);
+        merge(local);
+      }
+    );
+    return;
+  }
+#endif
+
+  for (size_t i = 0; i < src.size(); ++i) push(src(i));
+}
+
+template<typename T>
+void QuantileSketch<T>::merge(const QuantileSketch& other)
+{
+  if (this == &other)
+  {
+    QuantileSketch copy(other);
+    merge(copy);
+    return;
+  }
+
+  while (compactors_.size() < other.compactors_.size()) grow();
+  for (size_t h = 0; h < other.compactors_.size(); ++h)
+  {
+    auto& dst = compactors_[h];
+    auto middle = static_cast<std::ptrdiff_t>(dst.size());
+    dst.insert(dst.end(), other.compactors_[h].begin(), other.compactors_[h].end());
+    if (h > 0) std::inplace_merge(dst.begin(), dst.begin() + middle, dst.end());
+  }
+  size_ += other.size_;
+  count_ += other.count_;
+  if (other.min_ < min_) min_ = other.min_;
+  if (other.max_ > max_) max_ = other.max_;
+
+  while (size_ >= max_size_) compress();
+}
+
+template<typename T>
+void QuantileSketch<T>::reset()
+{
+  compactors_.clear();
+  capacities_.clear();
+  count_ = 0;
+  size_ = 0;
+  min_ = std::numeric_limits<T>::infinity();
+  max_ = -std::numeric_limits<T>::infinity();
+  grow();
+}
+
+template<typename T>
+T QuantileSketch<T>::quantile(double q) const
+{
+  return quantiles({q}).front();
+}
+
+template<typename T>
+std::vector<T> QuantileSketch<T>::quantiles(const std::vector<double>& qs) const
+{
+  for (auto q : qs)
+  {
+    FOAM_ASSERT_ARGUMENT(q >= 0. && q <= 1., "Quantile must be within [0, 1]")
+  }
+
+  std::vector<T> ret(qs.size(), std::numeric_limits<T>::quiet_NaN());
+  if (count_ == 0) return ret;
+
+  // (value, weight)
+  std::vector<std::pair<T, size_t>> items;
+  size_t total = 0;
+  if (std::any_of(qs.begin(), qs.end(), [] (double q) { return q > 0. && q < 1.; }))
+  {
+    items.reserve(size_);
+    for (size_t h = 0; h < compactors_.size(); ++h)
+    {
+      size_t weight = size_t(1) << h;
+      for (auto v : compactors_[h]) items.emplace_back(v, weight);
+      total += weight * compactors_[h].size();
+    }
+    std::sort(items.begin(), items.end());
+  }
+
+  // answer the quantiles in ascending order
+  std::vector<size_t> order(qs.size());
+  std::iota(order.begin(), order.end(), 0);
+  std::sort(order.begin(), order.end(), [&qs] (size_t i, size_t j) { return qs[i] < qs[j]; });
+
+  auto it = items.begin();
+  size_t cum = 0;
+  for (auto i : order)
+  {
+    double q = qs[i];
+    if (q == 0.) { ret[i] = min_; continue; }
+    if (q == 1.) { ret[i] = max_; continue; }
+
+    // rounding half to even as numpy
+    auto rank = static_cast<size_t>(std::nearbyint(q * static_cast<double>(total - 1)));
+    while (it != items.end() && cum + it->second <= rank)
+    {
+      cum += it->second;
+      ++it;
+    }
+    ret[i] = it != items.end() ? it->first : max_;
+  }
+  return ret;
+}
+
 } // foam
 
 
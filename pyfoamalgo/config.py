@@ -18,3 +18,8 @@ __XFEL_RAW_IMAGE_DTYPE__ = np.uint16
 __NAN_DTYPES__ = (
     np.float32, np.float64
 )
+
+# integer dtypes supported by the NaN-reducers, which are free of NaN
+__INT_DTYPES__ = (
+    np.int16, np.uint16, np.int32, np.uint32
+)
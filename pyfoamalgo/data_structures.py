@@ -15,7 +15,7 @@ from threading import Lock
 
 import numpy as np
 
-from pyfoamalgo.lib.imageproc import movingAvgImageData
+from pyfoamalgo.lib.imageproc import movingAvgImageData, MovingAverageImageData
 
 
 __all__ = [
@@ -545,22 +545,58 @@ class MovingAverageScalar(_MovingAverageBase):
 class MovingAverageArray(_MovingAverageBase):
     """Stores moving average of 2D/3D (and higher dimension) array data."""
 
-    def __init__(self, window=1, *, copy_first=False):
+    def __init__(self, window=1, *, copy_first=False, exact=False):
         """Initialization.
 
         :param int window: moving average window size.
         :param bool copy_first: True for copy the first data.
+        :param bool exact: True for calculating the exact moving average of
+            2D/3D float32 array data by keeping the last 'window' data in a
+            pre-allocated ring buffer. Otherwise, the moving average decays
+            exponentially once the window is full. Note that the moving
+            average is always stored in its own buffer in this case.
         """
         super().__init__(window=window)
 
         self._copy_first = copy_first
+        self._exact = exact
+        self._ma = None  # C++ implementation of the exact moving average
+
+    @property
+    def window(self):
+        return self._window
+
+    @window.setter
+    def window(self, v):
+        _MovingAverageBase.window.fset(self, v)
+
+        if self._ma is not None:
+            self._ma.setWindow(v)
+            self._count = self._ma.count()
+            if self._count > 0:
+                self._ma.average(self._data)
+
+    def __delete__(self, instance):
+        super().__delete__(instance)
+        self._ma = None
 
     def __set__(self, instance, data):
         if data is None:
             self._data = None
             self._count = 0
+            self._ma = None
+            return
+
+        if self._exact and data.ndim in (2, 3) \
+                and data.dtype == np.float32:
+            if self._ma is None or data.shape != self._data.shape:
+                self._ma = MovingAverageImageData(max(self._window, 1))
+                self._data = np.empty_like(data)
+            self._ma.update(data, self._data)
+            self._count = self._ma.count()
             return
 
+        self._ma = None
         if self._data is not None and self._window > 1 and \
                 self._count <= self._window and data.shape == self._data.shape:
             if self._count < self._window:
@@ -7,20 +7,47 @@ Author: Jun Zhu <jun.zhu@xfel.eu>, Ebad Kamil <ebad.kamil@xfel.eu>
 Copyright (C) European X-Ray Free-Electron Laser Facility GmbH.
 All rights reserved.
 """
+import numpy as np
+
+from .statistics import nanmedian, nanquantile, nanstd
+from pyfoamalgo.lib.miscellaneous import intersection
 from pyfoamalgo.lib.imageproc import (
-    nanmeanImageArray,
+    nanmeanImageArray, groupedNanmeanImageArray, nanmedianImageArray, nanstdImageArray,
+    sigmaClippedNanmeanImageArray, ImageStatsAccumulator, PeakFinder,
+    PixelCorrelationAccumulator,
+    ClusterFinder,
+    BadPixel, computeBadPixelMask, photonize as _photonize,
+    RoiStat, roiStatistics, roiProjection, imageMoments,
+    binImageData, upsampleImageData,
     imageDataNanMask, maskImageDataNan, maskImageDataZero,
     correctGain, correctOffset, correctDsscOffset, correctGainOffset
 )
 
 __all__ = [
     'nanmean_image_data',
+    'pump_probe_mean',
+    'nanmedian_image_data',
+    'nanstd_image_data',
+    'sigma_clipped_nanmean_image_data',
+    'ImageStatsAccumulator',
+    'PixelCorrelationAccumulator',
+    'PeakFinder',
     'correct_image_data',
     'mask_image_data',
+    'BadPixel',
+    'compute_bad_pixel_mask',
+    'photonize',
+    'roi_statistics',
+    'roi_projection',
+    'image_moments',
+    'bin_image',
+    'upsample_image',
+    'ImageRegistration',
+    'find_clusters',
 ]
 
 
-def nanmean_image_data(*args, kept=None):
+def nanmean_image_data(*args, kept=None, out=None):
     """Compute nanmean of an array of images or a tuple/list of two images.
 
     :param args: One input which is a 2D or 3D array or two inputs which
@@ -30,21 +57,126 @@ def nanmean_image_data(*args, kept=None):
         detectors at the same time.
     :param None/list kept: Indices of the kept images. Ignored if args has
         more than one items.
+    :param None/numpy.ndarray out: Pre-allocated 2D array to place the
+        result in. It must have the same shape and dtype as the expected
+        output. If given, no new array will be allocated.
 
     :return: nanmean of the input data.
     :rtype: numpy.ndarray.
     """
     if len(args) > 1:
-        return nanmeanImageArray(*args)
+        if out is None:
+            return nanmeanImageArray(*args)
+        nanmeanImageArray(*args, out=out)
+        return out
 
     images = args[0]
     if images.ndim == 2:
-        return images.copy()
+        if out is None:
+            return images.copy()
+        np.copyto(out, images)
+        return out
+
+    if kept is None:
+        if out is None:
+            return nanmeanImageArray(images)
+        nanmeanImageArray(images, out=out)
+        return out
+
+    if out is None:
+        return nanmeanImageArray(images, kept)
+    nanmeanImageArray(images, kept, out=out)
+    return out
+
+
+def pump_probe_mean(data, pattern, *, out=None):
+    """Compute nanmeans of groups of images, e.g. pumped and unpumped
+    images, from an array of images in a single pass.
+
+    :param numpy.ndarray data: image data. Shape = (indices, y, x). The
+        dtype must be float32 or float64.
+    :param array-like pattern: integer group label of each image. Images
+        with negative labels are ignored. If it is shorter than the number
+        of images, it is repeated, e.g. (0, 1) for alternating on/off
+        images.
+    :param None/numpy.ndarray out: Pre-allocated 3D array with shape
+        (groups, y, x) and the same dtype as 'data' to place the result in.
+
+    :return: nanmean image of each label from 0 to max(pattern). The
+        nanmean of a label without any image is NaN.
+        Shape = (max(pattern) + 1, y, x).
+    :rtype: numpy.ndarray.
+    """
+    labels = np.resize(np.asarray(pattern, dtype=np.int64), len(data))
+    if out is None:
+        n_groups = max(int(labels.max()) + 1, 0) if len(labels) else 0
+        out = np.empty((n_groups, *data.shape[-2:]), dtype=data.dtype)
+    groupedNanmeanImageArray(data, labels.tolist(), out)
+    return out
+
+
+def nanmedian_image_data(data, *, kept=None):
+    """Compute nanmedian of an array of images.
+
+    :param numpy.ndarray data: A 2D or 3D array. If the input is a 2D
+        array, a copy will be returned.
+    :param None/list kept: Indices of the kept images.
+
+    :return: nanmedian of the input data.
+    :rtype: numpy.ndarray.
+    """
+    if data.ndim == 2:
+        return data.copy()
 
     if kept is None:
-        return nanmeanImageArray(images)
+        return nanmedianImageArray(data)
+
+    return nanmedianImageArray(data, kept)
+
 
-    return nanmeanImageArray(images, kept)
+def nanstd_image_data(data, *, kept=None):
+    """Compute nanstd of an array of images.
+
+    :param numpy.ndarray data: A 2D or 3D array. If the input is a 2D
+        array, an array of zeros will be returned, where the non-finite
+        pixels are NaN.
+    :param None/list kept: Indices of the kept images.
+
+    :return: nanstd of the input data.
+    :rtype: numpy.ndarray.
+    """
+    if data.ndim == 2:
+        return np.where(np.isfinite(data), 0, np.nan).astype(data.dtype)
+
+    if kept is None:
+        return nanstdImageArray(data)
+
+    return nanstdImageArray(data, kept)
+
+
+def sigma_clipped_nanmean_image_data(data, *, kept=None, sigma=3., max_iter=5):
+    """Compute sigma-clipped nanmean of an array of images.
+
+    For each pixel, values which are more than 'sigma' standard deviations
+    away from the median are rejected iteratively before computing the mean.
+
+    :param numpy.ndarray data: A 2D or 3D array. If the input is a 2D
+        array, a copy will be returned.
+    :param None/list kept: Indices of the kept images.
+    :param float sigma: Number of standard deviations used as the
+        clipping bound.
+    :param int max_iter: Maximum number of clipping iterations.
+
+    :return: sigma-clipped nanmean of the input data.
+    :rtype: numpy.ndarray.
+    """
+    if data.ndim == 2:
+        return data.copy()
+
+    if kept is None:
+        return sigmaClippedNanmeanImageArray(data, sigma, max_iter)
+
+    return sigmaClippedNanmeanImageArray(data, kept, sigma, max_iter)
 
 
 def correct_image_data(data, *,
@@ -130,3 +262,496 @@ def mask_image_data(data, *,
                 f(data, image_mask, out)
             else:
                 f(data, image_mask, *threshold_mask, out)
+
+
+def _bad_pixel_bounds(data, threshold, threshold_type):
+    """Compute the (lower, upper) bounds of each map in data.
+
+    :return tuple: (lower bounds, upper bounds). Each of them is a 1D array
+        which has one element for each map.
+    """
+    n = 1 if data.ndim == 2 else data.shape[0]
+    lb = np.full(n, -np.inf)
+    ub = np.full(n, np.inf)
+
+    if threshold_type not in ('absolute', 'sigma', 'percentile'):
+        raise ValueError(f"Unknown threshold type: {threshold_type}")
+
+    if threshold is None:
+        return lb, ub
+
+    lower, upper = threshold
+    axis = (-2, -1)
+    if threshold_type == 'absolute':
+        if lower is not None:
+            lb[:] = lower
+        if upper is not None:
+            ub[:] = upper
+    elif threshold_type == 'sigma':
+        center = nanmedian(data, axis=axis)
+        spread = nanstd(data, axis=axis)
+        if lower is not None:
+            lb[:] = center - lower * spread
+        if upper is not None:
+            ub[:] = center + upper * spread
+    else:
+        if lower is not None:
+            lb[:] = nanquantile(data, lower / 100., axis=axis)
+        if upper is not None:
+            ub[:] = nanquantile(data, upper / 100., axis=axis)
+
+    return lb, ub
+
+
+def compute_bad_pixel_mask(mean, std, *,
+                           mean_threshold=None,
+                           mean_threshold_type='absolute',
+                           std_threshold=None,
+                           std_threshold_type='absolute',
+                           as_bool=False):
+    """Compute bad pixel mask from mean and standard deviation maps.
+
+    A pixel is bad if its mean or standard deviation is NaN (BadPixel.NaN),
+    its mean is below (BadPixel.Cold) or above (BadPixel.Hot) the mean
+    thresholds, or its standard deviation is below (BadPixel.Dead) or
+    above (BadPixel.Noisy) the standard deviation thresholds.
+
+    :param numpy.ndarray mean: Mean map(s), e.g. offset map(s) from a dark
+        run. Shape = (y, x) or (indices, y, x), where indices can be memory
+        cells or modules.
+    :param numpy.ndarray std: Standard deviation map(s), e.g. noise map(s)
+        from a dark run. It must have the same shape and dtype as 'mean'.
+    :param tuple/None mean_threshold: (lower, upper) thresholds of the mean.
+        Either of them can be None for no bound.
+    :param str mean_threshold_type: Type of the mean thresholds.
+        'absolute' - the thresholds are the bounds;
+        'sigma' - the thresholds are the numbers of standard deviations of
+        the map below/above its median;
+        'percentile' - the thresholds are percentiles of the map, which
+        must be within [0, 100].
+        For an array of maps, the bounds are calculated for each map
+        separately.
+    :param tuple/None std_threshold: (lower, upper) thresholds of the
+        standard deviation.
+    :param str std_threshold_type: Type of the standard deviation
+        thresholds. See 'mean_threshold_type'.
+    :param bool as_bool: True for returning a bool mask, in which bad
+        pixels are True. A 2D bool mask can be passed to
+        :func:`mask_image_data` as 'image_mask' directly. Otherwise, a
+        uint8 mask with the bitwise OR of the reason codes is returned.
+
+    :return: bad pixel mask which has the same shape as 'mean'.
+    :rtype: numpy.ndarray.
+    """
+    mean_lb, mean_ub = _bad_pixel_bounds(
+        mean, mean_threshold, mean_threshold_type)
+    std_lb, std_ub = _bad_pixel_bounds(
+        std, std_threshold, std_threshold_type)
+
+    out = np.empty(mean.shape, dtype=bool if as_bool else np.uint8)
+    if mean.ndim == 2:
+        computeBadPixelMask(mean, std, mean_lb[0], mean_ub[0],
+                            std_lb[0], std_ub[0], out)
+    else:
+        computeBadPixelMask(mean, std, mean_lb.tolist(), mean_ub.tolist(),
+                            std_lb.tolist(), std_ub.tolist(), out)
+    return out
+
+
+def photonize(data, adu_per_photon, threshold=None, *,
+              dtype=np.uint16, out=None):
+    """Convert image data from ADU to number of photons.
+
+    A pixel is zero if its value is below the threshold or NaN. Otherwise,
+    its value is divided by 'adu_per_photon' and rounded to the nearest
+    integer, which saturates at the maximum of the output dtype.
+
+    :param numpy.ndarray data: image data in ADU. Shape = (y, x) or
+        (indices, y, x). The dtype must be float32 or uint16 (raw data).
+    :param float adu_per_photon: ADU per photon.
+    :param float/None threshold: threshold in ADU. If None, it is half of
+        'adu_per_photon'.
+    :param numpy.dtype dtype: dtype of the output, which must be uint8 or
+        uint16. Ignored if 'out' is given.
+    :param numpy.ndarray out: optional output array which has the same
+        shape as 'data' and dtype uint8 or uint16.
+
+    :return: number of photons.
+    :rtype: numpy.ndarray.
+    """
+    if threshold is None:
+        threshold = 0.5 * adu_per_photon
+
+    if out is None:
+        out = np.empty(data.shape, dtype=dtype)
+    _photonize(data, adu_per_photon, threshold, out)
+    return out
+
+
+_ROI_STATS = {
+    'sum': RoiStat.Sum,
+    'nansum': RoiStat.NanSum,
+    'mean': RoiStat.Mean,
+    'nanmean': RoiStat.NanMean,
+    'min': RoiStat.Min,
+    'nanmin': RoiStat.NanMin,
+    'max': RoiStat.Max,
+    'nanmax': RoiStat.NanMax,
+}
+
+
+def roi_statistics(data, rois, stats=('nansum', 'nanmean', 'nanmin', 'nanmax')):
+    """Compute statistics of ROIs of an image or an array of images.
+
+    All the statistics of a ROI are computed in a single pass and an array
+    of images is processed in parallel.
+
+    :param numpy.ndarray data: image data. Shape = (y, x) or
+        (indices, y, x). The dtype must be float32 or float64.
+    :param list rois: a list of (x, y, w, h) of ROIs. ROIs are clipped by
+        the image. For a ROI which does not overlap with the image, the
+        sums are 0 and the other statistics are NaN.
+    :param tuple stats: names of statistics, which can be 'sum', 'nansum',
+        'mean', 'nanmean', 'min', 'nanmin', 'max' and 'nanmax'.
+
+    :return: statistics with shape (rois, stats) for an image or
+        (indices, rois, stats) for an array of images.
+    :rtype: numpy.ndarray.
+    """
+    try:
+        codes = [_ROI_STATS[s] for s in stats]
+    except KeyError as e:
+        raise ValueError(f"Unknown ROI statistic: {e.args[0]}")
+
+    out = np.empty(data.shape[:-2] + (len(rois), len(codes)),
+                   dtype=np.float64)
+    roiStatistics(data, rois, codes, out)
+    return out
+
+
+def roi_projection(data, rois, *, axis=-2, average=False, out=None):
+    """Compute projections of ROIs of an image or an array of images.
+
+    The projections of all the ROIs are computed in a single parallel pass
+    over the array of images and written into a single output array.
+
+    :param numpy.ndarray data: image data. Shape = (y, x) or
+        (indices, y, x). The dtype must be float32 or float64.
+    :param list rois: a list of (x, y, w, h) of ROIs. ROIs are clipped by
+        the image. The projection of a ROI which does not overlap with the
+        image is empty.
+    :param int axis: axis of the image to be reduced. -2 for the
+        projections onto x with length w and -1 for the projections onto
+        y with length h.
+    :param bool average: True for nanmean and False for nansum.
+    :param numpy.ndarray out: optional output array which has the same
+        dtype as 'data' and shape (total,) or (indices, total), where
+        'total' is the sum of the lengths of all the projections.
+
+    :return list: projections of the ROIs with shape (length,) or
+        (indices, length). They are views of the output array.
+    """
+    if axis not in (-1, -2):
+        raise ValueError(f"Axis must be either -1 or -2: {axis}")
+
+    h, w = data.shape[-2:]
+    lengths = []
+    for roi in rois:
+        _, _, rw, rh = intersection(roi, [0, 0, w, h])
+        if rw <= 0 or rh <= 0:
+            lengths.append(0)
+        else:
+            lengths.append(rw if axis == -2 else rh)
+
+    if out is None:
+        out = np.empty(data.shape[:-2] + (sum(lengths),), dtype=data.dtype)
+
+    if data.ndim == 2:
+        roiProjection(data[np.newaxis], rois, axis + 2, average,
+                      out[np.newaxis])
+    else:
+        roiProjection(data, rois, axis + 2, average, out)
+
+    return np.split(out, np.cumsum(lengths)[:-1], axis=-1) if lengths else []
+
+
+def image_moments(data, mask=None, roi=None):
+    """Compute the intensity-weighted centroid and width of an image or
+    an array of images.
+
+    The moments of an image are computed in a single pass over the pixels
+    and an array of images is processed in parallel. NaN pixels are
+    ignored.
+
+    :param numpy.ndarray data: image data. Shape = (y, x) or
+        (indices, y, x). The dtype must be float32 or float64.
+    :param numpy.ndarray mask: optional image mask with shape (y, x) and
+        dtype bool. Masked pixels, i.e. True, are ignored.
+    :param tuple roi: optional (x, y, w, h) of the ROI. It is clipped by
+        the image. Default is the whole image.
+
+    :return: (total, cy, cx, sigma_y, sigma_x) with shape (5,) for an
+        image or (indices, 5) for an array of images. The coordinates are
+        in pixels of the image. Negative pixels, e.g. in dark-subtracted
+        images, are included in the total but have zero weight in the
+        other moments, which are NaN if there is no positive pixel.
+    :rtype: numpy.ndarray.
+    """
+    if roi is None:
+        h, w = data.shape[-2:]
+        roi = (0, 0, w, h)
+
+    out = np.empty(data.shape[:-2] + (5,), dtype=np.float64)
+    if mask is None:
+        imageMoments(data, roi, out)
+    else:
+        imageMoments(data, mask, roi, out)
+    return out
+
+
+def bin_image(data, factor, *, op='mean', out=None):
+    """Bin an image or an array of images.
+
+    Each block of factor x factor pixels is reduced to one pixel by
+    averaging or summing its non-NaN pixels. The blocks at the bottom and
+    the right edges are smaller if the image size is not a multiple of
+    the factor.
+
+    :param numpy.ndarray data: image data. Shape = (y, x) or
+        (indices, y, x). The dtype must be float32 or float64.
+    :param int factor: binning factor.
+    :param str op: 'mean' for nanmean and 'sum' for nansum. The mean of
+        a block with only NaN pixels is NaN.
+    :param numpy.ndarray out: optional output array which has the same
+        dtype as 'data' and shape (ceil(y / factor), ceil(x / factor)) or
+        (indices, ceil(y / factor), ceil(x / factor)).
+
+    :return: binned data.
+    :rtype: numpy.ndarray.
+    """
+    if op not in ('mean', 'sum'):
+        raise ValueError(f"Unknown binning operation: {op}")
+
+    if factor < 1:
+        raise ValueError(f"Binning factor must be positive: {factor}")
+
+    if out is None:
+        h, w = data.shape[-2:]
+        out = np.empty(data.shape[:-2] + ((h + factor - 1) // factor,
+                                        (w + factor - 1) // factor),
+                       dtype=data.dtype)
+    binImageData(data, factor, op == 'mean', out)
+    return out
+
+
+def upsample_image(data, factor, shape=None, *, out=None):
+    """Up-sample an image or an array of images.
+
+    Each pixel is repeated factor x factor times. It is the inverse of
+    :func:`bin_image` in terms of shape.
+
+    :param numpy.ndarray data: image data. Shape = (y, x) or
+        (indices, y, x). The dtype must be float32 or float64.
+    :param int factor: up-sampling factor.
+    :param tuple/None shape: (y', x') of the up-sampled image, which
+        must satisfy ceil(y' / factor) = y and ceil(x' / factor) = x. If
+        None, it is (y * factor, x * factor). Ignored if 'out' is given.
+    :param numpy.ndarray out: optional output array which has the dtype
+        of 'data' or float64.
+
+    :return: up-sampled data.
+    :rtype: numpy.ndarray.
+    """
+    if factor < 1:
+        raise ValueError(f"Up-sampling factor must be positive: {factor}")
+
+    if out is None:
+        if shape is None:
+            shape = (data.shape[-2] * factor, data.shape[-1] * factor)
+        out = np.empty(data.shape[:-2] + tuple(shape), dtype=data.dtype)
+    upsampleImageData(data, factor, out)
+    return out
+
+
+def _parabolic_offset(left, center, right):
+    """Return the offset of the vertex of the parabola through three points.
+
+    The offset is 0 if the three points are on a straight line.
+    """
+    denominator = left - 2 * center + right
+    return 0.5 * np.divide(left - right, denominator,
+                           out=np.zeros_like(denominator),
+                           where=denominator != 0)
+
+
+def _fft():
+    """Return the 2D real FFT functions which accept 'workers'.
+
+    scipy.fft is preferred since it runs a batched transform with multiple
+    workers. It falls back to numpy.fft, which ignores 'workers', if scipy
+    is not installed.
+    """
+    try:
+        from scipy.fft import irfft2, rfft2
+    except ImportError:
+        def rfft2(x, *, workers=None):
+            return np.fft.rfft2(x)
+
+        def irfft2(x, s=None, *, workers=None):
+            return np.fft.irfft2(x, s=s)
+
+    return rfft2, irfft2
+
+
+class ImageRegistration:
+    """Estimate shifts of images with respect to a reference image.
+
+    The shift of an image is found from the peak of its phase correlation
+    (or cross-correlation) with the reference and refined to subpixel
+    precision by parabolic interpolation. The spectrum of the reference is
+    cached and an array of images is transformed in a single batched FFT
+    with multiple workers.
+    """
+    def __init__(self, reference=None, *, normalize=True, workers=-1):
+        """Initialization.
+
+        :param numpy.ndarray/None reference: reference image with shape
+            (y, x).
+        :param bool normalize: True for phase correlation, which only uses
+            the phase of the cross-power spectrum and is thus insensitive
+            to the intensity variation; False for cross-correlation.
+        :param int workers: maximum number of workers for FFT. A negative
+            value counts backwards from the number of CPUs, i.e. -1 means
+            all the CPUs. It is ignored if scipy is not installed.
+        """
+        self._normalize = normalize
+        self._workers = workers
+
+        self._shape = None
+        self._reference_spectrum = None
+        if reference is not None:
+            self.set_reference(reference)
+
+    @staticmethod
+    def _prepare(data):
+        # remove the offset of each image and exclude NaN pixels, e.g.
+        # masked pixels, from the correlation
+        data = data - np.nanmean(data, axis=(-2, -1), keepdims=True)
+        data[np.isnan(data)] = 0
+        return data
+
+    def set_reference(self, reference):
+        """Set the reference image.
+
+        :param numpy.ndarray reference: reference image with shape (y, x).
+        """
+        if reference.ndim != 2:
+            raise ValueError(f"Reference must be an image: "
+                             f"ndim = {reference.ndim}")
+
+        rfft2, _ = _fft()
+        self._shape = reference.shape
+        self._reference_spectrum = np.conj(
+            rfft2(self._prepare(reference), workers=self._workers))
+
+    def register(self, data):
+        """Estimate the shifts of an image or an array of images.
+
+        :param numpy.ndarray data: image data with shape (y, x) or
+            (indices, y, x). The images must have the same shape as the
+            reference.
+
+        :return: (dy, dx) by which the reference should be shifted to
+            match the image, i.e. np.roll(reference, (dy, dx), axis=(0, 1))
+            for integer shifts. The shape is (2,) for an image and
+            (indices, 2) for an array of images. A shift is within
+            [-size // 2, size - size // 2) along each axis.
+        :rtype: numpy.ndarray.
+        """
+        if self._reference_spectrum is None:
+            raise ValueError("Reference image has not been set")
+
+        if data.ndim not in (2, 3) or data.shape[-2:] != self._shape:
+            raise ValueError(f"Image data with shape {data.shape} do not "
+                             f"match the reference with shape {self._shape}")
+
+        rfft2, irfft2 = _fft()
+        spectrum = rfft2(self._prepare(data), workers=self._workers)
+        spectrum *= self._reference_spectrum
+        if self._normalize:
+            amplitude = np.abs(spectrum)
+            amplitude[amplitude == 0] = 1
+            spectrum /= amplitude
+        h, w = self._shape
+        corr = irfft2(spectrum, s=self._shape,
+                      workers=self._workers).reshape(-1, h, w)
+
+        indices = np.arange(corr.shape[0])
+        py, px = np.unravel_index(
+            np.argmax(corr.reshape(corr.shape[0], -1), axis=1), (h, w))
+        peak = corr[indices, py, px]
+        dy = _parabolic_offset(corr[indices, (py - 1) % h, px], peak,
+                               corr[indices, (py + 1) % h, px])
+        dx = _parabolic_offset(corr[indices, py, (px - 1) % w], peak,
+                               corr[indices, py, (px + 1) % w])
+
+        size = np.array(self._shape)
+        shifts = np.stack([py + dy, px + dx], axis=-1)
+        shifts = (shifts + size // 2) % size - size // 2
+
+        return shifts[0] if data.ndim == 2 else shifts
+
+
+_CLUSTER_DTYPE = np.dtype([
+    ('pulse', np.int64),
+    ('cluster_id', np.int64),
+    ('npix', np.int64),
+    ('sum', np.float64),
+    ('cy', np.float64),
+    ('cx', np.float64),
+])
+
+
+def find_clusters(data, threshold, *, connectivity=8, min_pixels=1):
+    """Find clusters of connected pixels above a threshold.
+
+    It is designed for photon-sparse images, where a photon hit, i.e. a
+    droplet, usually spreads over a few neighbouring pixels. Clusters are
+    labeled with a union-find and an array of images is processed in
+    parallel. NaN pixels do not belong to any cluster.
+
+    :param numpy.ndarray data: image data. Shape = (y, x) or
+        (indices, y, x). The dtype must be float32 or float64.
+    :param float threshold: pixels with values above the threshold are
+        considered.
+    :param int connectivity: 4 for connecting pixels only with the
+        horizontal and vertical neighbours and 8 for also with the
+        diagonal ones.
+    :param int min_pixels: minimum number of pixels in a cluster.
+
+    :return: a structured array with fields 'pulse', 'cluster_id', 'npix',
+        'sum', 'cy' and 'cx', where (cy, cx) is the intensity-weighted
+        center of a cluster, or the unweighted one if any pixel of the
+        cluster is not positive, e.g. for dark-subtracted data with a
+        non-positive threshold. Clusters in each image are numbered from 0 in
+        the order of their first pixels in the raster scan. 'pulse' is
+        always 0 for a single image.
+    :rtype: numpy.ndarray.
+    """
+    finder = ClusterFinder(threshold, connectivity, min_pixels)
+    if data.ndim == 2:
+        clusters = finder.find(data)
+        counts = np.array([len(clusters)])
+    else:
+        clusters, counts = finder.find(data)
+        counts = counts.astype(np.int64)
+
+    ret = np.empty(len(clusters), dtype=_CLUSTER_DTYPE)
+    ret['pulse'] = np.repeat(np.arange(len(counts)), counts)
+    ret['cluster_id'] = np.arange(len(clusters)) - np.repeat(
+        np.cumsum(counts) - counts, counts)
+    ret['npix'] = clusters[:, 0]
+    ret['sum'] = clusters[:, 1]
+    ret['cy'] = clusters[:, 2]
+    ret['cx'] = clusters[:, 3]
+    return ret
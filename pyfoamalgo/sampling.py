@@ -9,6 +9,8 @@ All rights reserved.
 """
 import numpy as np
 
+from .imageproc import bin_image, upsample_image
+
 __all__ = [
     'down_sample',
     'slice_curve',
@@ -39,20 +41,28 @@ def slice_curve(y, x, x_min=None, x_max=None):
     return y[indices], x[indices]
 
 
-def down_sample(x):
+def down_sample(x, rate=2, *, op=None):
     """Down sample an array.
 
     :param numpy.ndarray x: data.
+    :param int rate: down-sample rate.
+    :param str/None op: None for keeping only the first element of each
+        block. 'mean' or 'sum' for nan-aware block averaging or summing
+        (see :func:`pyfoamalgo.bin_image`), which requires float32 or
+        float64 data.
 
     :return numpy.ndarray: down-sampled data.
     """
-    # down-sample rate. the rate is fixed at 2 due to the complexity of
-    # up-sampling
-    rate = 2
-
     if not isinstance(x, np.ndarray):
         raise TypeError("Input must be a numpy.ndarray!")
 
+    if op is not None and len(x.shape) in (1, 2, 3):
+        if len(x.shape) == 1:
+            return bin_image(x[np.newaxis], rate, op=op)[0]
+        # the first dimension of a 3D array is the data ID, which will not
+        # be down-sampled
+        return bin_image(x, rate, op=op)
+
     if len(x.shape) == 1:
         return x[::rate]
 
@@ -66,11 +76,12 @@ def down_sample(x):
     raise ValueError("Array dimension > 3!")
 
 
-def up_sample(x, shape):
+def up_sample(x, shape, rate=2):
     """Up sample an array.
 
     :param numpy.ndarray x: data.
     :param tuple shape: shape of the up-sampled data.
+    :param int rate: up-sample rate.
 
     :return numpy.ndarray: up-sampled data.
 
@@ -102,9 +113,6 @@ def up_sample(x, shape):
     For other target shapes, ValueError will be raised. This implementation
     makes the down-sampling and up-sampling self-consistent.
     """
-    # up-sample rate
-    rate = 2
-
     if not isinstance(x, np.ndarray):
         raise TypeError("Input must be a numpy.ndarray!")
 
@@ -128,6 +136,9 @@ def up_sample(x, shape):
                 np.ceil(shape[1] / rate) != x.shape[1]:
             raise ValueError(msg)
 
+        if x.dtype in (np.float32, np.float64):
+            return upsample_image(x, rate, out=np.empty(shape))
+
         ret = np.zeros((x.shape[0]*rate, x.shape[1]*rate))
         ret[:, :] = x.repeat(rate, axis=0).repeat(rate, axis=1)
         return ret[:shape[0], :shape[1]]
@@ -139,6 +150,9 @@ def up_sample(x, shape):
                 np.ceil(shape[2] / rate) != x.shape[2]:
             raise ValueError(msg)
 
+        if x.dtype in (np.float32, np.float64):
+            return upsample_image(x, rate, out=np.empty(shape))
+
         ret = np.zeros((x.shape[0], x.shape[1]*rate, x.shape[2]*rate))
         ret[:, :, :] = x.repeat(rate, axis=1).repeat(rate, axis=2)
         return ret[:, :shape[1], :shape[2]]
@@ -8,10 +8,12 @@ Copyright (C) European X-Ray Free-Electron Laser Facility GmbH.
 All rights reserved.
 """
 import numpy as np
-from scipy.stats import binned_statistic
+
+from .statistics import binned_mean_count
 
 __all__ = [
-    'compute_spectrum_1d'
+    'compute_spectrum_1d',
+    'SpectrumAccumulator',
 ]
 
 
@@ -27,8 +29,8 @@ def compute_spectrum_1d(x, y, n_bins=10, *,
         edges = np.full((n_bins + 1,), np.nan)
         counts = np.full((n_bins,), np.nan)
     else:
-        stats, edges, _ = binned_statistic(x, y, 'mean', n_bins, range=bin_range)
-        counts, _, _ = binned_statistic(x, y, 'count', n_bins, range=bin_range)
+        stats, counts, edges = binned_mean_count(x, y, n_bins, bin_range)
+        counts = counts.astype(np.float64)
 
     if nan_to_num:
         np.nan_to_num(stats, copy=False)
@@ -37,3 +39,158 @@ def compute_spectrum_1d(x, y, n_bins=10, *,
     if edge2center:
         return stats, (edges[1:] + edges[:-1]) / 2., counts
     return stats, edges, counts
+
+
+class SpectrumAccumulator:
+    """Spectrum accumulated over a stream of (x, y) data.
+
+    Instead of recomputing the spectrum from the whole history, only the
+    new data are binned and merged into the per-bin count, sum and sum of
+    squared deviations. The statistics are kept in a fine histogram with
+    fixed edges, from which the spectrum is rebinned when the number of
+    bins changes. NaN and the x values outside the edges are ignored.
+
+    If the number of bins of the spectrum is not a divisor of n_fine_bins,
+    the statistics of a fine bin which overlaps two spectrum bins are split
+    in proportion to the overlap, i.e. the data are assumed to be uniformly
+    distributed within a fine bin. The counts can then be fractional.
+
+    :param float lb: Left edge of the first bin.
+    :param float ub: Right edge of the last bin.
+    :param int n_bins: Number of bins of the spectrum.
+    :param int n_fine_bins: Number of bins of the fine histogram.
+    """
+    def __init__(self, lb, ub, n_bins=10, *, n_fine_bins=1200):
+        """Initialization."""
+        if not (np.isfinite(lb) and np.isfinite(ub) and lb < ub):
+            raise ValueError("Edges must be finite and lower bound must be "
+                             "smaller than upper bound")
+        if n_fine_bins <= 0:
+            raise ValueError("n_fine_bins must be positive")
+
+        self._lb = lb
+        self._ub = ub
+        self._n_fine_bins = n_fine_bins
+        self._count = np.zeros(n_fine_bins, dtype=np.int64)
+        self._sum = np.zeros(n_fine_bins, dtype=np.float64)
+        # sum of squared deviations from the mean
+        self._m2 = np.zeros(n_fine_bins, dtype=np.float64)
+
+        self._n_bins = None
+        self.n_bins = n_bins
+
+    @property
+    def n_bins(self):
+        """Number of bins of the spectrum."""
+        return self._n_bins
+
+    @n_bins.setter
+    def n_bins(self, v):
+        if v <= 0:
+            raise ValueError(f"Number of bins must be positive: {v}")
+        self._n_bins = int(v)
+
+    def update(self, x, y):
+        """Accumulate new data.
+
+        :param array-like x: Values to be binned.
+        :param array-like y: Values of the spectrum, which has the same
+            shape as x.
+        """
+        mean, count, var, _ = binned_mean_count(
+            x, y, self._n_fine_bins, (self._lb, self._ub), return_var=True)
+        filled = count > 0
+        count = count[filled]
+        mean = mean[filled]
+
+        n_a = self._count[filled]
+        n = n_a + count
+        mean_a = np.divide(self._sum[filled], n_a,
+                           out=np.zeros(len(n_a)), where=n_a > 0)
+        # Chan's formula of combining the sums of squared deviations
+        self._m2[filled] += var[filled] * count \
+            + (mean - mean_a) ** 2 * n_a * count / n
+        self._sum[filled] += mean * count
+        self._count[filled] = n
+
+    def reset(self):
+        """Reset the accumulated statistics."""
+        self._count.fill(0)
+        self._sum.fill(0)
+        self._m2.fill(0)
+
+    def _rebin(self):
+        """Return the count, sum and sum of squared deviations of the
+        spectrum bins."""
+        n_bins, n_fine_bins = self._n_bins, self._n_fine_bins
+        # In units of 1 / (n_bins * n_fine_bins) of the range, the edges
+        # are integers and split the range into segments, each of which
+        # belongs to one spectrum bin and one fine bin.
+        points = np.union1d(np.arange(n_bins + 1) * n_fine_bins,
+                            np.arange(n_fine_bins + 1) * n_bins)
+        start = points[:-1]
+        idx = start // n_fine_bins
+        fine_idx = start // n_bins
+        frac = np.diff(points) / n_bins
+
+        count = self._count[fine_idx]
+        sum_ = self._sum[fine_idx]
+        total_count = np.bincount(idx, frac * count, minlength=n_bins)
+        total_sum = np.bincount(idx, frac * sum_, minlength=n_bins)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = total_sum / total_count
+            fine_mean = np.where(count > 0, sum_ / count, 0.)
+        total_m2 = np.bincount(
+            idx,
+            frac * (self._m2[fine_idx] + count * (fine_mean - mean[idx]) ** 2),
+            minlength=n_bins)
+        return total_count, total_sum, total_m2
+
+    def edges(self):
+        """Return the bin edges of the spectrum.
+
+        :rtype: numpy.ndarray
+        """
+        return np.linspace(self._lb, self._ub, self._n_bins + 1)
+
+    def centers(self):
+        """Return the bin centers of the spectrum.
+
+        :rtype: numpy.ndarray
+        """
+        edges = self.edges()
+        return (edges[1:] + edges[:-1]) / 2.
+
+    def var(self):
+        """Return the (population) variance of y in each bin.
+
+        It is NaN in empty bins.
+
+        :rtype: numpy.ndarray
+        """
+        count, _, m2 = self._rebin()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return m2 / count
+
+    def get(self, *, edge2center=True, nan_to_num=False):
+        """Return the spectrum.
+
+        :param bool edge2center: True for returning the bin centers
+            instead of the bin edges.
+        :param bool nan_to_num: True for replacing NaN in empty bins by 0.
+
+        :return: (mean, bin centers or edges, count), the same as
+            :func:`compute_spectrum_1d`.
+        :rtype: (numpy.array, numpy.array, numpy.array)
+        """
+        count, sum_, _ = self._rebin()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            stats = sum_ / count
+        counts = count.astype(np.float64)
+
+        if nan_to_num:
+            np.nan_to_num(stats, copy=False)
+
+        if edge2center:
+            return stats, self.centers(), counts
+        return stats, self.edges(), counts
@@ -15,6 +15,163 @@
 
 namespace py = pybind11;
 
+#define DECLARE_DTYPE_OVERLOAD(FUNCTOR) \
+  FUNCTOR(double)                       \
+  FUNCTOR(float)                        \
+  FUNCTOR(uint16_t)
+
+
+template<typename T>
+void declareImageStatsAccumulator(py::module& m)
+{
+  using Accumulator = foam::ImageStatsAccumulator<T>;
+
+  std::string py_class_name = "ImageStatsAccumulator";
+  py::class_<Accumulator> cls(m, py_class_name.c_str());
+
+  cls.def(py::init<size_t, size_t, size_t>(),
+          py::arg("ny"), py::arg("nx"), py::arg("n_cells") = 1);
+
+#define IMAGE_STATS_ACCUMULATOR_UPDATE(DTYPE)                                                         \
+  cls.def("update", (void (Accumulator::*)(const xt::pytensor<DTYPE, 2>&))                            \
+     &Accumulator::template update<xt::pytensor<DTYPE, 2>>,                                           \
+     py::arg("src").noconvert());                                                                     \
+  cls.def("update", (void (Accumulator::*)(const xt::pytensor<DTYPE, 3>&))                            \
+     &Accumulator::template update<xt::pytensor<DTYPE, 3>>,                                           \
+     py::arg("src").noconvert());                                                                     \
+  cls.def("update", (void (Accumulator::*)(const xt::pytensor<DTYPE, 3>&, const std::vector<size_t>&)) \
+     &Accumulator::template update<xt::pytensor<DTYPE, 3>>,                                           \
+     py::arg("src").noconvert(), py::arg("cells"));
+
+  DECLARE_DTYPE_OVERLOAD(IMAGE_STATS_ACCUMULATOR_UPDATE)
+
+  cls.def("merge", &Accumulator::merge, py::arg("other"));
+  cls.def("reset", &Accumulator::reset);
+  cls.def("count", &Accumulator::count);
+  cls.def("mean", &Accumulator::mean);
+  cls.def("variance", &Accumulator::variance, py::arg("ddof") = 0);
+  cls.def("std", &Accumulator::std, py::arg("ddof") = 0);
+}
+
+template<typename T>
+void declarePixelCorrelationAccumulator(py::module& m)
+{
+  using Accumulator = foam::PixelCorrelationAccumulator<T>;
+
+  std::string py_class_name = "PixelCorrelationAccumulator";
+  py::class_<Accumulator> cls(m, py_class_name.c_str());
+
+  cls.def(py::init<size_t, size_t>(), py::arg("ny"), py::arg("nx"));
+
+#define PIXEL_CORRELATION_ACCUMULATOR_UPDATE(DTYPE)                                                   \
+  cls.def("update", (void (Accumulator::*)(const xt::pytensor<DTYPE, 2>&, T))                         \
+     &Accumulator::template update<xt::pytensor<DTYPE, 2>>,                                           \
+     py::arg("src").noconvert(), py::arg("scalar"));                                                  \
+  cls.def("update", (void (Accumulator::*)(const xt::pytensor<DTYPE, 3>&, const std::vector<T>&))     \
+     &Accumulator::template update<xt::pytensor<DTYPE, 3>>,                                           \
+     py::arg("src").noconvert(), py::arg("scalars"));
+
+  DECLARE_DTYPE_OVERLOAD(PIXEL_CORRELATION_ACCUMULATOR_UPDATE)
+
+  cls.def("merge", &Accumulator::merge, py::arg("other"));
+  cls.def("reset", &Accumulator::reset);
+  cls.def("count", &Accumulator::count);
+  cls.def("covariance", &Accumulator::covariance, py::arg("ddof") = 0);
+  cls.def("correlation", &Accumulator::correlation);
+}
+
+template<typename T>
+void declareMovingAverageImageData(py::module& m)
+{
+  using MovingAverage = foam::MovingAverageImageData<T>;
+
+  std::string py_class_name = "MovingAverageImageData";
+  py::class_<MovingAverage> cls(m, py_class_name.c_str());
+
+  cls.def(py::init<size_t>(), py::arg("window"));
+
+#define MOVING_AVERAGE_IMAGE_DATA_UPDATE(N_DIM)                                                       \
+  cls.def("update", (void (MovingAverage::*)(const xt::pytensor<T, N_DIM>&, xt::pytensor<T, N_DIM>&)) \
+     &MovingAverage::template update<xt::pytensor<T, N_DIM>, xt::pytensor<T, N_DIM>>,                 \
+     py::arg("src").noconvert(), py::arg("out").noconvert());                                         \
+  cls.def("average", (void (MovingAverage::*)(xt::pytensor<T, N_DIM>&) const)                        \
+     &MovingAverage::template average<xt::pytensor<T, N_DIM>>,                                        \
+     py::arg("out").noconvert());
+
+  MOVING_AVERAGE_IMAGE_DATA_UPDATE(2)
+  MOVING_AVERAGE_IMAGE_DATA_UPDATE(3)
+
+  cls.def("setWindow", &MovingAverage::setWindow, py::arg("window"));
+  cls.def("reset", &MovingAverage::reset);
+  cls.def("count", &MovingAverage::count);
+  cls.def("window", &MovingAverage::window);
+}
+
+template<typename T>
+void declarePeakFinder(py::module& m)
+{
+  using Finder = foam::PeakFinder<T>;
+  using Peaks = typename Finder::peaks_type;
+  using Counts = typename Finder::counts_type;
+
+  std::string py_class_name = "PeakFinder";
+  py::class_<Finder> cls(m, py_class_name.c_str(),
+    "Find peaks, e.g. Bragg spots, in an image or an array of images.\n\n"
+    "Each peak is a row of (y, x, intensity, number of pixels, SNR). The pixels of\n"
+    "a peak are above the local threshold and connected to the local maximum.\n\n"
+    "At most 'max_peaks' peaks are returned for each image. For an array of images,\n"
+    "find returns (peaks, counts), where counts are the numbers of peaks found. A\n"
+    "count larger than 'max_peaks' indicates that the peaks of the image are truncated.");
+
+  cls.def(py::init<T, T, size_t, size_t, size_t, size_t>(),
+          py::arg("adc_threshold"), py::arg("min_snr"), py::arg("min_pixels") = 2,
+          py::arg("max_pixels") = 50, py::arg("local_bg_radius") = 3, py::arg("max_peaks") = 2048);
+
+#define PEAK_FINDER_FIND(DTYPE)                                                                       \
+  cls.def("find", (Peaks (Finder::*)(const xt::pytensor<DTYPE, 2>&) const)                            \
+     &Finder::template find<xt::pytensor<DTYPE, 2>>,                                                  \
+     py::arg("src").noconvert());                                                                     \
+  cls.def("find", (Peaks (Finder::*)(const xt::pytensor<DTYPE, 2>&, const xt::pytensor<bool, 2>&) const) \
+     &Finder::template find<xt::pytensor<DTYPE, 2>, xt::pytensor<bool, 2>>,                           \
+     py::arg("src").noconvert(), py::arg("mask").noconvert());                                        \
+  cls.def("find", (std::pair<Peaks, Counts> (Finder::*)(const xt::pytensor<DTYPE, 3>&) const)         \
+     &Finder::template find<xt::pytensor<DTYPE, 3>>,                                                  \
+     py::arg("src").noconvert());                                                                     \
+  cls.def("find", (std::pair<Peaks, Counts> (Finder::*)(const xt::pytensor<DTYPE, 3>&,                \
+                                                        const xt::pytensor<bool, 2>&) const)          \
+     &Finder::template find<xt::pytensor<DTYPE, 3>, xt::pytensor<bool, 2>>,                           \
+     py::arg("src").noconvert(), py::arg("mask").noconvert());
+
+  PEAK_FINDER_FIND(float)
+  PEAK_FINDER_FIND(double)
+}
+
+
+template<typename T>
+void declareClusterFinder(py::module& m)
+{
+  using Finder = foam::ClusterFinder<T>;
+  using Clusters = typename Finder::clusters_type;
+  using Counts = typename Finder::counts_type;
+
+  std::string py_class_name = "ClusterFinder";
+  py::class_<Finder> cls(m, py_class_name.c_str());
+
+  cls.def(py::init<T, size_t, size_t>(),
+          py::arg("threshold"), py::arg("connectivity") = 8, py::arg("min_pixels") = 1);
+
+#define CLUSTER_FINDER_FIND(DTYPE)                                                                    \
+  cls.def("find", (Clusters (Finder::*)(const xt::pytensor<DTYPE, 2>&) const)                         \
+     &Finder::template find<xt::pytensor<DTYPE, 2>>,                                                  \
+     py::arg("src").noconvert());                                                                     \
+  cls.def("find", (std::pair<Clusters, Counts> (Finder::*)(const xt::pytensor<DTYPE, 3>&) const)      \
+     &Finder::template find<xt::pytensor<DTYPE, 3>>,                                                  \
+     py::arg("src").noconvert());
+
+  CLUSTER_FINDER_FIND(float)
+  CLUSTER_FINDER_FIND(double)
+}
+
 
 PYBIND11_MODULE(imageproc, m)
 {
@@ -39,14 +196,67 @@ PYBIND11_MODULE(imageproc, m)
     { return nanmeanImageArray(src1, src2); },                                                  \
     py::arg("src1").noconvert(), py::arg("src2").noconvert());
 
+#define FOAM_NANMEAN_IMAGE_ARRAY_WITH_OUT_IMPL(VALUE_TYPE)                                      \
+  m.def("nanmeanImageArray",                                                                    \
+    [] (const xt::pytensor<VALUE_TYPE, 3>& src, xt::pytensor<VALUE_TYPE, 2>& out)               \
+    { nanmeanImageArray(src, out); }, py::arg("src").noconvert(), py::arg("out").noconvert());  \
+  m.def("nanmeanImageArray",                                                                    \
+    [] (const xt::pytensor<VALUE_TYPE, 3>& src, const std::vector<size_t>& keep,                \
+        xt::pytensor<VALUE_TYPE, 2>& out)                                                       \
+    { nanmeanImageArray(src, keep, out); },                                                     \
+    py::arg("src").noconvert(), py::arg("keep"), py::arg("out").noconvert());                   \
+  m.def("nanmeanImageArray",                                                                    \
+    [] (const xt::pytensor<VALUE_TYPE, 2>& src1, const xt::pytensor<VALUE_TYPE, 2>& src2,       \
+        xt::pytensor<VALUE_TYPE, 2>& out)                                                       \
+    { nanmeanImageArray(src1, src2, out); },                                                    \
+    py::arg("src1").noconvert(), py::arg("src2").noconvert(), py::arg("out").noconvert());
+
   FOAM_NANMEAN_IMAGE_ARRAY_IMPL(float)
   FOAM_NANMEAN_IMAGE_ARRAY_WITH_FILTER_IMPL(float)
   FOAM_NANMEAN_IMAGE_ARRAY_BINARY_IMPL(float)
+  FOAM_NANMEAN_IMAGE_ARRAY_WITH_OUT_IMPL(float)
 
   // It is also used in nanmean so that we need the binding for double
   FOAM_NANMEAN_IMAGE_ARRAY_IMPL(double)
   FOAM_NANMEAN_IMAGE_ARRAY_WITH_FILTER_IMPL(double)
   FOAM_NANMEAN_IMAGE_ARRAY_BINARY_IMPL(double)
+  FOAM_NANMEAN_IMAGE_ARRAY_WITH_OUT_IMPL(double)
+
+#define FOAM_GROUPED_NANMEAN_IMAGE_ARRAY_IMPL(VALUE_TYPE)                                       \
+  m.def("groupedNanmeanImageArray",                                                             \
+    [] (const xt::pytensor<VALUE_TYPE, 3>& src, const std::vector<int>& labels,                 \
+        xt::pytensor<VALUE_TYPE, 3>& out)                                                       \
+    { groupedNanmeanImageArray(src, labels, out); },                                            \
+    py::arg("src").noconvert(), py::arg("labels"), py::arg("out").noconvert());
+
+  FOAM_GROUPED_NANMEAN_IMAGE_ARRAY_IMPL(float)
+  FOAM_GROUPED_NANMEAN_IMAGE_ARRAY_IMPL(double)
+
+#define FOAM_NAN_REDUCE_IMAGE_ARRAY_IMPL(FUNCTOR, VALUE_TYPE)                                   \
+  m.def(#FUNCTOR, [] (const xt::pytensor<VALUE_TYPE, 3>& src)                                   \
+    { return FUNCTOR(src); }, py::arg("src").noconvert());                                      \
+  m.def(#FUNCTOR,                                                                               \
+    [] (const xt::pytensor<VALUE_TYPE, 3>& src, const std::vector<size_t>& keep)                \
+    { return FUNCTOR(src, keep); }, py::arg("src").noconvert(), py::arg("keep"));
+
+  FOAM_NAN_REDUCE_IMAGE_ARRAY_IMPL(nanmedianImageArray, float)
+  FOAM_NAN_REDUCE_IMAGE_ARRAY_IMPL(nanmedianImageArray, double)
+  FOAM_NAN_REDUCE_IMAGE_ARRAY_IMPL(nanstdImageArray, float)
+  FOAM_NAN_REDUCE_IMAGE_ARRAY_IMPL(nanstdImageArray, double)
+
+#define FOAM_SIGMA_CLIPPED_NANMEAN_IMAGE_ARRAY_IMPL(VALUE_TYPE)                                       \
+  m.def("sigmaClippedNanmeanImageArray",                                                              \
+    [] (const xt::pytensor<VALUE_TYPE, 3>& src, VALUE_TYPE sigma, size_t max_iter)                    \
+    { return sigmaClippedNanmeanImageArray(src, sigma, max_iter); },                                  \
+    py::arg("src").noconvert(), py::arg("sigma"), py::arg("max_iter"));                               \
+  m.def("sigmaClippedNanmeanImageArray",                                                              \
+    [] (const xt::pytensor<VALUE_TYPE, 3>& src, const std::vector<size_t>& keep,                      \
+        VALUE_TYPE sigma, size_t max_iter)                                                            \
+    { return sigmaClippedNanmeanImageArray(src, keep, sigma, max_iter); },                            \
+    py::arg("src").noconvert(), py::arg("keep"), py::arg("sigma"), py::arg("max_iter"));
+
+  FOAM_SIGMA_CLIPPED_NANMEAN_IMAGE_ARRAY_IMPL(float)
+  FOAM_SIGMA_CLIPPED_NANMEAN_IMAGE_ARRAY_IMPL(double)
 
 #define FOAM_MOVING_AVG_IMAGE_DATA_IMPL(VALUE_TYPE, N_DIM)                                     \
   m.def("movingAvgImageData",                                                                  \
@@ -56,6 +266,8 @@ PYBIND11_MODULE(imageproc, m)
   FOAM_MOVING_AVG_IMAGE_DATA_IMPL(float, 2)
   FOAM_MOVING_AVG_IMAGE_DATA_IMPL(float, 3)
 
+  declareMovingAverageImageData<float>(m);
+
   //
   // mask
   //
@@ -153,6 +365,157 @@ PYBIND11_MODULE(imageproc, m)
   FOAM_MASK_IMAGE_DATA_BOTH_WITH_OUT(maskImageDataZero)
   FOAM_MASK_IMAGE_DATA_BOTH_WITH_OUT(maskImageDataNan)
 
+  //
+  // bad pixel
+  //
+
+  py::enum_<BadPixel>(m, "BadPixel", py::arithmetic())
+    .value("NaN", BadPixel::NAN_VALUE)
+    .value("Cold", BadPixel::COLD)
+    .value("Hot", BadPixel::HOT)
+    .value("Dead", BadPixel::DEAD)
+    .value("Noisy", BadPixel::NOISY);
+
+#define FOAM_COMPUTE_BAD_PIXEL_MASK_IMPL(VALUE_TYPE, OUT_TYPE)                                          \
+  m.def("computeBadPixelMask",                                                                          \
+    [] (const xt::pytensor<VALUE_TYPE, 2>& mean, const xt::pytensor<VALUE_TYPE, 2>& stdev,              \
+        VALUE_TYPE mean_lb, VALUE_TYPE mean_ub, VALUE_TYPE std_lb, VALUE_TYPE std_ub,                   \
+        xt::pytensor<OUT_TYPE, 2>& out)                                                                 \
+    { computeBadPixelMask(mean, stdev, mean_lb, mean_ub, std_lb, std_ub, out); },                       \
+    py::arg("mean").noconvert(), py::arg("std").noconvert(),                                            \
+    py::arg("mean_lb"), py::arg("mean_ub"), py::arg("std_lb"), py::arg("std_ub"),                       \
+    py::arg("out").noconvert());                                                                        \
+  m.def("computeBadPixelMask",                                                                          \
+    [] (const xt::pytensor<VALUE_TYPE, 3>& mean, const xt::pytensor<VALUE_TYPE, 3>& stdev,              \
+        const std::vector<VALUE_TYPE>& mean_lb, const std::vector<VALUE_TYPE>& mean_ub,                \
+        const std::vector<VALUE_TYPE>& std_lb, const std::vector<VALUE_TYPE>& std_ub,                  \
+        xt::pytensor<OUT_TYPE, 3>& out)                                                                 \
+    { computeBadPixelMask(mean, stdev, mean_lb, mean_ub, std_lb, std_ub, out); },                       \
+    py::arg("mean").noconvert(), py::arg("std").noconvert(),                                            \
+    py::arg("mean_lb"), py::arg("mean_ub"), py::arg("std_lb"), py::arg("std_ub"),                       \
+    py::arg("out").noconvert());
+
+  FOAM_COMPUTE_BAD_PIXEL_MASK_IMPL(float, uint8_t)
+  FOAM_COMPUTE_BAD_PIXEL_MASK_IMPL(float, bool)
+  FOAM_COMPUTE_BAD_PIXEL_MASK_IMPL(double, uint8_t)
+  FOAM_COMPUTE_BAD_PIXEL_MASK_IMPL(double, bool)
+
+  //
+  // photonization
+  //
+
+#define FOAM_PHOTONIZE_IMPL(VALUE_TYPE, OUT_TYPE, N_DIM)                                      \
+  m.def("photonize",                                                                          \
+    [] (const xt::pytensor<VALUE_TYPE, N_DIM>& src, double adu_per_photon, double threshold,  \
+        xt::pytensor<OUT_TYPE, N_DIM>& out)                                                   \
+    { photonize(src, adu_per_photon, threshold, out); },                                      \
+    py::arg("src").noconvert(), py::arg("adu_per_photon"), py::arg("threshold"),              \
+    py::arg("out").noconvert());
+
+#define FOAM_PHOTONIZE(VALUE_TYPE)                                                            \
+  FOAM_PHOTONIZE_IMPL(VALUE_TYPE, uint8_t, 2)                                                 \
+  FOAM_PHOTONIZE_IMPL(VALUE_TYPE, uint8_t, 3)                                                 \
+  FOAM_PHOTONIZE_IMPL(VALUE_TYPE, uint16_t, 2)                                                \
+  FOAM_PHOTONIZE_IMPL(VALUE_TYPE, uint16_t, 3)
+
+  FOAM_PHOTONIZE(float)
+  FOAM_PHOTONIZE(uint16_t)
+
+  //
+  // ROI statistics
+  //
+
+  py::enum_<RoiStat>(m, "RoiStat", py::arithmetic())
+    .value("Sum", RoiStat::SUM)
+    .value("NanSum", RoiStat::NANSUM)
+    .value("Mean", RoiStat::MEAN)
+    .value("NanMean", RoiStat::NANMEAN)
+    .value("Min", RoiStat::MIN)
+    .value("NanMin", RoiStat::NANMIN)
+    .value("Max", RoiStat::MAX)
+    .value("NanMax", RoiStat::NANMAX);
+
+#define FOAM_ROI_STATISTICS_IMPL(VALUE_TYPE, N_DIM)                                           \
+  m.def("roiStatistics",                                                                      \
+    [] (const xt::pytensor<VALUE_TYPE, N_DIM>& src,                                           \
+        const std::vector<std::array<int, 4>>& rois,                                          \
+        const std::vector<RoiStat>& stats,                                                    \
+        xt::pytensor<double, N_DIM>& out)                                                     \
+    { roiStatistics(src, rois, stats, out); },                                                \
+    py::arg("src").noconvert(), py::arg("rois"), py::arg("stats"),                            \
+    py::arg("out").noconvert());
+
+  FOAM_ROI_STATISTICS_IMPL(float, 2)
+  FOAM_ROI_STATISTICS_IMPL(float, 3)
+  FOAM_ROI_STATISTICS_IMPL(double, 2)
+  FOAM_ROI_STATISTICS_IMPL(double, 3)
+
+#define FOAM_ROI_PROJECTION_IMPL(VALUE_TYPE)                                                  \
+  m.def("roiProjection",                                                                      \
+    [] (const xt::pytensor<VALUE_TYPE, 3>& src,                                               \
+        const std::vector<std::array<int, 4>>& rois,                                          \
+        int axis, bool average,                                                               \
+        xt::pytensor<VALUE_TYPE, 2>& out)                                                     \
+    { roiProjection(src, rois, axis, average, out); },                                        \
+    py::arg("src").noconvert(), py::arg("rois"), py::arg("axis"), py::arg("average"),         \
+    py::arg("out").noconvert());
+
+  FOAM_ROI_PROJECTION_IMPL(float)
+  FOAM_ROI_PROJECTION_IMPL(double)
+
+  //
+  // image moments
+  //
+
+#define FOAM_IMAGE_MOMENTS_IMPL(VALUE_TYPE, N_DIM)                                            \
+  m.def("imageMoments",                                                                       \
+    [] (const xt::pytensor<VALUE_TYPE, N_DIM>& src, const std::array<int, 4>& roi,            \
+        xt::pytensor<double, N_DIM - 1>& out)                                                 \
+    { imageMoments(src, roi, out); },                                                         \
+    py::arg("src").noconvert(), py::arg("roi"), py::arg("out").noconvert());                  \
+  m.def("imageMoments",                                                                       \
+    [] (const xt::pytensor<VALUE_TYPE, N_DIM>& src, const xt::pytensor<bool, 2>& mask,        \
+        const std::array<int, 4>& roi, xt::pytensor<double, N_DIM - 1>& out)                  \
+    { imageMoments(src, mask, roi, out); },                                                   \
+    py::arg("src").noconvert(), py::arg("mask").noconvert(), py::arg("roi"),                  \
+    py::arg("out").noconvert());
+
+  FOAM_IMAGE_MOMENTS_IMPL(float, 2)
+  FOAM_IMAGE_MOMENTS_IMPL(float, 3)
+  FOAM_IMAGE_MOMENTS_IMPL(double, 2)
+  FOAM_IMAGE_MOMENTS_IMPL(double, 3)
+
+  //
+  // binning / up-sampling
+  //
+
+#define FOAM_BIN_IMAGE_DATA_IMPL(VALUE_TYPE, N_DIM)                                           \
+  m.def("binImageData",                                                                       \
+    [] (const xt::pytensor<VALUE_TYPE, N_DIM>& src, size_t factor, bool average,              \
+        xt::pytensor<VALUE_TYPE, N_DIM>& out)                                                 \
+    { binImageData(src, factor, average, out); },                                             \
+    py::arg("src").noconvert(), py::arg("factor"), py::arg("average"),                        \
+    py::arg("out").noconvert());
+
+  FOAM_BIN_IMAGE_DATA_IMPL(float, 2)
+  FOAM_BIN_IMAGE_DATA_IMPL(float, 3)
+  FOAM_BIN_IMAGE_DATA_IMPL(double, 2)
+  FOAM_BIN_IMAGE_DATA_IMPL(double, 3)
+
+#define FOAM_UPSAMPLE_IMAGE_DATA_IMPL(VALUE_TYPE, OUT_TYPE, N_DIM)                            \
+  m.def("upsampleImageData",                                                                  \
+    [] (const xt::pytensor<VALUE_TYPE, N_DIM>& src, size_t factor,                            \
+        xt::pytensor<OUT_TYPE, N_DIM>& out)                                                   \
+    { upsampleImageData(src, factor, out); },                                                 \
+    py::arg("src").noconvert(), py::arg("factor"), py::arg("out").noconvert());
+
+  FOAM_UPSAMPLE_IMAGE_DATA_IMPL(float, float, 2)
+  FOAM_UPSAMPLE_IMAGE_DATA_IMPL(float, float, 3)
+  FOAM_UPSAMPLE_IMAGE_DATA_IMPL(float, double, 2)
+  FOAM_UPSAMPLE_IMAGE_DATA_IMPL(float, double, 3)
+  FOAM_UPSAMPLE_IMAGE_DATA_IMPL(double, double, 2)
+  FOAM_UPSAMPLE_IMAGE_DATA_IMPL(double, double, 3)
+
   //
   // gain / offset correction
   //
@@ -200,4 +563,23 @@ PYBIND11_MODULE(imageproc, m)
 
   FOAM_CORRECT_GAIN_AND_OFFSET_IMPL(float, 2)
   FOAM_CORRECT_GAIN_AND_OFFSET_IMPL(float, 3)
+
+  //
+  // accumulator
+  //
+
+  declareImageStatsAccumulator<double>(m);
+  declarePixelCorrelationAccumulator<double>(m);
+
+  //
+  // peak finding
+  //
+
+  declarePeakFinder<float>(m);
+
+  //
+  // cluster finding
+  //
+
+  declareClusterFinder<double>(m);
 }
@@ -5,9 +5,12 @@
  *
  * Author: Jun Zhu
  */
+#include <cstdint>
+#include <optional>
 #include <vector>
 
 #include "pybind11/pybind11.h"
+#include "pybind11/numpy.h"
 #include "pybind11/stl.h"
 
 #include "foamalgo/statistics.hpp"
@@ -16,6 +19,109 @@
 namespace py = pybind11;
 
 
+/**
+ * Allocate the output of reducing an array along the given axes.
+ */
+template<typename T, typename E>
+xt::pyarray<T> emptyReduced(const E& src, const std::vector<int>& axis)
+{
+  return xt::pyarray<T>::from_shape(foam::detail::AxesReduction(src, axis).shape());
+}
+
+/**
+ * Value type of the result of reducing an integer array.
+ */
+template<foam::IntegerReduction op, typename T>
+using integer_reduced_t = decltype(foam::detail::IntegerStats<T, op>().result());
+
+
+template<typename T>
+void declareStreamingHistogram(py::module& m)
+{
+  using Histogram = foam::StreamingHistogram<T>;
+
+  std::string py_class_name = "StreamingHistogram";
+  py::class_<Histogram> cls(m, py_class_name.c_str());
+
+  cls.def(py::init<size_t, T, T, bool>(),
+          py::arg("n_bins"), py::arg("lb"), py::arg("ub"), py::arg("log") = false);
+
+#define STREAMING_HISTOGRAM_FILL(DTYPE)                                                               \
+  cls.def("fill", (void (Histogram::*)(const xt::pytensor<DTYPE, 1>&))                                \
+     &Histogram::template fill<xt::pytensor<DTYPE, 1>>,                                               \
+     py::arg("src").noconvert());                                                                     \
+  cls.def("fill", (void (Histogram::*)(const xt::pytensor<DTYPE, 1>&, const xt::pytensor<T, 1>&))     \
+     &Histogram::template fill<xt::pytensor<DTYPE, 1>, xt::pytensor<T, 1>>,                           \
+     py::arg("src").noconvert(), py::arg("weights").noconvert());
+
+  STREAMING_HISTOGRAM_FILL(uint16_t)
+  STREAMING_HISTOGRAM_FILL(int16_t)
+  STREAMING_HISTOGRAM_FILL(int)
+  STREAMING_HISTOGRAM_FILL(unsigned int)
+  STREAMING_HISTOGRAM_FILL(long long)
+  STREAMING_HISTOGRAM_FILL(unsigned long long)
+  STREAMING_HISTOGRAM_FILL(float)
+  STREAMING_HISTOGRAM_FILL(double)
+
+  cls.def("merge", &Histogram::merge, py::arg("other"),
+    "Merge the counts accumulated by another histogram with the same edges.");
+  cls.def("reset", &Histogram::reset, "Reset the counts.");
+  // a read-only view of the counts which keeps the histogram alive
+  cls.def("counts", [] (py::object self)
+  {
+    const auto& counts = self.cast<const Histogram&>().counts();
+    py::array_t<T> view(counts.shape(), counts.data(), self);
+    py::detail::array_proxy(view.ptr())->flags &= ~py::detail::npy_api::NPY_ARRAY_WRITEABLE_;
+    return view;
+  },
+    "Return the (weighted) counts.\n\n"
+    "It is a read-only view of the internal buffer, which changes when the\n"
+    "histogram is filled, merged or reset.");
+  cls.def("edges", &Histogram::edges, "Return the bin edges.");
+  cls.def("centers", &Histogram::centers,
+    "Return the bin centers, which are geometric means of the edges for\n"
+    "logarithmically spaced bins.");
+}
+
+
+template<typename T>
+void declareQuantileSketch(py::module& m)
+{
+  using Sketch = foam::QuantileSketch<T>;
+
+  std::string py_class_name = "QuantileSketch";
+  py::class_<Sketch> cls(m, py_class_name.c_str());
+
+  cls.def(py::init([] (size_t k, std::optional<unsigned int> seed)
+  {
+    return seed ? Sketch(k, *seed) : Sketch(k);
+  }), py::arg("k") = 200, py::arg("seed") = py::none());
+
+#define QUANTILE_SKETCH_UPDATE(DTYPE)                                                                 \
+  cls.def("update", &Sketch::template update<xt::pytensor<DTYPE, 1>>, py::arg("src").noconvert());
+
+  QUANTILE_SKETCH_UPDATE(uint16_t)
+  QUANTILE_SKETCH_UPDATE(int16_t)
+  QUANTILE_SKETCH_UPDATE(int)
+  QUANTILE_SKETCH_UPDATE(unsigned int)
+  QUANTILE_SKETCH_UPDATE(long long)
+  QUANTILE_SKETCH_UPDATE(unsigned long long)
+  QUANTILE_SKETCH_UPDATE(float)
+  QUANTILE_SKETCH_UPDATE(double)
+
+  cls.def("merge", &Sketch::merge, py::arg("other"), "Merge the values summarized by another sketch.");
+  cls.def("reset", &Sketch::reset, "Remove all the values.");
+  cls.def("quantile", &Sketch::quantile, py::arg("q"));
+  cls.def("quantiles", &Sketch::quantiles, py::arg("qs"),
+    "Return the estimated quantiles of a sequence of quantiles.\n\n"
+    "The retained values are sorted once for all the quantiles.");
+  cls.def("count", &Sketch::count, "Return the number of values added to the sketch.");
+  cls.def("size", &Sketch::size);
+  cls.def("k", &Sketch::k);
+  cls.def("min", &Sketch::min, "Return the minimum value, which is NaN if there is no value.");
+  cls.def("max", &Sketch::max, "Return the maximum value, which is NaN if there is no value.");
+}
+
 PYBIND11_MODULE(statistics, m)
 {
 
@@ -37,7 +143,17 @@ PYBIND11_MODULE(statistics, m)
   m.def(#REDUCER, [] (const xt::pytensor<VALUE_TYPE, N_DIM>& src)                                 \
   {                                                                                               \
     return xt::eval(xt::REDUCER<VALUE_TYPE>(src))[0];                                             \
-  }, py::arg("src").noconvert());
+  }, py::arg("src").noconvert());                                                                \
+  m.def(#REDUCER, [] (const xt::pytensor<VALUE_TYPE, N_DIM>& src, const std::vector<int>& axis,   \
+                      xt::pyarray<VALUE_TYPE>& out)                                               \
+  {                                                                                               \
+    reduceInto(xt::REDUCER<VALUE_TYPE>(src, axis), out);                                          \
+  }, py::arg("src").noconvert(), py::arg("axis"), py::arg("out").noconvert());                    \
+  m.def(#REDUCER, [] (const xt::pytensor<VALUE_TYPE, N_DIM>& src, int axis,                       \
+                      xt::pyarray<VALUE_TYPE>& out)                                               \
+  {                                                                                               \
+    reduceInto(xt::REDUCER<VALUE_TYPE>(src, {axis}), out);                                        \
+  }, py::arg("src").noconvert(), py::arg("axis"), py::arg("out").noconvert());
 
 #define FOAM_NAN_REDUCER_ALL_DIMENSIONS(FUNCTOR, VALUE_TYPE)                                   \
   FOAM_NAN_REDUCER_IMP(FUNCTOR, VALUE_TYPE, 1)                                                 \
@@ -57,15 +173,190 @@ PYBIND11_MODULE(statistics, m)
   FOAM_NAN_REDUCER(nanmin)
   FOAM_NAN_REDUCER(nanmax)
 
+#define FOAM_INTEGER_REDUCER_IMP(REDUCER, OP, VALUE_TYPE, N_DIM)                                  \
+  m.def(#REDUCER, [] (const xt::pytensor<VALUE_TYPE, N_DIM>& src, const std::vector<int>& axis)   \
+  {                                                                                               \
+    auto out = emptyReduced<integer_reduced_t<OP, VALUE_TYPE>>(src, axis);                        \
+    integerReduce<OP>(src, axis, out);                                                            \
+    return out;                                                                                   \
+  }, py::arg("src").noconvert(), py::arg("axis"));                                                \
+  m.def(#REDUCER, [] (const xt::pytensor<VALUE_TYPE, N_DIM>& src, int axis)                       \
+  {                                                                                               \
+    auto out = emptyReduced<integer_reduced_t<OP, VALUE_TYPE>>(src, {axis});                      \
+    integerReduce<OP>(src, {axis}, out);                                                          \
+    return out;                                                                                   \
+  }, py::arg("src").noconvert(), py::arg("axis"));                                                \
+  m.def(#REDUCER, [] (const xt::pytensor<VALUE_TYPE, N_DIM>& src)                                 \
+  {                                                                                               \
+    return integerReduce<OP>(src);                                                                \
+  }, py::arg("src").noconvert());                                                                \
+  m.def(#REDUCER, [] (const xt::pytensor<VALUE_TYPE, N_DIM>& src, const std::vector<int>& axis,   \
+                      xt::pyarray<integer_reduced_t<OP, VALUE_TYPE>>& out)                        \
+  {                                                                                               \
+    integerReduce<OP>(src, axis, out);                                                            \
+  }, py::arg("src").noconvert(), py::arg("axis"), py::arg("out").noconvert());                    \
+  m.def(#REDUCER, [] (const xt::pytensor<VALUE_TYPE, N_DIM>& src, int axis,                       \
+                      xt::pyarray<integer_reduced_t<OP, VALUE_TYPE>>& out)                        \
+  {                                                                                               \
+    integerReduce<OP>(src, {axis}, out);                                                          \
+  }, py::arg("src").noconvert(), py::arg("axis"), py::arg("out").noconvert());
+
+#define FOAM_INTEGER_REDUCER_ALL_DIMENSIONS(REDUCER, OP, VALUE_TYPE)                           \
+  FOAM_INTEGER_REDUCER_IMP(REDUCER, OP, VALUE_TYPE, 1)                                         \
+  FOAM_INTEGER_REDUCER_IMP(REDUCER, OP, VALUE_TYPE, 2)                                         \
+  FOAM_INTEGER_REDUCER_IMP(REDUCER, OP, VALUE_TYPE, 3)                                         \
+  FOAM_INTEGER_REDUCER_IMP(REDUCER, OP, VALUE_TYPE, 4)                                         \
+  FOAM_INTEGER_REDUCER_IMP(REDUCER, OP, VALUE_TYPE, 5)
+
+#define FOAM_INTEGER_REDUCER(REDUCER, OP)                                                      \
+  FOAM_INTEGER_REDUCER_ALL_DIMENSIONS(REDUCER, OP, int16_t)                                    \
+  FOAM_INTEGER_REDUCER_ALL_DIMENSIONS(REDUCER, OP, uint16_t)                                   \
+  FOAM_INTEGER_REDUCER_ALL_DIMENSIONS(REDUCER, OP, int32_t)                                    \
+  FOAM_INTEGER_REDUCER_ALL_DIMENSIONS(REDUCER, OP, uint32_t)
+
+  // NaN is irrelevant to integer arrays
+  FOAM_INTEGER_REDUCER(nansum, IntegerReduction::SUM)
+  FOAM_INTEGER_REDUCER(nanmean, IntegerReduction::MEAN)
+  FOAM_INTEGER_REDUCER(nanstd, IntegerReduction::STD)
+  FOAM_INTEGER_REDUCER(nanvar, IntegerReduction::VAR)
+  FOAM_INTEGER_REDUCER(nanmin, IntegerReduction::MIN)
+  FOAM_INTEGER_REDUCER(nanmax, IntegerReduction::MAX)
+
+
+  py::enum_<QuantileMethod>(m, "QuantileMethod", py::arithmetic())
+    .value("Linear", QuantileMethod::LINEAR)
+    .value("Nearest", QuantileMethod::NEAREST);
+
+#define FOAM_NAN_QUANTILE_IMP(VALUE_TYPE, N_DIM)                                                    \
+  m.def("nanquantile", [] (const xt::pytensor<VALUE_TYPE, N_DIM>& src, double q,                    \
+                           const std::vector<int>& axis, QuantileMethod method)                     \
+  {                                                                                                 \
+    auto out = emptyReduced<VALUE_TYPE>(src, axis);                                                 \
+    nanquantile(src, q, axis, out, method);                                                         \
+    return out;                                                                                     \
+  }, py::arg("src").noconvert(), py::arg("q"), py::arg("axis"),                                     \
+     py::arg("method") = QuantileMethod::LINEAR);                                                   \
+  m.def("nanquantile", [] (const xt::pytensor<VALUE_TYPE, N_DIM>& src, double q,                    \
+                           QuantileMethod method)                                                   \
+  {                                                                                                 \
+    return nanquantile(src, q, method);                                                             \
+  }, py::arg("src").noconvert(), py::arg("q"), py::arg("method") = QuantileMethod::LINEAR);         \
+  m.def("nanquantile", [] (const xt::pytensor<VALUE_TYPE, N_DIM>& src, double q,                    \
+                           const std::vector<int>& axis, xt::pyarray<VALUE_TYPE>& out,              \
+                           QuantileMethod method)                                                   \
+  {                                                                                                 \
+    nanquantile(src, q, axis, out, method);                                                         \
+  }, py::arg("src").noconvert(), py::arg("q"), py::arg("axis"), py::arg("out").noconvert(),         \
+     py::arg("method") = QuantileMethod::LINEAR);                                                   \
+  m.def("nanmedian", [] (const xt::pytensor<VALUE_TYPE, N_DIM>& src, const std::vector<int>& axis)  \
+  {                                                                                                 \
+    auto out = emptyReduced<VALUE_TYPE>(src, axis);                                                 \
+    nanmedian(src, axis, out);                                                                      \
+    return out;                                                                                     \
+  }, py::arg("src").noconvert(), py::arg("axis"));                                                  \
+  m.def("nanmedian", [] (const xt::pytensor<VALUE_TYPE, N_DIM>& src)                                \
+  {                                                                                                 \
+    return nanmedian(src);                                                                          \
+  }, py::arg("src").noconvert());                                                                   \
+  m.def("nanmedian", [] (const xt::pytensor<VALUE_TYPE, N_DIM>& src, const std::vector<int>& axis,  \
+                         xt::pyarray<VALUE_TYPE>& out)                                              \
+  {                                                                                                 \
+    nanmedian(src, axis, out);                                                                      \
+  }, py::arg("src").noconvert(), py::arg("axis"), py::arg("out").noconvert());
+
+#define FOAM_NAN_QUANTILE(VALUE_TYPE)                                                               \
+  FOAM_NAN_QUANTILE_IMP(VALUE_TYPE, 1)                                                              \
+  FOAM_NAN_QUANTILE_IMP(VALUE_TYPE, 2)                                                              \
+  FOAM_NAN_QUANTILE_IMP(VALUE_TYPE, 3)                                                              \
+  FOAM_NAN_QUANTILE_IMP(VALUE_TYPE, 4)                                                              \
+  FOAM_NAN_QUANTILE_IMP(VALUE_TYPE, 5)
+
+  FOAM_NAN_QUANTILE(float)
+  FOAM_NAN_QUANTILE(double)
+
+#define FOAM_NAN_DESCRIBE_IMP(VALUE_TYPE, N_DIM)                                                    \
+  m.def("nanDescribe", [] (const xt::pytensor<VALUE_TYPE, N_DIM>& src)                              \
+  {                                                                                                 \
+    return nanDescribe(src);                                                                        \
+  }, py::arg("src").noconvert());                                                                   \
+  m.def("nanDescribe", [] (const xt::pytensor<VALUE_TYPE, N_DIM>& src, const std::vector<int>& axis) \
+  {                                                                                                 \
+    std::vector<size_t> shape {6};                                                                  \
+    for (auto n : detail::AxesReduction(src, axis).shape()) shape.push_back(n);                     \
+    auto out = xt::pyarray<double>::from_shape(shape);                                              \
+    nanDescribe(src, axis, out);                                                                    \
+    return out;                                                                                     \
+  }, py::arg("src").noconvert(), py::arg("axis"));
+
+#define FOAM_NAN_DESCRIBE(VALUE_TYPE)                                                               \
+  FOAM_NAN_DESCRIBE_IMP(VALUE_TYPE, 1)                                                              \
+  FOAM_NAN_DESCRIBE_IMP(VALUE_TYPE, 2)                                                              \
+  FOAM_NAN_DESCRIBE_IMP(VALUE_TYPE, 3)                                                              \
+  FOAM_NAN_DESCRIBE_IMP(VALUE_TYPE, 4)                                                              \
+  FOAM_NAN_DESCRIBE_IMP(VALUE_TYPE, 5)
+
+  FOAM_NAN_DESCRIBE(float)
+  FOAM_NAN_DESCRIBE(double)
 
 #define FOAM_HISTOGRAM_IMP(VALUE_TYPE)                                                                \
   m.def("histogram1d", [] (const xt::pytensor<VALUE_TYPE, 1>& src,                                    \
-                           VALUE_TYPE left,                                                           \
-                           VALUE_TYPE right,                                                          \
+                           double left,                                                               \
+                           double right,                                                              \
+                           size_t bins)                                                               \
+  {                                                                                                   \
+    auto hist = xt::pytensor<long long, 1>::from_shape({bins});                                       \
+    histogram1d(src, left, right, hist);                                                              \
+    return hist;                                                                                      \
+  }, py::arg("src").noconvert(), py::arg("left"), py::arg("right"), py::arg("bins"));                 \
+  m.def("histogram1d", [] (const xt::pytensor<VALUE_TYPE, 1>& src,                                    \
+                           const xt::pytensor<double, 1>& weights,                                    \
+                           double left,                                                               \
+                           double right,                                                              \
                            size_t bins)                                                               \
   {                                                                                                   \
-    return xt::histogram<long long>(src, bins, left, right);                                          \
-  }, py::arg("src").noconvert(), py::arg("left"), py::arg("right"), py::arg("bins"));
+    auto hist = xt::pytensor<double, 1>::from_shape({bins});                                          \
+    histogram1d(src, weights, left, right, hist);                                                     \
+    return hist;                                                                                      \
+  }, py::arg("src").noconvert(), py::arg("weights").noconvert(),                                      \
+     py::arg("left"), py::arg("right"), py::arg("bins"));                                             \
+  m.def("histogram1d", [] (const xt::pytensor<VALUE_TYPE, 1>& src,                                    \
+                           const xt::pytensor<double, 1>& edges)                                      \
+  {                                                                                                   \
+    auto hist = xt::pytensor<long long, 1>::from_shape({edges.size() > 0 ? edges.size() - 1 : 0});    \
+    histogram1d(src, edges, hist);                                                                    \
+    return hist;                                                                                      \
+  }, py::arg("src").noconvert(), py::arg("edges").noconvert());                                       \
+  m.def("histogram1d", [] (const xt::pytensor<VALUE_TYPE, 1>& src,                                    \
+                           const xt::pytensor<double, 1>& weights,                                    \
+                           const xt::pytensor<double, 1>& edges)                                      \
+  {                                                                                                   \
+    auto hist = xt::pytensor<double, 1>::from_shape({edges.size() > 0 ? edges.size() - 1 : 0});       \
+    histogram1d(src, weights, edges, hist);                                                           \
+    return hist;                                                                                      \
+  }, py::arg("src").noconvert(), py::arg("weights").noconvert(), py::arg("edges").noconvert());       \
+  m.def("histogram2d", [] (const xt::pytensor<VALUE_TYPE, 1>& x,                                      \
+                           const xt::pytensor<VALUE_TYPE, 1>& y,                                      \
+                           double x_left, double x_right, double y_left, double y_right,              \
+                           size_t x_bins, size_t y_bins)                                              \
+  {                                                                                                   \
+    auto hist = xt::pytensor<double, 2>::from_shape({x_bins, y_bins});                                \
+    histogram2d(x, y, x_left, x_right, y_left, y_right, hist);                                        \
+    return hist;                                                                                      \
+  }, py::arg("x").noconvert(), py::arg("y").noconvert(),                                              \
+     py::arg("x_left"), py::arg("x_right"), py::arg("y_left"), py::arg("y_right"),                    \
+     py::arg("x_bins"), py::arg("y_bins"));                                                           \
+  m.def("histogram2d", [] (const xt::pytensor<VALUE_TYPE, 1>& x,                                      \
+                           const xt::pytensor<VALUE_TYPE, 1>& y,                                      \
+                           const xt::pytensor<double, 1>& weights,                                    \
+                           double x_left, double x_right, double y_left, double y_right,              \
+                           size_t x_bins, size_t y_bins)                                              \
+  {                                                                                                   \
+    auto hist = xt::pytensor<double, 2>::from_shape({x_bins, y_bins});                                \
+    histogram2d(x, y, weights, x_left, x_right, y_left, y_right, hist);                               \
+    return hist;                                                                                      \
+  }, py::arg("x").noconvert(), py::arg("y").noconvert(), py::arg("weights").noconvert(),              \
+     py::arg("x_left"), py::arg("x_right"), py::arg("y_left"), py::arg("y_right"),                    \
+     py::arg("x_bins"), py::arg("y_bins"));
 
   FOAM_HISTOGRAM_IMP(int)
   FOAM_HISTOGRAM_IMP(unsigned int)
@@ -74,4 +365,55 @@ PYBIND11_MODULE(statistics, m)
   FOAM_HISTOGRAM_IMP(float)
   FOAM_HISTOGRAM_IMP(double)
 
+#define FOAM_BINNED_MEAN_COUNT_IMP(VALUE_TYPE)                                                        \
+  m.def("binnedMeanCount", [] (const xt::pytensor<VALUE_TYPE, 1>& x,                                  \
+                               const xt::pytensor<VALUE_TYPE, 1>& y,                                  \
+                               double left,                                                           \
+                               double right,                                                          \
+                               size_t bins)                                                           \
+  {                                                                                                   \
+    auto mean = xt::pytensor<double, 1>::from_shape({bins});                                          \
+    auto count = xt::pytensor<long long, 1>::from_shape({bins});                                      \
+    binnedMeanCount(x, y, left, right, mean, count);                                                  \
+    return std::make_tuple(mean, count);                                                              \
+  }, py::arg("x").noconvert(), py::arg("y").noconvert(),                                              \
+     py::arg("left"), py::arg("right"), py::arg("bins"));                                             \
+  m.def("binnedMeanCountVar", [] (const xt::pytensor<VALUE_TYPE, 1>& x,                               \
+                                  const xt::pytensor<VALUE_TYPE, 1>& y,                               \
+                                  double left,                                                        \
+                                  double right,                                                       \
+                                  size_t bins)                                                        \
+  {                                                                                                   \
+    auto mean = xt::pytensor<double, 1>::from_shape({bins});                                          \
+    auto count = xt::pytensor<long long, 1>::from_shape({bins});                                      \
+    auto var = xt::pytensor<double, 1>::from_shape({bins});                                           \
+    binnedMeanCount(x, y, left, right, mean, count, var);                                             \
+    return std::make_tuple(mean, count, var);                                                         \
+  }, py::arg("x").noconvert(), py::arg("y").noconvert(),                                              \
+     py::arg("left"), py::arg("right"), py::arg("bins"));
+
+  FOAM_BINNED_MEAN_COUNT_IMP(float)
+  FOAM_BINNED_MEAN_COUNT_IMP(double)
+
+#define FOAM_NANHIST_WITH_STATS_IMP(VALUE_TYPE, N_DIM)                                                \
+  m.def("nanhistWithStats", [] (const xt::pytensor<VALUE_TYPE, N_DIM>& src,                           \
+                                double lb,                                                            \
+                                double ub,                                                            \
+                                xt::pytensor<int64_t, 1>& hist)                                       \
+  {                                                                                                   \
+    return nanhistWithStats(src, lb, ub, hist);                                                       \
+  }, py::arg("src").noconvert(), py::arg("lb"), py::arg("ub"), py::arg("hist").noconvert());
+
+#define FOAM_NANHIST_WITH_STATS(VALUE_TYPE)                                                           \
+  FOAM_NANHIST_WITH_STATS_IMP(VALUE_TYPE, 1)                                                          \
+  FOAM_NANHIST_WITH_STATS_IMP(VALUE_TYPE, 2)                                                          \
+  FOAM_NANHIST_WITH_STATS_IMP(VALUE_TYPE, 3)
+
+  FOAM_NANHIST_WITH_STATS(float)
+  FOAM_NANHIST_WITH_STATS(double)
+
+  declareStreamingHistogram<double>(m);
+
+  declareQuantileSketch<double>(m);
+
 }
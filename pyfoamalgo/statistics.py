@@ -6,17 +6,30 @@ The full license is in the file LICENSE, distributed with this software.
 Author: Jun Zhu
 """
 import math
+import warnings
+from collections import namedtuple
+
 import numpy as np
 
-from .imageproc import mask_image_data, nanmeanImageArray
-from .config import __NAN_DTYPES__, __ALL_DTYPES__
+from .config import __NAN_DTYPES__, __ALL_DTYPES__, __INT_DTYPES__
+from pyfoamalgo.lib.imageproc import nanmeanImageArray, nanstdImageArray
 from pyfoamalgo.lib.statistics import nanmean as _nanmean_cpp
 from pyfoamalgo.lib.statistics import nansum as _nansum_cpp
 from pyfoamalgo.lib.statistics import nanstd as _nanstd_cpp
 from pyfoamalgo.lib.statistics import nanvar as _nanvar_cpp
 from pyfoamalgo.lib.statistics import nanmin as _nanmin_cpp
 from pyfoamalgo.lib.statistics import nanmax as _nanmax_cpp
+from pyfoamalgo.lib.statistics import nanmedian as _nanmedian_cpp
+from pyfoamalgo.lib.statistics import nanquantile as _nanquantile_cpp
+from pyfoamalgo.lib.statistics import QuantileMethod as _QuantileMethod
+from pyfoamalgo.lib.statistics import nanDescribe as _nan_describe_cpp
 from pyfoamalgo.lib.statistics import histogram1d as _histogram1d_cpp
+from pyfoamalgo.lib.statistics import histogram2d as _histogram2d_cpp
+from pyfoamalgo.lib.statistics import binnedMeanCount as _binned_mean_count_cpp
+from pyfoamalgo.lib.statistics import binnedMeanCountVar as _binned_mean_count_var_cpp
+from pyfoamalgo.lib.statistics import nanhistWithStats as _nanhist_with_stats_cpp
+from pyfoamalgo.lib.statistics import StreamingHistogram as _StreamingHistogramCpp
+from pyfoamalgo.lib.statistics import QuantileSketch as _QuantileSketchCpp
 
 __all__ = [
     'hist_with_stats',
@@ -28,12 +41,44 @@ __all__ = [
     'nanvar',
     'nanmin',
     'nanmax',
+    'nanmedian',
+    'nanquantile',
+    'nan_describe',
     'quick_min_max',
     'histogram1d',
+    'histogram2d',
+    'binned_mean_count',
+    'StreamingHistogram',
+    'QuantileSketch',
 ]
 
 
-def nansum(a, axis=None):
+def _nanreduce(cpp_reducer, np_reducer, a, axis, out, int_dtype=None):
+    """Dispatch a nan-reducer to the C++ implementation when applicable.
+
+    If 'out' is given, the C++ implementation writes the result into it
+    directly. Otherwise, it falls back to the numpy implementation.
+
+    Integer arrays are also reduced by the C++ implementation, whose
+    result has the dtype 'int_dtype' (default = dtype of the array) as
+    the numpy implementation.
+    """
+    if a.dtype in __NAN_DTYPES__ or a.dtype in __INT_DTYPES__:
+        if out is None:
+            if axis is None:
+                return cpp_reducer(a)
+            return cpp_reducer(a, axis=axis)
+
+        dtype = a.dtype if a.dtype in __NAN_DTYPES__ or int_dtype is None \
+            else int_dtype
+        if axis is not None and out.dtype == dtype:
+            cpp_reducer(a, axis=axis, out=out)
+            return out
+
+    return np_reducer(a, axis=axis, out=out)
+
+
+def nansum(a, axis=None, *, out=None):
     """Faster numpy.nansum.
 
     It uses the C++ implementation when applicable. Otherwise, it falls
@@ -42,16 +87,15 @@ def nansum(a, axis=None):
     :param numpy.ndarray a: Data array.
     :param None/int/tuple axis: Axis or axes along which the sum is computed.
         The default is to compute the sum of the flattened array.
+    :param None/numpy.ndarray out: Pre-allocated array to place the result
+        in. It must have the same shape as the expected output.
     """
-    if a.dtype in __NAN_DTYPES__:
-        if axis is None:
-            return _nansum_cpp(a)
-        return _nansum_cpp(a, axis=axis)
+    int_dtype = np.int64 if np.issubdtype(a.dtype, np.signedinteger) \
+        else np.uint64
+    return _nanreduce(_nansum_cpp, np.nansum, a, axis, out, int_dtype)
 
-    return np.nansum(a, axis=axis)
 
-
-def nanmean(a, axis=None):
+def nanmean(a, axis=None, *, out=None):
     """Faster numpy.nanmean.
 
     It uses the C++ implementation when applicable. Otherwise, it falls
@@ -63,18 +107,20 @@ def nanmean(a, axis=None):
     :param numpy.ndarray a: Data array.
     :param None/int/tuple axis: Axis or axes along which the mean is computed.
         The default is to compute the mean of the flattened array.
+    :param None/numpy.ndarray out: Pre-allocated array to place the result
+        in. It must have the same shape as the expected output.
     """
-    if a.dtype in __NAN_DTYPES__:
-        if axis == 0 and a.ndim == 3:
+    if a.dtype in __NAN_DTYPES__ and axis == 0 and a.ndim == 3:
+        if out is None:
             return nanmeanImageArray(a)
-        if axis is None:
-            return _nanmean_cpp(a)
-        return _nanmean_cpp(a, axis=axis)
+        if out.dtype == a.dtype:
+            nanmeanImageArray(a, out=out)
+            return out
 
-    return np.nanmean(a, axis=axis)
+    return _nanreduce(_nanmean_cpp, np.nanmean, a, axis, out, np.float64)
 
 
-def nanstd(a, axis=None, *, normalized=False):
+def nanstd(a, axis=None, *, normalized=False, out=None):
     """Faster numpy.nanstd.
 
     It uses the C++ implementation when applicable. Otherwise, it falls
@@ -86,21 +132,21 @@ def nanstd(a, axis=None, *, normalized=False):
         deviation of the flattened array.
     :param bool normalized: True for normalizing the result by nanmean
         along the same axis or axes.
+    :param None/numpy.ndarray out: Pre-allocated array to place the result
+        in. It must have the same shape as the expected output.
     """
-    if a.dtype in __NAN_DTYPES__:
-        if axis is None:
-            ret = _nanstd_cpp(a)
-        else:
-            ret = _nanstd_cpp(a, axis=axis)
+    if a.dtype in __NAN_DTYPES__ and axis == 0 and a.ndim == 3 \
+            and out is None:
+        ret = nanstdImageArray(a)
     else:
-        ret = np.nanstd(a, axis=axis)
+        ret = _nanreduce(_nanstd_cpp, np.nanstd, a, axis, out, np.float64)
 
     if normalized:
-        return ret / nanmean(a, axis=axis)
+        return np.divide(ret, nanmean(a, axis=axis), out=out)
     return ret
 
 
-def nanvar(a, axis=None, *, normalized=False):
+def nanvar(a, axis=None, *, normalized=False, out=None):
     """Faster numpy.nanvar.
 
     It uses the C++ implementation when applicable. Otherwise, it falls
@@ -112,21 +158,17 @@ def nanvar(a, axis=None, *, normalized=False):
         flattened array.
     :param bool normalized: True for normalizing the result by square of
         nanmean along the same axis or axes.
+    :param None/numpy.ndarray out: Pre-allocated array to place the result
+        in. It must have the same shape as the expected output.
     """
-    if a.dtype in __NAN_DTYPES__:
-        if axis is None:
-            ret = _nanvar_cpp(a)
-        else:
-            ret = _nanvar_cpp(a, axis=axis)
-    else:
-        ret = np.nanvar(a, axis=axis)
+    ret = _nanreduce(_nanvar_cpp, np.nanvar, a, axis, out, np.float64)
 
     if normalized:
-        return ret / nanmean(a, axis=axis) ** 2
+        return np.divide(ret, nanmean(a, axis=axis) ** 2, out=out)
     return ret
 
 
-def nanmin(a, axis=None):
+def nanmin(a, axis=None, *, out=None):
     """Faster numpy.nanmin.
 
     It uses the C++ implementation when applicable. Otherwise, it falls
@@ -135,16 +177,13 @@ def nanmin(a, axis=None):
     :param numpy.ndarray a: Data array.
     :param None/int/tuple axis: Axis or axes along which the mean is computed.
         The default is to compute the nanmin of the flattened array.
+    :param None/numpy.ndarray out: Pre-allocated array to place the result
+        in. It must have the same shape as the expected output.
     """
-    if a.dtype in __NAN_DTYPES__:
-        if axis is None:
-            return _nanmin_cpp(a)
-        return _nanmin_cpp(a, axis=axis)
-
-    return np.nanmin(a, axis=axis)
+    return _nanreduce(_nanmin_cpp, np.nanmin, a, axis, out)
 
 
-def nanmax(a, axis=None):
+def nanmax(a, axis=None, *, out=None):
     """Faster numpy.nanmax.
 
     It uses the C++ implementation when applicable. Otherwise, it falls
@@ -153,46 +192,345 @@ def nanmax(a, axis=None):
     :param numpy.ndarray a: Data array.
     :param None/int/tuple axis: Axis or axes along which the mean is computed.
         The default is to compute the nanmax of the flattened array.
+    :param None/numpy.ndarray out: Pre-allocated array to place the result
+        in. It must have the same shape as the expected output.
     """
-    if a.dtype in __NAN_DTYPES__:
+    return _nanreduce(_nanmax_cpp, np.nanmax, a, axis, out)
+
+
+def _normalize_axis(axis):
+    """Convert an int or a tuple of axes to a list."""
+    if isinstance(axis, (int, np.integer)):
+        return [int(axis)]
+    return list(axis)
+
+
+def nanmedian(a, axis=None, *, out=None):
+    """Faster numpy.nanmedian.
+
+    It uses the C++ implementation when applicable. Otherwise, it falls
+    back to numpy.nanmedian.
+
+    :param numpy.ndarray a: Data array.
+    :param None/int/tuple axis: Axis or axes along which the median is
+        computed. The default is to compute the median of the flattened
+        array.
+    :param None/numpy.ndarray out: Pre-allocated array to place the result
+        in. It must have the same shape as the expected output.
+    """
+    if a.dtype in __NAN_DTYPES__ and 0 < a.ndim <= 5:
+        if axis is None:
+            if out is None:
+                return _nanmedian_cpp(a)
+        elif out is None:
+            return _nanmedian_cpp(a, axis=_normalize_axis(axis))
+        elif out.dtype == a.dtype:
+            _nanmedian_cpp(a, axis=_normalize_axis(axis), out=out)
+            return out
+
+    return np.nanmedian(a, axis=axis, out=out)
+
+
+def nanquantile(a, q, axis=None, *, method='linear', out=None):
+    """Faster numpy.nanquantile.
+
+    It uses the C++ implementation, which selects the quantile instead of
+    sorting the data, when applicable. Otherwise, it falls back to
+    numpy.nanquantile.
+
+    :param numpy.ndarray a: Data array.
+    :param float q: Quantile, which must be within [0, 1].
+    :param None/int/tuple axis: Axis or axes along which the quantile is
+        computed. The default is to compute the quantile of the flattened
+        array.
+    :param str method: Method of estimating the quantile. Only 'linear'
+        and 'nearest' are implemented in C++.
+    :param None/numpy.ndarray out: Pre-allocated array to place the result
+        in. It must have the same shape as the expected output.
+    """
+    if a.dtype in __NAN_DTYPES__ and 0 < a.ndim <= 5 and np.ndim(q) == 0 \
+            and method in ('linear', 'nearest'):
+        cpp_method = _QuantileMethod.Linear if method == 'linear' \
+            else _QuantileMethod.Nearest
         if axis is None:
-            return _nanmax_cpp(a)
-        return _nanmax_cpp(a, axis=axis)
+            if out is None:
+                return _nanquantile_cpp(a, q, method=cpp_method)
+        elif out is None:
+            return _nanquantile_cpp(
+                a, q, axis=_normalize_axis(axis), method=cpp_method)
+        elif out.dtype == a.dtype:
+            _nanquantile_cpp(a, q, axis=_normalize_axis(axis), out=out,
+                             method=cpp_method)
+            return out
+
+    return np.nanquantile(a, q, axis=axis, method=method, out=out)
 
-    return np.nanmax(a, axis=axis)
 
+_NanDescription = namedtuple(
+    'NanDescription', ['count', 'sum', 'min', 'max', 'mean', 'var', 'std'])
+
+
+def nan_describe(a, axis=None):
+    """Compute the statistics of the non-NaN values of an array.
+
+    It uses the C++ implementation, which computes all the statistics in
+    a single pass over the data, when applicable. Otherwise, it falls back
+    to numpy.
+
+    :param numpy.ndarray a: Data array.
+    :param None/int/tuple axis: Axis or axes along which the statistics
+        are computed. The default is to compute the statistics of the
+        flattened array.
+
+    :return: namedtuple of (count, sum, min, max, mean, var, std). min,
+        max, mean, var and std are NaN if there is no value.
+    """
+    if a.dtype in __NAN_DTYPES__ and 0 < a.ndim <= 5:
+        if axis is None:
+            count, sum_, min_, max_, mean, var = _nan_describe_cpp(a)
+            count = np.int64(count)
+            sum_, min_, max_, mean, var = (
+                a.dtype.type(v) for v in (sum_, min_, max_, mean, var))
+        else:
+            ret = _nan_describe_cpp(a, axis=_normalize_axis(axis))
+            count = ret[0].astype(np.int64)
+            sum_, min_, max_, mean, var = ret[1:].astype(a.dtype)
+        return _NanDescription(count, sum_, min_, max_, mean, var, np.sqrt(var))
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        var = np.nanvar(a, axis=axis)
+        return _NanDescription(np.sum(~np.isnan(a), axis=axis),
+                               np.nansum(a, axis=axis),
+                               np.nanmin(a, axis=axis),
+                               np.nanmax(a, axis=axis),
+                               np.nanmean(a, axis=axis),
+                               var,
+                               np.sqrt(var))
+
+
+def _get_range(a, bin_range):
+    """Get the range of histogram following numpy.histogram."""
+    if bin_range is None:
+        # keep the precision of the data as numpy.histogram
+        bin_range = (a.dtype.type(nanmin(a)), a.dtype.type(nanmax(a)))
 
-def histogram1d(a, bins=10, range=None):
+    first, last = bin_range
+    if first == last:
+        first -= 0.5
+        last += 0.5
+    return first, last
+
+
+def histogram1d(a, bins=10, range=None, weights=None):
     """Faster numpy.histogram.
 
     It uses the C++ implementation when applicable. Otherwise, it falls
-    back to numpy.histogram.
+    back to numpy.histogram. Unlike numpy.histogram, NaN is ignored.
 
     :param numpy.ndarray a: Data array.
-    :param int bins: Number of bins.
+    :param int/array-like bins: Number of equal-width bins or the
+        monotonically increasing bin edges, e.g. logarithmically spaced
+        ones. The bin of a value is found by binary search in the latter
+        case.
     :param tuple/None range: The (lower, upper) boundary of the bins.
-        Default = (a.min(), a.max())
+        Default = (nanmin(a), nanmax(a)). It is ignored if the bin edges
+        are given.
+    :param None/numpy.ndarray weights: Weights of the values, which has
+        the same shape as the data array.
 
     :return: (Values of the histogram, bin edges)
     :rtype: (numpy.array, numpy.array)
     """
-    if range is None:
-        range = (a.min(), a.max())
+    if a.dtype in __ALL_DTYPES__ and np.ndim(bins) == 1:
+        bin_edges = np.asarray(bins, dtype=np.float64)
+        if weights is None:
+            hist = _histogram1d_cpp(a.ravel(), bin_edges)
+        else:
+            hist = _histogram1d_cpp(
+                a.ravel(), np.asarray(weights, dtype=np.float64).ravel(),
+                bin_edges)
+        return hist, bin_edges
 
     if a.dtype in __ALL_DTYPES__:
+        range = _get_range(a, range)
         be_dtype = np.float32 if a.dtype == np.float32 else np.float64
         bin_edges = np.linspace(range[0], range[1], bins+1, dtype=be_dtype)
-        return (_histogram1d_cpp(a.ravel(), range[0], range[1], bins),
-                bin_edges)
-    return np.histogram(a, bins=bins, range=range)
+        if weights is None:
+            hist = _histogram1d_cpp(a.ravel(), range[0], range[1], bins)
+        else:
+            hist = _histogram1d_cpp(
+                a.ravel(), np.asarray(weights, dtype=np.float64).ravel(),
+                range[0], range[1], bins)
+        return hist, bin_edges
+
+    if range is None and np.ndim(bins) == 0:
+        range = (a.min(), a.max())
+    return np.histogram(a, bins=bins, range=range, weights=weights)
+
+
+def histogram2d(x, y, bins=10, range=None, weights=None):
+    """Faster numpy.histogram2d.
+
+    It uses the C++ implementation when applicable. Otherwise, it falls
+    back to numpy.histogram2d. A pair of values is ignored if either of
+    them is NaN.
+
+    :param numpy.ndarray x: Data array of the first dimension.
+    :param numpy.ndarray y: Data array of the second dimension, which has
+        the same shape as x.
+    :param int/tuple bins: Number of bins of both dimensions or
+        (number of x bins, number of y bins).
+    :param tuple/None range: ((x lower, x upper), (y lower, y upper))
+        boundaries of the bins. Default = ((nanmin(x), nanmax(x)),
+        (nanmin(y), nanmax(y)))
+    :param None/numpy.ndarray weights: Weights of the pairs of values,
+        which has the same shape as x.
+
+    :return: (Values of the histogram, bin edges of x, bin edges of y)
+    :rtype: (numpy.array, numpy.array, numpy.array)
+    """
+    if np.ndim(bins) == 0:
+        bins = (bins, bins)
+
+    if x.dtype in __ALL_DTYPES__ and y.dtype == x.dtype:
+        if range is None:
+            range = (None, None)
+        x_range = _get_range(x, range[0])
+        y_range = _get_range(y, range[1])
+        x_edges = np.linspace(*x_range, bins[0] + 1)
+        y_edges = np.linspace(*y_range, bins[1] + 1)
+        if weights is None:
+            hist = _histogram2d_cpp(x.ravel(), y.ravel(),
+                                    *x_range, *y_range, *bins)
+        else:
+            hist = _histogram2d_cpp(
+                x.ravel(), y.ravel(),
+                np.asarray(weights, dtype=np.float64).ravel(),
+                *x_range, *y_range, *bins)
+        return hist, x_edges, y_edges
+
+    return np.histogram2d(x.ravel(), y.ravel(), bins=bins, range=range,
+                          weights=None if weights is None
+                          else np.ravel(weights))
+
+
+def binned_mean_count(x, y, bins=10, range=None, *, return_var=False):
+    """Compute the mean and the count of y in the bins of x.
+
+    It is equivalent to calling scipy.stats.binned_statistic with 'mean'
+    and 'count' (and optionally 'var'), but all the statistics are
+    computed in a single pass over the data. A pair of values is ignored
+    if either of them is NaN.
+
+    :param array-like x: Values to be binned.
+    :param array-like y: Values on which the statistics are computed,
+        which has the same shape as x.
+    :param int bins: Number of equal-width bins.
+    :param tuple/None range: The (lower, upper) boundary of the bins.
+        Default = (nanmin(x), nanmax(x)).
+    :param bool return_var: True for also returning the (population)
+        variance of y in each bin.
+
+    :return: (mean, count, [variance,] bin edges). The mean and the
+        variance are NaN in empty bins.
+    :rtype: (numpy.array, numpy.array, [numpy.array,] numpy.array)
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    if x.dtype != y.dtype or x.dtype not in __NAN_DTYPES__:
+        x = x.astype(np.float64)
+        y = y.astype(np.float64)
+
+    bin_range = _get_range(x, range)
+    edges = np.linspace(*bin_range, bins + 1)
+    if return_var:
+        mean, count, var = _binned_mean_count_var_cpp(
+            x.ravel(), y.ravel(), *bin_range, bins)
+        return mean, count, var, edges
+
+    mean, count = _binned_mean_count_cpp(x.ravel(), y.ravel(), *bin_range, bins)
+    return mean, count, edges
+
+
+class StreamingHistogram(_StreamingHistogramCpp):
+    """Histogram with fixed edges accumulated over a stream of data.
+
+    The bins are equal-width in either the linear or the logarithmic
+    scale. Following numpy.histogram, a bin includes its left edge and the
+    last bin also includes its right edge. NaN and the values outside the
+    edges are ignored. Histograms with the same edges, e.g. filled by
+    different workers, can be merged.
+
+    :param int n_bins: Number of bins.
+    :param float lb: Left edge of the first bin.
+    :param float ub: Right edge of the last bin.
+    :param bool log: True for logarithmically spaced edges, which requires
+        positive lb.
+    """
+    def fill(self, a, weights=None):
+        """Fill values into the histogram.
+
+        Large arrays are filled in parallel by chunks.
+
+        :param numpy.ndarray a: Data array.
+        :param None/numpy.ndarray weights: Weights of the values, which
+            has the same shape as the data array.
+        """
+        if weights is None:
+            super().fill(a.ravel())
+        else:
+            super().fill(a.ravel(),
+                         np.asarray(weights, dtype=np.float64).ravel())
+
+
+class QuantileSketch(_QuantileSketchCpp):
+    """Quantiles estimated over a stream of data with bounded memory.
+
+    It is a KLL sketch, which retains O(k log(n / k)) of the n values. The
+    error of the rank of an estimated quantile is below 2% of n for
+    k = 200 with high probability and the quantiles are exact before the
+    sketch retains about k values. NaN is ignored. Sketches, e.g. filled
+    by different workers, can be merged.
+
+    :param int k: Parameter which controls the accuracy and the memory of
+        the sketch.
+    :param int seed: Seed of the random compaction. Default is random.
+    """
+    def update(self, a):
+        """Add values to the sketch.
+
+        Large arrays are added in parallel by chunks.
+
+        :param numpy.ndarray a: Data array.
+        """
+        super().update(a.ravel())
+
+    def quantile(self, q):
+        """Return the estimated quantile(s).
 
+        Similar to numpy.nanquantile(..., method='nearest'), it returns the
+        value whose rank is the nearest to q (n - 1). It is NaN if there is
+        no value.
 
-def quick_min_max(x, q=None):
+        :param float/array-like q: Quantile or sequence of quantiles, which
+            must be within [0, 1].
+        """
+        if np.ndim(q) == 0:
+            return super().quantile(q)
+        return np.array(self.quantiles(np.ravel(q).tolist())).reshape(
+            np.shape(q))
+
+
+def quick_min_max(x, q=None, *, sketch=None):
     """Estimate the min/max values of input by down-sampling.
 
     :param numpy.ndarray x: data, 2D array for now.
     :param float/None q: quantile when calculating the min/max, which
         must be within [0, 1].
+    :param QuantileSketch/None sketch: If given, the down-sampled data
+        are added to it and the min/max values are estimated from all the
+        data summarized by the sketch, e.g. over many frames.
 
     :return tuple: (min, max)
     """
@@ -202,21 +540,30 @@ def quick_min_max(x, q=None):
     if x.ndim != 2:
         raise ValueError("Input must be a 2D array!")
 
+    if q is not None and not 0 <= q <= 1:
+        raise ValueError("Quantile must be within [0, 1]")
+
     while x.size > 1e5:
         sl = [slice(None)] * x.ndim
         sl[np.argmax(x.shape)] = slice(None, None, 2)
         x = x[tuple(sl)]
 
+    if sketch is not None:
+        sketch.update(x)
+        if q is None:
+            return sketch.min(), sketch.max()
+        if q < 0.5:
+            q = 1 - q
+        return tuple(sketch.quantiles([1 - q, q]))
+
     if q is None:
         return np.nanmin(x), np.nanmax(x)
 
     if q < 0.5:
         q = 1 - q
 
-    # Let np.nanquantile to handle the case when q is outside [0, 1]
-    # caveat: nanquantile is about 30 times slower than nanmin/nanmax
-    return np.nanquantile(x, 1 - q, method='nearest'), \
-           np.nanquantile(x, q, method='nearest')
+    return nanquantile(x, 1 - q, method='nearest'), \
+           nanquantile(x, q, method='nearest')
 
 
 def _get_outer_edges(arr, bin_range):
@@ -278,32 +625,39 @@ def compute_statistics(data):
     if len(data) == 0:
         # suppress runtime warning
         return np.nan, np.nan, np.nan
-    return np.mean(data), np.median(data), np.std(data)
+    mean = np.mean(data)
+    if data.dtype in __NAN_DTYPES__ and not np.isnan(mean):
+        # there is no NaN in the data
+        median = nanmedian(data)
+    else:
+        median = np.median(data)
+    return mean, median, np.std(data)
 
 
 def nanhist_with_stats(data, bin_range=None, n_bins=10):
     """Compute nan-histogram and nan-statistics of an array.
 
-    :param numpy.ndarray data: Image ROI.
+    NaN and the values outside the bin range are ignored. The histogram,
+    mean and standard deviation are computed in a single pass over the data
+    and the median is selected from the values in the bin(s) where it
+    locates. The data is not copied.
+
+    :param numpy.ndarray data: Image ROI. The dtype must be float32 or
+        float64.
     :param tuple bin_range: (lb, ub) of histogram.
     :param int n_bins: Number of bins of histogram.
 
     :raise ValueError: if finite outer edges cannot be found.
     """
-    # Note: Since the nan functions in numpy is typically 5-8 slower
-    # than the non-nan counterpart, it is always faster to remove nan
-    # first, which results in a copy, and then calculate the statistics.
-
-    # TODO: the following three steps can be merged into one to improve
-    #       the performance.
-    filtered = data.copy()
-    mask_image_data(filtered, threshold_mask=bin_range)
-    filtered = filtered[~np.isnan(filtered)]
-
-    outer_edges = _get_outer_edges(filtered, bin_range)
-    hist, bin_edges = np.histogram(filtered, range=outer_edges, bins=n_bins)
+    if bin_range is None:
+        bin_range = (-math.inf, math.inf)
+
+    hist = np.empty(n_bins, dtype=np.int64)
+    v_min, v_max, mean, median, std = _nanhist_with_stats_cpp(
+        data, *bin_range, hist)
+
+    bin_edges = np.linspace(v_min, v_max, n_bins + 1, dtype=data.dtype)
     bin_centers = (bin_edges[1:] + bin_edges[:-1]) / 2.0
-    mean, median, std = compute_statistics(filtered)
 
     return hist, bin_centers, mean, median, std
 
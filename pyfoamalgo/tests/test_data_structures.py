@@ -528,6 +528,51 @@ class TestMovingAverageArray:
         dm.data = arr
         assert dm.data is not arr
 
+    @pytest.mark.parametrize("shape", [(3, 4), (2, 3, 4)])
+    def testExact(self, shape):
+        class Dummy:
+            data = MovingAverageArray(3, exact=True)
+
+        dm = Dummy()
+
+        frames = [np.random.rand(*shape).astype(np.float32) for _ in range(6)]
+        frames[2][(0,) * len(shape)] = np.nan
+        frames[1][(-1,) * len(shape)] = np.inf
+        for i, frame in enumerate(frames):
+            dm.data = frame
+            assert dm.data is not frame
+            assert Dummy.data.count == min(i + 1, 3)
+            np.testing.assert_array_almost_equal(
+                np.mean(frames[max(0, i - 2):i + 1], axis=0), dm.data)
+        # the nan and inf have been moved out of the window
+        assert np.isfinite(dm.data).all()
+
+        # shrink the window
+        Dummy.data.window = 2
+        assert Dummy.data.count == 2
+        np.testing.assert_array_almost_equal(np.mean(frames[-2:], axis=0), dm.data)
+
+        # enlarge the window
+        Dummy.data.window = 4
+        assert Dummy.data.count == 2
+        dm.data = frames[0]
+        assert Dummy.data.count == 3
+        np.testing.assert_array_almost_equal(
+            np.mean(frames[-2:] + frames[:1], axis=0), dm.data)
+
+        # set an array with a different shape
+        new_arr = np.ones((5, 5), dtype=np.float32)
+        dm.data = new_arr
+        assert Dummy.data.count == 1
+        np.testing.assert_array_equal(new_arr, dm.data)
+
+        del dm.data
+        assert dm.data is None
+        assert Dummy.data.count == 0
+        dm.data = frames[0]
+        assert Dummy.data.count == 1
+        np.testing.assert_array_equal(frames[0], dm.data)
+
 
 class TestSimpleQueue(unittest.TestCase):
     def testGeneral(self):
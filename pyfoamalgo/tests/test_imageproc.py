@@ -1,13 +1,19 @@
 import pytest
 
+import sys
 import warnings
+from unittest.mock import patch
 
 import numpy as np
 
 from pyfoamalgo.config import __XFEL_IMAGE_DTYPE__ as IMAGE_DTYPE
 from pyfoamalgo.config import __NAN_DTYPES__
 from pyfoamalgo import (
-    correct_image_data, mask_image_data, nanmean_image_data
+    correct_image_data, mask_image_data, nanmean_image_data, pump_probe_mean,
+    nanmedian_image_data, nanstd_image_data, sigma_clipped_nanmean_image_data,
+    ImageStatsAccumulator, PixelCorrelationAccumulator, BadPixel, compute_bad_pixel_mask, photonize,
+    roi_statistics, roi_projection, image_moments, bin_image, upsample_image,
+    ImageRegistration, PeakFinder, find_clusters
 )
 from pyfoamalgo.lib.imageproc import movingAvgImageData
 
@@ -63,6 +69,23 @@ class TestImageProc:
             np.testing.assert_array_almost_equal(np.nanmean(data[0:3:2, ...], axis=0),
                                                  nanmean_image_data(data, kept=[0, 2]))
 
+            # write into a pre-allocated array
+            out = np.empty((2, 3), dtype=dtype)
+            assert nanmean_image_data(data, out=out) is out
+            np.testing.assert_array_almost_equal(expected, out)
+            assert nanmean_image_data(data, kept=[0, 2], out=out) is out
+            np.testing.assert_array_almost_equal(np.nanmean(data[0:3:2, ...], axis=0), out)
+
+        # output has a different shape
+        with pytest.raises(ValueError):
+            nanmean_image_data(data, out=np.empty((3, 2), dtype=dtype))
+
+        # input is a 2D array and the output is pre-allocated
+        data = np.random.randn(2, 2).astype(dtype)
+        out = np.empty((2, 2), dtype=dtype)
+        assert nanmean_image_data(data, out=out) is out
+        np.testing.assert_array_equal(data, out)
+
         # ---
         # input are two images
         # ---
@@ -82,6 +105,618 @@ class TestImageProc:
         expected = np.array([[1., 0.5, 3], [np.inf, np.nan, -np.inf]])
         np.testing.assert_array_almost_equal(expected, nanmean_image_data(img1, img2))
 
+        out = np.empty((2, 3), dtype=dtype)
+        assert nanmean_image_data(img1, img2, out=out) is out
+        np.testing.assert_array_almost_equal(expected, out)
+
+    @pytest.mark.parametrize("dtype", __NAN_DTYPES__)
+    def testPumpProbeMean(self, dtype):
+        data = np.random.RandomState(1).rand(6, 4, 5).astype(dtype)
+        data[0, 0, 0] = np.nan
+        data[2, 0, 0] = np.nan
+        data[3, 1, 1] = np.nan
+
+        # alternating on/off
+        ret = pump_probe_mean(data, (1, 0))
+        assert ret.shape == (2, 4, 5)
+        assert ret.dtype == dtype
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            np.testing.assert_array_almost_equal(
+                nanmean_image_data(data, kept=[1, 3, 5]), ret[0])
+            np.testing.assert_array_almost_equal(np.nanmean(data[::2], axis=0), ret[1])
+
+        # ignored images and empty groups
+        pattern = [2, -1, 0, 2, -1, 0]
+        out = np.empty((3, 4, 5), dtype=dtype)
+        ret = pump_probe_mean(data, pattern, out=out)
+        assert ret is out
+        np.testing.assert_array_almost_equal(data[[2, 5]].mean(axis=0)[1:], ret[0][1:])
+        assert ret[0, 0, 0] == data[5, 0, 0]
+        assert np.all(np.isnan(ret[1]))
+        np.testing.assert_array_almost_equal(nanmean_image_data(data, kept=[0, 3]), ret[2])
+
+        with pytest.raises(ValueError, match="Label"):
+            pump_probe_mean(data, [0, 1, 2], out=np.empty((2, 4, 5), dtype=dtype))
+
+    @pytest.mark.parametrize("dtype", __NAN_DTYPES__)
+    def testNanmedianImageData(self, dtype):
+        with pytest.raises(TypeError):
+            nanmedian_image_data(np.ones(2, dtype=dtype))
+        with pytest.raises(ValueError):
+            nanmedian_image_data(np.ones((2, 2, 2), dtype=dtype), kept=[])
+
+        data = np.random.randn(2, 2).astype(dtype)
+        ret = nanmedian_image_data(data)
+        np.testing.assert_array_equal(data, ret)
+        assert ret is not data
+
+        data = np.random.randn(5, 3, 4).astype(dtype)
+        data[::2, 0, 0] = np.nan
+        data[:, 1, 1] = np.nan
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+
+            np.testing.assert_array_almost_equal(np.nanmedian(data, axis=0),
+                                                 nanmedian_image_data(data))
+            np.testing.assert_array_almost_equal(np.nanmedian(data[[0, 1, 3]], axis=0),
+                                                 nanmedian_image_data(data, kept=[0, 1, 3]))
+            np.testing.assert_array_almost_equal(np.nanmedian(data[[0, 2]], axis=0),
+                                                 nanmedian_image_data(data, kept=[0, 2]))
+
+    @pytest.mark.parametrize("dtype", __NAN_DTYPES__)
+    def testNanstdImageData(self, dtype):
+        with pytest.raises(ValueError):
+            nanstd_image_data(np.ones((2, 2, 2), dtype=dtype), kept=[])
+
+        img = np.array([[1, np.nan], [np.inf, 2]], dtype=dtype)
+        ret = nanstd_image_data(img)
+        assert ret.dtype == dtype
+        np.testing.assert_array_equal([[0, np.nan], [np.nan, 0]], ret)
+
+        data = np.random.randn(5, 3, 4).astype(dtype)
+        data[::2, 0, 0] = np.nan
+        data[:, 1, 1] = np.nan
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+
+            np.testing.assert_array_almost_equal(np.nanstd(data, axis=0),
+                                                 nanstd_image_data(data))
+            np.testing.assert_array_almost_equal(np.nanstd(data[[1, 2, 4]], axis=0),
+                                                 nanstd_image_data(data, kept=[1, 2, 4]))
+
+        # precision with a large number of images
+        data = (1e4 + np.random.randn(20000, 2, 2)).astype(dtype)
+        np.testing.assert_allclose(np.std(data.astype(np.float64), axis=0),
+                                   nanstd_image_data(data), rtol=1e-5)
+
+    @pytest.mark.parametrize("dtype", __NAN_DTYPES__)
+    def testSigmaClippedNanmeanImageData(self, dtype):
+        with pytest.raises(ValueError):
+            sigma_clipped_nanmean_image_data(np.ones((2, 2, 2), dtype=dtype), kept=[])
+        with pytest.raises(ValueError):
+            sigma_clipped_nanmean_image_data(np.ones((2, 2, 2), dtype=dtype), sigma=0)
+
+        data = np.ones((20, 3, 4), dtype=dtype)
+        data[::2] = 2
+        data[3, 0, 0] = 1000
+        data[:, 1, 1] = np.nan
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+
+            ret = sigma_clipped_nanmean_image_data(data)
+            expected = np.full((3, 4), 1.5, dtype=dtype)
+            expected[0, 0] = np.mean(np.delete(data[:, 0, 0], 3))
+            expected[1, 1] = np.nan
+            np.testing.assert_array_almost_equal(expected, ret)
+
+            # the outlier is not rejected without iteration
+            ret = sigma_clipped_nanmean_image_data(data, max_iter=0)
+            np.testing.assert_array_almost_equal(np.nanmean(data, axis=0), ret)
+
+            ret = sigma_clipped_nanmean_image_data(data, kept=[1, 3, 5, 7], sigma=1)
+            assert 1 == ret[0, 1]
+            assert 1 == ret[0, 0]
+
+    @pytest.mark.parametrize("dtype", [np.float32, np.float64, np.uint16])
+    def testImageStatsAccumulator(self, dtype):
+        data = (100 + 10 * np.random.randn(40, 3, 4)).astype(dtype)
+        if dtype != np.uint16:
+            data[5, 1, 2] = np.nan
+
+        acc = ImageStatsAccumulator(3, 4)
+        acc.update(data[:10])
+        for img in data[10:20]:
+            acc.update(img)
+        other = ImageStatsAccumulator(3, 4)
+        other.update(data[20:])
+        acc.merge(other)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+
+            np.testing.assert_array_equal(np.sum(~np.isnan(data), axis=0)[np.newaxis],
+                                          acc.count())
+            np.testing.assert_array_almost_equal(
+                np.nanmean(data.astype(np.float64), axis=0)[np.newaxis], acc.mean())
+            np.testing.assert_array_almost_equal(
+                np.nanvar(data.astype(np.float64), axis=0)[np.newaxis], acc.variance())
+            np.testing.assert_array_almost_equal(
+                np.nanstd(data.astype(np.float64), axis=0, ddof=1)[np.newaxis], acc.std(ddof=1))
+
+        with pytest.raises(ValueError, match="different shapes"):
+            acc.update(np.ones((2, 3, 3), dtype=dtype))
+        with pytest.raises(ValueError, match="different shapes"):
+            acc.merge(ImageStatsAccumulator(3, 4, 2))
+
+        acc.reset()
+        assert np.all(acc.count() == 0)
+        assert np.all(np.isnan(acc.mean()))
+
+        # memory cells
+        acc = ImageStatsAccumulator(3, 4, n_cells=2)
+        acc.update(data[:2])
+        acc.update(data[2:4])
+        acc.update(data[4:6], cells=[1, 1])
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+
+            expected = np.stack([np.nanmean(data[0:4:2].astype(np.float64), axis=0),
+                                 np.nanmean(np.concatenate([data[1:4:2], data[4:6]])
+                                            .astype(np.float64), axis=0)])
+            np.testing.assert_array_almost_equal(expected, acc.mean())
+
+        with pytest.raises(ValueError):
+            acc.update(data[:3])
+        with pytest.raises(ValueError):
+            acc.update(data[:2], cells=[0, 2])
+        with pytest.raises(ValueError):
+            acc.update(data[0])
+
+    @pytest.mark.parametrize("dtype", [np.float32, np.float64, np.uint16])
+    def testPixelCorrelationAccumulator(self, dtype):
+        rng = np.random.RandomState(1)
+        scalars = rng.rand(40)
+        data = (100 + 10 * rng.randn(40, 3, 4)).astype(dtype)
+        data[:, 0, 0] = 100 + 50 * scalars
+        data[:, 0, 1] = 100 - 50 * scalars
+        if dtype != np.uint16:
+            data[5, 1, 2] = np.nan
+
+        acc = PixelCorrelationAccumulator(3, 4)
+        acc.update(data[:10], scalars[:10])
+        for img, s in zip(data[10:20], scalars[10:20]):
+            acc.update(img, s)
+        other = PixelCorrelationAccumulator(3, 4)
+        other.update(data[20:], scalars[20:])
+        acc.merge(other)
+
+        x = data.astype(np.float64)
+        valid = ~np.isnan(x)
+        y = np.where(valid, scalars[:, np.newaxis, np.newaxis], np.nan)
+        cov = np.nanmean((x - np.nanmean(x, axis=0)) * (y - np.nanmean(y, axis=0)), axis=0)
+        corr = cov / (np.nanstd(x, axis=0) * np.nanstd(y, axis=0))
+
+        np.testing.assert_array_equal(valid.sum(axis=0), acc.count())
+        np.testing.assert_array_almost_equal(cov, acc.covariance())
+        np.testing.assert_array_almost_equal(cov[:, :2] * 40 / 39, acc.covariance(ddof=1)[:, :2])
+        np.testing.assert_array_almost_equal(corr, acc.correlation())
+        assert acc.correlation()[0, 0] > 0.99
+        assert acc.correlation()[0, 1] < -0.99
+
+        # images with NaN scalars are skipped
+        acc.update(data[:2], [np.nan, np.nan])
+        np.testing.assert_array_equal(valid.sum(axis=0), acc.count())
+
+        with pytest.raises(ValueError, match="different"):
+            acc.update(data[:2], scalars[:3])
+        with pytest.raises(ValueError, match="different shapes"):
+            acc.update(np.ones((2, 3, 3), dtype=dtype), scalars[:2])
+        with pytest.raises(ValueError, match="different shapes"):
+            acc.merge(PixelCorrelationAccumulator(3, 3))
+
+        acc.reset()
+        assert np.all(acc.count() == 0)
+        assert np.all(np.isnan(acc.correlation()))
+
+    @pytest.mark.parametrize("dtype", __NAN_DTYPES__)
+    def testComputeBadPixelMask(self, dtype):
+        mean = np.array([[1, 5, np.nan], [-1, 2, 2]], dtype=dtype)
+        std = np.array([[1, 1, 1], [1, 0, 9]], dtype=dtype)
+
+        with pytest.raises(ValueError, match="Unknown threshold type"):
+            compute_bad_pixel_mask(mean, std, mean_threshold_type='abc')
+
+        ret = compute_bad_pixel_mask(mean, std)
+        assert ret.dtype == np.uint8
+        np.testing.assert_array_equal([[0, 0, int(BadPixel.NaN)], [0, 0, 0]], ret)
+
+        ret = compute_bad_pixel_mask(mean, std, mean_threshold=(0, 4), std_threshold=(0.1, 5))
+        np.testing.assert_array_equal([[0, int(BadPixel.Hot), int(BadPixel.NaN)],
+                                       [int(BadPixel.Cold), int(BadPixel.Dead), int(BadPixel.Noisy)]],
+                                      ret)
+
+        # one-sided bound
+        ret = compute_bad_pixel_mask(mean, std, mean_threshold=(None, 4))
+        np.testing.assert_array_equal([[0, int(BadPixel.Hot), int(BadPixel.NaN)], [0, 0, 0]], ret)
+
+        # bool mask can be used as image mask directly
+        ret = compute_bad_pixel_mask(mean, std, mean_threshold=(0, 4), as_bool=True)
+        np.testing.assert_array_equal([[False, True, True], [True, False, False]], ret)
+        img = np.ones((2, 3), dtype=IMAGE_DTYPE)
+        mask_image_data(img, image_mask=ret)
+        np.testing.assert_array_equal([[1, np.nan, np.nan], [np.nan, 1, 1]], img)
+
+        # thresholds in sigma and percentile
+        mean = np.ones((2, 10, 10), dtype=dtype)
+        mean[1] += 0.1 * np.arange(100).reshape(10, 10)
+        mean[0, 1, 1] = 10
+        std = np.ones((2, 10, 10), dtype=dtype)
+        std[:, 2, 2] = 0.
+        ret = compute_bad_pixel_mask(mean, std,
+                                     mean_threshold=(None, 3), mean_threshold_type='sigma',
+                                     std_threshold=(5, None), std_threshold_type='percentile')
+        assert ret.shape == (2, 10, 10)
+        assert ret[0, 1, 1] == int(BadPixel.Hot)
+        assert np.count_nonzero(ret[0] & int(BadPixel.Hot)) == 1
+        # the upper bound of the second map is above its maximum
+        assert np.count_nonzero(ret[1] & int(BadPixel.Hot)) == 0
+        assert ret[0, 2, 2] == ret[1, 2, 2] == int(BadPixel.Dead)
+
+        ret = compute_bad_pixel_mask(mean, std, mean_threshold=(10, 90),
+                                     mean_threshold_type='percentile')
+        assert np.count_nonzero(ret[1] & int(BadPixel.Cold)) == 10
+        assert np.count_nonzero(ret[1] & int(BadPixel.Hot)) == 10
+
+    @pytest.mark.parametrize("dtype", [IMAGE_DTYPE, np.uint16])
+    def testPhotonize(self, dtype):
+        data = np.array([[0, 4, 5], [14, 16, 3000]], dtype=dtype)
+        if dtype == IMAGE_DTYPE:
+            data[0, 0] = np.nan
+
+        ret = photonize(data, 10)
+        assert ret.dtype == np.uint16
+        np.testing.assert_array_equal([[0, 0, 1], [1, 2, 300]], ret)
+
+        ret = photonize(data, 10, 15, dtype=np.uint8)
+        assert ret.dtype == np.uint8
+        np.testing.assert_array_equal([[0, 0, 0], [0, 2, 255]], ret)
+
+        out = np.ones((2, 3), dtype=np.uint8)
+        assert photonize(data, 10, out=out) is out
+        np.testing.assert_array_equal([[0, 0, 1], [1, 2, 255]], out)
+
+        with pytest.raises(ValueError, match="shapes"):
+            photonize(data, 10, out=np.ones((3, 2), dtype=np.uint8))
+
+        with pytest.raises(ValueError, match="positive"):
+            photonize(data, 0)
+
+        with pytest.raises(TypeError):
+            photonize(data, 10, dtype=np.float32)
+
+        # array of images
+        data = np.tile(data, (4, 1, 1))
+        ret = photonize(data, 10)
+        assert ret.shape == (4, 2, 3)
+        np.testing.assert_array_equal(np.tile([[0, 0, 1], [1, 2, 300]], (4, 1, 1)), ret)
+
+    @pytest.mark.parametrize("dtype", __NAN_DTYPES__)
+    def testRoiStatistics(self, dtype):
+        data = np.arange(60, dtype=dtype).reshape(5, 3, 4)
+        data[1, 0, 0] = np.nan
+        rois = [(0, 0, 2, 2), (2, 1, 10, 10), (-5, -5, 2, 2)]
+        stats = ('sum', 'nansum', 'mean', 'nanmean', 'min', 'nanmin', 'max', 'nanmax')
+        funcs = (np.sum, np.nansum, np.mean, np.nanmean, np.min, np.nanmin, np.max, np.nanmax)
+
+        ret = roi_statistics(data, rois, stats)
+        assert ret.shape == (5, 3, 8)
+        assert ret.dtype == np.float64
+        for i in range(len(data)):
+            for j, (x, y, w, h) in enumerate(rois[:2]):
+                roi = data[i, y:y + h, x:x + w]
+                np.testing.assert_array_almost_equal([f(roi) for f in funcs], ret[i, j])
+            # no overlap
+            np.testing.assert_array_equal([0, 0] + [np.nan] * 6, ret[i, 2])
+
+        # image
+        ret = roi_statistics(data[0], rois)
+        assert ret.shape == (3, 4)
+        np.testing.assert_array_almost_equal([10, 2.5, 0, 5], ret[0])
+
+        # no ROI
+        assert roi_statistics(data, []).shape == (5, 0, 4)
+
+        with pytest.raises(ValueError, match="Unknown ROI statistic"):
+            roi_statistics(data, rois, ('sum', 'std'))
+
+    @pytest.mark.parametrize("dtype", __NAN_DTYPES__)
+    def testRoiProjection(self, dtype):
+        data = np.arange(60, dtype=dtype).reshape(5, 3, 4)
+        data[1, :2, 0] = np.nan
+        rois = [(0, 0, 2, 2), (2, 1, 10, 10), (-5, -5, 2, 2)]
+
+        with pytest.raises(ValueError, match="Axis"):
+            roi_projection(data, rois, axis=0)
+
+        for axis in (-1, -2):
+            for average, f in ((False, np.nansum), (True, np.nanmean)):
+                ret = roi_projection(data, rois, axis=axis, average=average)
+                assert len(ret) == 3
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore", category=RuntimeWarning)
+                    for (x, y, w, h), proj in zip(rois[:2], ret):
+                        assert proj.dtype == dtype
+                        np.testing.assert_array_almost_equal(
+                            f(data[:, y:y + h, x:x + w], axis=axis), proj)
+                # no overlap
+                assert ret[2].shape == (5, 0)
+
+        # image with pre-allocated output
+        out = np.zeros(4, dtype=dtype)
+        ret = roi_projection(data[0], rois, out=out)
+        assert all(proj.base is out for proj in ret)
+        np.testing.assert_array_equal([4, 6], ret[0])
+        np.testing.assert_array_equal([16, 18], ret[1])
+        np.testing.assert_array_equal([4, 6, 16, 18], out)
+
+        with pytest.raises(ValueError, match="shape"):
+            roi_projection(data, rois, out=np.zeros((5, 3), dtype=dtype))
+
+        assert roi_projection(data, []) == []
+
+    @pytest.mark.parametrize("dtype", __NAN_DTYPES__)
+    def testImageMoments(self, dtype):
+        def moments(img):
+            img = np.nan_to_num(img.astype(np.float64))
+            y, x = np.indices(img.shape)
+            w = np.clip(img, 0, None)
+            total = w.sum()
+            cy, cx = (w * y).sum() / total, (w * x).sum() / total
+            return [img.sum(), cy, cx,
+                    np.sqrt((w * (y - cy) ** 2).sum() / total),
+                    np.sqrt((w * (x - cx) ** 2).sum() / total)]
+
+        data = np.random.RandomState(1).rand(4, 20, 30).astype(dtype)
+        data[1, 2, 3] = np.nan
+
+        # array of images
+        ret = image_moments(data)
+        assert ret.shape == (4, 5)
+        np.testing.assert_allclose([moments(img) for img in data], ret, rtol=1e-5)
+
+        # image
+        np.testing.assert_allclose(moments(data[1]), image_moments(data[1]), rtol=1e-5)
+
+        # ROI
+        ret = image_moments(data, roi=(5, 2, 10, 100))
+        expected = np.array([moments(img[2:, 5:15]) for img in data])
+        expected[:, 1] += 2
+        expected[:, 2] += 5
+        np.testing.assert_allclose(expected, ret, rtol=1e-5)
+
+        ret = image_moments(data[0], roi=(50, 2, 10, 10))
+        assert ret[0] == 0
+        assert np.all(np.isnan(ret[1:]))
+
+        # mask
+        mask = np.zeros((20, 30), dtype=bool)
+        mask[:, 10:] = True
+        masked = data.copy()
+        masked[:, mask] = 0
+        np.testing.assert_allclose(image_moments(masked), image_moments(data, mask), rtol=1e-5)
+        np.testing.assert_allclose(image_moments(masked[2]), image_moments(data[2], mask), rtol=1e-5)
+
+        with pytest.raises(ValueError):
+            image_moments(data, np.zeros((20, 29), dtype=bool))
+
+        # negative total, e.g. dark-subtracted images
+        dark = data - dtype(0.9)
+        ret = image_moments(dark)
+        assert np.all(ret[:, 0] < 0)
+        np.testing.assert_allclose([moments(img) for img in dark], ret, rtol=1e-5)
+        assert np.all((ret[:, 1] >= 0) & (ret[:, 1] < 20) & (ret[:, 2] >= 0) & (ret[:, 2] < 30))
+        ret = image_moments(-data[0])
+        assert ret[0] < 0
+        assert np.all(np.isnan(ret[1:]))
+
+    @pytest.mark.parametrize("dtype", __NAN_DTYPES__)
+    def testBinImage(self, dtype):
+        data = np.arange(30, dtype=dtype).reshape(2, 3, 5)
+        data[1, :2, :2] = np.nan
+
+        with pytest.raises(ValueError, match="Unknown binning operation"):
+            bin_image(data, 2, op='median')
+        with pytest.raises(ValueError, match="positive"):
+            bin_image(data, 0)
+
+        ret = bin_image(data, 2)
+        assert ret.shape == (2, 2, 3)
+        assert ret.dtype == dtype
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            for i in range(2):
+                for j in range(2):
+                    for k in range(3):
+                        block = data[i, 2 * j:2 * j + 2, 2 * k:2 * k + 2]
+                        np.testing.assert_array_almost_equal(np.nanmean(block), ret[i, j, k])
+        assert np.isnan(ret[1, 0, 0])
+
+        ret = bin_image(data, 2, op='sum')
+        assert ret[0, 0, 0] == 12
+        assert ret[1, 0, 0] == 0
+
+        # image with pre-allocated output
+        out = np.zeros((1, 1), dtype=dtype)
+        assert bin_image(data[0], 5, op='sum', out=out) is out
+        assert out[0, 0] == np.sum(data[0])
+
+        with pytest.raises(ValueError, match="shape"):
+            bin_image(data[0], 2, out=out)
+
+    @pytest.mark.parametrize("dtype", __NAN_DTYPES__)
+    def testUpsampleImage(self, dtype):
+        data = np.arange(12, dtype=dtype).reshape(2, 2, 3)
+
+        ret = upsample_image(data, 2)
+        assert ret.dtype == dtype
+        np.testing.assert_array_equal(data.repeat(2, axis=1).repeat(2, axis=2), ret)
+
+        ret = upsample_image(data[0], 3, (5, 7))
+        np.testing.assert_array_equal(data[0].repeat(3, axis=0).repeat(3, axis=1)[:5, :7], ret)
+
+        out = np.zeros((2, 3, 5), dtype=np.float64)
+        assert upsample_image(data, 2, out=out) is out
+        np.testing.assert_array_equal(data.repeat(2, axis=1).repeat(2, axis=2)[:, :3, :5], out)
+
+        with pytest.raises(ValueError, match="cannot be up-sampled"):
+            upsample_image(data[0], 2, (5, 5))
+
+        # inverse of binning in terms of shape
+        assert bin_image(upsample_image(data, 3, (6, 8)), 3).shape == data.shape
+
+    @pytest.mark.parametrize("dtype", __NAN_DTYPES__)
+    def testImageRegistration(self, dtype):
+        def gaussian(y0, x0, shape=(64, 48), sigma=3.):
+            y, x = np.ogrid[:shape[0], :shape[1]]
+            return np.exp(-((y - y0) ** 2 + (x - x0) ** 2) / (2 * sigma ** 2)).astype(dtype)
+
+        ref = gaussian(30, 20)
+
+        reg = ImageRegistration()
+        with pytest.raises(ValueError, match="Reference image has not been set"):
+            reg.register(ref)
+        with pytest.raises(ValueError, match="Reference must be an image"):
+            reg.set_reference(ref[np.newaxis])
+
+        reg.set_reference(ref)
+        with pytest.raises(ValueError, match="do not match the reference"):
+            reg.register(ref[:-1])
+
+        # integer shifts, including wrapping around the edges
+        data = np.stack([np.roll(ref, shift, axis=(0, 1))
+                         for shift in [(0, 0), (3, -5), (-20, 10), (40, 0)]])
+        np.testing.assert_allclose(
+            [[0, 0], [3, -5], [-20, 10], [-24, 0]], reg.register(data), atol=0.05)
+
+        # NaN pixels
+        img = np.roll(ref, (2, 1), axis=(0, 1))
+        img[:5] = np.nan
+        np.testing.assert_allclose([2, 1], reg.register(img), atol=0.05)
+
+        # subpixel shifts
+        reg = ImageRegistration(ref, normalize=False, workers=2)
+        data = np.stack([gaussian(30 + dy, 20 + dx)
+                         for dy, dx in [(0.3, -0.4), (-2.5, 1.2)]])
+        np.testing.assert_allclose([[0.3, -0.4], [-2.5, 1.2]], reg.register(data), atol=0.1)
+
+        # fall back to numpy.fft without scipy
+        with patch.dict(sys.modules, {'scipy.fft': None}):
+            reg = ImageRegistration(ref, normalize=False, workers=2)
+            np.testing.assert_allclose([[0.3, -0.4], [-2.5, 1.2]], reg.register(data), atol=0.1)
+
+    @pytest.mark.parametrize("dtype", __NAN_DTYPES__)
+    def testPeakFinder(self, dtype):
+        def add_peak(img, y, x, a):
+            img[y, x] += a
+            img[y - 1:y + 2:2, x] += a / 2
+            img[y, x - 1:x + 2:2] += a / 2
+
+        with pytest.raises(ValueError, match="min_pixels"):
+            PeakFinder(30, 6, min_pixels=3, max_pixels=2)
+        with pytest.raises(ValueError, match="min_snr"):
+            PeakFinder(30, -1)
+
+        data = np.random.RandomState(1).normal(10, 1, size=(4, 32, 40)).astype(dtype)
+        add_peak(data[0], 10, 10, 100)
+        add_peak(data[1], 5, 30, 80)
+        add_peak(data[1], 20, 8, 60)
+        data[2, 15, 15] += 100  # single-pixel peak
+        data[3, 0, 0] = np.nan
+
+        finder = PeakFinder(30, 6, min_pixels=2, local_bg_radius=3)
+        peaks, counts = finder.find(data)
+        np.testing.assert_array_equal([1, 2, 0, 0], counts)
+        assert peaks.shape == (3, 5)
+        np.testing.assert_allclose([[10, 10], [5, 30], [20, 8]], peaks[:, :2], atol=0.1)
+        np.testing.assert_array_equal([5, 5, 5], peaks[:, 3])
+        assert abs(peaks[0, 2] - 300) < 10
+        assert np.all(peaks[:, 4] > 6)
+
+        # image
+        np.testing.assert_array_equal(peaks[1:], finder.find(data[1]))
+
+        # mask
+        mask = np.zeros((32, 40), dtype=bool)
+        mask[3:8, 28:33] = True
+        _, counts = finder.find(data, mask)
+        np.testing.assert_array_equal([1, 1, 0, 0], counts)
+        assert finder.find(data[1], mask).shape == (1, 5)
+
+        # single-pixel peak and maximum number of peaks, where the number of
+        # peaks found is larger than the number of peaks returned
+        peaks, counts = PeakFinder(30, 6, min_pixels=1, max_peaks=1).find(data)
+        np.testing.assert_array_equal([1, 2, 1, 0], counts)
+        assert peaks.shape == (3, 5)
+        np.testing.assert_allclose([[10, 10], [5, 30], [15, 15]], peaks[:, :2], atol=0.1)
+
+        # pixels of a nearby peak are not counted since they are not connected
+        img = np.full((12, 12), 10, dtype=dtype)
+        img[5, 5] = 110
+        img[5, 7] = 100
+        assert finder.find(img).shape == (0, 5)
+        peaks = PeakFinder(30, 6, min_pixels=1).find(img)
+        np.testing.assert_array_equal([[5, 5, 100, 1], [5, 7, 90, 1]], peaks[:, :4])
+
+    @pytest.mark.parametrize("dtype", __NAN_DTYPES__)
+    def testFindClusters(self, dtype):
+        with pytest.raises(ValueError, match="Connectivity"):
+            find_clusters(np.zeros((2, 2), dtype=dtype), 0.5, connectivity=6)
+
+        img = np.array([[1, 0, 1, 0, 0, 2],
+                        [1, 0, 1, 0, 2, 0],
+                        [1, 1, 1, 0, 0, 0],
+                        [0, 0, 0, 0, 0, np.nan],
+                        [3, 0, 0, 0, 0, 1]], dtype=dtype)
+
+        clusters = find_clusters(img, 0.5)
+        np.testing.assert_array_equal([0, 0, 0, 0], clusters['pulse'])
+        np.testing.assert_array_equal([0, 1, 2, 3], clusters['cluster_id'])
+        np.testing.assert_array_equal([7, 2, 1, 1], clusters['npix'])
+        np.testing.assert_array_equal([7, 4, 3, 1], clusters['sum'])
+        np.testing.assert_allclose([8 / 7, 0.5, 4, 4], clusters['cy'])
+        np.testing.assert_allclose([1, 4.5, 0, 5], clusters['cx'])
+
+        # connectivity and minimum number of pixels
+        clusters = find_clusters(img, 0.5, connectivity=4)
+        np.testing.assert_array_equal([7, 1, 1, 1, 1], clusters['npix'])
+        np.testing.assert_array_equal([7], find_clusters(img, 0.5, min_pixels=2)['sum'][:1])
+
+        # the center is not weighted for a cluster with non-positive pixels
+        img_dark = np.array([[-1, -1, 1],
+                             [np.nan, np.nan, np.nan],
+                             [-1, 0, 1],
+                             [np.nan, np.nan, np.nan],
+                             [-1, -1, 2.5]], dtype=dtype)
+        clusters = find_clusters(img_dark, -2)
+        np.testing.assert_array_equal([-1, 0, 0.5], clusters['sum'])
+        np.testing.assert_allclose([0, 2, 4], clusters['cy'])
+        np.testing.assert_allclose([1, 1, 1], clusters['cx'])
+
+        # array of images
+        data = np.zeros((3, *img.shape), dtype=dtype)
+        data[0] = img
+        data[2] = img
+        data[2, 0, 0] = 0
+        clusters = find_clusters(data, 0.5)
+        np.testing.assert_array_equal([0] * 4 + [2] * 4, clusters['pulse'])
+        np.testing.assert_array_equal([0, 1, 2, 3] * 2, clusters['cluster_id'])
+        np.testing.assert_array_equal([7, 2, 1, 1, 6, 2, 1, 1], clusters['npix'])
+        assert find_clusters(np.zeros_like(data), 0.5).shape == (0,)
+
     def testMovingAverage(self):
         dtype = IMAGE_DTYPE
 
@@ -66,6 +66,27 @@ class TestSampling(unittest.TestCase):
         with self.assertRaises(ValueError):
             down_sample(np.arange(16).reshape(2, 2, 2, 2))
 
+    def test_downsample_with_op(self):
+        x1 = np.array([1, 2, np.nan], dtype=np.float32)
+        np.testing.assert_array_equal([1.5, np.nan], down_sample(x1, op='mean'))
+        np.testing.assert_array_equal([3, 0], down_sample(x1, op='sum'))
+
+        x2 = np.arange(16, dtype=np.float64).reshape(4, 4)
+        np.testing.assert_array_equal([[2.5, 4.5], [10.5, 12.5]], down_sample(x2, op='mean'))
+        np.testing.assert_array_equal([[120]], down_sample(x2, 4, op='sum'))
+
+        x3 = np.stack([x2, x2])
+        np.testing.assert_array_equal([[[2.5, 4.5], [10.5, 12.5]]] * 2, down_sample(x3, op='mean'))
+
+        # strided with a given rate
+        np.testing.assert_array_equal([[0, 3], [12, 15]], down_sample(x2, 3))
+
+        with self.assertRaises(ValueError):
+            down_sample(x2, op='median')
+
+        with self.assertRaises(ValueError):
+            down_sample(np.arange(16.).reshape(2, 2, 2, 2), op='mean')
+
     def test_upsample(self):
         x1 = np.array([1, 2])
         x1_gt = np.array([1, 1, 2, 2])
@@ -124,3 +145,21 @@ class TestSampling(unittest.TestCase):
 
         with self.assertRaises(ValueError):
             up_sample(np.arange(16).reshape(2, 2, 2, 2), (2, 4, 4, 4))
+
+    def test_upsample_with_rate(self):
+        for dtype in (np.int64, np.float32, np.float64):
+            x2 = np.array([[1, 2],
+                           [3, 4]], dtype=dtype)
+            with self.assertRaises(ValueError):
+                up_sample(x2, (7, 6), 3)
+            ret = up_sample(x2, (5, 6), 3)
+            self.assertEqual(np.float64, ret.dtype)
+            np.testing.assert_array_equal(x2.repeat(3, axis=0).repeat(3, axis=1)[:5, :6], ret)
+
+            x3 = np.stack([x2, 2 * x2])
+            ret = up_sample(x3, (2, 4, 3), 2)
+            self.assertEqual(np.float64, ret.dtype)
+            np.testing.assert_array_equal(x3.repeat(2, axis=1).repeat(2, axis=2)[:, :4, :3], ret)
+
+            # self-consistent with down-sampling
+            np.testing.assert_array_equal(x2, down_sample(up_sample(x2, (5, 6), 3), 3))
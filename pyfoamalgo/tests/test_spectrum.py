@@ -1,8 +1,9 @@
 import pytest
 
 import numpy as np
+from scipy.stats import binned_statistic
 
-from pyfoamalgo.spectrum import compute_spectrum_1d
+from pyfoamalgo.spectrum import compute_spectrum_1d, SpectrumAccumulator
 
 
 class TestSpectrum:
@@ -41,3 +42,72 @@ class TestSpectrum:
 
         _, edges, _ = compute_spectrum_1d(x, y, n_bins=5, edge2center=False)
         np.testing.assert_array_almost_equal([0., 1.8, 3.6, 5.4, 7.2, 9.], edges)
+
+    def testSpectrumAccumulator(self):
+        with pytest.raises(ValueError, match="Edges"):
+            SpectrumAccumulator(1, 1)
+        with pytest.raises(ValueError, match="positive"):
+            SpectrumAccumulator(0, 10, n_bins=0, n_fine_bins=100)
+
+        acc = SpectrumAccumulator(0, 10, n_bins=5, n_fine_bins=100)
+        assert 5 == acc.n_bins
+        np.testing.assert_array_almost_equal([0, 2, 4, 6, 8, 10], acc.edges())
+        np.testing.assert_array_almost_equal([1, 3, 5, 7, 9], acc.centers())
+
+        # empty spectrum
+        stats, centers, counts = acc.get()
+        np.testing.assert_array_equal(np.full(5, np.nan), stats)
+        np.testing.assert_array_equal(np.zeros(5), counts)
+        stats, _, _ = acc.get(nan_to_num=True)
+        np.testing.assert_array_equal(np.zeros(5), stats)
+
+        xs, ys = [], []
+        for _ in range(10):
+            x = 12 * np.random.rand(20) - 1
+            y = np.random.randn(20)
+            y[::7] = np.nan
+            acc.update(x, y)
+            xs.append(x)
+            ys.append(y)
+        x = np.concatenate(xs)
+        y = np.concatenate(ys)
+        valid = ~np.isnan(y)
+        x, y = x[valid], y[valid]
+
+        for n_bins in [5, 1, 20, 100]:
+            acc.n_bins = n_bins
+            stats_gt, edges_gt, counts_gt = compute_spectrum_1d(
+                x, y, n_bins, bin_range=(0, 10), edge2center=False)
+            stats, edges, counts = acc.get(edge2center=False)
+            np.testing.assert_array_almost_equal(stats_gt, stats)
+            np.testing.assert_array_almost_equal(edges_gt, edges)
+            np.testing.assert_array_equal(counts_gt, counts)
+
+            std_gt, _, _ = binned_statistic(x, y, 'std', n_bins, range=(0, 10))
+            np.testing.assert_array_almost_equal(std_gt ** 2, acc.var())
+
+        # the number of bins is not a divisor of n_fine_bins
+        acc.n_bins = 7
+        stats, _, counts = acc.get()
+        in_range = (x >= 0) & (x <= 10)
+        assert counts.sum() == pytest.approx(in_range.sum())
+        assert np.sum(stats * counts) == pytest.approx(y[in_range].sum())
+
+        with pytest.raises(ValueError):
+            acc.n_bins = 0
+        assert 7 == acc.n_bins
+        acc.n_bins = 100
+
+        acc.reset()
+        _, _, counts = acc.get()
+        np.testing.assert_array_equal(np.zeros(100), counts)
+
+    def testSpectrumAccumulatorFractionalRebin(self):
+        acc = SpectrumAccumulator(0, 12, n_bins=3, n_fine_bins=4)
+        # the 2nd and 3rd fine bins are split by 1:2 and 2:1
+        acc.update([1, 2, 4, 5, 7, 10, 11, 11.5], [1, 1, 2, 4, 6, 8, 8, 8])
+
+        stats, _, counts = acc.get()
+        np.testing.assert_array_almost_equal([8 / 3, 2, 10 / 3], counts)
+        np.testing.assert_array_almost_equal([1.5, 4, 7.8], stats)
+        np.testing.assert_array_almost_equal([1, 8 / 3, 0.36], acc.var())
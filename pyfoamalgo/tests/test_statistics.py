@@ -5,12 +5,14 @@ import math
 import warnings
 
 import numpy as np
+from scipy.stats import binned_statistic
 
-from pyfoamalgo.config import __NAN_DTYPES__, __ALL_DTYPES__
+from pyfoamalgo.config import __NAN_DTYPES__, __ALL_DTYPES__, __INT_DTYPES__
 from pyfoamalgo.statistics import (
-    histogram1d, hist_with_stats, nanhist_with_stats, compute_statistics,
+    histogram1d, histogram2d, binned_mean_count, hist_with_stats, nanhist_with_stats, compute_statistics,
     _get_outer_edges, nanmean, nansum, nanstd, nanvar, nanmin, nanmax,
-    quick_min_max
+    nanmedian, nanquantile, nan_describe, quick_min_max, StreamingHistogram,
+    QuantileSketch
 )
 
 _patch_dict = {
@@ -19,7 +21,8 @@ _patch_dict = {
     np.nanvar: "numpy.nanvar",
     np.nanstd: "numpy.nanstd",
     np.nanmin: "numpy.nanmin",
-    np.nanmax: "numpy.nanmax"
+    np.nanmax: "numpy.nanmax",
+    np.nanmedian: "numpy.nanmedian"
 }
 
 
@@ -45,6 +48,27 @@ class TestStatistics:
         assert quick_min_max(arr) == (1., 2.)
         assert quick_min_max(arr, q=0.9) == (1, 2)
 
+    def testQuickMinMaxWithSketch(self):
+        sketch = QuantileSketch()
+        arr = np.array([[np.nan, 1, 2, 3, 4], [5, 6, 7, 8, np.nan]])
+        assert quick_min_max(arr, sketch=sketch) == (1., 8.)
+        assert 8 == sketch.count()
+
+        # levels are estimated from all the frames
+        assert quick_min_max(arr + 10, q=0.8, sketch=sketch) == (4, 15)
+        assert 16 == sketch.count()
+
+        with pytest.raises(ValueError):
+            quick_min_max(arr, q=1.1, sketch=sketch)
+        assert 16 == sketch.count()
+
+        # test array size > 1e5
+        sketch.reset()
+        arr = np.ones((1000, 1000), dtype=np.float32)
+        arr[::3] = 2
+        assert quick_min_max(arr, q=0.9, sketch=sketch) == (1, 2)
+        assert sketch.count() <= 1e5
+
     def _assert_array_almost_equal(self, a, b):
         np.testing.assert_array_almost_equal(a, b)
         if isinstance(a, np.ndarray):
@@ -55,7 +79,8 @@ class TestStatistics:
                              [(nanmean, np.nanmean),
                               (nansum, np.nansum),
                               (nanmin, np.nanmin),
-                              (nanmax, np.nanmax)])
+                              (nanmax, np.nanmax),
+                              (nanmedian, np.nanmedian)])
     def testCppStatistics(self, f_cpp, f_py, dtype):
         a1d = np.array([np.nan, 1, 2], dtype=dtype)
         a2d = np.array([[np.nan, 1, 2], [3, 6, np.nan]], dtype=dtype)
@@ -88,6 +113,45 @@ class TestStatistics:
             self._assert_array_almost_equal(f_py(a3d, axis=(-2, -1)), f_cpp(a3d, axis=(-2, -1)))
             self._assert_array_almost_equal(f_py(a4d, axis=(-2, -1)), f_cpp(a4d, axis=(-2, -1)))
 
+    @pytest.mark.parametrize("dtype", __NAN_DTYPES__)
+    @pytest.mark.parametrize("f_cpp, f_py",
+                             [(nanmean, np.nanmean),
+                              (nansum, np.nansum),
+                              (nanstd, np.nanstd),
+                              (nanvar, np.nanvar),
+                              (nanmin, np.nanmin),
+                              (nanmax, np.nanmax),
+                              (nanmedian, np.nanmedian)])
+    def testCppStatisticsWithOut(self, f_cpp, f_py, dtype):
+        a3d = np.array([[[np.nan, np.nan,      2], [3, 6, np.nan]],
+                        [[     1,      4, np.nan], [6, 3, np.nan]]], dtype=dtype)
+        a4d = np.ones((2, 3, 4, 5), dtype=dtype)
+        a4d[:, ::2, ::3, ::4] = np.nan
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+
+            with patch(_patch_dict[f_py]) as mocked:
+                out = np.empty((2, 3), dtype=dtype)
+                assert f_cpp(a3d, axis=0, out=out) is out
+                mocked.assert_not_called()
+            self._assert_array_almost_equal(f_py(a3d, axis=0), out)
+
+            out = np.empty((2, 3), dtype=dtype)
+            f_cpp(a4d, axis=(-2, -1), out=out)
+            self._assert_array_almost_equal(f_py(a4d, axis=(-2, -1)), out)
+
+            # output has a different shape
+            with pytest.raises(ValueError):
+                f_cpp(a4d, axis=0, out=np.empty((3, 5), dtype=dtype))
+
+            # output has a different dtype
+            out = np.empty((2, 3), dtype=np.float64 if dtype == np.float32 else np.float32)
+            with patch(_patch_dict[f_py]) as mocked:
+                f_cpp(a3d, axis=0, out=out)
+                mocked.assert_called_once()
+
+    @pytest.mark.parametrize("dtype", __INT_DTYPES__)
     @pytest.mark.parametrize("f_cpp, f_py",
                              [(nanmean, np.nanmean),
                               (nansum, np.nansum),
@@ -95,6 +159,49 @@ class TestStatistics:
                               (nanvar, np.nanvar),
                               (nanmin, np.nanmin),
                               (nanmax, np.nanmax)])
+    def testCppIntegerStatistics(self, f_cpp, f_py, dtype):
+        a1d = np.array([0, 1, 2], dtype=dtype)
+        a3d = np.random.randint(0, 1000, size=(4, 5, 6)).astype(dtype)
+        # the result overflows the dtype of the data
+        a4d = np.full((2, 3, 4, 5), np.iinfo(dtype).max, dtype=dtype)
+        a4d[:, ::2, ::3, ::4] = np.iinfo(dtype).min
+        a5d = np.arange(120, dtype=dtype).reshape(1, 2, 3, 4, 5)
+
+        with patch(_patch_dict[f_py]) as mocked:
+            f_cpp(a1d)
+            f_cpp(a3d, axis=0)
+            mocked.assert_not_called()
+
+        for a in [a1d, a3d, a4d, a5d]:
+            np.testing.assert_allclose(f_py(a), f_cpp(a))
+        for axis in [0, -1, (1, 2), (0, -1)]:
+            self._assert_array_almost_equal(f_py(a3d, axis=axis), f_cpp(a3d, axis=axis))
+            self._assert_array_almost_equal(f_py(a4d, axis=axis), f_cpp(a4d, axis=axis))
+
+        expected = f_py(a3d, axis=0)
+        with patch(_patch_dict[f_py]) as mocked:
+            out = np.empty((5, 6), dtype=expected.dtype)
+            assert f_cpp(a3d, axis=0, out=out) is out
+            mocked.assert_not_called()
+        self._assert_array_almost_equal(expected, out)
+
+        with pytest.raises(ValueError):
+            f_cpp(a3d, axis=0, out=np.empty((6, 5), dtype=expected.dtype))
+
+        # output has a different dtype
+        out = np.empty((5, 6), dtype=np.int8)
+        with patch(_patch_dict[f_py]) as mocked:
+            f_cpp(a3d, axis=0, out=out)
+            mocked.assert_called_once()
+
+    @pytest.mark.parametrize("f_cpp, f_py",
+                             [(nanmean, np.nanmean),
+                              (nansum, np.nansum),
+                              (nanstd, np.nanstd),
+                              (nanvar, np.nanvar),
+                              (nanmin, np.nanmin),
+                              (nanmax, np.nanmax),
+                              (nanmedian, np.nanmedian)])
     def testCppStatisticsFallback(self, f_cpp, f_py):
         dtype = np.int64
         assert(dtype not in __NAN_DTYPES__)
@@ -104,6 +211,98 @@ class TestStatistics:
             f_cpp(a1d)
             mocked.assert_called_once()
 
+    @pytest.mark.parametrize("dtype", __NAN_DTYPES__)
+    def testNanquantile(self, dtype):
+        a1d = np.array([np.nan, 1, 2, 4], dtype=dtype)
+        a3d = np.random.rand(4, 5, 6).astype(dtype)
+        a3d[::2, ::3, ::2] = np.nan
+        a3d[1] = np.nan
+
+        with patch("numpy.nanquantile") as mocked:
+            nanquantile(a1d, 0.5)
+            nanquantile(a3d, 0.5, axis=0)
+            nanquantile(a3d, 0.5, axis=(1, 2), method='nearest')
+            mocked.assert_not_called()
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+
+            for q in [0, 0.1, 0.25, 0.5, 0.75, 1]:
+                for method in ['linear', 'nearest']:
+                    self._assert_array_almost_equal(
+                        np.nanquantile(a1d, q, method=method),
+                        nanquantile(a1d, q, method=method))
+                    self._assert_array_almost_equal(
+                        np.nanquantile(a3d, q, method=method),
+                        nanquantile(a3d, q, method=method))
+                    for axis in [0, -1, (0, 2), (-2, -1)]:
+                        self._assert_array_almost_equal(
+                            np.nanquantile(a3d, q, axis=axis, method=method),
+                            nanquantile(a3d, q, axis=axis, method=method))
+
+            out = np.empty((5, 6), dtype=dtype)
+            assert nanquantile(a3d, 0.3, axis=0, out=out) is out
+            self._assert_array_almost_equal(
+                np.nanquantile(a3d, 0.3, axis=0), out)
+
+        with pytest.raises(ValueError):
+            nanquantile(a1d, 1.1)
+        with pytest.raises(ValueError):
+            nanquantile(a3d, 0.5, axis=3)
+        with pytest.raises(ValueError):
+            nanquantile(a3d, 0.5, axis=0, out=np.empty((6, 5), dtype=dtype))
+
+        # fall back to numpy
+        with patch("numpy.nanquantile") as mocked:
+            nanquantile(a1d, [0.1, 0.9])
+            nanquantile(a1d, 0.5, method='lower')
+            nanquantile(np.array([0, 1, 2], dtype=np.int64), 0.5)
+            assert mocked.call_count == 3
+
+    @pytest.mark.parametrize("dtype", __NAN_DTYPES__)
+    def testNanDescribe(self, dtype):
+        a1d = np.array([np.nan, 1, 2, 4], dtype=dtype)
+        a3d = np.random.rand(4, 5, 6).astype(dtype)
+        a3d[::2, ::3, ::2] = np.nan
+        a3d[:, 0, 0] = np.nan
+
+        def _assert_description(ret, a, axis):
+            assert np.array_equal(np.sum(~np.isnan(a), axis=axis), ret.count)
+            for v, f in zip(ret[1:],
+                            [np.nansum, np.nanmin, np.nanmax, np.nanmean, np.nanvar, np.nanstd]):
+                expected = f(a, axis=axis)
+                # the C++ implementation accumulates in double precision
+                np.testing.assert_allclose(expected, v, rtol=1e-5)
+                if isinstance(expected, np.ndarray):
+                    assert expected.dtype == v.dtype
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+
+            for axis in [None, 0, -1, (1, 2), (0, -1)]:
+                with patch("numpy.nanmean") as mocked:
+                    ret = nan_describe(a3d, axis=axis)
+                    mocked.assert_not_called()
+                _assert_description(ret, a3d, axis)
+            _assert_description(nan_describe(a1d), a1d, None)
+
+        assert 3 == nan_describe(a1d).count
+        assert (3, 7, 1, 4) == nan_describe(a1d)[:4]
+
+        # no value
+        ret = nan_describe(np.array([np.nan, np.nan], dtype=dtype))
+        assert 0 == ret.count
+        assert 0 == ret.sum
+        assert all(np.isnan(v) for v in ret[2:])
+
+        with pytest.raises(ValueError):
+            nan_describe(a3d, axis=3)
+
+        # fall back to numpy
+        ret = nan_describe(np.array([[0, 1], [2, 4]]), axis=0)
+        np.testing.assert_array_equal([2, 2], ret.count)
+        np.testing.assert_array_equal([1, 2.5], ret.mean)
+
     def testNanhistWithStats(self):
         # case 1
         roi = np.array([[np.nan, 1, 2], [3, 6, np.nan]], dtype=np.float32)
@@ -147,6 +346,24 @@ class TestStatistics:
         with pytest.raises(ValueError):
             nanhist_with_stats(roi, (-np.inf, np.inf), 4)
 
+        # case 6 (compare with numpy)
+        data = np.random.RandomState(1).randn(20, 30)
+        data[data > 2] = np.nan
+        for bin_range in [None, (-1, 1), (0, np.inf), (-np.inf, 0.5)]:
+            for roi in [data, data[2:15:2, 3:20]]:  # the latter is not contiguous
+                hist, bin_centers, mean, median, std = nanhist_with_stats(roi, bin_range, 7)
+                filtered = roi[~np.isnan(roi)]
+                if bin_range is not None:
+                    filtered = filtered[(filtered >= bin_range[0]) & (filtered <= bin_range[1])]
+                hist_gt, bin_edges_gt = np.histogram(
+                    filtered, bins=7, range=_get_outer_edges(filtered, bin_range))
+                np.testing.assert_array_equal(hist_gt, hist)
+                np.testing.assert_array_almost_equal(
+                    (bin_edges_gt[1:] + bin_edges_gt[:-1]) / 2, bin_centers)
+                assert np.mean(filtered) == pytest.approx(mean)
+                assert np.median(filtered) == median
+                assert np.std(filtered) == pytest.approx(std)
+
     def testHistWithStats(self):
         data = np.array([0, 1, 2, 3, 6, 0], dtype=np.float32)  # 1D
         hist, bin_centers, mean, median, std = hist_with_stats(data, (1, 3), 4)
@@ -257,6 +474,153 @@ class TestStatistics:
             np.testing.assert_array_almost_equal(hist_np, hist)
             np.testing.assert_array_almost_equal(edges_np, edges)
 
+            # Test with weights
+            weights = np.random.rand(*arr.shape)
+            hist_np, _ = np.histogram(arr, bins=20, range=bin_range, weights=weights)
+            hist, _ = histogram1d(arr, bins=20, range=bin_range, weights=weights)
+            assert hist.dtype == np.float64
+            np.testing.assert_array_almost_equal(hist_np, hist)
+
+        with pytest.raises(ValueError):
+            histogram1d(arr1d, weights=np.ones(10))
+
+    def testHistogram1dNan(self):
+        arr = np.array([np.nan, 1, 2, 2, 3, np.nan])
+        hist, edges = histogram1d(arr, bins=2)
+        np.testing.assert_array_equal([1, 3], hist)
+        np.testing.assert_array_almost_equal([1, 2, 3], edges)
+
+        arr = np.array([np.nan, 1, 2, np.inf, 2, 3, np.nan])
+        hist, edges = histogram1d(arr, bins=2, range=(0, 4), weights=np.arange(7))
+        np.testing.assert_array_almost_equal([1, 11], hist)
+
+        hist, edges = histogram1d(np.array([1, 1], dtype=np.float32), bins=2)
+        np.testing.assert_array_equal([0, 2], hist)
+        np.testing.assert_array_almost_equal([0.5, 1, 1.5], edges)
+
+        with pytest.raises(ValueError):
+            histogram1d(np.array([np.nan, np.nan]))
+
+    @pytest.mark.parametrize("dtype", __ALL_DTYPES__)
+    def testHistogram1dWithEdges(self, dtype):
+        arr = (100 * np.random.rand(20, 10)).astype(dtype)
+        weights = np.random.rand(*arr.shape)
+
+        for edges in [np.logspace(0, 2, 11),
+                      [0, 1, 5, 20, 20, 60, 99],
+                      np.array([5, 10, 90], dtype=dtype)]:
+            with patch("numpy.histogram") as mocked:
+                histogram1d(arr, bins=edges)
+                mocked.assert_not_called()
+
+            hist_np, edges_np = np.histogram(arr, bins=edges)
+            hist, edges = histogram1d(arr, bins=edges)
+            assert hist_np.dtype == hist.dtype
+            np.testing.assert_array_equal(hist_np, hist)
+            np.testing.assert_array_equal(edges_np, edges)
+
+            hist_np, _ = np.histogram(arr, bins=edges, weights=weights)
+            hist, _ = histogram1d(arr, bins=edges, weights=weights)
+            np.testing.assert_array_almost_equal(hist_np, hist)
+
+        # NaN is ignored
+        hist, _ = histogram1d(np.array([np.nan, 1, 2, 10]), bins=[1, 2, 10])
+        np.testing.assert_array_equal([1, 2], hist)
+
+        with pytest.raises(ValueError, match="monotonically"):
+            histogram1d(arr, bins=[1, 3, 2])
+        with pytest.raises(ValueError):
+            histogram1d(arr, bins=[1])
+
+    @pytest.mark.parametrize("dtype", __ALL_DTYPES__)
+    def testHistogram2d(self, dtype):
+        x = (100 * np.random.rand(20, 10)).astype(dtype)
+        y = (10 * np.random.rand(20, 10)).astype(dtype)
+
+        with patch("numpy.histogram2d") as mocked:
+            histogram2d(x, y)
+            mocked.assert_not_called()
+
+        hist_np, x_edges_np, y_edges_np = np.histogram2d(x.ravel(), y.ravel())
+        hist, x_edges, y_edges = histogram2d(x, y)
+        assert hist.dtype == np.float64
+        np.testing.assert_array_equal(hist_np, hist)
+        # edges are always in double precision
+        np.testing.assert_allclose(x_edges_np, x_edges, rtol=1e-6)
+        np.testing.assert_allclose(y_edges_np, y_edges, rtol=1e-6)
+
+        bins = (20, 5)
+        bin_range = ((10, 90), (2, 8))
+        weights = np.random.rand(*x.shape)
+        hist_np, x_edges_np, y_edges_np = np.histogram2d(
+            x.ravel(), y.ravel(), bins=bins, range=bin_range, weights=weights.ravel())
+        hist, x_edges, y_edges = histogram2d(
+            x, y, bins=bins, range=bin_range, weights=weights)
+        np.testing.assert_array_almost_equal(hist_np, hist)
+        np.testing.assert_array_almost_equal(x_edges_np, x_edges)
+        np.testing.assert_array_almost_equal(y_edges_np, y_edges)
+
+        with pytest.raises(ValueError):
+            histogram2d(x, y[:10])
+
+    def testHistogram2dNan(self):
+        x = np.array([np.nan, 1, 2, 3, 2])
+        y = np.array([1, np.nan, 2, 3, 3])
+        hist, x_edges, y_edges = histogram2d(x, y, bins=2, weights=np.arange(5))
+        np.testing.assert_array_almost_equal([[0, 0], [0, 9]], hist)
+        np.testing.assert_array_almost_equal([1, 2, 3], x_edges)
+        np.testing.assert_array_almost_equal([1, 2, 3], y_edges)
+
+        # fall back to numpy for different dtypes
+        with patch("numpy.histogram2d") as mocked:
+            histogram2d(x, y.astype(np.float32))
+            mocked.assert_called_once()
+
+    @pytest.mark.parametrize("dtype", __ALL_DTYPES__)
+    def testBinnedMeanCount(self, dtype):
+        x = (100 * np.random.rand(1000)).astype(dtype)
+        y = np.random.randn(1000).astype(np.float32)
+
+        mean_sp, edges_sp, _ = binned_statistic(x, y, 'mean', 20)
+        count_sp, _, _ = binned_statistic(x, y, 'count', 20)
+        mean, count, edges = binned_mean_count(x, y, bins=20)
+        assert mean.dtype == np.float64
+        assert count.dtype == np.int64
+        np.testing.assert_allclose(mean_sp, mean, rtol=1e-5)
+        np.testing.assert_array_equal(count_sp, count)
+        np.testing.assert_allclose(edges_sp, edges, rtol=1e-6)
+
+        bin_range = (-10, 50)
+        var_sp, _, _ = binned_statistic(x, y, 'std', 30, range=bin_range)
+        mean, count, var, edges = binned_mean_count(
+            x, y, bins=30, range=bin_range, return_var=True)
+        np.testing.assert_allclose(var_sp ** 2, var, rtol=1e-5, atol=1e-7)
+        # empty bins
+        assert np.all(np.isnan(mean[:5]))
+        assert np.all(np.isnan(var[:5]))
+        np.testing.assert_array_equal(0, count[:5])
+        np.testing.assert_array_almost_equal(np.linspace(-10, 50, 31), edges)
+
+        with pytest.raises(ValueError):
+            binned_mean_count(x, y[:10])
+        with pytest.raises(ValueError):
+            binned_mean_count(x, y, range=(1, -1))
+
+    def testBinnedMeanCountNan(self):
+        x = np.array([np.nan, 1, 2, 3, 2, 1])
+        y = np.array([1, np.nan, 2, 3, 4, 1])
+        mean, count, var, edges = binned_mean_count(x, y, bins=2, return_var=True)
+        np.testing.assert_array_equal([1, 3], count)
+        np.testing.assert_array_almost_equal([1, 3], mean)
+        np.testing.assert_array_almost_equal([0, 2. / 3], var)
+        np.testing.assert_array_almost_equal([1, 2, 3], edges)
+
+        # all the values are the same
+        mean, count, edges = binned_mean_count([1, 1], [2, 4], bins=1)
+        np.testing.assert_array_equal([2], count)
+        np.testing.assert_array_almost_equal([3], mean)
+        np.testing.assert_array_almost_equal([0.5, 1.5], edges)
+
     def testHistogram1dFallback(self):
         dtype = np.int8
         assert(dtype not in __ALL_DTYPES__)
@@ -265,3 +629,126 @@ class TestStatistics:
         with patch("numpy.histogram") as mocked:
             histogram1d(arr1d)
             mocked.assert_called_once()
+
+    @pytest.mark.parametrize("dtype", (np.uint16, np.int16) + __ALL_DTYPES__)
+    def testStreamingHistogram(self, dtype):
+        with pytest.raises(ValueError):
+            StreamingHistogram(0, 0, 1)
+        with pytest.raises(ValueError):
+            StreamingHistogram(10, 1, 1)
+        with pytest.raises(ValueError):
+            StreamingHistogram(10, 0, 1, log=True)
+
+        arr1 = (100 * np.random.rand(200, 300)).astype(dtype)
+        arr2 = (100 * np.random.rand(100)).astype(dtype)
+
+        hist = StreamingHistogram(20, 10, 90)
+        hist.fill(arr1)
+        hist_np, edges_np = np.histogram(arr1, bins=20, range=(10, 90))
+        np.testing.assert_array_equal(hist_np, hist.counts())
+        np.testing.assert_array_almost_equal(edges_np, hist.edges())
+        np.testing.assert_array_almost_equal(
+            (edges_np[1:] + edges_np[:-1]) / 2., hist.centers())
+
+        # counts is a read-only view
+        counts = hist.counts()
+        with pytest.raises(ValueError, match="read-only"):
+            counts[0] = 1
+        hist.fill(arr2)
+        hist_np += np.histogram(arr2, bins=20, range=(10, 90))[0]
+        np.testing.assert_array_equal(hist_np, counts)
+        hist.reset()
+        np.testing.assert_array_equal(np.zeros(20), counts)
+
+        # weights
+        weights = np.random.rand(*arr1.shape)
+        hist.fill(arr1, weights)
+        np.testing.assert_array_almost_equal(
+            np.histogram(arr1, bins=20, range=(10, 90), weights=weights)[0],
+            hist.counts())
+        with pytest.raises(ValueError, match="different shapes"):
+            hist.fill(arr1, weights[0])
+
+        # merge
+        other = StreamingHistogram(20, 10, 90)
+        other.fill(arr2)
+        hist.reset()
+        hist.fill(arr1)
+        hist.merge(other)
+        np.testing.assert_array_equal(
+            np.histogram(np.concatenate((arr1.ravel(), arr2)),
+                         bins=20, range=(10, 90))[0],
+            hist.counts())
+        with pytest.raises(ValueError, match="different edges"):
+            hist.merge(StreamingHistogram(20, 10, 80))
+
+        # logarithmically spaced bins
+        hist_log = StreamingHistogram(10, 1, 100, log=True)
+        hist_log.fill(arr1)
+        edges_np = np.logspace(0, 2, 11)
+        np.testing.assert_array_almost_equal(edges_np, hist_log.edges())
+        np.testing.assert_array_almost_equal(
+            np.sqrt(edges_np[1:] * edges_np[:-1]), hist_log.centers())
+        np.testing.assert_array_equal(
+            np.histogram(arr1, bins=edges_np)[0], hist_log.counts())
+
+    def testStreamingHistogramNan(self):
+        arr = np.array([np.nan, 0, 1, np.inf, 2, -np.inf, 3])
+        hist = StreamingHistogram(3, 0, 3)
+        hist.fill(arr)
+        np.testing.assert_array_equal([1, 1, 2], hist.counts())
+
+    @pytest.mark.parametrize("dtype", [np.uint16, np.int32, np.float32, np.float64])
+    def testQuantileSketch(self, dtype):
+        q = [0, 0.01, 0.1, 0.5, 0.9, 0.99, 1]
+
+        sketch = QuantileSketch()
+        assert 0 == sketch.count()
+        assert np.isnan(sketch.quantile(0.5))
+        assert np.isnan(sketch.min())
+
+        # exact if the number of values is small
+        arr = (100 * np.random.rand(10, 10)).astype(dtype)
+        sketch.update(arr)
+        assert 100 == sketch.count()
+        np.testing.assert_array_equal(np.quantile(arr, q, method='nearest'), sketch.quantile(q))
+        assert arr.min() == sketch.min()
+        assert arr.max() == sketch.max()
+
+        # the rank errors are bounded
+        sketches = [QuantileSketch(seed=i) for i in range(4)]
+        arrays = [(1000 * np.random.rand(50000)).astype(dtype) for _ in range(20)]
+        for i, a in enumerate(arrays):
+            sketches[i % 4].update(a)
+        for other in sketches[1:]:
+            sketches[0].merge(other)
+        data = np.sort(np.concatenate(arrays))
+        n = len(data)
+        assert n == sketches[0].count()
+        for v, target in zip(sketches[0].quantile(q), np.array(q) * (n - 1)):
+            ranks = np.searchsorted(data, v, 'left'), np.searchsorted(data, v, 'right')
+            assert ranks[0] - 0.02 * n <= target <= ranks[1] + 0.02 * n
+        assert sketches[0].quantile(0) == data[0]
+        assert sketches[0].quantile(1) == data[-1]
+        # all the quantiles in one call
+        q_2d = np.array(q[::-1] + [0.25]).reshape(2, 4)
+        np.testing.assert_array_equal(
+            [[sketches[0].quantile(v) for v in row] for row in q_2d],
+            sketches[0].quantile(q_2d))
+
+        sketch.reset()
+        assert 0 == sketch.count()
+
+        with pytest.raises(ValueError):
+            sketch.quantile(1.1)
+        with pytest.raises(ValueError):
+            sketch.quantile([0.5, 1.1])
+        with pytest.raises(ValueError):
+            QuantileSketch(k=4)
+
+    def testQuantileSketchNan(self):
+        sketch = QuantileSketch()
+        sketch.update(np.array([np.nan, 1, 4, np.nan, 2, 3]))
+        assert 4 == sketch.count()
+        np.testing.assert_array_equal([1, 2, 3, 4], sketch.quantile([0, 0.4, 0.6, 1]))
+        assert sketch.quantile(0.5) == 3  # rounding half to even
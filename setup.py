@@ -195,13 +195,13 @@ setup(
     },
     install_requires=[
         'numpy>=1.16.1',
-        'scipy>=1.2.1',
         'h5py>=2.10.0',
     ],
     extras_require={
         'test': [
             'extra-geom==1.6.0',
             'pytest',
+            'scipy>=1.4.0',
         ],
     },
     python_requires='>=3.9',
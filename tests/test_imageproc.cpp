@@ -15,10 +15,13 @@ using ::testing::ElementsAre;
 using ::testing::ElementsAreArray;
 using ::testing::NanSensitiveFloatEq;
 using ::testing::FloatEq;
+using ::testing::DoubleEq;
+using ::testing::NanSensitiveDoubleEq;
 
 static constexpr auto nan = std::numeric_limits<float>::quiet_NaN();
 static const auto zero_mt = NanSensitiveFloatEq(0.f);
 static const auto nan_mt = NanSensitiveFloatEq(nan);
+static const auto nan_dmt = NanSensitiveDoubleEq(std::numeric_limits<double>::quiet_NaN());
 
 TEST(TestNanmeanImageArray, TestGeneral)
 {
@@ -37,6 +40,31 @@ TEST(TestNanmeanImageArray, TestGeneral)
   EXPECT_THAT(nanmeanImageArray(std::move(imgs)), ElementsAre(1.f, -inf, 2.5f, inf, nan_mt, 6.f));
 }
 
+TEST(TestNanmeanImageArray, TestWithOut)
+{
+  auto inf = std::numeric_limits<float>::infinity();
+
+  xt::xtensor<float, 3> imgs {{{1.f, -inf, 2.f}, {4.f, 5.f, nan}},
+                              {{1.f, 2.f, 3.f}, {inf, nan, 6.f}}};
+  xt::xtensor<float, 2> out = xt::zeros<float>({2, 3});
+  nanmeanImageArray(imgs, out);
+  EXPECT_THAT(out, ElementsAre(1.f, -inf, 2.5f, inf, 5.f, 6.f));
+
+  nanmeanImageArray(imgs, {1}, out);
+  EXPECT_THAT(out, ElementsAre(1.f, 2.f, 3.f, inf, nan_mt, 6.f));
+  EXPECT_THROW(nanmeanImageArray(imgs, {}, out), std::invalid_argument);
+
+  xt::xtensor<float, 2> out_wrong = xt::zeros<float>({3, 2});
+  EXPECT_THROW(nanmeanImageArray(imgs, out_wrong), std::invalid_argument);
+
+  // two images
+  xt::xtensor<float, 2> img1 {{1.f, -inf, 2.f}, {4.f, 5.f, nan}};
+  xt::xtensor<float, 2> img2 {{1.f, 2.f, 3.f}, {inf, nan, 6.f}};
+  nanmeanImageArray(img1, img2, out);
+  EXPECT_THAT(out, ElementsAre(1.f, -inf, 2.5f, inf, 5.f, 6.f));
+  EXPECT_THROW(nanmeanImageArray(img1, img2, out_wrong), std::invalid_argument);
+}
+
 TEST(TestNanmeanImageArray, TestTwoImages)
 {
   auto inf = std::numeric_limits<float>::infinity();
@@ -54,6 +82,73 @@ TEST(TestNanmeanImageArray, TestTwoImages)
   EXPECT_THAT(nanmeanImageArray(std::move(img1), std::move(img2)), ElementsAreArray(ret_gt));
 }
 
+TEST(TestGroupedNanmeanImageArray, TestGeneral)
+{
+  xt::xtensor<float, 3> imgs {{{1.f, 2.f}, {3.f, nan}},
+                              {{2.f, 3.f}, {4.f, 5.f}},
+                              {{3.f, nan}, {5.f, nan}},
+                              {{4.f, 5.f}, {6.f, 7.f}},
+                              {{9.f, 9.f}, {9.f, 9.f}}};
+  xt::xtensor<float, 3> out = xt::empty<float>({3, 2, 2});
+
+  groupedNanmeanImageArray(imgs, {0, 1, 0, 1, -1}, out);
+  EXPECT_THAT(xt::view(out, 0, xt::all(), xt::all()), ElementsAre(2.f, 2.f, 4.f, nan_mt));
+  EXPECT_THAT(xt::view(out, 1, xt::all(), xt::all()), ElementsAre(3.f, 4.f, 5.f, 6.f));
+  EXPECT_THAT(xt::view(out, 2, xt::all(), xt::all()), ElementsAre(nan_mt, nan_mt, nan_mt, nan_mt));
+
+  EXPECT_THROW(groupedNanmeanImageArray(imgs, {0, 1, 0, 1}, out), std::invalid_argument);
+  EXPECT_THROW(groupedNanmeanImageArray(imgs, {0, 1, 0, 1, 3}, out), std::invalid_argument);
+  xt::xtensor<float, 3> out_wrong = xt::empty<float>({3, 2, 3});
+  EXPECT_THROW(groupedNanmeanImageArray(imgs, {0, 1, 0, 1, 2}, out_wrong), std::invalid_argument);
+}
+
+TEST(TestNanmedianImageArray, TestGeneral)
+{
+  xt::xtensor<float, 3> imgs {{{1.f, nan}, {3.f, 100.f}},
+                              {{2.f, nan}, {4.f, 1.f}},
+                              {{4.f, 5.f}, {nan, 2.f}},
+                              {{10.f, nan}, {nan, 1.5f}}};
+
+  EXPECT_THAT(nanmedianImageArray(imgs), ElementsAre(3.f, 5.f, 3.5f, 1.75f));
+
+  EXPECT_THROW(nanmedianImageArray(imgs, {}), std::invalid_argument);
+  EXPECT_THAT(nanmedianImageArray(imgs, {0, 3}), ElementsAre(5.5f, nan_mt, 3.f, 50.75f));
+  EXPECT_THAT(nanmedianImageArray(imgs, {2}), ElementsAre(4.f, 5.f, nan_mt, 2.f));
+}
+
+TEST(TestNanstdImageArray, TestGeneral)
+{
+  xt::xtensor<float, 3> imgs {{{1.f, nan}, {3.f, 2.f}},
+                              {{3.f, nan}, {4.f, 2.f}},
+                              {{5.f, 5.f}, {nan, 2.f}}};
+
+  auto ret = nanstdImageArray(imgs);
+  EXPECT_THAT(ret, ElementsAre(FloatEq(std::sqrt(8.f / 3.f)), 0.f, 0.5f, 0.f));
+
+  EXPECT_THROW(nanstdImageArray(imgs, {}), std::invalid_argument);
+  EXPECT_THAT(nanstdImageArray(imgs, {0, 1}), ElementsAre(1.f, nan_mt, 0.5f, 0.f));
+}
+
+TEST(TestSigmaClippedNanmeanImageArray, TestGeneral)
+{
+  xt::xtensor<float, 3> imgs = xt::ones<float>({20, 2, 3});
+  xt::view(imgs, xt::range(0, xt::placeholders::_, 2), xt::all(), xt::all()) = 2.f;
+  imgs(3, 0, 0) = 1000.f;
+  xt::view(imgs, xt::all(), 1, 2) = nan;
+
+  EXPECT_THROW(sigmaClippedNanmeanImageArray(imgs, 0.f, 5), std::invalid_argument);
+  EXPECT_THAT(sigmaClippedNanmeanImageArray(imgs, 3.f, 5),
+              ElementsAre(FloatEq(29.f / 19.f), 1.5f, 1.5f, 1.5f, 1.5f, nan_mt));
+  // no clipping
+  EXPECT_THAT(sigmaClippedNanmeanImageArray(imgs, 3.f, 0),
+              ElementsAre(FloatEq(51.45f), 1.5f, 1.5f, 1.5f, 1.5f, nan_mt));
+
+  EXPECT_THROW(sigmaClippedNanmeanImageArray(imgs, {}, 3.f, 5), std::invalid_argument);
+  // at least 1 sigma is needed to reject the outlier with only 4 values
+  EXPECT_THAT(sigmaClippedNanmeanImageArray(imgs, {1, 3, 5, 7}, 1.f, 5),
+              ElementsAre(1.f, 1.f, 1.f, 1.f, 1.f, nan_mt));
+}
+
 TEST(TestImageDataMask, TestGeneral)
 {
   xt::xtensor<float, 2> img {{1.f, nan, 3.f}, {4.f, 5.f, nan}};
@@ -252,6 +347,307 @@ TEST(TestMaskImageData, Test3DBothMask)
   testMaskImageData(maskImageDataNan<xt::xtensor<float, 3>, xt::xtensor<bool, 2>, float>, nan_mt);
 }
 
+TEST(TestComputeBadPixelMask, Test2D)
+{
+  auto inf = std::numeric_limits<float>::infinity();
+
+  xt::xtensor<float, 2> mean {{1.f, 5.f, nan}, {-1.f, 2.f, 2.f}};
+  xt::xtensor<float, 2> stdev {{1.f, 1.f, 1.f}, {1.f, 0.f, 9.f}};
+
+  xt::xtensor<uint8_t, 2> out = xt::zeros<uint8_t>({2, 3});
+  computeBadPixelMask(mean, stdev, 0.f, 4.f, 0.1f, 5.f, out);
+  EXPECT_THAT(out, ElementsAre(0x00, 0x04, 0x01, 0x02, 0x08, 0x10));
+
+  xt::xtensor<bool, 2> out_bool = xt::zeros<bool>({2, 3});
+  computeBadPixelMask(mean, stdev, -inf, inf, -inf, inf, out_bool);
+  EXPECT_THAT(out_bool, ElementsAre(false, false, true, false, false, false));
+
+  xt::xtensor<uint8_t, 2> out_wrong = xt::zeros<uint8_t>({3, 2});
+  EXPECT_THROW(computeBadPixelMask(mean, stdev, 0.f, 4.f, 0.1f, 5.f, out_wrong), std::invalid_argument);
+}
+
+TEST(TestComputeBadPixelMask, Test3D)
+{
+  auto inf = std::numeric_limits<float>::infinity();
+
+  xt::xtensor<float, 3> mean {{{1.f, 5.f}}, {{1.f, nan}}};
+  xt::xtensor<float, 3> stdev {{{1.f, 1.f}}, {{1.f, 1.f}}};
+
+  xt::xtensor<uint8_t, 3> out = xt::zeros<uint8_t>({2, 1, 2});
+  computeBadPixelMask(mean, stdev,
+                      std::vector<float>{0.f, 2.f}, std::vector<float>{4.f, 6.f},
+                      std::vector<float>{0.f, 0.f}, std::vector<float>{inf, 0.5f}, out);
+  EXPECT_THAT(out, ElementsAre(0x00, 0x04, 0x12, 0x01));
+
+  // number of bounds and images are different
+  EXPECT_THROW(computeBadPixelMask(mean, stdev,
+                                   std::vector<float>{0.f}, std::vector<float>{4.f, 6.f},
+                                   std::vector<float>{0.f, 0.f}, std::vector<float>{inf, 0.5f}, out),
+               std::invalid_argument);
+}
+
+TEST(TestPhotonize, Test2D)
+{
+  xt::xtensor<float, 2> src {{nan, 4.f, 5.f}, {14.f, 16.f, 3000.f}};
+
+  xt::xtensor<uint16_t, 2> out = xt::zeros<uint16_t>({2, 3});
+  photonize(src, 10.f, 5.f, out);
+  EXPECT_THAT(out, ElementsAre(0, 0, 1, 1, 2, 300));
+
+  // saturated
+  xt::xtensor<uint8_t, 2> out_u8 = xt::zeros<uint8_t>({2, 3});
+  photonize(src, 10.f, 15.f, out_u8);
+  EXPECT_THAT(out_u8, ElementsAre(0, 0, 0, 0, 2, 255));
+
+  xt::xtensor<uint8_t, 2> out_wrong = xt::zeros<uint8_t>({3, 2});
+  EXPECT_THROW(photonize(src, 10.f, 5.f, out_wrong), std::invalid_argument);
+  EXPECT_THROW(photonize(src, 0.f, 5.f, out_u8), std::invalid_argument);
+}
+
+TEST(TestPhotonize, Test3D)
+{
+  xt::xtensor<uint16_t, 3> src {{{0, 4, 5}}, {{14, 16, 3000}}};
+
+  xt::xtensor<uint8_t, 3> out = xt::zeros<uint8_t>({2, 1, 3});
+  photonize(src, 10.f, 5.f, out);
+  EXPECT_THAT(out, ElementsAre(0, 0, 1, 1, 2, 255));
+}
+
+TEST(TestRoiStatistics, Test2D)
+{
+  xt::xtensor<float, 2> src {{0.f, 1.f, 2.f, 3.f}, {4.f, nan, 6.f, 7.f}, {8.f, 9.f, 10.f, 11.f}};
+  std::vector<std::array<int, 4>> rois {{0, 0, 2, 2}, {2, 1, 10, 10}, {-5, -5, 2, 2}};
+  std::vector<RoiStat> stats {RoiStat::SUM, RoiStat::NANSUM, RoiStat::MEAN, RoiStat::NANMEAN,
+                              RoiStat::MIN, RoiStat::NANMIN, RoiStat::MAX, RoiStat::NANMAX};
+
+  xt::xtensor<double, 2> out = xt::zeros<double>({3, 8});
+  roiStatistics(src, rois, stats, out);
+  EXPECT_THAT(xt::view(out, 0, xt::all()),
+              ElementsAre(nan_dmt, DoubleEq(5.), nan_dmt, DoubleEq(5. / 3), nan_dmt, DoubleEq(0.),
+                          nan_dmt, DoubleEq(4.)));
+  EXPECT_THAT(xt::view(out, 1, xt::all()),
+              ElementsAre(DoubleEq(34.), DoubleEq(34.), DoubleEq(8.5), DoubleEq(8.5), DoubleEq(6.),
+                          DoubleEq(6.), DoubleEq(11.), DoubleEq(11.)));
+  // no overlap
+  EXPECT_THAT(xt::view(out, 2, xt::all()),
+              ElementsAre(DoubleEq(0.), DoubleEq(0.), nan_dmt, nan_dmt, nan_dmt, nan_dmt, nan_dmt, nan_dmt));
+
+  xt::xtensor<double, 2> out_wrong = xt::zeros<double>({3, 7});
+  EXPECT_THROW(roiStatistics(src, rois, stats, out_wrong), std::invalid_argument);
+}
+
+TEST(TestRoiStatistics, Test3D)
+{
+  xt::xtensor<float, 3> src {{{1.f, 2.f}, {3.f, 4.f}}, {{5.f, 6.f}, {7.f, 8.f}}};
+  std::vector<std::array<int, 4>> rois {{0, 0, 1, 2}, {1, 0, 1, 1}};
+  std::vector<RoiStat> stats {RoiStat::SUM, RoiStat::MAX};
+
+  xt::xtensor<double, 3> out = xt::zeros<double>({2, 2, 2});
+  roiStatistics(src, rois, stats, out);
+  EXPECT_THAT(out, ElementsAre(4., 3., 2., 2., 12., 7., 6., 6.));
+
+  xt::xtensor<double, 3> out_wrong = xt::zeros<double>({1, 2, 2});
+  EXPECT_THROW(roiStatistics(src, rois, stats, out_wrong), std::invalid_argument);
+}
+
+TEST(TestRoiProjection, TestGeneral)
+{
+  xt::xtensor<float, 3> src {{{0.f, 1.f, 2.f, 3.f}, {4.f, 5.f, 6.f, 7.f}, {8.f, 9.f, 10.f, 11.f}},
+                             {{nan, 1.f, 2.f, 3.f}, {nan, 5.f, 6.f, 7.f}, {8.f, 9.f, 10.f, 11.f}}};
+  std::vector<std::array<int, 4>> rois {{0, 0, 2, 2}, {2, 1, 10, 10}, {-5, -5, 2, 2}};
+
+  xt::xtensor<float, 2> out = xt::zeros<float>({2, 4});
+  roiProjection(src, rois, 0, false, out);
+  EXPECT_THAT(out, ElementsAre(4.f, 6.f, 16.f, 18.f, 0.f, 6.f, 16.f, 18.f));
+
+  roiProjection(src, rois, 0, true, out);
+  EXPECT_THAT(out, ElementsAre(2.f, 3.f, 8.f, 9.f, nan_mt, 3.f, 8.f, 9.f));
+
+  roiProjection(src, rois, 1, true, out);
+  EXPECT_THAT(out, ElementsAre(0.5f, 4.5f, 6.5f, 10.5f, 1.f, 5.f, 6.5f, 10.5f));
+
+  xt::xtensor<float, 2> out_wrong = xt::zeros<float>({2, 5});
+  EXPECT_THROW(roiProjection(src, rois, 0, true, out_wrong), std::invalid_argument);
+  EXPECT_THROW(roiProjection(src, rois, 2, true, out), std::invalid_argument);
+}
+
+TEST(TestBinImageData, TestGeneral)
+{
+  xt::xtensor<float, 2> src {{0.f, 1.f, 2.f, 3.f, 4.f}, {5.f, 6.f, 7.f, 8.f, 9.f}, {10.f, 11.f, 12.f, 13.f, 14.f}};
+
+  xt::xtensor<float, 2> out = xt::zeros<float>({2, 3});
+  binImageData(src, 2, true, out);
+  EXPECT_THAT(out, ElementsAre(3.f, 5.f, 6.5f, 10.5f, 12.5f, 14.f));
+  binImageData(src, 2, false, out);
+  EXPECT_THAT(out, ElementsAre(12.f, 20.f, 13.f, 21.f, 25.f, 14.f));
+
+  xt::xtensor<float, 3> src3 {{{nan, nan}, {nan, 1.f}}, {{nan, nan}, {nan, nan}}};
+  xt::xtensor<double, 3> out3 = xt::zeros<double>({2, 1, 1});
+  binImageData(src3, 2, true, out3);
+  EXPECT_THAT(out3, ElementsAre(1., nan_dmt));
+  binImageData(src3, 2, false, out3);
+  EXPECT_THAT(out3, ElementsAre(1., 0.));
+
+  EXPECT_THROW(binImageData(src, 3, true, out), std::invalid_argument);
+  EXPECT_THROW(binImageData(src, 0, true, out), std::invalid_argument);
+}
+
+TEST(TestUpsampleImageData, TestGeneral)
+{
+  xt::xtensor<float, 2> src {{1.f, 2.f}, {3.f, 4.f}};
+
+  xt::xtensor<float, 2> out = xt::zeros<float>({3, 4});
+  upsampleImageData(src, 2, out);
+  EXPECT_THAT(out, ElementsAre(1.f, 1.f, 2.f, 2.f, 1.f, 1.f, 2.f, 2.f, 3.f, 3.f, 4.f, 4.f));
+
+  xt::xtensor<float, 3> src3 {{{1.f}}, {{2.f}}};
+  xt::xtensor<double, 3> out3 = xt::zeros<double>({2, 2, 1});
+  upsampleImageData(src3, 2, out3);
+  EXPECT_THAT(out3, ElementsAre(1., 1., 2., 2.));
+
+  xt::xtensor<float, 2> out_wrong = xt::zeros<float>({5, 4});
+  EXPECT_THROW(upsampleImageData(src, 2, out_wrong), std::invalid_argument);
+  EXPECT_THROW(upsampleImageData(src, 0, out), std::invalid_argument);
+}
+
+TEST(TestPeakFinder, TestGeneral)
+{
+  EXPECT_THROW(PeakFinder<float>(30.f, 6.f, 3, 2), std::invalid_argument);
+  EXPECT_THROW(PeakFinder<float>(30.f, 6.f, 1, 2, 0), std::invalid_argument);
+  EXPECT_THROW(PeakFinder<float>(30.f, -1.f), std::invalid_argument);
+
+  xt::xtensor<float, 3> src = 10.f * xt::ones<float>({3, 12, 12});
+  // 5-pixel peak
+  src(0, 5, 5) = 110.f;
+  src(0, 4, 5) = src(0, 6, 5) = src(0, 5, 4) = src(0, 5, 6) = 60.f;
+  // single-pixel peak
+  src(1, 5, 5) = 110.f;
+  // plateau
+  src(2, 5, 5) = src(2, 5, 6) = 110.f;
+  src(2, 2, 2) = nan;
+
+  PeakFinder<float> finder(30.f, 6.f, 2, 50, 3);
+  auto [peaks, counts] = finder.find(src);
+  EXPECT_THAT(counts, ElementsAre(1, 0, 1));
+  ASSERT_EQ(2, peaks.shape()[0]);
+  EXPECT_THAT(xt::view(peaks, 0, xt::range(0, 4)), ElementsAre(5.f, 5.f, 300.f, 5.f));
+  EXPECT_THAT(xt::view(peaks, 1, xt::range(0, 4)), ElementsAre(5.f, 5.5f, 200.f, 2.f));
+
+  xt::xtensor<bool, 2> mask = xt::zeros<bool>({12, 12});
+  mask(5, 6) = true;
+  EXPECT_THAT(finder.find(src, mask).second, ElementsAre(1, 0, 0));
+
+  xt::xtensor<float, 2> img = xt::view(src, 0, xt::all(), xt::all());
+  EXPECT_EQ(1, finder.find(img).shape()[0]);
+  EXPECT_EQ(0, finder.find(img, xt::xtensor<bool, 2>(xt::ones<bool>({12, 12}))).shape()[0]);
+
+  xt::xtensor<bool, 2> mask_wrong = xt::zeros<bool>({12, 11});
+  EXPECT_THROW(finder.find(src, mask_wrong), std::invalid_argument);
+
+  // pixels of a nearby peak are not counted since they are not connected
+  xt::xtensor<float, 3> src2 = 10.f * xt::ones<float>({1, 12, 12});
+  src2(0, 5, 5) = 110.f;
+  src2(0, 5, 7) = 100.f;
+  EXPECT_THAT(finder.find(src2).second, ElementsAre(0));
+  auto [peaks2, counts2] = PeakFinder<float>(30.f, 6.f, 1, 50, 3).find(src2);
+  EXPECT_THAT(counts2, ElementsAre(2));
+  EXPECT_THAT(xt::view(peaks2, 0, xt::range(0, 4)), ElementsAre(5.f, 5.f, 100.f, 1.f));
+  EXPECT_THAT(xt::view(peaks2, 1, xt::range(0, 4)), ElementsAre(5.f, 7.f, 90.f, 1.f));
+
+  // the number of peaks found is larger than the number of peaks returned
+  auto [peaks3, counts3] = PeakFinder<float>(30.f, 6.f, 1, 50, 3, 1).find(src2);
+  EXPECT_THAT(counts3, ElementsAre(2));
+  ASSERT_EQ(1, peaks3.shape()[0]);
+  EXPECT_EQ(5.f, peaks3(0, 1));
+}
+
+TEST(TestClusterFinder, TestGeneral)
+{
+  EXPECT_THROW(ClusterFinder<float>(0.5f, 6), std::invalid_argument);
+
+  xt::xtensor<float, 2> img {{1.f, 0.f, 1.f, 0.f, 0.f, 2.f},
+                             {1.f, 0.f, 1.f, 0.f, 2.f, 0.f},
+                             {1.f, 1.f, 1.f, 0.f, 0.f, 0.f},
+                             {0.f, 0.f, 0.f, 0.f, 0.f, nan},
+                             {3.f, 0.f, 0.f, 0.f, 0.f, 1.f}};
+
+  // the two arms of the 'U' are merged in the second pass
+  auto clusters = ClusterFinder<float>(0.5f).find(img);
+  ASSERT_EQ(4, clusters.shape()[0]);
+  EXPECT_THAT(xt::view(clusters, 0, xt::all()), ElementsAre(7., 7., DoubleEq(8. / 7.), 1.));
+  EXPECT_THAT(xt::view(clusters, 1, xt::all()), ElementsAre(2., 4., 0.5, 4.5));
+  EXPECT_THAT(xt::view(clusters, 2, xt::all()), ElementsAre(1., 3., 4., 0.));
+  EXPECT_THAT(xt::view(clusters, 3, xt::all()), ElementsAre(1., 1., 4., 5.));
+
+  EXPECT_EQ(5, ClusterFinder<float>(0.5f, 4).find(img).shape()[0]);
+  EXPECT_EQ(2, ClusterFinder<float>(0.5f, 8, 2).find(img).shape()[0]);
+
+  // the center is not weighted for a cluster with non-positive pixels
+  xt::xtensor<float, 2> img_dark {{-1.f, -1.f, 1.f},
+                                  {nan, nan, nan},
+                                  {-1.f, 0.f, 1.f},
+                                  {nan, nan, nan},
+                                  {-1.f, -1.f, 2.5f}};
+  auto clusters_dark = ClusterFinder<float>(-2.f).find(img_dark);
+  ASSERT_EQ(3, clusters_dark.shape()[0]);
+  EXPECT_THAT(xt::view(clusters_dark, 0, xt::all()), ElementsAre(3., -1., 0., 1.));
+  EXPECT_THAT(xt::view(clusters_dark, 1, xt::all()), ElementsAre(3., 0., 2., 1.));
+  EXPECT_THAT(xt::view(clusters_dark, 2, xt::all()), ElementsAre(3., 0.5, 4., 1.));
+
+  xt::xtensor<float, 3> src = xt::zeros<float>({3, 5, 6});
+  xt::view(src, 0, xt::all(), xt::all()) = img;
+  xt::view(src, 2, xt::all(), xt::all()) = img;
+  auto [clusters_arr, counts] = ClusterFinder<float>(0.5f).find(src);
+  EXPECT_THAT(counts, ElementsAre(4, 0, 4));
+  ASSERT_EQ(8, clusters_arr.shape()[0]);
+  EXPECT_THAT(xt::view(clusters_arr, 4, xt::all()), ElementsAre(7., 7., DoubleEq(8. / 7.), 1.));
+}
+
+TEST(TestImageMoments, TestGeneral)
+{
+  xt::xtensor<double, 2> img = xt::zeros<double>({4, 5});
+  img(0, 0) = nan;
+  img(1, 1) = img(1, 3) = 1.;
+  img(3, 2) = 2.;
+
+  xt::xtensor<double, 1> out = xt::empty<double>({5});
+  imageMoments(img, {0, 0, 5, 4}, out);
+  EXPECT_THAT(out, ElementsAre(4., 2., 2., DoubleEq(1.), DoubleEq(std::sqrt(0.5))));
+
+  // ROI
+  imageMoments(img, {1, 1, 10, 1}, out);
+  EXPECT_THAT(out, ElementsAre(2., 1., 2., 0., 1.));
+  imageMoments(img, {10, 10, 2, 2}, out);
+  EXPECT_THAT(out, ElementsAre(0., nan_dmt, nan_dmt, nan_dmt, nan_dmt));
+
+  // mask
+  xt::xtensor<bool, 2> mask = xt::zeros<bool>({4, 5});
+  mask(3, 2) = true;
+  imageMoments(img, mask, {0, 0, 5, 4}, out);
+  EXPECT_THAT(out, ElementsAre(2., 1., 2., 0., 1.));
+
+  xt::xtensor<double, 3> src = xt::zeros<double>({3, 4, 5});
+  xt::view(src, 1, xt::all(), xt::all()) = img;
+  xt::xtensor<double, 2> out_arr = xt::empty<double>({3, 5});
+  imageMoments(src, {0, 0, 5, 4}, out_arr);
+  EXPECT_THAT(xt::view(out_arr, 0, xt::all()), ElementsAre(0., nan_dmt, nan_dmt, nan_dmt, nan_dmt));
+  EXPECT_THAT(xt::view(out_arr, 1, xt::all()),
+              ElementsAre(4., 2., 2., DoubleEq(1.), DoubleEq(std::sqrt(0.5))));
+  imageMoments(src, mask, {0, 0, 5, 4}, out_arr);
+  EXPECT_THAT(xt::view(out_arr, 1, xt::all()), ElementsAre(2., 1., 2., 0., 1.));
+
+  // negative pixels have zero weight in the centroid and width
+  xt::xtensor<double, 2> img_dark {{-3., 1., 0.}, {0., -1., 1.}};
+  xt::xtensor<double, 1> out_dark = xt::empty<double>({5});
+  imageMoments(img_dark, {0, 0, 3, 2}, out_dark);
+  EXPECT_THAT(out_dark, ElementsAre(-2., 0.5, 1.5, 0.5, 0.5));
+  imageMoments(img_dark, {0, 0, 1, 2}, out_dark);
+  EXPECT_THAT(out_dark, ElementsAre(-3., nan_dmt, nan_dmt, nan_dmt, nan_dmt));
+
+  xt::xtensor<double, 2> out_wrong = xt::empty<double>({2, 5});
+  EXPECT_THROW(imageMoments(src, {0, 0, 5, 4}, out_wrong), std::invalid_argument);
+}
+
 TEST(TestMovingAvgImageData, Test2D)
 {
   xt::xtensor<float, 2> img1 {{1.f, 2.f, 3.f}, {3.f, 4.f, 5.f}};
@@ -310,6 +706,172 @@ TEST(TestMovingAvgImageData, Test3DWithNaN)
               ElementsAre(1.5f, nan_mt, 3.5f, 3.5f, nan_mt, 5.5f));
 }
 
+TEST(TestImageStatsAccumulator, TestGeneral)
+{
+  xt::xtensor<float, 3> imgs {{{1.f, nan}, {3.f, 2.f}},
+                              {{3.f, nan}, {4.f, 2.f}},
+                              {{5.f, 5.f}, {nan, 2.f}}};
+
+  ImageStatsAccumulator<double> acc(2, 2);
+  acc.update(imgs);
+  EXPECT_THAT(acc.count(), ElementsAre(3, 1, 2, 3));
+  EXPECT_THAT(acc.mean(), ElementsAre(3., 5., 3.5, 2.));
+  EXPECT_THAT(acc.variance(), ElementsAre(DoubleEq(8. / 3.), 0., 0.25, 0.));
+  EXPECT_THAT(acc.variance(1), ElementsAre(4., nan_dmt, 0.5, 0.));
+  EXPECT_THAT(acc.std(1), ElementsAre(2., nan_dmt, DoubleEq(std::sqrt(0.5)), 0.));
+
+  // accumulate the same data with two accumulators and merge them
+  ImageStatsAccumulator<double> acc1(2, 2);
+  ImageStatsAccumulator<double> acc2(2, 2);
+  acc1.update(xt::xtensor<float, 2>(xt::view(imgs, 0, xt::all(), xt::all())));
+  acc2.update(xt::xtensor<float, 3>(xt::view(imgs, xt::range(1, 3), xt::all(), xt::all())));
+  acc1.merge(acc2);
+  EXPECT_THAT(acc1.count(), ElementsAreArray(acc.count()));
+  EXPECT_THAT(acc1.mean(), ElementsAre(3., 5., 3.5, 2.));
+  EXPECT_THAT(acc1.variance(), ElementsAre(DoubleEq(8. / 3.), 0., 0.25, 0.));
+
+  EXPECT_THROW(acc.update(xt::xtensor<float, 3>(xt::ones<float>({2, 2, 3}))), std::invalid_argument);
+  EXPECT_THROW(acc.merge(ImageStatsAccumulator<double>(2, 3)), std::invalid_argument);
+
+  acc.reset();
+  EXPECT_THAT(acc.count(), ElementsAre(0, 0, 0, 0));
+  EXPECT_THAT(acc.mean(), ElementsAre(nan_dmt, nan_dmt, nan_dmt, nan_dmt));
+}
+
+TEST(TestImageStatsAccumulator, TestMemoryCells)
+{
+  xt::xtensor<float, 3> imgs {{{1.f, 2.f}, {3.f, 4.f}},
+                              {{5.f, 6.f}, {7.f, 8.f}}};
+
+  ImageStatsAccumulator<double> acc(2, 2, 2);
+  acc.update(imgs);
+  acc.update(xt::xtensor<float, 3>(imgs + 2.f));
+  EXPECT_THAT(acc.mean(), ElementsAre(2., 3., 4., 5., 6., 7., 8., 9.));
+  EXPECT_THAT(acc.variance(), ElementsAre(1., 1., 1., 1., 1., 1., 1., 1.));
+
+  acc.update(imgs, {1, 1});
+  EXPECT_THAT(acc.count(), ElementsAre(2, 2, 2, 2, 4, 4, 4, 4));
+  EXPECT_THAT(acc.mean(), ElementsAre(2., 3., 4., 5., 4., 5., 6., 7.));
+
+  // number of images and memory cells are different
+  EXPECT_THROW(acc.update(xt::xtensor<float, 3>(xt::ones<float>({3, 2, 2}))), std::invalid_argument);
+  // memory cell index is out of range
+  EXPECT_THROW(acc.update(imgs, {0, 2}), std::invalid_argument);
+  // single image is not allowed with more than one memory cell
+  EXPECT_THROW(acc.update(xt::xtensor<float, 2>(xt::ones<float>({2, 2}))), std::invalid_argument);
+  EXPECT_THROW(ImageStatsAccumulator<double>(2, 2, 0), std::invalid_argument);
+}
+
+TEST(TestPixelCorrelationAccumulator, TestGeneral)
+{
+  xt::xtensor<float, 3> imgs {{{1.f, nan}, {4.f, 2.f}},
+                              {{3.f, nan}, {3.f, 2.f}},
+                              {{5.f, 5.f}, {nan, 2.f}}};
+  std::vector<double> scalars {1., 2., 3.};
+
+  PixelCorrelationAccumulator<double> acc(2, 2);
+  acc.update(imgs, scalars);
+  EXPECT_THAT(acc.count(), ElementsAre(3, 1, 2, 3));
+  EXPECT_THAT(acc.covariance(), ElementsAre(DoubleEq(4. / 3.), 0., -0.25, 0.));
+  EXPECT_THAT(acc.covariance(1), ElementsAre(2., nan_dmt, -0.5, 0.));
+  EXPECT_THAT(acc.correlation(), ElementsAre(DoubleEq(1.), nan_dmt, DoubleEq(-1.), nan_dmt));
+
+  // accumulate the same data with two accumulators and merge them
+  PixelCorrelationAccumulator<double> acc1(2, 2);
+  PixelCorrelationAccumulator<double> acc2(2, 2);
+  acc1.update(xt::xtensor<float, 2>(xt::view(imgs, 0, xt::all(), xt::all())), 1.);
+  // images with NaN scalars are skipped
+  acc1.update(xt::xtensor<float, 2>(xt::view(imgs, 1, xt::all(), xt::all())), nan);
+  acc2.update(xt::xtensor<float, 3>(xt::view(imgs, xt::range(1, 3), xt::all(), xt::all())), {2., 3.});
+  acc1.merge(acc2);
+  EXPECT_THAT(acc1.count(), ElementsAreArray(acc.count()));
+  EXPECT_THAT(acc1.covariance(), ElementsAre(DoubleEq(4. / 3.), 0., -0.25, 0.));
+  EXPECT_THAT(acc1.correlation(), ElementsAre(DoubleEq(1.), nan_dmt, DoubleEq(-1.), nan_dmt));
+
+  EXPECT_THROW(acc.update(imgs, {1., 2.}), std::invalid_argument);
+  EXPECT_THROW(acc.update(xt::xtensor<float, 3>(xt::ones<float>({2, 2, 3})), {1., 2.}),
+               std::invalid_argument);
+  EXPECT_THROW(acc.merge(PixelCorrelationAccumulator<double>(2, 3)), std::invalid_argument);
+
+  acc.reset();
+  EXPECT_THAT(acc.count(), ElementsAre(0, 0, 0, 0));
+  EXPECT_THAT(acc.covariance(), ElementsAre(nan_dmt, nan_dmt, nan_dmt, nan_dmt));
+}
+
+TEST(TestMovingAverageImageData, Test2D)
+{
+  MovingAverageImageData<float> ma(2);
+  EXPECT_EQ(2, ma.window());
+
+  xt::xtensor<float, 2> out = xt::zeros<float>({1, 3});
+  ma.update(xt::xtensor<float, 2>({{1.f, nan, 2.f}}), out);
+  EXPECT_EQ(1, ma.count());
+  EXPECT_THAT(out, ElementsAre(1.f, nan_mt, 2.f));
+  ma.update(xt::xtensor<float, 2>({{3.f, 2.f, 4.f}}), out);
+  EXPECT_EQ(2, ma.count());
+  EXPECT_THAT(out, ElementsAre(2.f, nan_mt, 3.f));
+  // the first frame is moved out of the window
+  ma.update(xt::xtensor<float, 2>({{5.f, 4.f, 6.f}}), out);
+  EXPECT_EQ(2, ma.count());
+  EXPECT_THAT(out, ElementsAre(4.f, 3.f, 5.f));
+
+  // shrink the window
+  ma.setWindow(1);
+  EXPECT_EQ(1, ma.count());
+  ma.average(out);
+  EXPECT_THAT(out, ElementsAre(5.f, 4.f, 6.f));
+
+  // enlarge the window
+  ma.setWindow(3);
+  EXPECT_EQ(1, ma.count());
+  ma.update(xt::xtensor<float, 2>({{1.f, 2.f, 3.f}}), out);
+  EXPECT_THAT(out, ElementsAre(3.f, 3.f, 4.5f));
+
+  xt::xtensor<float, 2> out_wrong = xt::zeros<float>({1, 2});
+  EXPECT_THROW(ma.update(xt::xtensor<float, 2>({{1.f, 2.f}}), out_wrong), std::invalid_argument);
+
+  ma.reset();
+  EXPECT_EQ(0, ma.count());
+  ma.update(xt::xtensor<float, 2>({{1.f, 2.f}}), out_wrong);
+  EXPECT_THAT(out_wrong, ElementsAre(1.f, 2.f));
+
+  EXPECT_THROW(MovingAverageImageData<float>(0), std::invalid_argument);
+}
+
+TEST(TestMovingAverageImageData, TestInf)
+{
+  auto inf = std::numeric_limits<float>::infinity();
+  MovingAverageImageData<float> ma(2);
+
+  xt::xtensor<float, 2> out = xt::zeros<float>({1, 2});
+  ma.update(xt::xtensor<float, 2>({{inf, -inf}}), out);
+  EXPECT_THAT(out, ElementsAre(inf, -inf));
+  ma.update(xt::xtensor<float, 2>({{1.f, inf}}), out);
+  EXPECT_THAT(out, ElementsAre(inf, nan_mt));
+  // the infinite values are moved out of the window
+  ma.update(xt::xtensor<float, 2>({{3.f, 2.f}}), out);
+  EXPECT_THAT(out, ElementsAre(2.f, inf));
+  ma.update(xt::xtensor<float, 2>({{5.f, 4.f}}), out);
+  EXPECT_THAT(out, ElementsAre(4.f, 3.f));
+}
+
+TEST(TestMovingAverageImageData, Test3D)
+{
+  MovingAverageImageData<float> ma(3);
+
+  xt::xtensor<float, 3> out = xt::zeros<float>({2, 1, 2});
+  for (size_t i = 1; i <= 5; ++i)
+  {
+    ma.update(xt::xtensor<float, 3>(static_cast<float>(i) * xt::ones<float>({2, 1, 2})), out);
+  }
+  EXPECT_EQ(3, ma.count());
+  EXPECT_THAT(out, ElementsAre(4.f, 4.f, 4.f, 4.f));
+
+  ma.setWindow(2);
+  ma.average(out);
+  EXPECT_THAT(out, ElementsAre(4.5f, 4.5f, 4.5f, 4.5f));
+}
+
 TEST(correctImageData, TestOffset3D)
 {
   xt::xtensor<float, 3> imgs {{{nan, 2.f, nan}, {3.f, 4.f, 5.f}},
@@ -3,6 +3,7 @@
 
 #include "xtensor/xio.hpp"
 #include "xtensor/xtensor.hpp"
+#include "xtensor/xview.hpp"
 
 #include "foamalgo/statistics.hpp"
 
@@ -13,5 +14,325 @@ using ::testing::ElementsAre;
 using ::testing::ElementsAreArray;
 using ::testing::NanSensitiveFloatEq;
 using ::testing::FloatEq;
+using ::testing::DoubleEq;
+using ::testing::DoubleNear;
+using ::testing::NanSensitiveDoubleEq;
+
+static constexpr auto nan = std::numeric_limits<float>::quiet_NaN();
+static const auto nan_dmt = NanSensitiveDoubleEq(std::numeric_limits<double>::quiet_NaN());
+static const auto nan_mt = NanSensitiveFloatEq(nan);
+
+TEST(TestReduceInto, TestGeneral)
+{
+  xt::xtensor<float, 3> src {{{1.f, nan}, {3.f, 4.f}},
+                             {{5.f, nan}, {nan, 8.f}}};
+
+  xt::xtensor<float, 2> out = xt::zeros<float>({2, 2});
+  reduceInto(xt::nansum<float>(src, {0}), out);
+  EXPECT_THAT(out, ElementsAre(6.f, 0.f, 3.f, 12.f));
+
+  xt::xtensor<float, 1> out1d = xt::zeros<float>({2});
+  reduceInto(xt::nanmax<float>(src, {1, 2}), out1d);
+  EXPECT_THAT(out1d, ElementsAre(4.f, 8.f));
+
+  xt::xtensor<float, 2> out_wrong = xt::zeros<float>({2, 3});
+  EXPECT_THROW(reduceInto(xt::nansum<float>(src, {0}), out_wrong), std::invalid_argument);
+}
+
+TEST(TestNanhistWithStats, TestGeneral)
+{
+  xt::xtensor<float, 2> src {{nan, 1.f, 2.f}, {3.f, 6.f, nan}};
+  xt::xtensor<long long, 1> hist = xt::zeros<long long>({4});
+
+  auto ret = nanhistWithStats(src, 1., 3., hist);
+  EXPECT_THAT(hist, ElementsAre(1, 0, 1, 1));
+  EXPECT_THAT(ret, ElementsAre(1., 3., 2., 2., DoubleEq(std::sqrt(2. / 3.))));
+
+  // outer edges from the data and an even number of values
+  ret = nanhistWithStats(src, -std::numeric_limits<double>::infinity(),
+                         std::numeric_limits<double>::infinity(), hist);
+  EXPECT_THAT(hist, ElementsAre(2, 1, 0, 1));
+  EXPECT_THAT(ret, ElementsAre(1., 6., 3., 2.5, DoubleEq(std::sqrt(3.5))));
+
+  ret = nanhistWithStats(src, 2.5, std::numeric_limits<double>::infinity(), hist);
+  EXPECT_THAT(hist, ElementsAre(1, 0, 0, 1));
+  EXPECT_THAT(ret, ElementsAre(2.5, 6., 4.5, 4.5, 1.5));
+
+  // no value
+  ret = nanhistWithStats(src, 10., 20., hist);
+  EXPECT_THAT(hist, ElementsAre(0, 0, 0, 0));
+  EXPECT_THAT(ret, ElementsAre(10., 20., nan_dmt, nan_dmt, nan_dmt));
+
+  // same values
+  xt::xtensor<double, 1> src_same {1., 1., std::numeric_limits<double>::quiet_NaN()};
+  ret = nanhistWithStats(src_same, -std::numeric_limits<double>::infinity(),
+                         std::numeric_limits<double>::infinity(), hist);
+  EXPECT_THAT(hist, ElementsAre(0, 0, 2, 0));
+  EXPECT_THAT(ret, ElementsAre(0.5, 1.5, 1., 1., 0.));
+
+  // outer edges are not finite
+  src(0, 0) = -std::numeric_limits<float>::infinity();
+  EXPECT_THROW(nanhistWithStats(src, -std::numeric_limits<double>::infinity(), 5., hist),
+               std::invalid_argument);
+  EXPECT_THROW(nanhistWithStats(src, 3., 1., hist), std::invalid_argument);
+}
+
+TEST(TestHistogram, TestHistogram1d)
+{
+  xt::xtensor<float, 1> src {nan, 0.f, 1.f, 1.5f, 2.f, 3.f, 4.f, -1.f};
+  xt::xtensor<long long, 1> hist = xt::zeros<long long>({3});
+  histogram1d(src, 1., 4., hist);
+  EXPECT_THAT(hist, ElementsAre(2, 1, 2));
+
+  xt::xtensor<double, 1> weights {1., 1., 0.5, 1., 2., 1., 3., 1.};
+  xt::xtensor<double, 1> hist_w = xt::zeros<double>({3});
+  histogram1d(src, weights, 1., 4., hist_w);
+  EXPECT_THAT(hist_w, ElementsAre(1.5, 2., 4.));
+
+  xt::xtensor<int, 1> src_int {0, 1, 2, 3};
+  histogram1d(src_int, 0., 3., hist);
+  EXPECT_THAT(hist, ElementsAre(1, 1, 2));
+
+  EXPECT_THROW(histogram1d(src, 1., 1., hist), std::invalid_argument);
+  EXPECT_THROW(histogram1d(src, 1., std::numeric_limits<double>::infinity(), hist), std::invalid_argument);
+  EXPECT_THROW(histogram1d(src, xt::xtensor<double, 1>({1., 2.}), 1., 4., hist_w), std::invalid_argument);
+}
+
+TEST(TestHistogram, TestHistogram1dWithEdges)
+{
+  xt::xtensor<float, 1> src {nan, 0.f, 1.f, 1.5f, 2.f, 3.f, 10.f, 100.f};
+  xt::xtensor<double, 1> edges {1., 2., 2., 10.};
+  xt::xtensor<long long, 1> hist = xt::zeros<long long>({3});
+  histogram1d(src, edges, hist);
+  EXPECT_THAT(hist, ElementsAre(2, 0, 3));
+
+  xt::xtensor<double, 1> weights {1., 1., 0.5, 1., 2., 1., 3., 1.};
+  xt::xtensor<double, 1> hist_w = xt::zeros<double>({3});
+  histogram1d(src, weights, edges, hist_w);
+  EXPECT_THAT(hist_w, ElementsAre(1.5, 0., 6.));
+
+  EXPECT_THROW(histogram1d(src, xt::xtensor<double, 1>({1., 3., 2., 4.}), hist), std::invalid_argument);
+  EXPECT_THROW(histogram1d(src, xt::xtensor<double, 1>({1., 2., 3.}), hist), std::invalid_argument);
+}
+
+TEST(TestHistogram, TestHistogram2d)
+{
+  xt::xtensor<double, 1> x {nan, 0., 1., 2., 1.};
+  xt::xtensor<double, 1> y {0., nan, 1., 3., 4.};
+  xt::xtensor<double, 2> hist = xt::zeros<double>({2, 3});
+  histogram2d(x, y, 0., 2., 0., 3., hist);
+  EXPECT_THAT(hist, ElementsAre(0., 0., 0., 0., 1., 1.));
+
+  xt::xtensor<double, 1> weights {1., 1., 0.5, 2., 1.};
+  histogram2d(x, y, weights, 0., 2., 0., 3., hist);
+  EXPECT_THAT(hist, ElementsAre(0., 0., 0., 0., 0.5, 2.));
+
+  EXPECT_THROW(histogram2d(x, xt::xtensor<double, 1>({1., 2.}), 0., 2., 0., 3., hist),
+               std::invalid_argument);
+  EXPECT_THROW(histogram2d(x, y, 0., 2., 3., 0., hist), std::invalid_argument);
+}
+
+TEST(TestBinnedMeanCount, TestGeneral)
+{
+  xt::xtensor<double, 1> x {nan, 0., 1., 2., 1., 0.5, 1.5};
+  xt::xtensor<double, 1> y {1., 2., nan, 3., 4., 0., 1.};
+  xt::xtensor<double, 1> mean = xt::zeros<double>({3});
+  xt::xtensor<long long, 1> count = xt::zeros<long long>({3});
+  binnedMeanCount(x, y, 0., 3., mean, count);
+  EXPECT_THAT(count, ElementsAre(2, 2, 1));
+  EXPECT_THAT(mean, ElementsAre(1., 2.5, 3.));
+
+  xt::xtensor<double, 1> var = xt::zeros<double>({3});
+  binnedMeanCount(x, y, 0., 3., mean, count, var);
+  EXPECT_THAT(var, ElementsAre(1., 2.25, 0.));
+
+  binnedMeanCount(x, y, 0., 6., mean, count, var);
+  EXPECT_THAT(count, ElementsAre(4, 1, 0));
+  EXPECT_THAT(mean, ElementsAre(1.75, 3., NanSensitiveDoubleEq(nan)));
+  EXPECT_THAT(var, ElementsAre(DoubleEq(2.1875), 0., NanSensitiveDoubleEq(nan)));
+
+  EXPECT_THROW(binnedMeanCount(x, xt::xtensor<double, 1>({1., 2.}), 0., 3., mean, count),
+               std::invalid_argument);
+  EXPECT_THROW(binnedMeanCount(x, y, 3., 0., mean, count), std::invalid_argument);
+  EXPECT_THROW(binnedMeanCount(x, y, 0., 3., mean, xt::xtensor<long long, 1>({0, 0})),
+               std::invalid_argument);
+}
+
+TEST(TestNanquantile, TestGeneral)
+{
+  xt::xtensor<double, 1> src1d {nan, 4., 1., 2., nan};
+  EXPECT_EQ(2., nanmedian(src1d));
+  EXPECT_EQ(1.5, nanquantile(src1d, 0.25));
+  EXPECT_EQ(1., nanquantile(src1d, 0.25, QuantileMethod::NEAREST)); // round half to even
+  EXPECT_EQ(4., nanquantile(src1d, 1.));
+  EXPECT_THROW(nanquantile(src1d, 1.5), std::invalid_argument);
+
+  xt::xtensor<double, 1> src_nan {nan, nan};
+  EXPECT_THAT(nanmedian(src_nan), nan_dmt);
+
+  xt::xtensor<float, 3> src {{{nan, nan, 2.f}, {3.f, 6.f, nan}},
+                             {{1.f, 4.f, nan}, {6.f, 3.f, nan}}};
+
+  xt::xtensor<float, 2> out2d = xt::zeros<float>({2, 3});
+  nanmedian(src, {0}, out2d);
+  EXPECT_THAT(out2d, ElementsAre(1.f, 4.f, 2.f, 4.5f, 4.5f, nan_mt));
+
+  xt::xtensor<float, 1> out1d = xt::zeros<float>({2});
+  nanmedian(src, {-1, 1}, out1d);
+  EXPECT_THAT(out1d, ElementsAre(3.f, 3.5f));
+  nanquantile(src, 0.75, {1, 2}, out1d, QuantileMethod::NEAREST);
+  EXPECT_THAT(out1d, ElementsAre(6.f, 4.f));
+
+  EXPECT_THROW(nanmedian(src, {0}, out1d), std::invalid_argument);
+  EXPECT_THROW(nanmedian(src, {3}, out1d), std::invalid_argument);
+  EXPECT_THROW(nanmedian(src, {1, -1, 2}, out1d), std::invalid_argument);
+}
+
+TEST(TestNanDescribe, TestGeneral)
+{
+  xt::xtensor<double, 1> src1d {nan, 4., 1., 1., nan};
+  EXPECT_THAT(nanDescribe(src1d), ElementsAre(3., 6., 1., 4., 2., 2.));
+
+  xt::xtensor<double, 1> src_nan {nan, nan};
+  EXPECT_THAT(nanDescribe(src_nan), ElementsAre(0., 0., nan_dmt, nan_dmt, nan_dmt, nan_dmt));
+
+  xt::xtensor<float, 3> src {{{nan, nan, 2.f}, {3.f, 6.f, nan}},
+                             {{1.f, 4.f, nan}, {6.f, 3.f, nan}}};
+  EXPECT_THAT(nanDescribe(src), ElementsAre(7., 25., 1., 6., DoubleEq(25. / 7.), DoubleNear(111. / 7. - 625. / 49., 1e-12)));
+
+  xt::xtensor<double, 2> out = xt::zeros<double>({6, 2});
+  nanDescribe(src, {-1, 1}, out);
+  EXPECT_THAT(out, ElementsAre(3., 4., 11., 14., 2., 1., 6., 6.,
+                               DoubleEq(11. / 3.), 3.5, DoubleNear(49. / 3. - 121. / 9., 1e-12), 3.25));
+
+  xt::xtensor<double, 3> out3d = xt::zeros<double>({6, 2, 3});
+  nanDescribe(src, {0}, out3d);
+  EXPECT_THAT(xt::view(out3d, 0), ElementsAre(1., 1., 1., 2., 2., 0.));
+  EXPECT_THAT(xt::view(out3d, 4), ElementsAre(1., 4., 2., 4.5, 4.5, nan_dmt));
+
+  EXPECT_THROW(nanDescribe(src, {0}, out), std::invalid_argument);
+  EXPECT_THROW(nanDescribe(src, {1, 2}, out3d), std::invalid_argument);
+}
+
+TEST(TestIntegerReduce, TestGeneral)
+{
+  xt::xtensor<uint16_t, 2> src {{65535, 1, 2}, {3, 65535, 0}};
+  // the result does not overflow
+  auto sum = integerReduce<IntegerReduction::SUM>(src);
+  static_assert(std::is_same_v<decltype(sum), unsigned long long>);
+  EXPECT_EQ(131076ull, sum);
+  EXPECT_DOUBLE_EQ(131076. / 6., integerReduce<IntegerReduction::MEAN>(src));
+  EXPECT_EQ(0, integerReduce<IntegerReduction::MIN>(src));
+  EXPECT_EQ(65535, integerReduce<IntegerReduction::MAX>(src));
+
+  xt::xtensor<int16_t, 1> src1d {-3, 1};
+  EXPECT_EQ(-2ll, integerReduce<IntegerReduction::SUM>(src1d));
+  EXPECT_DOUBLE_EQ(4., integerReduce<IntegerReduction::VAR>(src1d));
+  EXPECT_DOUBLE_EQ(2., integerReduce<IntegerReduction::STD>(src1d));
+
+  xt::xtensor<unsigned long long, 1> sum_out = xt::zeros<unsigned long long>({3});
+  integerReduce<IntegerReduction::SUM>(src, {0}, sum_out);
+  EXPECT_THAT(sum_out, ElementsAre(65538ull, 65536ull, 2ull));
+
+  xt::xtensor<double, 1> std_out = xt::zeros<double>({3});
+  integerReduce<IntegerReduction::STD>(src, {-2}, std_out);
+  EXPECT_THAT(std_out, ElementsAre(32766., 32767., 1.));
+
+  xt::xtensor<int16_t, 1> empty = xt::zeros<int16_t>({0});
+  EXPECT_EQ(0ll, integerReduce<IntegerReduction::SUM>(empty));
+  EXPECT_THAT(integerReduce<IntegerReduction::MEAN>(empty), nan_dmt);
+  EXPECT_THROW(integerReduce<IntegerReduction::MIN>(empty), std::invalid_argument);
+
+  EXPECT_THROW(integerReduce<IntegerReduction::STD>(src, {1}, std_out), std::invalid_argument);
+  EXPECT_THROW(integerReduce<IntegerReduction::STD>(src, {2}, std_out), std::invalid_argument);
+}
+
+TEST(TestStreamingHistogram, TestGeneral)
+{
+  EXPECT_THROW(StreamingHistogram<>(0, 0., 1.), std::invalid_argument);
+  EXPECT_THROW(StreamingHistogram<>(2, 1., 1.), std::invalid_argument);
+  EXPECT_THROW(StreamingHistogram<>(2, 0., 1., true), std::invalid_argument);
+
+  StreamingHistogram<> hist(4, 0., 4.);
+  EXPECT_THAT(hist.edges(), ElementsAre(0., 1., 2., 3., 4.));
+  EXPECT_THAT(hist.centers(), ElementsAre(0.5, 1.5, 2.5, 3.5));
+
+  xt::xtensor<float, 1> src {nan, -1.f, 0.f, 1.5f, 3.f, 4.f, 5.f};
+  hist.fill(src);
+  EXPECT_THAT(hist.counts(), ElementsAre(1., 1., 0., 2.));
+
+  xt::xtensor<double, 1> weights {1., 1., 0.5, 2., 1., 1., 1.};
+  StreamingHistogram<> hist_w(4, 0., 4.);
+  hist_w.fill(src, weights);
+  EXPECT_THAT(hist_w.counts(), ElementsAre(0.5, 2., 0., 2.));
+  EXPECT_THROW(hist_w.fill(src, xt::xtensor<double, 1>({1., 2.})), std::invalid_argument);
+
+  hist.merge(hist_w);
+  EXPECT_THAT(hist.counts(), ElementsAre(1.5, 3., 0., 4.));
+  EXPECT_THROW(hist.merge(StreamingHistogram<>(4, 0., 5.)), std::invalid_argument);
+
+  hist.reset();
+  EXPECT_THAT(hist.counts(), ElementsAre(0., 0., 0., 0.));
+
+  StreamingHistogram<> hist_log(2, 1., 100., true);
+  EXPECT_THAT(hist_log.edges(), ElementsAre(1., 10., 100.));
+  EXPECT_THAT(hist_log.centers(), ElementsAre(DoubleEq(std::sqrt(10.)), DoubleEq(std::sqrt(1000.))));
+  hist_log.fill(xt::xtensor<double, 1>({0.5, 1., 9.9, 10., 100., 101.}));
+  EXPECT_THAT(hist_log.counts(), ElementsAre(2., 2.));
+}
+
+TEST(TestQuantileSketch, TestGeneral)
+{
+  EXPECT_THROW(QuantileSketch<>(4), std::invalid_argument);
+
+  QuantileSketch<> sketch(200, 1);
+  EXPECT_EQ(0u, sketch.count());
+  EXPECT_THAT(sketch.quantile(0.5), nan_dmt);
+  EXPECT_THAT(sketch.min(), nan_dmt);
+
+  xt::xtensor<float, 1> src {nan, 4.f, 1.f, 3.f, nan, 2.f};
+  sketch.update(src);
+  EXPECT_EQ(4u, sketch.count());
+  EXPECT_EQ(1., sketch.min());
+  EXPECT_EQ(4., sketch.max());
+  EXPECT_EQ(1., sketch.quantile(0.));
+  EXPECT_EQ(2., sketch.quantile(0.4));
+  // round half to even
+  EXPECT_EQ(3., sketch.quantile(0.5));
+  EXPECT_EQ(4., sketch.quantile(1.));
+  EXPECT_THROW(sketch.quantile(1.1), std::invalid_argument);
+  EXPECT_THAT(sketch.quantiles({1., 0.5, 0.4, 0.}), ElementsAre(4., 3., 2., 1.));
+  EXPECT_THROW(sketch.quantiles({0.5, 1.1}), std::invalid_argument);
+
+  // the ranks of the estimated quantiles are close to the exact ones
+  size_t n = 100000;
+  xt::xtensor<double, 1> values = xt::zeros<double>({n});
+  for (size_t i = 0; i < n; ++i) values(i) = static_cast<double>((i * 7919) % n);
+  QuantileSketch<> sketch1(200, 1);
+  QuantileSketch<> sketch2(200, 2);
+  sketch1.update(values);
+  sketch2.update(values);
+  sketch1.merge(sketch2);
+  EXPECT_EQ(2 * n, sketch1.count());
+  EXPECT_LT(sketch1.size(), 1000u);
+  for (double q : {0.01, 0.1, 0.5, 0.9, 0.99})
+  {
+    EXPECT_NEAR(q * static_cast<double>(n), sketch1.quantile(q), 0.02 * static_cast<double>(n));
+  }
+  EXPECT_EQ(0., sketch1.quantile(0.));
+  EXPECT_EQ(static_cast<double>(n - 1), sketch1.quantile(1.));
+  // all the quantiles are found in one sweep
+  std::vector<double> qs {0.99, 0., 0.5, 0.01, 1., 0.1};
+  auto estimated = sketch1.quantiles(qs);
+  ASSERT_EQ(qs.size(), estimated.size());
+  for (size_t i = 0; i < qs.size(); ++i) EXPECT_EQ(sketch1.quantile(qs[i]), estimated[i]);
+
+  sketch1.merge(sketch1);
+  EXPECT_EQ(4 * n, sketch1.count());
+
+  sketch1.reset();
+  EXPECT_EQ(0u, sketch1.count());
+  EXPECT_EQ(0u, sketch1.size());
+}
 
 } //foam::test
\ No newline at end of file